@@ -0,0 +1,210 @@
+"""
+Cohort and retention analytics.
+
+Signups and ticket purchases are pulled once as flat arrays and bucketed
+into weekly cohorts with NumPy, instead of running one query per cohort
+and week.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.cache import cache
+from django.utils import timezone
+import numpy as np
+
+from apps.common.cache import CacheKeys
+from apps.lotteries.models import Ticket
+from apps.users.models import User
+
+SECONDS_PER_WEEK = 7 * 24 * 3600
+# 1970-01-05 is the first Monday after the epoch; weeks start on Mondays.
+WEEK_ORIGIN = 4 * 24 * 3600
+COHORT_CACHE_TIMEOUT = 3600
+
+
+def _week_index(timestamps):
+    """Map epoch seconds to absolute Monday-aligned week numbers."""
+    return np.floor_divide(timestamps - WEEK_ORIGIN, SECONDS_PER_WEEK).astype(np.int64)
+
+
+def _week_label(week):
+    """Return the Monday date for an absolute week number."""
+    start = datetime.fromtimestamp(int(week) * SECONDS_PER_WEEK + WEEK_ORIGIN, tz=dt_timezone.utc)
+    return start.date().isoformat()
+
+
+def _split_keys(keys):
+    """Split 16-byte keys into big-endian (high, low) uint64 halves."""
+    halves = np.frombuffer(keys.tobytes(), dtype='>u8').reshape(-1, 2)
+    return halves[:, 0].astype(np.uint64), halves[:, 1].astype(np.uint64)
+
+
+class CohortAnalyticsService:
+    """Service for weekly signup-cohort retention and ARPU."""
+
+    @staticmethod
+    def _load_signups(start_date, end_date):
+        """
+        Load signups as (sorted user keys, signup weeks).
+
+        User keys are the 16-byte UUIDs so purchases can be matched with
+        a binary search instead of a per-row dict lookup.
+        """
+        keys = []
+        timestamps = []
+        rows = User.objects.filter(
+            created_at__gte=start_date,
+            created_at__lte=end_date
+        ).order_by().values_list('id', 'created_at')
+        for user_id, created_at in rows.iterator(chunk_size=20000):
+            keys.append(user_id.bytes)
+            timestamps.append(created_at.timestamp())
+
+        keys = np.array(keys, dtype='S16')
+        timestamps = np.array(timestamps, dtype=np.float64)
+
+        order = np.argsort(keys, kind='stable')
+        return keys[order], _week_index(timestamps[order])
+
+    @staticmethod
+    def _load_purchases(start_date, end_date):
+        """
+        Load ticket purchases as (user keys, purchase weeks, amounts).
+
+        Tickets aren't linked to the transaction that paid for them, so
+        amounts are the lottery's current ticket price; revenue for past
+        cohorts shifts if a lottery's price is edited after the sale.
+        """
+        keys = []
+        timestamps = []
+        amounts = []
+        rows = Ticket.objects.filter(
+            user__created_at__gte=start_date,
+            user__created_at__lte=end_date,
+            purchased_at__gte=start_date,
+            purchased_at__lte=end_date
+        ).order_by().values_list('user_id', 'purchased_at', 'lottery__ticket_price')
+        for user_id, purchased_at, price in rows.iterator(chunk_size=20000):
+            keys.append(user_id.bytes)
+            timestamps.append(purchased_at.timestamp())
+            amounts.append(price)
+
+        return (
+            np.array(keys, dtype='S16'),
+            _week_index(np.array(timestamps, dtype=np.float64)),
+            np.array(amounts, dtype=np.float64),
+        )
+
+    @staticmethod
+    def compute_matrices(signup_keys, signup_weeks, purchase_keys, purchase_weeks, amounts, periods):
+        """
+        Build retention and ARPU matrices from flat arrays.
+
+        Args:
+            signup_keys: Sorted user keys
+            signup_weeks: Signup week per user (aligned with signup_keys)
+            purchase_keys: User key per purchase
+            purchase_weeks: Week per purchase
+            amounts: Amount per purchase
+            periods: Number of weeks after signup to track
+
+        Returns:
+            tuple: (first week, cohort sizes, retention matrix, ARPU matrix)
+        """
+        if signup_keys.size == 0:
+            empty = np.zeros((0, periods))
+            return 0, np.zeros(0, dtype=np.int64), empty, empty
+
+        first_week = int(signup_weeks.min())
+        cohort_of_user = signup_weeks - first_week
+        cohorts = int(cohort_of_user.max()) + 1
+        sizes = np.bincount(cohort_of_user, minlength=cohorts)
+
+        # Match purchases to their user on the high 64 bits of the key
+        # (integer search is far faster than bytes), then confirm the low
+        # half; purchases by users outside the window are dropped.
+        signup_hi, signup_lo = _split_keys(signup_keys)
+        purchase_hi, purchase_lo = _split_keys(purchase_keys)
+        # Searching with sorted needles keeps the binary search cache-friendly
+        needle_order = np.argsort(purchase_hi)
+        positions = np.empty(purchase_hi.size, dtype=np.int64)
+        positions[needle_order] = np.searchsorted(signup_hi, purchase_hi[needle_order])
+        positions = np.clip(positions, 0, signup_keys.size - 1)
+        known = (signup_hi[positions] == purchase_hi) & (signup_lo[positions] == purchase_lo)
+
+        user_idx = positions[known]
+        offsets = purchase_weeks[known] - signup_weeks[user_idx]
+        in_range = (offsets >= 0) & (offsets < periods)
+        user_idx = user_idx[in_range]
+        offsets = offsets[in_range]
+        amounts = amounts[known][in_range]
+
+        cells = cohort_of_user[user_idx] * periods + offsets
+        revenue = np.bincount(cells, weights=amounts, minlength=cohorts * periods)
+
+        # Retention counts each user at most once per week offset
+        seen = np.zeros(signup_keys.size * periods, dtype=bool)
+        seen[user_idx * periods + offsets] = True
+        active_pairs = np.flatnonzero(seen)
+        active_cells = cohort_of_user[active_pairs // periods] * periods + active_pairs % periods
+        active = np.bincount(active_cells, minlength=cohorts * periods)
+
+        divisor = np.where(sizes > 0, sizes, 1)[:, None]
+        retention = active.reshape(cohorts, periods) / divisor
+        arpu = revenue.reshape(cohorts, periods) / divisor
+
+        return first_week, sizes, retention, arpu
+
+    @classmethod
+    def get_cohort_retention(cls, weeks=12, end_date=None, use_cache=True):
+        """
+        Get weekly signup-cohort retention and ARPU.
+
+        Args:
+            weeks: Number of cohorts (and weeks tracked per cohort)
+            end_date: Last day to include (defaults to now)
+            use_cache: Read/write the cached result
+
+        Returns:
+            dict: Cohort rows with size, retention and ARPU per week offset
+        """
+        if end_date is None:
+            end_date = timezone.now()
+        start_date = end_date - timedelta(weeks=weeks)
+
+        cache_key = CacheKeys.analytics_cohorts({'weeks': weeks, 'end_date': end_date.date().isoformat()})
+        if use_cache:
+            cached_result = cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
+
+        signup_keys, signup_weeks = cls._load_signups(start_date, end_date)
+        purchase_keys, purchase_weeks, amounts = cls._load_purchases(start_date, end_date)
+        first_week, sizes, retention, arpu = cls.compute_matrices(
+            signup_keys, signup_weeks, purchase_keys, purchase_weeks, amounts, weeks
+        )
+
+        current_week = int(_week_index(np.array([end_date.timestamp()]))[0])
+        cohorts = []
+        for row, size in enumerate(sizes):
+            if not size:
+                continue
+            week = first_week + row
+            # Offsets past the current week haven't happened yet
+            observed = min(weeks, current_week - week + 1)
+            cohorts.append({
+                'week': _week_label(week),
+                'size': int(size),
+                'retention': [round(float(value), 4) for value in retention[row][:observed]],
+                'arpu': [round(float(value), 2) for value in arpu[row][:observed]],
+            })
+
+        result = {
+            'weeks': weeks,
+            'cohorts': cohorts,
+            'period': {
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat(),
+            }
+        }
+
+        cache.set(cache_key, result, COHORT_CACHE_TIMEOUT)
+        return result
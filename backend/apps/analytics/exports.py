@@ -0,0 +1,228 @@
+"""
+Columnar (Parquet/Arrow) exports for analytics consumers.
+
+Rows are streamed from DB cursors and written as Arrow record batches with
+typed decimal and timestamp columns, so downstream loaders don't have to
+re-parse CSV text.
+"""
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from apps.common.exceptions import ExportError
+from apps.lotteries.models import Ticket
+from apps.transactions.models import Transaction
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+class ColumnarExportService:
+    """Service for exporting analytics datasets in columnar formats."""
+
+    DATASETS = ('transactions', 'tickets', 'daily_rollups')
+    FORMATS = {
+        'parquet': 'parquet',
+        'arrow': 'arrow',
+    }
+
+    @staticmethod
+    def is_available():
+        """Return True if pyarrow is installed."""
+        return pa is not None
+
+    @staticmethod
+    def export_dir():
+        """Directory async exports are written to and served from."""
+        return getattr(settings, 'ANALYTICS_EXPORT_DIR', os.path.join(settings.BASE_DIR, 'exports'))
+
+    @staticmethod
+    def _schema(dataset):
+        """Arrow schema for a dataset."""
+        timestamp = pa.timestamp('us', tz='UTC')
+        money = pa.decimal128(10, 2)
+
+        if dataset == 'transactions':
+            return pa.schema([
+                ('id', pa.string()),
+                ('user_id', pa.string()),
+                ('username', pa.string()),
+                ('type', pa.dictionary(pa.int8(), pa.string())),
+                ('status', pa.dictionary(pa.int8(), pa.string())),
+                ('amount', money),
+                ('lottery_id', pa.string()),
+                ('created_at', timestamp),
+                ('completed_at', timestamp),
+            ])
+        if dataset == 'tickets':
+            return pa.schema([
+                ('id', pa.string()),
+                ('user_id', pa.string()),
+                ('lottery_id', pa.string()),
+                ('lottery_name', pa.dictionary(pa.int32(), pa.string())),
+                ('ticket_number', pa.int32()),
+                ('ticket_price', money),
+                ('is_winner', pa.bool_()),
+                ('purchased_at', timestamp),
+            ])
+        if dataset == 'daily_rollups':
+            return pa.schema([
+                ('date', pa.date32()),
+                ('type', pa.dictionary(pa.int8(), pa.string())),
+                ('transaction_count', pa.int64()),
+                ('total_amount', pa.decimal128(18, 2)),
+            ])
+        raise ExportError(f'Unknown dataset: {dataset}')
+
+    @staticmethod
+    def _rows(dataset, start_date, end_date, filters=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Yield rows for a dataset as tuples matching its schema order.
+
+        Args:
+            dataset: Dataset name
+            start_date: Start date (inclusive)
+            end_date: End date (inclusive)
+            filters: Optional dict with 'type' and 'status' keys
+            batch_size: Cursor fetch size
+
+        Yields:
+            tuple
+        """
+        filters = filters or {}
+
+        if dataset == 'transactions':
+            queryset = Transaction.objects.filter(
+                created_at__gte=start_date,
+                created_at__lte=end_date
+            )
+            if filters.get('type'):
+                queryset = queryset.filter(type=filters['type'])
+            if filters.get('status'):
+                queryset = queryset.filter(status=filters['status'])
+            rows = queryset.order_by().values_list(
+                'id', 'user_id', 'user__username', 'type', 'status',
+                'amount', 'lottery_id', 'created_at', 'completed_at'
+            ).iterator(chunk_size=batch_size)
+            for row in rows:
+                yield (
+                    str(row[0]), str(row[1]), row[2], row[3], row[4],
+                    row[5], str(row[6]) if row[6] else None, row[7], row[8],
+                )
+
+        elif dataset == 'tickets':
+            rows = Ticket.objects.filter(
+                purchased_at__gte=start_date,
+                purchased_at__lte=end_date
+            ).order_by().values_list(
+                'id', 'user_id', 'lottery_id', 'lottery__name',
+                'ticket_number', 'lottery__ticket_price', 'is_winner', 'purchased_at'
+            ).iterator(chunk_size=batch_size)
+            for row in rows:
+                yield (str(row[0]), str(row[1]), str(row[2])) + tuple(row[3:])
+
+        elif dataset == 'daily_rollups':
+            queryset = Transaction.objects.filter(
+                status=filters.get('status') or 'COMPLETED',
+                created_at__gte=start_date,
+                created_at__lte=end_date
+            )
+            if filters.get('type'):
+                queryset = queryset.filter(type=filters['type'])
+            rows = queryset.order_by().annotate(
+                date=TruncDate('created_at')
+            ).values('date', 'type').annotate(
+                transaction_count=Count('id'),
+                total_amount=Sum('amount')
+            ).values_list('date', 'type', 'transaction_count', 'total_amount').order_by('date', 'type')
+            for row in rows.iterator(chunk_size=batch_size):
+                yield row
+
+        else:
+            raise ExportError(f'Unknown dataset: {dataset}')
+
+    @classmethod
+    def _batches(cls, schema, rows, batch_size):
+        """Group row tuples into Arrow record batches."""
+        width = len(schema)
+        columns = [[] for _ in range(width)]
+        pending = 0
+
+        for row in rows:
+            for index in range(width):
+                columns[index].append(row[index])
+            pending += 1
+            if pending >= batch_size:
+                yield pa.record_batch(columns, schema=schema)
+                columns = [[] for _ in range(width)]
+                pending = 0
+
+        if pending:
+            yield pa.record_batch(columns, schema=schema)
+
+    @classmethod
+    def export(cls, dataset, destination, start_date, end_date, format='parquet',
+               filters=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Export a dataset to a columnar file.
+
+        Args:
+            dataset: One of DATASETS
+            destination: File path or writable binary file object
+            start_date: Start date (inclusive)
+            end_date: End date (inclusive)
+            format: 'parquet' or 'arrow'
+            filters: Optional dict with 'type' and 'status' keys
+            batch_size: Rows per record batch
+
+        Returns:
+            int: Number of rows written
+
+        Raises:
+            ExportError: If pyarrow is missing or arguments are invalid
+        """
+        if not cls.is_available():
+            raise ExportError('pyarrow is required for columnar exports')
+        if dataset not in cls.DATASETS:
+            raise ExportError(f'Unknown dataset: {dataset}')
+        if format not in cls.FORMATS:
+            raise ExportError(f'Unsupported export format: {format}')
+
+        schema = cls._schema(dataset)
+        rows = cls._rows(dataset, start_date, end_date, filters, batch_size)
+        total = 0
+
+        if format == 'parquet':
+            writer = pq.ParquetWriter(destination, schema, compression='zstd')
+        else:
+            writer = pa.ipc.new_file(destination, schema)
+
+        try:
+            for batch in cls._batches(schema, rows, batch_size):
+                writer.write_batch(batch)
+                total += batch.num_rows
+        finally:
+            writer.close()
+
+        logger.info(f'Exported {total} {dataset} rows as {format}')
+        return total
+
+    @classmethod
+    def build_filename(cls, dataset, start_date, end_date, format='parquet'):
+        """Build a unique export filename."""
+        return (
+            f'{dataset}_{start_date.date()}_{end_date.date()}_'
+            f'{uuid.uuid4().hex[:8]}.{cls.FORMATS[format]}'
+        )
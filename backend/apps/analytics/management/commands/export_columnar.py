@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from datetime import datetime, timedelta
+
+from apps.analytics.exports import ColumnarExportService
+from apps.common.exceptions import ExportError
+
+
+class Command(BaseCommand):
+    help = 'Export transactions, tickets or daily rollups as Parquet/Arrow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=ColumnarExportService.DATASETS)
+        parser.add_argument('output', help='Destination file path')
+        parser.add_argument('--format', choices=list(ColumnarExportService.FORMATS), default='parquet')
+        parser.add_argument('--start-date', help='ISO start date (default: 30 days ago)')
+        parser.add_argument('--end-date', help='ISO end date (default: now)')
+        parser.add_argument('--type', help='Filter by transaction type')
+        parser.add_argument('--status', help='Filter by transaction status')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per record batch')
+
+    def _parse_date(self, value, default):
+        if not value:
+            return default
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'Invalid date: {value}')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def handle(self, *args, **options):
+        end_date = self._parse_date(options['end_date'], timezone.now())
+        start_date = self._parse_date(options['start_date'], end_date - timedelta(days=30))
+        filters = {
+            'type': options['type'],
+            'status': options['status'],
+        }
+
+        try:
+            rows = ColumnarExportService.export(
+                options['dataset'],
+                options['output'],
+                start_date,
+                end_date,
+                format=options['format'],
+                filters=filters,
+                batch_size=options['batch_size'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {rows} {options['dataset']} rows to {options['output']}"
+        ))
@@ -112,9 +112,7 @@ class AnalyticsService:
         ).count()
         
         # Users with tickets
-        users_with_tickets = User.objects.filter(
-            tickets__isnull=False
-        ).distinct().count()
+        users_with_tickets = Ticket.objects.values('user_id').distinct().count()
         
         return {
             'total_users': total_users,
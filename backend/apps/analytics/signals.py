@@ -0,0 +1,27 @@
+"""
+Signals for analytics app.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from apps.lotteries.models import LotteryDrawLog
+from apps.transactions.models import WithdrawalRequest
+from apps.analytics.snapshots import DashboardSnapshotService
+
+
+@receiver(post_save, sender=LotteryDrawLog)
+def refresh_dashboard_after_draw(sender, instance, created, **kwargs):
+    """
+    Rebuild dashboard snapshots once a draw is committed.
+    """
+    if created:
+        transaction.on_commit(DashboardSnapshotService.request_refresh)
+
+
+@receiver(post_save, sender=WithdrawalRequest)
+def refresh_dashboard_after_withdrawal(sender, instance, created, **kwargs):
+    """
+    Rebuild dashboard snapshots when a withdrawal is approved or paid out.
+    """
+    if instance.status in ('APPROVED', 'COMPLETED'):
+        transaction.on_commit(DashboardSnapshotService.request_refresh)
@@ -0,0 +1,103 @@
+"""
+Materialized admin dashboard snapshots.
+
+Dashboard metrics for the standard windows are rebuilt in the background
+and stored without expiry, so the dashboard endpoint is a single key read
+even right after a deploy or cache eviction of the short-lived entries.
+"""
+import logging
+from datetime import timedelta
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.analytics.services import AnalyticsService
+from apps.common.cache import CacheKeys
+
+logger = logging.getLogger(__name__)
+
+STANDARD_WINDOWS = (1, 7, 30, 90)
+# Bursts of events within this window trigger a single rebuild
+REFRESH_DEBOUNCE_SECONDS = 60
+
+
+class DashboardSnapshotService:
+    """Service for building and reading dashboard snapshots."""
+
+    @staticmethod
+    def compute(days):
+        """
+        Compute dashboard metrics for the last `days` days.
+
+        Args:
+            days: Window size in days
+
+        Returns:
+            dict: Financial, user and lottery metrics
+        """
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=days)
+
+        return {
+            'financial': AnalyticsService.get_financial_metrics(start_date, end_date),
+            'users': AnalyticsService.get_user_metrics(start_date, end_date),
+            'lotteries': AnalyticsService.get_lottery_metrics(start_date, end_date),
+            'generated_at': end_date.isoformat(),
+        }
+
+    @classmethod
+    def build(cls, days):
+        """Compute and store the snapshot for one window."""
+        snapshot = cls.compute(days)
+        cache.set(CacheKeys.analytics_dashboard_snapshot(days), snapshot, None)
+        return snapshot
+
+    @classmethod
+    def build_all(cls):
+        """Rebuild snapshots for all standard windows."""
+        for days in STANDARD_WINDOWS:
+            cls.build(days)
+        return len(STANDARD_WINDOWS)
+
+    @classmethod
+    def get(cls, days):
+        """
+        Get the dashboard snapshot for a window.
+
+        Standard windows are served from the stored snapshot (built inline
+        only if it has never been built); other windows fall back to a
+        short-lived cache entry.
+
+        Args:
+            days: Window size in days
+
+        Returns:
+            dict: Dashboard metrics
+        """
+        if days in STANDARD_WINDOWS:
+            snapshot = cache.get(CacheKeys.analytics_dashboard_snapshot(days))
+            if snapshot is None:
+                snapshot = cls.build(days)
+            return snapshot
+
+        cache_key = CacheKeys.analytics_summary({'days': days})
+        result = cache.get(cache_key)
+        if result is None:
+            result = cls.compute(days)
+            cache.set(cache_key, result, 300)
+        return result
+
+    @staticmethod
+    def request_refresh():
+        """Schedule a debounced rebuild after a significant event."""
+        from apps.analytics.tasks import refresh_dashboard_snapshots_task
+
+        if not cache.add(CacheKeys.analytics_dashboard_refresh_pending(), True, REFRESH_DEBOUNCE_SECONDS):
+            return False
+
+        try:
+            refresh_dashboard_snapshots_task.apply_async(countdown=REFRESH_DEBOUNCE_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not schedule dashboard snapshot refresh: {str(e)}")
+            cache.delete(CacheKeys.analytics_dashboard_refresh_pending())
+            return False
+        return True
@@ -0,0 +1,59 @@
+"""
+Celery tasks for analytics reports.
+"""
+from celery import shared_task
+from datetime import datetime
+from apps.analytics.exports import ColumnarExportService
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_columnar_export_task(dataset, start_date, end_date, format='parquet', filters=None):
+    """
+    Write a columnar export to ANALYTICS_EXPORT_DIR.
+
+    Args:
+        dataset: Dataset name (see ColumnarExportService.DATASETS)
+        start_date: ISO formatted start date
+        end_date: ISO formatted end date
+        format: 'parquet' or 'arrow'
+        filters: Optional filters dict
+
+    Returns:
+        str: Name of the written file, served by the reports_download endpoint
+    """
+    try:
+        start = datetime.fromisoformat(start_date)
+        end = datetime.fromisoformat(end_date)
+
+        export_dir = ColumnarExportService.export_dir()
+        os.makedirs(export_dir, exist_ok=True)
+        filename = ColumnarExportService.build_filename(dataset, start, end, format)
+        path = os.path.join(export_dir, filename)
+
+        rows = ColumnarExportService.export(dataset, path, start, end, format=format, filters=filters)
+        logger.info(f"Columnar export written to {path} ({rows} rows)")
+        return filename
+    except Exception as e:
+        logger.error(f"Error generating columnar export: {str(e)}")
+        raise
+
+
+@shared_task
+def refresh_dashboard_snapshots_task():
+    """Rebuild admin dashboard snapshots for the standard windows."""
+    from apps.analytics.snapshots import DashboardSnapshotService
+    from apps.common.cache import CacheKeys
+    from django.core.cache import cache
+    
+    try:
+        # Clear the debounce flag first so events during the rebuild schedule another one
+        cache.delete(CacheKeys.analytics_dashboard_refresh_pending())
+        count = DashboardSnapshotService.build_all()
+        return f"Refreshed {count} dashboard snapshots"
+    except Exception as e:
+        logger.error(f"Error refreshing dashboard snapshots: {str(e)}")
+        raise
@@ -3,7 +3,7 @@ from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from apps.analytics.services import AnalyticsService
-from apps.lotteries.models import Lottery
+from apps.lotteries.models import Lottery, Ticket
 from apps.transactions.models import Transaction
 from apps.users.models import User
 from decimal import Decimal
@@ -127,3 +127,309 @@ class AnalyticsViewSetTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('active_lotteries', response.data)
 
+
+
+class ColumnarExportServiceTestCase(TestCase):
+    """Test ColumnarExportService"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='exportuser',
+            email='export@example.com',
+            password='TestPassword123'
+        )
+        self.start_date = timezone.now() - timedelta(days=1)
+        self.end_date = timezone.now() + timedelta(minutes=1)
+        for amount in ('100.00', '25.50'):
+            Transaction.objects.create(
+                user=self.user,
+                type='DEPOSIT',
+                amount=Decimal(amount),
+                status='COMPLETED'
+            )
+
+    def test_export_transactions_parquet(self):
+        """Test transactions are written with typed columns"""
+        import os
+        import tempfile
+        from apps.analytics.exports import ColumnarExportService, pq, pa
+
+        if not ColumnarExportService.is_available():
+            self.skipTest('pyarrow not installed')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'transactions.parquet')
+            rows = ColumnarExportService.export(
+                'transactions', path, self.start_date, self.end_date, batch_size=1
+            )
+            table = pq.read_table(path)
+
+        self.assertEqual(rows, 2)
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(table.schema.field('amount').type, pa.decimal128(10, 2))
+        self.assertEqual(
+            sorted(table.column('amount').to_pylist()),
+            [Decimal('25.50'), Decimal('100.00')]
+        )
+
+    def test_export_daily_rollups_arrow(self):
+        """Test daily rollups aggregate per day and type"""
+        import io
+        from apps.analytics.exports import ColumnarExportService, pa
+
+        if not ColumnarExportService.is_available():
+            self.skipTest('pyarrow not installed')
+
+        sink = io.BytesIO()
+        ColumnarExportService.export(
+            'daily_rollups', sink, self.start_date, self.end_date, format='arrow'
+        )
+        table = pa.ipc.open_file(pa.BufferReader(sink.getvalue())).read_all()
+
+        self.assertEqual(table.num_rows, 1)
+        self.assertEqual(table.column('transaction_count').to_pylist(), [2])
+        self.assertEqual(table.column('total_amount').to_pylist(), [Decimal('125.50')])
+
+
+class ColumnarExportViewTestCase(TestCase):
+    """Test queued columnar exports and their download endpoint"""
+
+    def setUp(self):
+        import tempfile
+        from apps.analytics.exports import ColumnarExportService
+
+        if not ColumnarExportService.is_available():
+            self.skipTest('pyarrow not installed')
+
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            username='exportadmin',
+            email='exportadmin@example.com',
+            password='AdminPassword123',
+            role='admin'
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        for amount in ('100.00', '25.50'):
+            Transaction.objects.create(
+                user=self.admin_user,
+                type='DEPOSIT',
+                amount=Decimal(amount),
+                status='COMPLETED'
+            )
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.export_dir = tmp.name
+        settings_override = self.settings(ANALYTICS_EXPORT_DIR=self.export_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _queue(self, url):
+        from unittest.mock import patch
+
+        with patch('apps.analytics.tasks.generate_columnar_export_task.delay') as delay:
+            delay.return_value.id = 'export-task'
+            response = self.client.get(url)
+        return response, delay
+
+    def test_transactions_report_parquet_queues_export(self):
+        """Test ?format=parquet on the transactions report queues a columnar export"""
+        response, delay = self._queue('/api/admin/analytics/reports_transactions/?format=parquet')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(delay.call_args[0][0], 'transactions')
+        self.assertEqual(delay.call_args[0][3], 'parquet')
+        self.assertTrue(
+            response.data['download_url'].endswith('/reports_download/?task_id=export-task')
+        )
+
+    def test_reports_columnar_queues_dataset(self):
+        """Test the columnar report queues the requested dataset and format"""
+        response, delay = self._queue(
+            '/api/admin/analytics/reports_columnar/?dataset=daily_rollups&format=arrow'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['dataset'], 'daily_rollups')
+        self.assertEqual(delay.call_args[0][0], 'daily_rollups')
+        self.assertEqual(delay.call_args[0][3], 'arrow')
+
+    def test_reports_columnar_rejects_unknown_dataset(self):
+        """Test unknown datasets and formats are rejected before queueing"""
+        response, delay = self._queue('/api/admin/analytics/reports_columnar/?dataset=users')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response, delay = self._queue('/api/admin/analytics/reports_columnar/?format=csv')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        delay.assert_not_called()
+
+    def test_export_task_writes_file_and_download_serves_it(self):
+        """Test the task writes into the export dir and the download endpoint serves it"""
+        import io
+        import os
+        from unittest.mock import patch
+        from apps.analytics.exports import pq
+        from apps.analytics.tasks import generate_columnar_export_task
+
+        filename = generate_columnar_export_task(
+            'transactions',
+            (timezone.now() - timedelta(days=1)).isoformat(),
+            (timezone.now() + timedelta(minutes=1)).isoformat(),
+            'parquet'
+        )
+        self.assertEqual(os.path.dirname(filename), '')
+        self.assertTrue(os.path.exists(os.path.join(self.export_dir, filename)))
+
+        with patch('celery.result.AsyncResult') as async_result:
+            async_result.return_value.ready.return_value = True
+            async_result.return_value.successful.return_value = True
+            async_result.return_value.result = filename
+            response = self.client.get('/api/admin/analytics/reports_download/?task_id=export-task')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        table = pq.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 2)
+
+    def test_download_pending_export(self):
+        """Test downloading an unfinished export reports it as pending"""
+        from unittest.mock import patch
+
+        with patch('celery.result.AsyncResult') as async_result:
+            async_result.return_value.ready.return_value = False
+            response = self.client.get('/api/admin/analytics/reports_download/?task_id=export-task')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+
+    def test_download_stays_inside_export_dir(self):
+        """Test a result naming another path is not served"""
+        from unittest.mock import patch
+
+        with patch('celery.result.AsyncResult') as async_result:
+            async_result.return_value.ready.return_value = True
+            async_result.return_value.successful.return_value = True
+            async_result.return_value.result = '/etc/passwd'
+            response = self.client.get('/api/admin/analytics/reports_download/?task_id=export-task')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CohortAnalyticsServiceTestCase(TestCase):
+    """Test CohortAnalyticsService"""
+
+    def test_compute_matrices(self):
+        """Test retention counts users once per week and ARPU sums revenue"""
+        import numpy as np
+        from apps.analytics.cohorts import CohortAnalyticsService
+
+        signup_keys = np.array([b'a' * 16, b'b' * 16, b'c' * 16], dtype='S16')
+        signup_weeks = np.array([100, 100, 101])
+        purchase_keys = np.array([b'a' * 16, b'a' * 16, b'b' * 16, b'c' * 16, b'z' * 16], dtype='S16')
+        purchase_weeks = np.array([100, 100, 101, 101, 100])
+        amounts = np.array([10.0, 5.0, 20.0, 8.0, 99.0])
+
+        first_week, sizes, retention, arpu = CohortAnalyticsService.compute_matrices(
+            signup_keys, signup_weeks, purchase_keys, purchase_weeks, amounts, 2
+        )
+
+        self.assertEqual(first_week, 100)
+        self.assertEqual(sizes.tolist(), [2, 1])
+        self.assertEqual(retention.tolist(), [[0.5, 0.5], [1.0, 0.0]])
+        self.assertEqual(arpu.tolist(), [[7.5, 10.0], [8.0, 0.0]])
+
+    def test_get_cohort_retention(self):
+        """Test cohorts are built from signups and ticket purchases"""
+        from apps.analytics.cohorts import CohortAnalyticsService
+
+        user = User.objects.create_user(
+            username='cohortuser',
+            email='cohort@example.com',
+            password='TestPassword123'
+        )
+        lottery = Lottery.objects.create(
+            name='Cohort Lottery',
+            description='Test',
+            ticket_price=Decimal('10.00'),
+            total_tickets=100,
+            available_tickets=99,
+            prize_amount=Decimal('500.00'),
+            status='ACTIVE',
+            draw_date=timezone.now() + timedelta(days=7),
+            created_by=user
+        )
+        Ticket.objects.create(user=user, lottery=lottery, ticket_number=1)
+
+        result = CohortAnalyticsService.get_cohort_retention(weeks=4, use_cache=False)
+
+        self.assertEqual(len(result['cohorts']), 1)
+        cohort = result['cohorts'][0]
+        self.assertEqual(cohort['size'], 1)
+        self.assertEqual(cohort['retention'], [1.0])
+        self.assertEqual(cohort['arpu'], [10.0])
+
+    def test_load_purchases_bounded_by_window(self):
+        """Test purchases after the report window are not counted"""
+        from apps.analytics.cohorts import CohortAnalyticsService
+
+        user = User.objects.create_user(
+            username='windowuser',
+            email='window@example.com',
+            password='TestPassword123'
+        )
+        lottery = Lottery.objects.create(
+            name='Window Lottery',
+            description='Test',
+            ticket_price=Decimal('10.00'),
+            total_tickets=100,
+            available_tickets=98,
+            prize_amount=Decimal('500.00'),
+            status='ACTIVE',
+            draw_date=timezone.now() + timedelta(days=7),
+            created_by=user
+        )
+        Ticket.objects.create(user=user, lottery=lottery, ticket_number=1)
+        late = Ticket.objects.create(user=user, lottery=lottery, ticket_number=2)
+        end_date = timezone.now() + timedelta(minutes=1)
+        Ticket.objects.filter(pk=late.pk).update(purchased_at=end_date + timedelta(days=1))
+
+        keys, weeks, amounts = CohortAnalyticsService._load_purchases(
+            timezone.now() - timedelta(days=1), end_date
+        )
+
+        self.assertEqual(amounts.tolist(), [10.0])
+
+
+class DashboardSnapshotServiceTestCase(TestCase):
+    """Test DashboardSnapshotService"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.common.cache import CacheKeys
+        from apps.analytics.snapshots import STANDARD_WINDOWS
+
+        for days in STANDARD_WINDOWS:
+            cache.delete(CacheKeys.analytics_dashboard_snapshot(days))
+
+    def test_get_serves_stored_snapshot(self):
+        """Test standard windows are read from the stored snapshot"""
+        from unittest.mock import patch
+        from apps.analytics.snapshots import DashboardSnapshotService
+
+        built = DashboardSnapshotService.build(7)
+
+        with patch.object(DashboardSnapshotService, 'compute') as compute:
+            snapshot = DashboardSnapshotService.get(7)
+
+        compute.assert_not_called()
+        self.assertEqual(snapshot['generated_at'], built['generated_at'])
+        self.assertIn('financial', snapshot)
+
+    def test_get_builds_missing_snapshot(self):
+        """Test a missing snapshot is built once and stored"""
+        from django.core.cache import cache
+        from apps.common.cache import CacheKeys
+        from apps.analytics.snapshots import DashboardSnapshotService
+
+        snapshot = DashboardSnapshotService.get(30)
+
+        self.assertEqual(cache.get(CacheKeys.analytics_dashboard_snapshot(30)), snapshot)
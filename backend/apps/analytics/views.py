@@ -3,48 +3,41 @@ Analytics views for admin dashboard.
 """
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.response import Response
+from rest_framework.settings import APISettings, DEFAULTS, IMPORT_STRINGS
+from django.http import FileResponse
+from django.urls import reverse
 from django.utils import timezone
-from django.core.cache import cache
-from apps.common.cache import CacheKeys
 from datetime import timedelta, datetime
+import os
 
 from apps.analytics.services import AnalyticsService
+from apps.analytics.exports import ColumnarExportService
+from apps.analytics.snapshots import DashboardSnapshotService
 from apps.users.permissions import IsAdminUser
 
 
+class ReportFormatNegotiation(DefaultContentNegotiation):
+    """
+    Content negotiation that leaves ?format= to the report actions.
+    
+    DRF treats ?format= as a renderer override and 404s on values such as
+    csv or parquet before the view runs.
+    """
+    settings = APISettings({'URL_FORMAT_OVERRIDE': None}, DEFAULTS, IMPORT_STRINGS)
+
+
 class AnalyticsViewSet(viewsets.ViewSet):
     """Analytics endpoints for admin dashboard"""
     permission_classes = [IsAdminUser]
+    content_negotiation_class = ReportFormatNegotiation
     
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get dashboard overview metrics"""
-        # Get date range from query params
         days = int(request.query_params.get('days', 30))
-        start_date = timezone.now() - timedelta(days=days)
-        end_date = timezone.now()
-        
-        # Try to get from cache
-        cache_key = CacheKeys.analytics_summary({'days': days})
-        cached_result = cache.get(cache_key)
-        if cached_result is not None:
-            return Response(cached_result)
-        
-        financial = AnalyticsService.get_financial_metrics(start_date, end_date)
-        users = AnalyticsService.get_user_metrics(start_date, end_date)
-        lotteries = AnalyticsService.get_lottery_metrics(start_date, end_date)
-        
-        result = {
-            'financial': financial,
-            'users': users,
-            'lotteries': lotteries,
-        }
-        
-        # Cache for 5 minutes
-        cache.set(cache_key, result, 300)
-        
-        return Response(result)
+        return Response(DashboardSnapshotService.get(days))
     
     @action(detail=False, methods=['get'])
     def financial(self, request):
@@ -131,6 +124,18 @@ class AnalyticsViewSet(viewsets.ViewSet):
             'data': chart_data
         })
     
+    @action(detail=False, methods=['get'])
+    def cohorts(self, request):
+        """Get weekly signup-cohort retention and ARPU"""
+        from apps.analytics.cohorts import CohortAnalyticsService
+        
+        try:
+            weeks = min(max(int(request.query_params.get('weeks', 12)), 1), 52)
+        except ValueError:
+            weeks = 12
+        
+        return Response(CohortAnalyticsService.get_cohort_retention(weeks=weeks))
+    
     @action(detail=False, methods=['get'])
     def reports_financial(self, request):
         """Download financial report"""
@@ -227,5 +232,118 @@ class AnalyticsViewSet(viewsets.ViewSet):
             'status': request.query_params.get('status'),
         }
         
+        format_type = request.query_params.get('format', 'csv')
+        if format_type in ColumnarExportService.FORMATS:
+            return self._queue_columnar_export('transactions', start_date, end_date, format_type, filters)
+        
         return ReportService.export_transactions(start_date, end_date, filters)
+    
+    @action(detail=False, methods=['get'])
+    def reports_columnar(self, request):
+        """Queue a Parquet/Arrow export of transactions, tickets or daily rollups"""
+        dataset = request.query_params.get('dataset', 'transactions')
+        format_type = request.query_params.get('format', 'parquet')
+        
+        if dataset not in ColumnarExportService.DATASETS:
+            return Response(
+                {'error': f'Invalid dataset. Choose from: {", ".join(ColumnarExportService.DATASETS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if format_type not in ColumnarExportService.FORMATS:
+            return Response(
+                {'error': f'Invalid format. Choose from: {", ".join(ColumnarExportService.FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        
+        if not start_date:
+            start_date = timezone.now() - timedelta(days=30)
+        else:
+            try:
+                start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+                if timezone.is_naive(start_date):
+                    start_date = timezone.make_aware(start_date)
+            except:
+                start_date = timezone.now() - timedelta(days=30)
+        
+        if not end_date:
+            end_date = timezone.now()
+        else:
+            try:
+                end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+                if timezone.is_naive(end_date):
+                    end_date = timezone.make_aware(end_date)
+            except:
+                end_date = timezone.now()
+        
+        filters = {
+            'type': request.query_params.get('type'),
+            'status': request.query_params.get('status'),
+        }
+        
+        return self._queue_columnar_export(dataset, start_date, end_date, format_type, filters)
+    
+    def _queue_columnar_export(self, dataset, start_date, end_date, format_type, filters):
+        """Hand a columnar export off to Celery"""
+        from apps.analytics.tasks import generate_columnar_export_task
+        
+        if not ColumnarExportService.is_available():
+            return Response(
+                {'error': 'Columnar exports are not available on this server'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
+        result = generate_columnar_export_task.delay(
+            dataset,
+            start_date.isoformat(),
+            end_date.isoformat(),
+            format_type,
+            filters
+        )
+        
+        return Response({
+            'task_id': result.id,
+            'dataset': dataset,
+            'format': format_type,
+            'status': 'queued',
+            'download_url': self.request.build_absolute_uri(
+                f"{reverse('analytics-reports-download')}?task_id={result.id}"
+            ),
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=False, methods=['get'])
+    def reports_download(self, request):
+        """Download the file written by a queued columnar export"""
+        from celery.result import AsyncResult
+        
+        task_id = request.query_params.get('task_id')
+        if not task_id:
+            return Response(
+                {'error': 'task_id is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = AsyncResult(task_id)
+        if not result.ready():
+            return Response(
+                {'task_id': task_id, 'status': 'pending'},
+                status=status.HTTP_202_ACCEPTED
+            )
+        if not result.successful():
+            return Response(
+                {'error': 'Export failed'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        # The task returns a bare filename; never resolve paths outside the export dir
+        filename = os.path.basename(str(result.result))
+        path = os.path.join(ColumnarExportService.export_dir(), filename)
+        if not os.path.exists(path):
+            return Response(
+                {'error': 'Export file not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
 
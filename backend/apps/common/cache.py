@@ -5,6 +5,8 @@ from django.core.cache import cache
 from functools import wraps
 import hashlib
 import json
+import threading
+import time
 
 
 def cache_key_generator(*args, **kwargs):
@@ -65,6 +67,120 @@ def invalidate_cache_pattern(pattern):
         pass
 
 
+def get_redis_client():
+    """
+    Return the raw Redis client behind the default cache, or None when the
+    cache isn't Redis-backed (e.g. the local memory fallback).
+    """
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception:
+        return None
+
+
+# Field marking a counter hash as complete. Increments alone never set it,
+# so a hash recreated by HINCRBY after expiry or eviction reads as unseeded.
+COUNTER_READY_FIELD = 'ready'
+
+# KEYS: counter hash
+# ARGV: ttl, mode ('seed' or 'correct'), then (field, database total, value
+#       seen before the database read) triples
+#
+# Totals are applied as a difference against the values seen before the
+# database read, so increments made in between are kept. 'seed' skips a
+# hash that another reader seeded in the meantime; 'correct' only touches
+# hashes that still exist. Either way the hash is then marked with
+# COUNTER_READY_FIELD.
+_APPLY_COUNTER_TOTALS_SCRIPT = """
+local exists = redis.call('EXISTS', KEYS[1]) == 1
+if ARGV[2] == 'seed' and exists and redis.call('HEXISTS', KEYS[1], 'ready') == 1 then
+    return 0
+end
+if ARGV[2] == 'correct' and not exists then
+    return 0
+end
+for i = 3, #ARGV, 3 do
+    if exists then
+        redis.call('HINCRBY', KEYS[1], ARGV[i], tonumber(ARGV[i + 1]) - tonumber(ARGV[i + 2]))
+    else
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+end
+redis.call('HSET', KEYS[1], 'ready', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def apply_counter_totals(client, key, totals, seen, ttl, seed=False):
+    """
+    Bring a Redis counter hash in line with totals read from the database.
+
+    Args:
+        client: Redis client or pipeline
+        key: Counter hash key
+        totals: dict of field -> integer total from the database
+        seen: dict of field -> value read from the hash before querying
+            the database (missing fields count as 0)
+        ttl: Expiry in seconds
+        seed: Create the hash if it's missing instead of only correcting
+            an existing one
+    """
+    args = [ttl, 'seed' if seed else 'correct']
+    for field, total in totals.items():
+        args.extend([field, int(total), int(seen.get(field) or 0)])
+    return client.eval(_APPLY_COUNTER_TOTALS_SCRIPT, 1, key, *args)
+
+
+class TwoTierCache:
+    """
+    Per-process memory cache in front of the shared Django cache.
+
+    Hot keys are answered from process memory for `local_timeout` seconds
+    and from the shared cache after that. `delete` clears the shared entry
+    and this process's copy; other processes see the change once their
+    local entry expires, so keep `local_timeout` short.
+    """
+
+    def __init__(self, local_timeout=5, max_entries=10000):
+        self.local_timeout = local_timeout
+        self.max_entries = max_entries
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._local.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                return value
+            self._local.pop(key, None)
+
+        value = cache.get(key)
+        if value is not None:
+            self._set_local(key, value)
+        return value
+
+    def set(self, key, value, timeout):
+        cache.set(key, value, timeout)
+        self._set_local(key, value)
+
+    def delete(self, key):
+        self._local.pop(key, None)
+        cache.delete(key)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _set_local(self, key, value):
+        with self._lock:
+            if len(self._local) >= self.max_entries:
+                self._local.clear()
+            self._local[key] = (time.monotonic() + self.local_timeout, value)
+
+
 def get_or_set_cache(key, callable_func, timeout=300):
     """
     Get value from cache or set it using a callable
@@ -101,12 +217,89 @@ class CacheKeys:
     def referral_stats(user_id):
         return f"referral:stats:{user_id}"
     
+    @staticmethod
+    def referral_leaderboard(limit=10):
+        return f"referral:leaderboard:{limit}"
+    
     @staticmethod
     def referral_program_settings():
         return "referral:program:settings"
     
+    @staticmethod
+    def referral_deposit_events():
+        return "referral:deposit_events"
+    
+    @staticmethod
+    def referral_deposits_pending():
+        return "referral:deposit_events:pending"
+    
     @staticmethod
     def analytics_summary(date_range=None):
         range_str = json.dumps(date_range or {}, sort_keys=True)
         return f"analytics:summary:{hashlib.md5(range_str.encode()).hexdigest()}"
 
+    
+    @staticmethod
+    def analytics_dashboard_snapshot(days):
+        return f"analytics:dashboard:snapshot:{days}"
+    
+    @staticmethod
+    def analytics_dashboard_refresh_pending():
+        return "analytics:dashboard:refresh_pending"
+    
+    @staticmethod
+    def analytics_cohorts(params=None):
+        params_str = json.dumps(params or {}, sort_keys=True)
+        return f"analytics:cohorts:{hashlib.md5(params_str.encode()).hexdigest()}"
+    
+    @staticmethod
+    def lottery_sales(lottery_id):
+        return f"lottery:sales:{lottery_id}"
+    
+    @staticmethod
+    def lottery_participants(lottery_id):
+        return f"lottery:participants:{lottery_id}"
+    
+    @staticmethod
+    def auth_principal(user_id):
+        return f"auth:principal:{user_id}"
+    
+    @staticmethod
+    def login_failures(username_key):
+        return f"auth:login_failures:{username_key}"
+    
+    @staticmethod
+    def login_lockout(username_key):
+        return f"auth:login_lockout:{username_key}"
+    
+    @staticmethod
+    def audit_buffer():
+        return "audit:buffer"
+    
+    @staticmethod
+    def spend_window(user_id, window, bucket):
+        return f"rg:spend:{user_id}:{window}:{bucket}"
+    
+    @staticmethod
+    def withdrawal_window(user_id, window, bucket):
+        return f"withdrawal:usage:{user_id}:{window}:{bucket}"
+    
+    @staticmethod
+    def stripe_events_drain_pending():
+        return "payments:stripe_events:drain_pending"
+    
+    @staticmethod
+    def stripe_customer_id(user_id):
+        return f"payments:stripe_customer:{user_id}"
+    
+    @staticmethod
+    def stripe_payment_methods(customer_id):
+        return f"payments:stripe_payment_methods:{customer_id}"
+    
+    @staticmethod
+    def outbound_bulkhead(provider, host):
+        return f"outbound:bulkhead:{provider}:{host}"
+    
+    @staticmethod
+    def outbound_metrics(provider):
+        return f"outbound:metrics:{provider}"
@@ -57,3 +57,28 @@ class MaxTicketsExceededError(TicketPurchaseError):
     """Raised when user exceeds maximum tickets per lottery."""
     pass
 
+
+
+class ExportError(LotterySystemException):
+    """Raised when a report export fails."""
+    pass
+
+
+class ServiceUnavailableError(LotterySystemException):
+    """Raised when a call to an external provider is rejected or times out."""
+    pass
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised when a provider's circuit breaker is open."""
+    pass
+
+
+class BulkheadFullError(ServiceUnavailableError):
+    """Raised when too many calls to a provider are already in flight."""
+    pass
+
+
+class DeadlineExceededError(ServiceUnavailableError):
+    """Raised when a provider call runs past its deadline."""
+    pass
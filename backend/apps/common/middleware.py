@@ -3,9 +3,10 @@ Middleware for audit logging and other common functionality.
 """
 import json
 import logging
+from django.db import transaction
 from django.utils.deprecation import MiddlewareMixin
 from django.middleware.csrf import CsrfViewMiddleware
-from apps.users.models import AuditLog
+from apps.users.audit import begin_request, end_request, build_audit_entry, write_audit_events
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,11 @@ logger = logging.getLogger(__name__)
 class AuditLoggingMiddleware(MiddlewareMixin):
     """
     Middleware to log admin actions and sensitive operations.
+
+    Also scopes the per-request audit buffer: events recorded with
+    `record_audit` during the request and committed are written in one
+    batch after the response, and the generic row below is skipped when
+    the view already logged the action.
     """
     
     # Actions that should be logged
@@ -28,40 +34,60 @@ class AuditLoggingMiddleware(MiddlewareMixin):
     def process_request(self, request):
         """Store request info for later use in process_response."""
         request._audit_logged = False
+        request._audit_token = begin_request()
     
     def process_response(self, request, response):
         """Log admin actions and sensitive operations."""
-        # Skip if already logged or not a sensitive endpoint
-        if getattr(request, '_audit_logged', False):
+        token = getattr(request, '_audit_token', None)
+        if token is None:
             return response
+        state = end_request(token)
+        
+        # Queued behind the view's own on_commit callbacks, so the batch only
+        # holds events whose transactions committed. Runs immediately in
+        # autocommit.
+        transaction.on_commit(lambda: self._write_events(request, response, state))
         
-        # Only log admin actions on sensitive endpoints
-        if (request.method in self.ADMIN_ACTIONS and 
+        return response
+    
+    def _write_events(self, request, response, state):
+        """Write the request's committed events plus the generic row, if needed."""
+        events = state.events
+        
+        # Skip if the view already logged the action or not a sensitive endpoint
+        already_logged = getattr(request, '_audit_logged', False) or state.logged
+        if (not already_logged and request.method in self.ADMIN_ACTIONS and
             any(endpoint in request.path for endpoint in self.SENSITIVE_ENDPOINTS)):
             
             # Get user from request
             user = getattr(request, 'user', None)
             
             # Skip if user is not authenticated or not admin
-            if not user or not user.is_authenticated:
-                return response
-            
-            # Determine action type
-            action_type = self._get_action_type(request.method, request.path)
-            
-            # Log the action
-            try:
-                AuditLog.objects.create(
+            if user and user.is_authenticated:
+                events.append(build_audit_entry(
+                    self._get_action_type(request.method, request.path),
+                    f'{request.method} {request.path} - Status: {response.status_code}',
                     user=user,
-                    action=action_type,
-                    description=f'{request.method} {request.path} - Status: {response.status_code}',
                     ip_address=self._get_client_ip(request),
-                    user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
-                )
-            except Exception as e:
-                logger.error(f'Error creating audit log: {str(e)}')
+                    user_agent=request.META.get('HTTP_USER_AGENT', '')
+                ))
         
-        return response
+        # Write everything recorded during the request in one batch
+        try:
+            write_audit_events(events)
+        except Exception as e:
+            logger.error(f'Error writing {len(events)} audit log entries: {str(e)}')
+            self._write_individually(events)
+    
+    def _write_individually(self, events):
+        """Retry a failed batch one event at a time so one bad row doesn't drop the rest."""
+        if len(events) < 2:
+            return
+        for event in events:
+            try:
+                write_audit_events([event])
+            except Exception as e:
+                logger.error(f'Dropping audit log entry {event["action"]}: {str(e)}')
     
     def _get_action_type(self, method, path):
         """Determine audit log action type from method and path."""
@@ -0,0 +1,420 @@
+"""
+Resilience for outbound calls to external providers (Stripe).
+
+Every provider call goes through an `OutboundProvider`, which combines:
+
+- a deadline: calls run on the provider's thread pool and the caller
+  stops waiting after the call timeout, or earlier when the enclosing
+  `deadline()` budget runs out. The request worker is released even if
+  the provider never answers;
+- a circuit breaker: after `failure_threshold` consecutive failures or
+  timeouts the circuit opens and calls fail immediately. After
+  `reset_timeout` seconds a few probe calls are let through (half-open):
+  a successful probe closes the circuit, a failing one re-opens it;
+- a bulkhead: at most `max_concurrent` calls per provider are in flight
+  on a host, across all worker processes (a Redis sorted set of leases,
+  falling back to a per-process semaphore). With a slow provider, only
+  that many gunicorn workers wait on it; the rest keep serving browsing
+  and ticket purchases.
+
+Rejections raise subclasses of ServiceUnavailableError, which views turn
+into 503 responses. Only errors that say something about the provider's
+health (connection errors, 5xx, rate limiting, timeouts) count towards
+the breaker; declined cards and bad requests don't.
+
+Breaker state is per process. Call counters and latency are aggregated
+across processes in Redis and exposed by /api/health/providers/.
+"""
+import logging
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from django.conf import settings
+
+from apps.common.cache import CacheKeys, get_redis_client
+from apps.common.exceptions import BulkheadFullError, CircuitOpenError, DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+METRIC_FIELDS = (
+    'calls', 'successes', 'failures', 'timeouts',
+    'rejected_open', 'rejected_bulkhead', 'circuit_opened', 'latency_ms',
+)
+RETRY_AFTER_SECONDS = 10
+
+_local = threading.local()
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Limit the total time provider calls may take inside the block.
+
+    Nested budgets can only shorten the outer one.
+    """
+    previous = getattr(_local, 'deadline', None)
+    expires_at = time.monotonic() + seconds
+    _local.deadline = min(previous, expires_at) if previous is not None else expires_at
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def remaining_budget():
+    """Return the seconds left in the current deadline, or None if unbounded."""
+    expires_at = getattr(_local, 'deadline', None)
+    if expires_at is None:
+        return None
+    return expires_at - time.monotonic()
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_call(self):
+        """
+        Reserve a call.
+
+        Returns:
+            bool: True if the call is a half-open probe
+
+        Raises:
+            CircuitOpenError: If the circuit is open or enough probes are
+                already in flight
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+        raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def release_probe(self):
+        """Give back a probe slot for a call that never ran."""
+        with self._lock:
+            if self._probes:
+                self._probes -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probes = 0
+            self._state = CLOSED
+
+    def record_failure(self):
+        """
+        Count a failed call.
+
+        Returns:
+            bool: True if this failure opened the circuit
+        """
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == HALF_OPEN or (state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+                return True
+            return False
+
+
+class Bulkhead:
+    """Limit on concurrent in-flight calls per host."""
+
+    def __init__(self, name, max_concurrent, lease_seconds):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.lease_seconds = lease_seconds
+        self.key = CacheKeys.outbound_bulkhead(name, socket.gethostname())
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self):
+        """
+        Take a slot.
+
+        Returns:
+            str: Lease token to pass to `release`
+
+        Raises:
+            BulkheadFullError: If all slots are taken
+        """
+        client = get_redis_client()
+        if client is not None:
+            token = uuid.uuid4().hex
+            now = time.time()
+            try:
+                pipe = client.pipeline()
+                # Leases of crashed workers expire instead of leaking slots
+                pipe.zremrangebyscore(self.key, '-inf', now)
+                pipe.zadd(self.key, {token: now + self.lease_seconds})
+                pipe.zcard(self.key)
+                pipe.expire(self.key, int(self.lease_seconds) + 1)
+                in_flight = pipe.execute()[2]
+            except Exception as e:
+                logger.warning(f"Bulkhead for {self.name} unavailable, using local limit: {str(e)}")
+            else:
+                if in_flight > self.max_concurrent:
+                    self._release_lease(client, token)
+                    raise BulkheadFullError(f"{self.name} is busy, try again shortly")
+                return token
+
+        if not self._semaphore.acquire(blocking=False):
+            raise BulkheadFullError(f"{self.name} is busy, try again shortly")
+        return None
+
+    def release(self, token):
+        if token is None:
+            self._semaphore.release()
+            return
+        client = get_redis_client()
+        if client is not None:
+            self._release_lease(client, token)
+
+    def _release_lease(self, client, token):
+        try:
+            client.zrem(self.key, token)
+        except Exception as e:
+            logger.warning(f"Failed to release bulkhead slot for {self.name}: {str(e)}")
+
+
+class ProviderMetrics:
+    """Call counters per provider, shared by all processes through Redis."""
+
+    def __init__(self, name):
+        self.name = name
+        self.key = CacheKeys.outbound_metrics(name)
+        self._lock = threading.Lock()
+        self._local = dict.fromkeys(METRIC_FIELDS, 0)
+
+    def incr(self, **counts):
+        client = get_redis_client()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for field, value in counts.items():
+                    pipe.hincrby(self.key, field, int(value))
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Failed to record metrics for {self.name}: {str(e)}")
+        with self._lock:
+            for field, value in counts.items():
+                self._local[field] += int(value)
+
+    def snapshot(self):
+        client = get_redis_client()
+        if client is not None:
+            try:
+                values = client.hmget(self.key, *METRIC_FIELDS)
+                return {field: int(value or 0) for field, value in zip(METRIC_FIELDS, values)}
+            except Exception as e:
+                logger.warning(f"Failed to read metrics for {self.name}: {str(e)}")
+        with self._lock:
+            return dict(self._local)
+
+
+class OutboundProvider:
+    """Deadline, circuit breaker, bulkhead and metrics for one provider."""
+
+    def __init__(self, name, timeout=5.0, failure_threshold=5, reset_timeout=30.0,
+                 max_concurrent=4, half_open_max_calls=1, is_failure=None):
+        self.name = name
+        self.timeout = timeout
+        self.is_failure = is_failure or (lambda error: True)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout, half_open_max_calls)
+        # A lease outlives the call it guards; calls are bounded by the HTTP timeout
+        self.bulkhead = Bulkhead(name, max_concurrent, lease_seconds=timeout * 2 + 1)
+        self.metrics = ProviderMetrics(name)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix=f'outbound-{name}')
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Start a call on the provider's thread pool.
+
+        Returns:
+            Future: Pass it to `wait`
+
+        Raises:
+            ServiceUnavailableError: If the call is rejected
+        """
+        self._check_budget()
+        try:
+            probe = self.breaker.before_call()
+        except CircuitOpenError:
+            self.metrics.incr(rejected_open=1)
+            raise
+        try:
+            token = self.bulkhead.acquire()
+        except BulkheadFullError:
+            if probe:
+                self.breaker.release_probe()
+            self.metrics.incr(rejected_bulkhead=1)
+            raise
+
+        started = time.monotonic()
+        call_state = {'abandoned': False}
+
+        def run():
+            _local.in_provider = self.name
+            error = None
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _local.in_provider = None
+                # Recorded before the caller sees the result
+                if not call_state['abandoned']:
+                    self._record_outcome(error, started)
+                self.bulkhead.release(token)
+
+        future = self._executor.submit(run)
+        future.call_state = call_state
+        return future
+
+    def wait(self, future):
+        """
+        Wait for a submitted call within the call timeout and budget.
+
+        Raises:
+            DeadlineExceededError: If the call didn't finish in time
+        """
+        timeout = self.timeout
+        remaining = remaining_budget()
+        if remaining is not None:
+            timeout = max(min(timeout, remaining), 0)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # The call keeps its bulkhead slot until it finishes
+            future.call_state['abandoned'] = True
+            self._record_failure(calls=1, timeouts=1)
+            raise DeadlineExceededError(f"{self.name} did not respond within {timeout:.1f}s")
+
+    def call(self, fn, *args, **kwargs):
+        """Run one call under the provider's policies."""
+        if getattr(_local, 'in_provider', None) == self.name:
+            # Already on this provider's pool (e.g. part of a composite call)
+            return self._call_inline(fn, *args, **kwargs)
+        return self.wait(self.submit(fn, *args, **kwargs))
+
+    def _call_inline(self, fn, *args, **kwargs):
+        self._check_budget()
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.metrics.incr(rejected_open=1)
+            raise
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._record_outcome(e, started)
+            raise
+        self._record_outcome(None, started)
+        return result
+
+    def _check_budget(self):
+        remaining = remaining_budget()
+        if remaining is not None and remaining <= 0:
+            self.metrics.incr(timeouts=1)
+            raise DeadlineExceededError(f"Time budget for {self.name} calls exhausted")
+
+    def _record_outcome(self, error, started):
+        latency_ms = (time.monotonic() - started) * 1000
+        if error is not None and self.is_failure(error):
+            self._record_failure(failures=1, calls=1, latency_ms=latency_ms)
+            return
+        # Client errors (declined cards, bad requests) mean the provider is up
+        self.breaker.record_success()
+        self.metrics.incr(calls=1, successes=1 if error is None else 0, latency_ms=latency_ms)
+
+    def _record_failure(self, **counts):
+        opened = self.breaker.record_failure()
+        if opened:
+            counts['circuit_opened'] = 1
+            logger.error(f"Circuit opened for {self.name}")
+        self.metrics.incr(**counts)
+
+    def status(self):
+        """Breaker state (this process) and shared counters."""
+        return {
+            'state': self.breaker.state,
+            'max_concurrent': self.bulkhead.max_concurrent,
+            'timeout': self.timeout,
+            'metrics': self.metrics.snapshot(),
+        }
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name, is_failure=None):
+    """
+    Get the provider configured in OUTBOUND_PROVIDERS, creating it once
+    per process.
+    """
+    with _providers_lock:
+        provider = _providers.get(name)
+        if provider is None:
+            provider = OutboundProvider(name, is_failure=is_failure, **settings.OUTBOUND_PROVIDERS.get(name, {}))
+            _providers[name] = provider
+        return provider
+
+
+def reset_providers():
+    """Forget all providers so they're rebuilt from settings."""
+    with _providers_lock:
+        _providers.clear()
+
+
+def providers_status():
+    with _providers_lock:
+        providers = dict(_providers)
+    return {name: provider.status() for name, provider in providers.items()}
+
+
+def unavailable_response(error, retry_after=RETRY_AFTER_SECONDS):
+    """503 response for a provider call that was rejected or timed out."""
+    from rest_framework import status
+    from rest_framework.response import Response
+
+    return Response(
+        {'error': 'Service temporarily unavailable. Please try again shortly.', 'detail': str(error)},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(retry_after)}
+    )
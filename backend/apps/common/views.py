@@ -81,3 +81,23 @@ def health_cache(request):
             'error': str(e)
         }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def health_providers(request):
+    """
+    Outbound provider health: circuit breaker state and call metrics.
+    GET /api/health/providers/
+    """
+    from apps.common.resilience import OPEN, providers_status
+    from apps.payments.stripe_client import get_provider
+
+    # Report Stripe even before this process made its first call
+    get_provider()
+    providers = providers_status()
+    degraded = any(provider['state'] == OPEN for provider in providers.values())
+    return Response({
+        'status': 'degraded' if degraded else 'healthy',
+        'providers': providers
+    }, status=status.HTTP_200_OK)
@@ -0,0 +1,194 @@
+"""
+Real-time sales counters per lottery, kept in Redis.
+
+The purchase path bumps a per-lottery hash (tickets sold, revenue in cents)
+and a HyperLogLog of participant ids, so live pages and admin stats can be
+served without touching the database. The counters are periodically
+rebuilt from the database by `reconcile_sales_counters`.
+
+Purchases only bump counters that have already been seeded by a reconcile;
+a missing hash (never seeded, expired or flushed) stays missing so readers
+fall back to the database instead of trusting a partial count.
+"""
+import logging
+from decimal import Decimal
+from django.db.models import Count
+
+from apps.common.cache import CacheKeys, get_redis_client
+from apps.lotteries.models import Ticket
+
+logger = logging.getLogger(__name__)
+
+COUNTER_TTL = 30 * 24 * 3600  # 30 days
+RECONCILE_CHUNK_SIZE = 5000
+
+# KEYS: sales hash, participants HLL
+# ARGV: quantity, revenue cents, user id, ttl
+RECORD_PURCHASE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'tickets_sold', ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'revenue_cents', ARGV[2])
+redis.call('PFADD', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return 1
+"""
+
+# KEYS: sales hash
+# ARGV: tickets sold, revenue cents (from the database), tickets sold,
+#       revenue cents (read before the database aggregate), ttl
+#
+# Applies the database totals as a difference against the values seen
+# before aggregating, so increments recorded in between are kept.
+APPLY_TOTALS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'tickets_sold', tonumber(ARGV[1]) - tonumber(ARGV[3]))
+    redis.call('HINCRBY', KEYS[1], 'revenue_cents', tonumber(ARGV[2]) - tonumber(ARGV[4]))
+else
+    redis.call('HSET', KEYS[1], 'tickets_sold', ARGV[1], 'revenue_cents', ARGV[2])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+
+def _to_cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1')))
+
+
+class SalesCounters:
+    """Redis-backed tickets sold / revenue / participants per lottery."""
+
+    @staticmethod
+    def record_purchase(lottery_id, user_id, amount, quantity=1):
+        """
+        Record a completed ticket purchase.
+
+        Does nothing until the lottery's counters have been seeded by
+        `reconcile`.
+
+        Args:
+            lottery_id: Lottery ID
+            user_id: Buyer's user ID
+            amount: Total amount paid
+            quantity: Number of tickets bought
+        """
+        client = get_redis_client()
+        if client is None:
+            return
+
+        sales_key = CacheKeys.lottery_sales(lottery_id)
+        participants_key = CacheKeys.lottery_participants(lottery_id)
+        try:
+            client.eval(
+                RECORD_PURCHASE_SCRIPT, 2, sales_key, participants_key,
+                quantity, _to_cents(amount), str(user_id), COUNTER_TTL
+            )
+        except Exception as e:
+            logger.warning(f"Failed to update sales counters for lottery {lottery_id}: {str(e)}")
+
+    @staticmethod
+    def get(lottery_id):
+        """
+        Get live counters for a lottery.
+
+        Args:
+            lottery_id: Lottery ID
+
+        Returns:
+            dict with tickets_sold, revenue (Decimal) and participants, or
+            None if counters are unavailable and the caller should fall
+            back to the database
+        """
+        client = get_redis_client()
+        if client is None:
+            return None
+
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.hmget(CacheKeys.lottery_sales(lottery_id), 'tickets_sold', 'revenue_cents')
+            pipe.pfcount(CacheKeys.lottery_participants(lottery_id))
+            (tickets_sold, revenue_cents), participants = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to read sales counters for lottery {lottery_id}: {str(e)}")
+            return None
+
+        if tickets_sold is None:
+            # Not seeded (or expired); let the caller fall back until
+            # reconciliation runs
+            return None
+
+        return {
+            'tickets_sold': int(tickets_sold),
+            'revenue': Decimal(int(revenue_cents or 0)) / 100,
+            'participants': int(participants),
+        }
+
+    @staticmethod
+    def reconcile(lottery):
+        """
+        Rebuild a lottery's counters from the database.
+
+        Args:
+            lottery: Lottery instance
+
+        Returns:
+            dict: The reconciled counter values
+        """
+        client = get_redis_client()
+        if client is None:
+            return SalesCounters._totals(lottery)
+
+        sales_key = CacheKeys.lottery_sales(lottery.id)
+        participants_key = CacheKeys.lottery_participants(lottery.id)
+        rebuild_key = f"{participants_key}:rebuild"
+
+        # Snapshot the live counters before aggregating so the database
+        # totals can be applied as a difference
+        seen_sold, seen_cents = client.hmget(sales_key, 'tickets_sold', 'revenue_cents')
+        values = SalesCounters._totals(lottery)
+        tickets = Ticket.objects.filter(lottery=lottery)
+
+        # Build the new HyperLogLog on a side key, then swap it in so
+        # readers never see a half-built set.
+        client.delete(rebuild_key)
+        user_ids = tickets.order_by().values_list('user_id', flat=True).distinct()
+        chunk = []
+        for user_id in user_ids.iterator(chunk_size=RECONCILE_CHUNK_SIZE):
+            chunk.append(str(user_id))
+            if len(chunk) >= RECONCILE_CHUNK_SIZE:
+                client.pfadd(rebuild_key, *chunk)
+                chunk = []
+        if chunk:
+            client.pfadd(rebuild_key, *chunk)
+
+        client.eval(
+            APPLY_TOTALS_SCRIPT, 1, sales_key,
+            values['tickets_sold'], _to_cents(values['revenue']),
+            int(seen_sold or 0), int(seen_cents or 0), COUNTER_TTL
+        )
+
+        pipe = client.pipeline(transaction=True)
+        if values['participants']:
+            pipe.rename(rebuild_key, participants_key)
+        else:
+            pipe.delete(participants_key)
+        pipe.expire(participants_key, COUNTER_TTL)
+        pipe.execute()
+
+        return values
+
+    @staticmethod
+    def _totals(lottery):
+        """Aggregate a lottery's counters from the database."""
+        totals = Ticket.objects.filter(lottery=lottery).aggregate(
+            tickets_sold=Count('id'),
+            participants=Count('user', distinct=True)
+        )
+        return {
+            'tickets_sold': totals['tickets_sold'],
+            'revenue': lottery.ticket_price * totals['tickets_sold'],
+            'participants': totals['participants'],
+        }
@@ -169,7 +169,7 @@ class Winner(models.Model):
 
     def claim_prize(self):
         if not self.is_claimed:
-            self.user.add_balance(self.prize_amount)
+            self.user.add_balance(self.prize_amount, 'PRIZE_AWARD')
             self.is_claimed = True
             self.claimed_at = timezone.now()
             self.save()
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from apps.lotteries.models import Lottery, Ticket, Winner, LotteryDrawLog
+from apps.lotteries.counters import SalesCounters
 from apps.users.serializers import UserSerializer
 
 
@@ -19,13 +20,32 @@ class LotterySerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_by', 'created_at', 'updated_at']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sales_by_lottery = {}
+
+    def _get_sales(self, obj):
+        """Live counters for obj, read once per object (None if unavailable)."""
+        if obj.pk not in self._sales_by_lottery:
+            self._sales_by_lottery[obj.pk] = SalesCounters.get(obj.pk)
+        return self._sales_by_lottery[obj.pk]
+
     def get_total_participants(self, obj):
+        sales = self._get_sales(obj)
+        if sales is not None:
+            return sales['participants']
         return obj.get_total_participants()
 
     def get_total_tickets_sold(self, obj):
+        sales = self._get_sales(obj)
+        if sales is not None:
+            return sales['tickets_sold']
         return obj.get_total_tickets_sold()
 
     def get_revenue(self, obj):
+        sales = self._get_sales(obj)
+        if sales is not None:
+            return str(sales['revenue'])
         return str(obj.get_revenue())
 
 
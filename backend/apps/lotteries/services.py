@@ -6,8 +6,10 @@ import logging
 from django.utils import timezone
 from django.db import transaction
 from apps.lotteries.models import Lottery, Ticket, Winner, LotteryDrawLog
+from apps.lotteries.counters import SalesCounters
 from apps.transactions.models import Transaction
-from apps.users.models import UserProfile, AuditLog
+from apps.users.models import UserProfile
+from apps.users.audit import record_audit
 from apps.common.exceptions import DrawError, LotteryError
 
 logger = logging.getLogger(__name__)
@@ -76,7 +78,7 @@ class DrawService:
         lottery.save()
         
         # Credit prize to winner's wallet
-        winner.user.add_balance(lottery.prize_amount)
+        winner.user.add_balance(lottery.prize_amount, 'PRIZE_AWARD')
         
         # Create transaction record
         Transaction.objects.create(
@@ -95,7 +97,7 @@ class DrawService:
         profile.save()
         
         # Log action
-        AuditLog.objects.create(
+        record_audit(
             user=conducted_by,
             action='WIN',
             description=f'Lottery draw conducted for {lottery.name}. Winner: {winner.user.username}'
@@ -189,15 +191,8 @@ class TicketPurchaseService:
             )
             tickets.append(ticket)
         
-        # Deduct from wallet
-        user.deduct_balance(total_cost)
-        
-        # Update lottery
-        lottery.available_tickets -= quantity
-        lottery.save()
-        
         # Create transaction record
-        Transaction.objects.create(
+        purchase = Transaction.objects.create(
             user=user,
             type='TICKET_PURCHASE',
             amount=total_cost,
@@ -206,6 +201,15 @@ class TicketPurchaseService:
             description=f'Purchased {quantity} ticket(s) for {lottery.name}'
         )
         
+        # Deduct from wallet; the balance check is enforced in SQL, so a
+        # concurrent purchase that drained the wallet rolls this back
+        if not user.deduct_balance(total_cost, 'TICKET_PURCHASE', purchase.id):
+            raise LotteryError('Insufficient balance')
+        
+        # Update lottery
+        lottery.available_tickets -= quantity
+        lottery.save()
+        
         # Update user profile
         profile = user.profile
         profile.total_spent += float(total_cost)
@@ -215,12 +219,16 @@ class TicketPurchaseService:
         profile.save()
         
         # Log action
-        AuditLog.objects.create(
+        record_audit(
             user=user,
             action='BUY_TICKET',
             description=f'Purchased {quantity} ticket(s) for lottery: {lottery.name}'
         )
         
+        transaction.on_commit(
+            lambda: SalesCounters.record_purchase(lottery.id, user.id, total_cost, quantity)
+        )
+        
         logger.info(f"User {user.username} purchased {quantity} ticket(s) for lottery {lottery.id}")
         
         return tickets
@@ -127,3 +127,20 @@ def update_lottery_statuses():
     except Exception as e:
         logger.error(f"Error updating lottery statuses: {str(e)}")
         raise
+
+
+@shared_task
+def reconcile_sales_counters():
+    """Rebuild live sales counters from the database for open lotteries."""
+    from apps.lotteries.counters import SalesCounters
+    
+    try:
+        count = 0
+        for lottery in Lottery.objects.filter(status__in=['ACTIVE', 'CLOSED']).only('id', 'ticket_price'):
+            SalesCounters.reconcile(lottery)
+            count += 1
+        
+        return f"Reconciled sales counters for {count} lotteries"
+    except Exception as e:
+        logger.error(f"Error reconciling sales counters: {str(e)}")
+        raise
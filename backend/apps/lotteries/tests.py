@@ -5,7 +5,10 @@ from rest_framework import status
 from apps.lotteries.models import Lottery, Ticket, Winner
 from apps.transactions.models import Transaction
 from decimal import Decimal
+from django.utils import timezone
+from datetime import timedelta
 import uuid
+from unittest.mock import patch
 
 User = get_user_model()
 
@@ -190,3 +193,170 @@ class LotteryViewSetTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['name'], 'New Lottery')
 
+
+
+class SalesCountersTestCase(TestCase):
+    """Test Redis-backed sales counters"""
+
+    def setUp(self):
+        from apps.common.cache import get_redis_client
+
+        if get_redis_client() is None:
+            self.skipTest('Redis cache not configured')
+
+        self.user = User.objects.create_user(
+            username='counteruser',
+            email='counter@example.com',
+            password='TestPassword123'
+        )
+        self.lottery = Lottery.objects.create(
+            name='Counter Lottery',
+            description='Test Description',
+            ticket_price=Decimal('2.50'),
+            total_tickets=100,
+            available_tickets=98,
+            prize_amount=Decimal('100.00'),
+            status='ACTIVE',
+            draw_date=timezone.now() + timedelta(days=7),
+            created_by=self.user
+        )
+
+    def test_unseeded_counters_fall_back(self):
+        """Test counters return None before the first purchase or reconcile"""
+        from apps.lotteries.counters import SalesCounters
+
+        self.assertIsNone(SalesCounters.get(self.lottery.id))
+
+    def test_record_purchase_and_reconcile(self):
+        """Test purchases increment seeded counters and reconcile rebuilds them"""
+        from apps.lotteries.counters import SalesCounters
+
+        SalesCounters.reconcile(self.lottery)
+        SalesCounters.record_purchase(self.lottery.id, self.user.id, Decimal('2.50'))
+        SalesCounters.record_purchase(self.lottery.id, self.user.id, Decimal('2.50'))
+
+        sales = SalesCounters.get(self.lottery.id)
+        self.assertEqual(sales['tickets_sold'], 2)
+        self.assertEqual(sales['revenue'], Decimal('5.00'))
+        self.assertEqual(sales['participants'], 1)
+
+        Ticket.objects.create(user=self.user, lottery=self.lottery, ticket_number=1)
+        SalesCounters.reconcile(self.lottery)
+
+        sales = SalesCounters.get(self.lottery.id)
+        self.assertEqual(sales['tickets_sold'], 1)
+        self.assertEqual(sales['revenue'], Decimal('2.50'))
+        self.assertEqual(sales['participants'], 1)
+
+    def test_record_purchase_does_not_seed_counters(self):
+        """Test a purchase against missing counters leaves them missing"""
+        from apps.lotteries.counters import SalesCounters
+
+        SalesCounters.record_purchase(self.lottery.id, self.user.id, Decimal('2.50'))
+
+        self.assertIsNone(SalesCounters.get(self.lottery.id))
+
+    def test_reconcile_keeps_concurrent_purchases(self):
+        """Test purchases recorded while reconcile aggregates are not lost"""
+        from apps.lotteries.counters import SalesCounters
+
+        SalesCounters.reconcile(self.lottery)
+        Ticket.objects.create(user=self.user, lottery=self.lottery, ticket_number=1)
+        totals = SalesCounters._totals
+
+        def totals_with_concurrent_purchase(lottery):
+            values = totals(lottery)
+            SalesCounters.record_purchase(lottery.id, self.user.id, Decimal('2.50'))
+            return values
+
+        with patch.object(SalesCounters, '_totals', side_effect=totals_with_concurrent_purchase):
+            SalesCounters.reconcile(self.lottery)
+
+        sales = SalesCounters.get(self.lottery.id)
+        self.assertEqual(sales['tickets_sold'], 2)
+        self.assertEqual(sales['revenue'], Decimal('5.00'))
+
+
+class OverdraftProtectionTestCase(TestCase):
+    """Test purchases abort when the SQL balance check rejects the debit"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='overdraft',
+            email='overdraft@example.com',
+            password='TestPassword123',
+            wallet_balance=Decimal('10.00')
+        )
+        self.lottery = Lottery.objects.create(
+            name='Overdraft Lottery',
+            description='Test Description',
+            ticket_price=Decimal('10.00'),
+            total_tickets=100,
+            available_tickets=100,
+            prize_amount=Decimal('500.00'),
+            status='ACTIVE',
+            draw_date=timezone.now() + timedelta(days=7),
+            created_by=self.user
+        )
+        # A concurrent purchase drained the wallet after this user was loaded
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=Decimal('0.00'))
+
+    def _assert_nothing_written(self):
+        self.assertFalse(Ticket.objects.filter(lottery=self.lottery).exists())
+        self.assertFalse(Transaction.objects.filter(type='TICKET_PURCHASE').exists())
+        self.lottery.refresh_from_db()
+        self.assertEqual(self.lottery.available_tickets, 100)
+        self.assertEqual(User.objects.get(pk=self.user.pk).wallet_balance, Decimal('0.00'))
+        self.assertIsNone(User.objects.get(pk=self.user.pk).last_session_start)
+
+    def test_buy_ticket_rejected_debit_aborts(self):
+        """Test the view returns 400 and issues no ticket"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f'/api/lotteries/{self.lottery.id}/buy_ticket/')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self._assert_nothing_written()
+
+    def test_inactive_lottery_does_not_start_session(self):
+        """Test a purchase rejected after the gate leaves the session unstarted"""
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=Decimal('10.00'))
+        Lottery.objects.filter(pk=self.lottery.pk).update(status='CLOSED')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f'/api/lotteries/{self.lottery.id}/buy_ticket/')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(User.objects.get(pk=self.user.pk).last_session_start)
+
+    def test_successful_purchase_starts_session(self):
+        """Test the session starts with the purchase that went through"""
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=Decimal('10.00'))
+        self.client.force_authenticate(user=self.user)
+        with patch('apps.lotteries.views.send_ticket_purchase_confirmation_task.delay'):
+            response = self.client.post(f'/api/lotteries/{self.lottery.id}/buy_ticket/')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNotNone(User.objects.get(pk=self.user.pk).last_session_start)
+
+    def test_purchase_service_rejected_debit_aborts(self):
+        """Test the purchase service raises and rolls back"""
+        from apps.common.exceptions import LotteryError
+        from apps.lotteries.services import TicketPurchaseService
+
+        with self.assertRaises(LotteryError):
+            TicketPurchaseService.purchase_ticket(self.user, self.lottery)
+        self._assert_nothing_written()
+
+    def test_purchase_links_ledger_to_transaction(self):
+        """Test the debit's ledger entries reference the purchase transaction"""
+        from apps.lotteries.services import TicketPurchaseService
+        from apps.transactions.models import LedgerEntry
+
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=Decimal('10.00'))
+        TicketPurchaseService.purchase_ticket(self.user, self.lottery)
+
+        purchase = Transaction.objects.get(type='TICKET_PURCHASE')
+        self.assertEqual(
+            set(LedgerEntry.objects.filter(entry_type='TICKET_PURCHASE').values_list('transaction_id', flat=True)),
+            {purchase.id}
+        )
@@ -2,19 +2,24 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Count
+from django.shortcuts import get_object_or_404
 from django.core.cache import cache
 from apps.common.cache import CacheKeys
+from apps.common.exceptions import InsufficientBalanceError
 import random
 import secrets
 
 from apps.lotteries.models import Lottery, Ticket, Winner, LotteryDrawLog
+from apps.lotteries.counters import SalesCounters
 from apps.lotteries.serializers import (
     LotterySerializer, TicketSerializer, WinnerSerializer,
     LotteryDrawLogSerializer
 )
 from apps.transactions.models import Transaction
-from apps.users.models import AuditLog, UserProfile, User
+from apps.users.models import UserProfile, User
+from apps.users.audit import record_audit
 from apps.notifications.tasks import (
     send_ticket_purchase_confirmation_task,
     send_draw_result_win_task,
@@ -46,7 +51,7 @@ class LotteryViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             serializer.save(created_by=request.user)
-            AuditLog.objects.create(
+            record_audit(
                 user=request.user,
                 action='BUY_TICKET',
                 description=f'Created lottery: {serializer.data["name"]}'
@@ -75,24 +80,16 @@ class LotteryViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def buy_ticket(self, request, pk=None):
         """Purchase a lottery ticket"""
-        from apps.users.responsible_gaming import ResponsibleGamingService
+        from apps.users.responsible_gaming import ResponsibleGamingGate
         
         lottery = self.get_object()
 
-        # Check self-exclusion
-        is_excluded, exclusion_reason = ResponsibleGamingService.check_self_exclusion(request.user)
-        if is_excluded:
+        # Self-exclusion, session time and loss limit in one pass
+        verdict = ResponsibleGamingGate.check_purchase(request.user, lottery.ticket_price)
+        if not verdict:
             return Response(
-                {'error': exclusion_reason},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        
-        # Check session time
-        is_valid, error_msg, minutes_remaining = ResponsibleGamingService.check_session_time(request.user)
-        if not is_valid:
-            return Response(
-                {'error': error_msg},
-                status=status.HTTP_403_FORBIDDEN
+                {'error': verdict.error},
+                status=verdict.status_code
             )
 
         # Validation
@@ -107,61 +104,66 @@ class LotteryViewSet(viewsets.ModelViewSet):
                 {'error': 'Insufficient balance'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Check loss limit
-        is_valid, error_message = ResponsibleGamingService.check_loss_limit(request.user, lottery.ticket_price)
-        if not is_valid:
+
+        try:
+            with transaction.atomic():
+                # Generate ticket number
+                last_ticket = Ticket.objects.filter(lottery=lottery).order_by('ticket_number').last()
+                ticket_number = (last_ticket.ticket_number + 1) if last_ticket else 1
+
+                # Create ticket
+                ticket = Ticket.objects.create(
+                    user=request.user,
+                    lottery=lottery,
+                    ticket_number=ticket_number
+                )
+
+                # Create transaction
+                purchase = Transaction.objects.create(
+                    user=request.user,
+                    type='TICKET_PURCHASE',
+                    amount=lottery.ticket_price,
+                    status='COMPLETED',
+                    lottery=lottery,
+                    description=f'Bought ticket #{ticket_number} for {lottery.name}'
+                )
+
+                # Deduct from wallet; the balance check is enforced in SQL, so
+                # a concurrent purchase that drained the wallet rolls this back
+                if not request.user.deduct_balance(lottery.ticket_price, 'TICKET_PURCHASE', purchase.id):
+                    raise InsufficientBalanceError('Insufficient balance')
+
+                # Start the session only for a purchase that went through
+                ResponsibleGamingGate.apply_pending(request.user, verdict)
+
+                # Update lottery
+                lottery.available_tickets -= 1
+                lottery.save()
+
+                # Update user profile
+                profile = request.user.profile
+                profile.total_spent += float(lottery.ticket_price)
+                profile.total_tickets_bought += 1
+                profile.save()
+        except InsufficientBalanceError as e:
             return Response(
-                {'error': error_message},
+                {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Update session start if not set
-        if not request.user.last_session_start:
-            request.user.last_session_start = timezone.now()
-            request.user.save()
-
-        # Generate ticket number
-        last_ticket = Ticket.objects.filter(lottery=lottery).order_by('ticket_number').last()
-        ticket_number = (last_ticket.ticket_number + 1) if last_ticket else 1
-
-        # Create ticket
-        ticket = Ticket.objects.create(
-            user=request.user,
-            lottery=lottery,
-            ticket_number=ticket_number
-        )
-
-        # Deduct from wallet
-        request.user.deduct_balance(lottery.ticket_price)
-
-        # Update lottery
-        lottery.available_tickets -= 1
-        lottery.save()
-
-        # Create transaction
-        Transaction.objects.create(
-            user=request.user,
-            type='TICKET_PURCHASE',
-            amount=lottery.ticket_price,
-            status='COMPLETED',
-            lottery=lottery,
-            description=f'Bought ticket #{ticket_number} for {lottery.name}'
-        )
-
-        # Update user profile
-        profile = request.user.profile
-        profile.total_spent += float(lottery.ticket_price)
-        profile.total_tickets_bought += 1
-        profile.save()
 
         # Log action
-        AuditLog.objects.create(
+        record_audit(
             user=request.user,
             action='BUY_TICKET',
             description=f'Bought ticket #{ticket_number} for lottery: {lottery.name}'
         )
 
+        # Update live sales counters once the purchase is committed
+        lottery_id, user_id, ticket_price = lottery.id, request.user.id, lottery.ticket_price
+        transaction.on_commit(
+            lambda: SalesCounters.record_purchase(lottery_id, user_id, ticket_price)
+        )
+
         # Send ticket purchase confirmation email asynchronously
         send_ticket_purchase_confirmation_task.delay(
             str(request.user.id),
@@ -283,7 +285,7 @@ class LotteryViewSet(viewsets.ModelViewSet):
         profile.save()
 
         # Log action
-        AuditLog.objects.create(
+        record_audit(
             user=request.user,
             action='WIN',
             description=f'Lottery draw conducted for {lottery.name}. Winner: {winner.user.username}'
@@ -352,13 +354,39 @@ class LotteryViewSet(viewsets.ModelViewSet):
             )
 
         lottery = self.get_object()
+        sales = SalesCounters.get(lottery.id) or {
+            'tickets_sold': lottery.get_total_tickets_sold(),
+            'revenue': lottery.get_revenue(),
+            'participants': lottery.get_total_participants(),
+        }
         return Response({
             'lottery': LotterySerializer(lottery).data,
-            'total_participants': lottery.get_total_participants(),
-            'total_tickets_sold': lottery.get_total_tickets_sold(),
+            'total_participants': sales['participants'],
+            'total_tickets_sold': sales['tickets_sold'],
             'total_tickets_remaining': lottery.available_tickets,
-            'revenue': str(lottery.get_revenue()),
-            'revenue_percentage': f"{(lottery.get_total_tickets_sold() / lottery.total_tickets * 100) if lottery.total_tickets > 0 else 0:.2f}%"
+            'revenue': str(sales['revenue']),
+            'revenue_percentage': f"{(sales['tickets_sold'] / lottery.total_tickets * 100) if lottery.total_tickets > 0 else 0:.2f}%"
+        })
+
+    @action(detail=True, methods=['get'])
+    def sales(self, request, pk=None):
+        """Get live sales counters"""
+        lottery = get_object_or_404(Lottery.objects.only('id', 'ticket_price', 'total_tickets', 'available_tickets'), pk=pk)
+        sales = SalesCounters.get(lottery.id)
+        live = sales is not None
+        if not live:
+            sales = {
+                'tickets_sold': lottery.get_total_tickets_sold(),
+                'revenue': lottery.get_revenue(),
+                'participants': lottery.get_total_participants(),
+            }
+        return Response({
+            'lottery_id': str(lottery.id),
+            'tickets_sold': sales['tickets_sold'],
+            'revenue': str(sales['revenue']),
+            'participants': sales['participants'],
+            'total_tickets': lottery.total_tickets,
+            'live': live,
         })
 
 
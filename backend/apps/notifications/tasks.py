@@ -128,6 +128,69 @@ def send_referral_bonus_credited_task(user_id, bonus_amount, referral_id):
         raise
 
 
+@shared_task
+def send_withdrawal_status_batch_task(items):
+    """
+    Send withdrawal status emails for a batch of withdrawals.
+    
+    Args:
+        items: List of [user_id, withdrawal_id, status_message]
+    """
+    from apps.transactions.models import WithdrawalRequest
+    
+    withdrawals = {
+        str(pk): withdrawal
+        for pk, withdrawal in WithdrawalRequest.objects.select_related('user').in_bulk(
+            {item[1] for item in items}
+        ).items()
+    }
+    
+    sent = 0
+    for user_id, withdrawal_id, status_message in items:
+        withdrawal = withdrawals.get(withdrawal_id)
+        if withdrawal is None:
+            continue
+        try:
+            EmailService.send_withdrawal_status(withdrawal.user, withdrawal, status_message)
+            sent += 1
+        except Exception as e:
+            logger.error(f"Error sending withdrawal status email to {user_id}: {str(e)}")
+    
+    return f"Sent {sent} withdrawal status emails"
+
+
+@shared_task
+def send_referral_bonus_credited_batch_task(items):
+    """
+    Send referral bonus credited emails for a batch of bonuses.
+    
+    Args:
+        items: List of [user_id, bonus_amount, referral_id]
+    """
+    from apps.users.models import User
+    from apps.referrals.models import Referral
+    
+    users = {
+        str(pk): user
+        for pk, user in User.objects.in_bulk({item[0] for item in items}).items()
+    }
+    referrals = Referral.objects.in_bulk({item[2] for item in items})
+    
+    sent = 0
+    for user_id, bonus_amount, referral_id in items:
+        user = users.get(user_id)
+        referral = referrals.get(referral_id)
+        if user is None or referral is None:
+            continue
+        try:
+            EmailService.send_referral_bonus_credited(user, bonus_amount, referral)
+            sent += 1
+        except Exception as e:
+            logger.error(f"Error sending referral bonus email to {user_id}: {str(e)}")
+    
+    return f"Sent {sent} referral bonus emails"
+
+
 @shared_task
 def send_lottery_ending_soon_task(user_id, lottery_id, hours_remaining):
     """Send lottery ending soon reminder asynchronously."""
@@ -144,6 +207,37 @@ def send_lottery_ending_soon_task(user_id, lottery_id, hours_remaining):
         raise
 
 
+@shared_task
+def send_deposit_confirmation_batch_task(items):
+    """
+    Send deposit confirmation emails for a batch of deposits.
+    
+    Args:
+        items: List of [user_id, transaction_id]
+    """
+    from apps.transactions.models import Transaction
+    
+    transactions = {
+        str(pk): transaction
+        for pk, transaction in Transaction.objects.select_related('user').in_bulk(
+            {item[1] for item in items}
+        ).items()
+    }
+    
+    sent = 0
+    for user_id, transaction_id in items:
+        transaction = transactions.get(transaction_id)
+        if transaction is None:
+            continue
+        try:
+            EmailService.send_deposit_confirmation(transaction.user, transaction)
+            sent += 1
+        except Exception as e:
+            logger.error(f"Error sending deposit confirmation email to {user_id}: {str(e)}")
+    
+    return f"Sent {sent} deposit confirmation emails"
+
+
 @shared_task
 def send_deposit_confirmation_email(user_id, transaction_id=None):
     """Send deposit confirmation email asynchronously."""
@@ -188,3 +282,30 @@ def create_notification_task(user_id, notification_type, title, message, action_
     except Exception as e:
         logger.error(f"Error creating notification: {str(e)}")
         raise
+
+
+@shared_task
+def create_notifications_batch_task(notifications):
+    """
+    Create in-app notifications in bulk.
+    
+    Args:
+        notifications: List of dicts with user_id, type, title, message and
+            optional action_url/metadata
+    """
+    try:
+        created = Notification.objects.bulk_create([
+            Notification(
+                user_id=item['user_id'],
+                type=item['type'],
+                title=item['title'],
+                message=item['message'],
+                action_url=item.get('action_url') or '',
+                metadata=item.get('metadata') or {}
+            )
+            for item in notifications
+        ])
+        return f"Created {len(created)} notifications"
+    except Exception as e:
+        logger.error(f"Error creating notifications in bulk: {str(e)}")
+        raise
@@ -139,3 +139,33 @@ class NotificationViewSetTestCase(TestCase):
         notification.refresh_from_db()
         self.assertTrue(notification.is_read)
 
+
+
+class NotificationBatchTaskTestCase(TestCase):
+    """Test batched notification tasks"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='batchuser',
+            email='batch@example.com',
+            password='TestPassword123'
+        )
+
+    def test_create_notifications_batch_task(self):
+        """Test notifications are created in bulk"""
+        from apps.notifications.tasks import create_notifications_batch_task
+
+        create_notifications_batch_task([
+            {
+                'user_id': str(self.user.id),
+                'type': 'REFERRAL_BONUS',
+                'title': f'Title {index}',
+                'message': 'Message',
+                'metadata': {'index': index},
+            }
+            for index in range(3)
+        ])
+
+        self.assertEqual(
+            Notification.objects.filter(user=self.user, type='REFERRAL_BONUS').count(), 3
+        )
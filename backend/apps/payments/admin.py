@@ -2,7 +2,7 @@
 Admin configuration for payments app.
 """
 from django.contrib import admin
-from apps.payments.models import StripeCustomer, PaymentIntent
+from apps.payments.models import StripeCustomer, PaymentIntent, StripeWebhookEvent
 
 
 @admin.register(StripeCustomer)
@@ -20,3 +20,12 @@ class PaymentIntentAdmin(admin.ModelAdmin):
     search_fields = ['stripe_payment_intent_id', 'user__username', 'user__email']
     readonly_fields = ['created_at', 'updated_at', 'completed_at']
     date_hierarchy = 'created_at'
+
+
+@admin.register(StripeWebhookEvent)
+class StripeWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'type', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'type', 'received_at']
+    search_fields = ['event_id']
+    readonly_fields = ['received_at', 'locked_at', 'processed_at']
+    date_hierarchy = 'received_at'
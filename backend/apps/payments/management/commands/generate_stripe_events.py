@@ -0,0 +1,147 @@
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from decimal import Decimal
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.payments.models import PaymentIntent
+from apps.payments.webhooks import ingest_events, process_pending_events
+from apps.users.models import User
+
+USERNAME_PREFIX = 'loadtest_'
+BATCH_SIZE = 500
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """Build a Stripe-Signature header for `payload`."""
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+class Command(BaseCommand):
+    help = 'Generate fake Stripe payment intent events for load testing the webhook pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Number of payment intents')
+        parser.add_argument('--users', type=int, default=100, help='Number of load test users to spread them over')
+        parser.add_argument('--amount', type=Decimal, default=Decimal('10.00'), help='Amount per intent')
+        parser.add_argument('--failure-rate', type=float, default=0.05, help='Share of intents that fail')
+        parser.add_argument('--duplicate-rate', type=float, default=0.1, help='Share of events delivered twice')
+        parser.add_argument('--url', help='POST signed events to this webhook URL instead of recording them directly')
+        parser.add_argument('--process', action='store_true', help='Drain the recorded events inline afterwards')
+        parser.add_argument('--seed', type=int, help='Random seed')
+        parser.add_argument(
+            '--i-know-this-is-not-prod', action='store_true', dest='not_prod',
+            help='Run even though DEBUG is off and STRIPE_SECRET_KEY is not a test key'
+        )
+
+    def handle(self, *args, **options):
+        # Creates users, payment intents and wallet credits; never let it
+        # run against production by accident
+        is_test_key = settings.STRIPE_SECRET_KEY.startswith('sk_test_')
+        if not (settings.DEBUG or is_test_key or options['not_prod']):
+            raise CommandError(
+                'Refusing to generate fake payments: DEBUG is off and STRIPE_SECRET_KEY is not a test key. '
+                'Pass --i-know-this-is-not-prod to run anyway.'
+            )
+        if options['url'] and not settings.STRIPE_WEBHOOK_SECRET:
+            raise CommandError('STRIPE_WEBHOOK_SECRET is required to sign events for --url')
+
+        rng = random.Random(options['seed'])
+        users = self._load_test_users(options['users'])
+        events = self._build_events(users, options, rng)
+        self.stdout.write(f"Generated {len(events)} deliveries for {options['count']} payment intents")
+
+        started = time.monotonic()
+        if options['url']:
+            self._post(events, options['url'])
+        else:
+            for start in range(0, len(events), BATCH_SIZE):
+                ingest_events(events[start:start + BATCH_SIZE])
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'Delivered in {elapsed:.2f}s ({len(events) / max(elapsed, 1e-6):.0f} events/s)')
+
+        if options['process']:
+            started = time.monotonic()
+            processed = process_pending_events()
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Processed {processed} events in {elapsed:.2f}s ({processed / max(elapsed, 1e-6):.0f} events/s)'
+            ))
+
+    def _load_test_users(self, count):
+        usernames = [f'{USERNAME_PREFIX}{index}' for index in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        missing = [
+            User(username=username, email=f'{username}@example.com', password='!')
+            for username in usernames if username not in existing
+        ]
+        User.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+        return list(User.objects.filter(username__in=usernames).values_list('id', flat=True))
+
+    def _build_events(self, user_ids, options, rng):
+        amount = options['amount']
+        currency = settings.STRIPE_CURRENCY
+        now = int(time.time())
+
+        intents = []
+        events = []
+        for _ in range(options['count']):
+            intent_id = f'pi_fake_{uuid.uuid4().hex}'
+            intents.append(PaymentIntent(
+                user_id=rng.choice(user_ids),
+                stripe_payment_intent_id=intent_id,
+                amount=amount,
+                currency=currency,
+                status='processing',
+                metadata={'load_test': True},
+            ))
+
+            failed = rng.random() < options['failure_rate']
+            intent = {
+                'id': intent_id,
+                'object': 'payment_intent',
+                'amount': int(amount * 100),
+                'currency': currency,
+                'status': 'requires_payment_method' if failed else 'succeeded',
+            }
+            if failed:
+                intent['last_payment_error'] = {'message': 'Your card was declined.'}
+            event = {
+                'id': f'evt_fake_{uuid.uuid4().hex}',
+                'object': 'event',
+                'type': 'payment_intent.payment_failed' if failed else 'payment_intent.succeeded',
+                'created': now,
+                'livemode': False,
+                'data': {'object': intent},
+            }
+            events.append(event)
+            if rng.random() < options['duplicate_rate']:
+                events.append(event)
+
+        PaymentIntent.objects.bulk_create(intents, batch_size=BATCH_SIZE)
+        rng.shuffle(events)
+        return events
+
+    def _post(self, events, url):
+        secret = settings.STRIPE_WEBHOOK_SECRET
+        errors = 0
+        with requests.Session() as session:
+            for event in events:
+                payload = json.dumps(event)
+                response = session.post(
+                    url,
+                    data=payload,
+                    headers={'Content-Type': 'application/json', 'Stripe-Signature': sign_payload(payload, secret)},
+                    timeout=10,
+                )
+                if response.status_code != 200:
+                    errors += 1
+        if errors:
+            self.stdout.write(self.style.WARNING(f'{errors} deliveries were rejected'))
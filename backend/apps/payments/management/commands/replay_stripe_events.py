@@ -0,0 +1,99 @@
+from datetime import datetime, time
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apps.payments.models import StripeWebhookEvent
+from apps.payments.webhooks import ingest_events, process_pending_events, request_drain
+
+
+class Command(BaseCommand):
+    help = 'Re-queue recorded Stripe webhook events, or fetch missed ones from Stripe, and process them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event-id', action='append', default=[], help='Event to replay (repeatable)')
+        parser.add_argument('--status', choices=['RECEIVED', 'PROCESSING', 'PROCESSED', 'FAILED'],
+                            help='Only replay events in this status (default: FAILED unless --event-id is given)')
+        parser.add_argument('--type', help='Only replay events of this type, e.g. payment_intent.succeeded')
+        parser.add_argument('--since', help='Only replay events received at or after this date/time')
+        parser.add_argument('--from-stripe', action='store_true',
+                            help='Fetch events from the Stripe API (from --since) and record any that are missing')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be replayed')
+        parser.add_argument('--sync', action='store_true', help='Process inline instead of through Celery')
+
+    def handle(self, *args, **options):
+        since = self._parse_since(options['since'])
+
+        if options['from_stripe']:
+            self._fetch_from_stripe(since, options['type'], options['dry_run'])
+        else:
+            events = StripeWebhookEvent.objects.all()
+            if options['event_id']:
+                events = events.filter(event_id__in=options['event_id'])
+            if options['status'] or not options['event_id']:
+                events = events.filter(status=options['status'] or 'FAILED')
+            if options['type']:
+                events = events.filter(type=options['type'])
+            if since:
+                events = events.filter(received_at__gte=since)
+
+            if options['dry_run']:
+                count = 0
+                for event_id, event_type, status in events.values_list('event_id', 'type', 'status').iterator():
+                    self.stdout.write(f'Would replay {event_id} ({event_type}, {status})')
+                    count += 1
+                self.stdout.write(f'{count} events match')
+                return
+
+            count = events.update(status='RECEIVED', attempts=0, last_error='', locked_at=None)
+            self.stdout.write(f'Re-queued {count} events')
+
+        if options['dry_run']:
+            return
+        if options['sync']:
+            processed = process_pending_events()
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} events'))
+        else:
+            request_drain()
+            self.stdout.write(self.style.SUCCESS('Scheduled processing'))
+
+    def _parse_since(self, value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Invalid --since value: {value}')
+            since = datetime.combine(day, time.min)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def _fetch_from_stripe(self, since, event_type, dry_run):
+        if not settings.STRIPE_SECRET_KEY:
+            raise CommandError('STRIPE_SECRET_KEY is not configured')
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+
+        params = {'limit': 100}
+        if since:
+            params['created'] = {'gte': int(since.timestamp())}
+        if event_type:
+            params['type'] = event_type
+
+        batch = []
+        fetched = 0
+        for event in stripe.Event.list(**params).auto_paging_iter():
+            fetched += 1
+            batch.append(event.to_dict_recursive())
+            if len(batch) >= 500:
+                if not dry_run:
+                    ingest_events(batch)
+                batch = []
+        if batch and not dry_run:
+            ingest_events(batch)
+
+        verb = 'Fetched' if dry_run else 'Fetched and recorded'
+        self.stdout.write(f'{verb} {fetched} events from Stripe (already recorded events are skipped)')
@@ -71,3 +71,38 @@ class PaymentIntent(models.Model):
     def __str__(self):
         return f"PaymentIntent {self.stripe_payment_intent_id} - {self.user.username} - {self.amount}"
 
+
+
+class StripeWebhookEvent(models.Model):
+    """
+    Received Stripe webhook events, keyed by Stripe's event ID.
+
+    The primary key deduplicates redeliveries; events are processed
+    asynchronously after the webhook has been acknowledged.
+    """
+    STATUS_CHOICES = [
+        ('RECEIVED', 'Received'),
+        ('PROCESSING', 'Processing'),
+        ('PROCESSED', 'Processed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=255, primary_key=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RECEIVED')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'stripe_webhook_events'
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} - {self.type} ({self.status})"
@@ -1,15 +1,31 @@
 import stripe
+from collections import defaultdict
+from decimal import Decimal
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import F
 from django.utils import timezone
+from apps.common.cache import CacheKeys
+from apps.common.exceptions import ServiceUnavailableError
+from apps.payments import stripe_client
 from apps.payments.models import StripeCustomer, PaymentIntent
+from apps.referrals.deposit_events import publish_deposits
 from apps.transactions.models import Transaction
+from apps.transactions.ledger import LedgerService
 from apps.users.models import User
 import logging
 
 logger = logging.getLogger(__name__)
 
+BULK_BATCH_SIZE = 1000
+NOTIFICATION_BATCH_SIZE = 500
+CUSTOMER_ID_CACHE_TIMEOUT = 24 * 3600
+# Payment intent statuses a later failure event must not overwrite
+TERMINAL_INTENT_STATUSES = ('succeeded', 'canceled')
+
 # Initialize Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe_client.configure()
 
 
 class StripeService:
@@ -28,7 +44,8 @@ class StripeService:
                 return stripe_customer_obj
 
             # Create customer in Stripe
-            customer = stripe.Customer.create(
+            customer = stripe_client.call(
+                stripe.Customer.create,
                 email=user.email,
                 name=f"{user.first_name} {user.last_name}".strip() or user.username,
                 metadata={
@@ -53,6 +70,89 @@ class StripeService:
             logger.error(f"Error creating Stripe customer: {e}")
             raise
 
+    @staticmethod
+    def get_customer_id(user, create=True):
+        """
+        Get the user's Stripe customer ID, cached.
+
+        Args:
+            user: User instance
+            create: Create the customer if the user has none
+
+        Returns:
+            str: Stripe customer ID, or None if there is none and
+            `create` is False
+        """
+        key = CacheKeys.stripe_customer_id(user.id)
+        customer_id = cache.get(key)
+        if customer_id:
+            return customer_id
+
+        customer_id = StripeCustomer.objects.filter(user=user).values_list(
+            'stripe_customer_id', flat=True
+        ).first()
+        if customer_id is None:
+            if not create:
+                return None
+            customer_id = StripeService.create_customer(user).stripe_customer_id
+
+        cache.set(key, customer_id, CUSTOMER_ID_CACHE_TIMEOUT)
+        return customer_id
+
+    @staticmethod
+    def _cached_payment_methods(customer_id):
+        return cache.get(CacheKeys.stripe_payment_methods(customer_id))
+
+    @staticmethod
+    def _cache_payment_methods(customer_id, payment_methods):
+        data = [payment_method.to_dict_recursive() for payment_method in payment_methods]
+        cache.set(CacheKeys.stripe_payment_methods(customer_id), data, settings.STRIPE_PAYMENT_METHODS_CACHE_TIMEOUT)
+        return data
+
+    @staticmethod
+    def get_payment_methods(customer_id):
+        """
+        List a customer's saved cards, cached until a payment_method
+        webhook or a local change invalidates the listing.
+
+        Returns:
+            list: stripe.PaymentMethod objects
+        """
+        data = StripeService._cached_payment_methods(customer_id)
+        if data is None:
+            payment_methods = stripe_client.call(stripe.PaymentMethod.list, customer=customer_id, type='card')
+            data = StripeService._cache_payment_methods(customer_id, payment_methods.data)
+        return [stripe.PaymentMethod.construct_from(item, stripe.api_key) for item in data]
+
+    @staticmethod
+    def invalidate_payment_methods(customer_id):
+        """Drop the cached card listing for a customer."""
+        if customer_id:
+            cache.delete(CacheKeys.stripe_payment_methods(customer_id))
+
+    @staticmethod
+    def _finish_saving_card(customer_id, payment_method_id, results, saved_cards):
+        """Make a newly attached card the default if it's the customer's first."""
+        attached, *listing = results
+        try:
+            if isinstance(attached, Exception):
+                raise attached
+            if saved_cards is None:
+                if isinstance(listing[0], Exception):
+                    raise listing[0]
+                saved_cards = listing[0].data
+            # The listing may or may not include the card attached concurrently
+            if not [card for card in saved_cards if card['id'] != payment_method_id]:
+                stripe_client.call(
+                    stripe.Customer.modify,
+                    customer_id,
+                    invoice_settings={'default_payment_method': payment_method_id}
+                )
+        except (stripe.error.StripeError, ServiceUnavailableError) as e:
+            logger.warning(f"Could not save payment method: {e}")
+        finally:
+            StripeService.invalidate_payment_methods(customer_id)
+
     @staticmethod
     def create_payment_intent(amount, user, payment_method_id=None, save_payment_method=False):
         """
@@ -60,9 +160,7 @@ class StripeService:
         Returns PaymentIntent instance
         """
         try:
-            # Get or create Stripe customer
-            stripe_customer = StripeService.create_customer(user)
-            customer_id = stripe_customer.stripe_customer_id
+            customer_id = StripeService.get_customer_id(user)
 
             # Create payment intent parameters
             intent_params = {
@@ -82,28 +180,22 @@ class StripeService:
                 intent_params['confirmation_method'] = 'manual'
                 intent_params['confirm'] = False
 
-            # Create payment intent in Stripe
-            intent = stripe.PaymentIntent.create(**intent_params)
-
-            # Save payment method if requested
-            if save_payment_method and payment_method_id:
-                try:
-                    stripe.PaymentMethod.attach(
-                        payment_method_id,
-                        customer=customer_id
-                    )
-                    # Set as default if it's the first payment method
-                    payment_methods = stripe.PaymentMethod.list(
-                        customer=customer_id,
-                        type='card'
-                    )
-                    if len(payment_methods.data) == 1:
-                        stripe.Customer.modify(
-                            customer_id,
-                            invoice_settings={'default_payment_method': payment_method_id}
-                        )
-                except stripe.error.StripeError as e:
-                    logger.warning(f"Could not save payment method: {e}")
+            # Creating the intent, attaching the card and listing saved
+            # cards don't depend on each other
+            calls = [lambda: stripe.PaymentIntent.create(**intent_params)]
+            save_card = bool(save_payment_method and payment_method_id)
+            saved_cards = None
+            if save_card:
+                calls.append(lambda: stripe.PaymentMethod.attach(payment_method_id, customer=customer_id))
+                saved_cards = StripeService._cached_payment_methods(customer_id)
+                if saved_cards is None:
+                    calls.append(lambda: stripe.PaymentMethod.list(customer=customer_id, type='card'))
+            with stripe_client.request_budget():
+                intent, *card_results = stripe_client.run_concurrently(*calls, return_exceptions=True)
+                if save_card:
+                    StripeService._finish_saving_card(customer_id, payment_method_id, card_results, saved_cards)
+            if isinstance(intent, Exception):
+                raise intent
 
             # Create PaymentIntent record
             payment_intent = PaymentIntent.objects.create(
@@ -141,15 +233,17 @@ class StripeService:
             if payment_method_id:
                 confirm_params['payment_method'] = payment_method_id
 
-            intent = stripe.PaymentIntent.confirm(
+            intent = stripe_client.call(
+                stripe.PaymentIntent.confirm,
                 payment_intent_id,
                 **confirm_params
             )
 
-            # Update payment intent status
+            # Update payment intent status; only these fields, so a
+            # transaction linked by a webhook during the Stripe call is kept
             payment_intent.status = intent.status
             payment_intent.client_secret = intent.client_secret
-            payment_intent.save()
+            payment_intent.save(update_fields=['status', 'client_secret', 'updated_at'])
 
             logger.info(f"Confirmed payment intent {payment_intent_id}, status: {intent.status}")
             return payment_intent
@@ -171,21 +265,24 @@ class StripeService:
         Returns payment method object
         """
         try:
-            stripe_customer = StripeService.create_customer(user)
-            customer_id = stripe_customer.stripe_customer_id
-
-            # Attach payment method to customer
-            payment_method = stripe.PaymentMethod.attach(
-                payment_method_id,
-                customer=customer_id
-            )
-
-            # Set as primary if requested
-            if set_as_primary:
-                stripe.Customer.modify(
-                    customer_id,
-                    invoice_settings={'default_payment_method': payment_method_id}
+            customer_id = StripeService.get_customer_id(user)
+
+            with stripe_client.request_budget():
+                # Attach payment method to customer
+                payment_method = stripe_client.call(
+                    stripe.PaymentMethod.attach,
+                    payment_method_id,
+                    customer=customer_id
                 )
+                StripeService.invalidate_payment_methods(customer_id)
+
+                # Set as primary if requested
+                if set_as_primary:
+                    stripe_client.call(
+                        stripe.Customer.modify,
+                        customer_id,
+                        invoice_settings={'default_payment_method': payment_method_id}
+                    )
 
             # Update PaymentMethod model if it exists
             from apps.transactions.models import PaymentMethod
@@ -233,16 +330,11 @@ class StripeService:
         Returns list of payment methods
         """
         try:
-            stripe_customer = StripeCustomer.objects.filter(user=user).first()
-            if not stripe_customer:
+            customer_id = StripeService.get_customer_id(user, create=False)
+            if not customer_id:
                 return []
 
-            payment_methods = stripe.PaymentMethod.list(
-                customer=stripe_customer.stripe_customer_id,
-                type='card'
-            )
-
-            return payment_methods.data
+            return StripeService.get_payment_methods(customer_id)
 
         except stripe.error.StripeError as e:
             logger.error(f"Stripe error listing payment methods: {e}")
@@ -257,8 +349,10 @@ class StripeService:
         Delete a payment method
         """
         try:
-            payment_method = stripe.PaymentMethod.retrieve(payment_method_id)
-            stripe.PaymentMethod.detach(payment_method_id)
+            with stripe_client.request_budget():
+                payment_method = stripe_client.call(stripe.PaymentMethod.retrieve, payment_method_id)
+                stripe_client.call(stripe.PaymentMethod.detach, payment_method_id)
+            StripeService.invalidate_payment_methods(payment_method.customer)
 
             # Also delete from PaymentMethod model
             from apps.transactions.models import PaymentMethod
@@ -280,51 +374,48 @@ class StripeService:
     def handle_payment_success(payment_intent_id):
         """
         Handle successful payment - credit user wallet and create transaction
+
+        Safe under concurrent webhook retries and the confirm endpoint: the
+        payment intent row is locked before checking whether it has already
+        been credited.
         """
         try:
-            payment_intent = PaymentIntent.objects.get(
-                stripe_payment_intent_id=payment_intent_id
-            )
+            with db_transaction.atomic():
+                payment_intent = PaymentIntent.objects.select_for_update().select_related('user').get(
+                    stripe_payment_intent_id=payment_intent_id
+                )
 
-            # Check if already processed
-            if payment_intent.transaction and payment_intent.transaction.status == 'COMPLETED':
-                logger.warning(f"Payment intent {payment_intent_id} already processed")
-                return payment_intent
+                # Check if already processed
+                if payment_intent.transaction_id:
+                    logger.warning(f"Payment intent {payment_intent_id} already processed")
+                    return payment_intent
 
-            user = payment_intent.user
+                user = payment_intent.user
 
-            # Credit user wallet
-            user.add_balance(payment_intent.amount)
+                # Create transaction
+                transaction = Transaction.objects.create(
+                    user=user,
+                    type='DEPOSIT',
+                    amount=payment_intent.amount,
+                    status='COMPLETED',
+                    description=f'Deposit via Stripe - Payment Intent {payment_intent_id}',
+                    reference_id=payment_intent_id
+                )
 
-            # Create transaction
-            transaction = Transaction.objects.create(
-                user=user,
-                type='DEPOSIT',
-                amount=payment_intent.amount,
-                status='COMPLETED',
-                description=f'Deposit via Stripe - Payment Intent {payment_intent_id}',
-                reference_id=payment_intent_id
-            )
+                # Credit user wallet
+                user.add_balance(payment_intent.amount, 'DEPOSIT', transaction.id)
+
+                # Link transaction to payment intent
+                payment_intent.transaction = transaction
+                payment_intent.status = 'succeeded'
+                payment_intent.completed_at = timezone.now()
+                payment_intent.save(update_fields=['transaction', 'status', 'completed_at', 'updated_at'])
 
-            # Link transaction to payment intent
-            payment_intent.transaction = transaction
-            payment_intent.status = 'succeeded'
-            payment_intent.completed_at = timezone.now()
-            payment_intent.save()
-
-            # Track referral deposit if user was referred
-            try:
-                from apps.referrals.services import ReferralService
-                ReferralService.update_referral_deposit(user, payment_intent.amount)
-            except Exception as e:
-                logger.warning(f"Error updating referral deposit: {e}")
-
-            # Send deposit confirmation email
-            try:
-                from apps.notifications.tasks import send_deposit_confirmation_email
-                send_deposit_confirmation_email.delay(str(user.id), str(transaction.id))
-            except Exception as e:
-                logger.warning(f"Error sending deposit confirmation email: {e}")
+                db_transaction.on_commit(
+                    lambda: StripeService._after_payment_success(user, payment_intent, transaction)
+                )
+                # Referral qualification runs off the deposit path
+                publish_deposits([user.id])
 
             logger.info(f"Processed successful payment {payment_intent_id} for user {user.id}")
             return payment_intent
@@ -337,21 +428,146 @@ class StripeService:
             raise
 
     @staticmethod
-    def handle_payment_failure(payment_intent_id):
+    def _after_payment_success(user, payment_intent, transaction):
+        """Side effects of a credited deposit, run after commit."""
+        # Send deposit confirmation email
+        try:
+            from apps.notifications.tasks import send_deposit_confirmation_email
+            send_deposit_confirmation_email.delay(str(user.id), str(transaction.id))
+        except Exception as e:
+            logger.warning(f"Error sending deposit confirmation email: {e}")
+
+    @staticmethod
+    def handle_payment_successes(payment_intent_ids):
         """
-        Handle failed payment - log error and notify
+        Credit many succeeded payment intents in one transaction.
+
+        Bulk counterpart of handle_payment_success used by the webhook
+        batch processor: intents are locked with one query, transactions
+        and ledger entries are bulk inserted and wallets are credited with
+        one UPDATE per distinct amount.
+
+        Args:
+            payment_intent_ids: Stripe payment intent IDs
+
+        Returns:
+            set: IDs of the intents that exist (credited now or earlier)
         """
-        try:
-            payment_intent = PaymentIntent.objects.get(
-                stripe_payment_intent_id=payment_intent_id
+        now = timezone.now()
+        with db_transaction.atomic():
+            intents = list(
+                PaymentIntent.objects.select_for_update(of=('self',))
+                .select_related('user')
+                .filter(stripe_payment_intent_id__in=list(payment_intent_ids))
+            )
+            found = {intent.stripe_payment_intent_id for intent in intents}
+            pending = [
+                intent for intent in intents
+                if not intent.transaction_id
+            ]
+            if not pending:
+                return found
+
+            transactions = []
+            credits = defaultdict(Decimal)
+            for intent in pending:
+                transaction = Transaction(
+                    user_id=intent.user_id,
+                    type='DEPOSIT',
+                    amount=intent.amount,
+                    status='COMPLETED',
+                    description=f'Deposit via Stripe - Payment Intent {intent.stripe_payment_intent_id}',
+                    reference_id=intent.stripe_payment_intent_id
+                )
+                transactions.append(transaction)
+                credits[intent.user_id] += intent.amount
+                intent.transaction = transaction
+                intent.status = 'succeeded'
+                intent.completed_at = now
+                intent.updated_at = now
+            Transaction.objects.bulk_create(transactions, batch_size=BULK_BATCH_SIZE)
+
+            # Wallet credits: one UPDATE per distinct credit amount
+            users_by_credit = defaultdict(list)
+            for user_id, amount in credits.items():
+                users_by_credit[amount].append(user_id)
+            for amount, user_ids in users_by_credit.items():
+                User.objects.filter(id__in=user_ids).update(
+                    wallet_balance=F('wallet_balance') + amount,
+                    updated_at=now
+                )
+            LedgerService.post_many(
+                (intent.user_id, intent.amount, 'DEPOSIT', intent.transaction.id) for intent in pending
+            )
+
+            PaymentIntent.objects.bulk_update(
+                pending, ['transaction', 'status', 'completed_at', 'updated_at'], batch_size=BULK_BATCH_SIZE
             )
 
-            payment_intent.status = 'canceled'
-            payment_intent.save()
+            db_transaction.on_commit(lambda: StripeService._after_payment_successes(pending))
+            publish_deposits({intent.user_id for intent in pending})
+
+        logger.info(f"Credited {len(pending)} payment intents in bulk")
+        return found
+
+    @staticmethod
+    def _after_payment_successes(intents):
+        """Side effects of credited deposits, run after commit."""
+        from apps.notifications.tasks import send_deposit_confirmation_batch_task
+
+        items = [[str(intent.user_id), str(intent.transaction.id)] for intent in intents]
+        try:
+            for start in range(0, len(items), NOTIFICATION_BATCH_SIZE):
+                send_deposit_confirmation_batch_task.delay(items[start:start + NOTIFICATION_BATCH_SIZE])
+        except Exception as e:
+            logger.warning(f"Error sending deposit confirmation emails: {e}")
+
+    @staticmethod
+    def handle_payment_failures(payment_intent_ids, status='requires_payment_method'):
+        """
+        Record failures or cancellations for many payment intents.
+
+        Intents that already succeeded (and so have a deposit transaction)
+        or were canceled are left alone. Failed intents have no transaction
+        yet, since one is only created when the deposit is credited.
+
+        Args:
+            payment_intent_ids: Stripe payment intent IDs
+            status: 'requires_payment_method' for a failed attempt, which
+                Stripe leaves retryable, or 'canceled'
+
+        Returns:
+            int: Number of intents updated
+        """
+        return PaymentIntent.objects.filter(
+            stripe_payment_intent_id__in=list(payment_intent_ids),
+            transaction__isnull=True
+        ).exclude(status__in=TERMINAL_INTENT_STATUSES).update(
+            status=status, updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def handle_payment_failure(payment_intent_id, status='requires_payment_method'):
+        """
+        Handle failed or canceled payment - log error and notify
+
+        A failed attempt leaves the intent retryable; only a cancellation is
+        final. A late event never overrides a payment that has already
+        succeeded or been canceled.
+        """
+        try:
+            with db_transaction.atomic():
+                payment_intent = PaymentIntent.objects.select_for_update().get(
+                    stripe_payment_intent_id=payment_intent_id
+                )
+                if payment_intent.status in TERMINAL_INTENT_STATUSES or payment_intent.transaction_id:
+                    logger.warning(
+                        f"Ignoring failure for {payment_intent.status} payment intent {payment_intent_id}"
+                    )
+                    return payment_intent
 
-            if payment_intent.transaction:
-                payment_intent.transaction.status = 'FAILED'
-                payment_intent.transaction.save()
+                payment_intent.status = status
+                payment_intent.save(update_fields=['status', 'updated_at'])
 
             logger.warning(f"Payment failed for payment intent {payment_intent_id}")
             return payment_intent
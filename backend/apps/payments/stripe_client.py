@@ -0,0 +1,116 @@
+"""
+Stripe HTTP transport.
+
+The Stripe SDK opens a new HTTPS connection per thread by default. Here
+every call shares one keep-alive connection pool (STRIPE_HTTP_POOL_SIZE
+connections), so a deposit pays for the TLS handshake once per worker
+rather than once per request, and independent calls can run in parallel
+with `run_concurrently`.
+
+All calls go through the 'stripe' outbound provider (see
+apps.common.resilience): each has a deadline, counts towards the circuit
+breaker and takes a bulkhead slot. Use `call` rather than calling the SDK
+directly.
+
+STRIPE_API_BASE points the SDK at another endpoint, e.g. a local
+stripe-mock or fake server in tests.
+"""
+import logging
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from apps.common import resilience
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_BASE = 'https://api.stripe.com'
+PROVIDER = 'stripe'
+
+
+def is_provider_failure(error):
+    """Errors that say Stripe is unhealthy, as opposed to a bad request or a declined card."""
+    return isinstance(error, (
+        stripe.error.APIConnectionError,
+        stripe.error.APIError,
+        stripe.error.RateLimitError,
+    ))
+
+
+def build_session(pool_size=None):
+    """Build a requests session with a keep-alive pool sized for concurrent calls."""
+    pool_size = pool_size or settings.STRIPE_HTTP_POOL_SIZE
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_provider():
+    return resilience.get_provider(PROVIDER, is_failure=is_provider_failure)
+
+
+def configure():
+    """Configure the Stripe SDK: API key, endpoint and pooled HTTP client."""
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = settings.STRIPE_API_BASE or DEFAULT_API_BASE
+    # Calls abandoned at their deadline still end at the HTTP timeout
+    timeout = settings.OUTBOUND_PROVIDERS.get(PROVIDER, {}).get('timeout', 80)
+    stripe.default_http_client = stripe.http_client.RequestsClient(timeout=timeout, session=build_session())
+
+
+def request_budget():
+    """Time budget for all Stripe calls made while handling one request."""
+    return resilience.deadline(settings.STRIPE_REQUEST_BUDGET)
+
+
+def call(fn, *args, **kwargs):
+    """
+    Make one Stripe call under the provider's deadline, circuit breaker
+    and bulkhead.
+
+    Raises:
+        ServiceUnavailableError: If the call is rejected or times out
+    """
+    return get_provider().call(fn, *args, **kwargs)
+
+
+def run_concurrently(*calls, return_exceptions=False):
+    """
+    Run independent Stripe calls in parallel.
+
+    Each call must be a single SDK call that doesn't touch the database.
+
+    Args:
+        calls: Zero-argument callables
+        return_exceptions: Return errors in place of results instead of
+            re-raising the first one once all calls are done
+
+    Returns:
+        list: Results in the order of `calls`
+    """
+    provider = get_provider()
+    futures = []
+    for fn in calls:
+        try:
+            futures.append(provider.submit(fn))
+        except Exception as e:
+            futures.append(e)
+
+    results = []
+    for future in futures:
+        if isinstance(future, Exception):
+            results.append(future)
+            continue
+        try:
+            results.append(provider.wait(future))
+        except Exception as e:
+            results.append(e)
+
+    if not return_exceptions:
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+    return results
@@ -0,0 +1,38 @@
+"""
+Celery tasks for payment processing.
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_stripe_event_task(event_id):
+    """Process a recorded Stripe webhook event."""
+    from apps.payments.webhooks import process_event
+
+    try:
+        if process_event(event_id):
+            return f"Processed Stripe event {event_id}"
+        return f"Skipped Stripe event {event_id}"
+    except Exception as e:
+        logger.error(f"Error processing Stripe event {event_id}: {str(e)}")
+        raise
+
+
+@shared_task
+def process_stripe_events_task():
+    """Drain recorded Stripe webhook events in batches."""
+    from apps.common.cache import CacheKeys
+    from apps.payments.webhooks import process_pending_events
+    from django.core.cache import cache
+
+    try:
+        # Clear the debounce flag first so events arriving during the drain schedule another one
+        cache.delete(CacheKeys.stripe_events_drain_pending())
+        count = process_pending_events()
+        return f"Processed {count} Stripe events"
+    except Exception as e:
+        logger.error(f"Error processing Stripe events: {str(e)}")
+        raise
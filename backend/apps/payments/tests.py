@@ -1,11 +1,17 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from unittest.mock import patch, MagicMock
 from apps.payments.models import StripeCustomer, PaymentIntent
 from apps.payments.services import StripeService
+from apps.common.cache import CacheKeys
 from apps.transactions.models import Transaction
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
 import uuid
 
 User = get_user_model()
@@ -180,3 +186,431 @@ class PaymentWebhookTestCase(TestCase):
 
         mock_handle.assert_called_once_with('pi_test123')
 
+
+
+class WebhookIdempotencyTestCase(TestCase):
+    """Test deduplicated, asynchronous webhook processing"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='depositor',
+            email='depositor@example.com',
+            password='TestPassword123'
+        )
+        PaymentIntent.objects.create(
+            user=self.user,
+            stripe_payment_intent_id='pi_dedup',
+            amount=100.00,
+            status='processing'
+        )
+        self.event = {
+            'id': 'evt_dedup',
+            'type': 'payment_intent.succeeded',
+            'data': {'object': {'id': 'pi_dedup', 'amount': 10000}},
+        }
+
+    @patch('apps.payments.tasks.process_stripe_events_task.apply_async')
+    def test_duplicate_deliveries_recorded_once(self, mock_apply_async):
+        """Test redeliveries of a recorded event are acknowledged without work"""
+        from apps.payments.models import StripeWebhookEvent
+        from apps.payments.webhooks import ingest_event, ingest_events
+
+        cache.delete(CacheKeys.stripe_events_drain_pending())
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_event(self.event)
+            ingest_events([self.event, self.event])
+
+        self.assertEqual(StripeWebhookEvent.objects.filter(event_id='evt_dedup').count(), 1)
+        # Drains are debounced
+        mock_apply_async.assert_called_once()
+
+    @patch('apps.notifications.tasks.send_deposit_confirmation_email.delay')
+    def test_event_processed_once(self, mock_email):
+        """Test repeated processing credits the wallet once"""
+        from apps.payments.models import StripeWebhookEvent
+        from apps.payments.webhooks import process_event
+
+        StripeWebhookEvent.objects.create(event_id='evt_dedup', type=self.event['type'], payload=self.event)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(process_event('evt_dedup'))
+            self.assertFalse(process_event('evt_dedup'))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, 100)
+        self.assertEqual(Transaction.objects.filter(type='DEPOSIT').count(), 1)
+        self.assertEqual(StripeWebhookEvent.objects.get(event_id='evt_dedup').status, 'PROCESSED')
+        mock_email.assert_called_once()
+
+    def test_payment_success_idempotent(self):
+        """Test handle_payment_success skips an already credited intent"""
+        with patch('apps.notifications.tasks.send_deposit_confirmation_email.delay'):
+            StripeService.handle_payment_success('pi_dedup')
+            StripeService.handle_payment_success('pi_dedup')
+            StripeService.handle_payment_failure('pi_dedup')
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, 100)
+        self.assertEqual(PaymentIntent.objects.get(stripe_payment_intent_id='pi_dedup').status, 'succeeded')
+
+    def test_failed_payment_stays_retryable(self):
+        """Test a failed attempt leaves the intent retryable and a cancellation is final"""
+        StripeService.handle_payment_failure('pi_dedup')
+        intent = PaymentIntent.objects.get(stripe_payment_intent_id='pi_dedup')
+        self.assertEqual(intent.status, 'requires_payment_method')
+
+        StripeService.handle_payment_failure('pi_dedup', status='canceled')
+        StripeService.handle_payment_failure('pi_dedup')
+        self.assertEqual(StripeService.handle_payment_failures(['pi_dedup']), 0)
+        intent.refresh_from_db()
+        self.assertEqual(intent.status, 'canceled')
+
+
+    def test_confirm_racing_webhook_credits_once(self):
+        """Test a webhook crediting during the confirm round trip isn't undone"""
+        def confirm(payment_intent_id, **kwargs):
+            # The webhook worker credits the deposit while Stripe responds
+            StripeService.handle_payment_success(payment_intent_id)
+            return MagicMock(status='succeeded', client_secret='secret_dedup')
+
+        with patch('apps.notifications.tasks.send_deposit_confirmation_email.delay'), \
+                patch('apps.payments.services.stripe.PaymentIntent.confirm', side_effect=confirm), \
+                patch('apps.payments.services.stripe_client.call', side_effect=lambda fn, *args, **kwargs: fn(*args, **kwargs)):
+            payment_intent = StripeService.confirm_payment_intent('pi_dedup')
+            StripeService.handle_payment_success('pi_dedup')
+
+        self.assertEqual(payment_intent.status, 'succeeded')
+        self.assertIsNotNone(PaymentIntent.objects.get(stripe_payment_intent_id='pi_dedup').transaction_id)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, 100)
+        self.assertEqual(Transaction.objects.filter(type='DEPOSIT').count(), 1)
+
+
+class WebhookBatchProcessingTestCase(TestCase):
+    """Test batched processing of queued webhook events"""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f'batch{index}',
+                email=f'batch{index}@example.com',
+                password='TestPassword123'
+            )
+            for index in range(3)
+        ]
+        for index, user in enumerate(self.users):
+            PaymentIntent.objects.create(
+                user=user,
+                stripe_payment_intent_id=f'pi_batch{index}',
+                amount=50.00,
+                status='processing'
+            )
+
+    def _event(self, event_id, event_type, intent_id, created=0):
+        return {
+            'id': event_id,
+            'type': event_type,
+            'created': created,
+            'data': {'object': {'id': intent_id}},
+        }
+
+    @patch('apps.notifications.tasks.send_deposit_confirmation_batch_task.delay')
+    @patch('apps.payments.tasks.process_stripe_events_task.apply_async')
+    def test_batch_credits_each_intent_once(self, mock_apply_async, mock_email):
+        """Test a batch resolves each intent once and marks every event processed"""
+        from apps.payments.models import StripeWebhookEvent
+        from apps.payments.webhooks import ingest_events, process_pending_events
+
+        events = [
+            self._event('evt_b0', 'payment_intent.succeeded', 'pi_batch0'),
+            self._event('evt_b0', 'payment_intent.succeeded', 'pi_batch0'),
+            self._event('evt_b0_retry', 'payment_intent.succeeded', 'pi_batch0'),
+            self._event('evt_b1', 'payment_intent.succeeded', 'pi_batch1'),
+            self._event('evt_b2_failed', 'payment_intent.payment_failed', 'pi_batch2', created=1),
+            self._event('evt_b2_canceled', 'payment_intent.canceled', 'pi_batch2', created=2),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_events(events)
+            self.assertEqual(process_pending_events(batch_size=10), 5)
+
+        for user, expected in zip(self.users, (50, 50, 0)):
+            user.refresh_from_db()
+            self.assertEqual(user.wallet_balance, expected)
+        self.assertEqual(Transaction.objects.filter(type='DEPOSIT').count(), 2)
+        self.assertEqual(PaymentIntent.objects.get(stripe_payment_intent_id='pi_batch2').status, 'canceled')
+        self.assertFalse(StripeWebhookEvent.objects.exclude(status='PROCESSED').exists())
+        mock_email.assert_called_once()
+
+        # Nothing left to drain
+        self.assertEqual(process_pending_events(), 0)
+
+    @patch('apps.payments.tasks.process_stripe_events_task.apply_async')
+    def test_unknown_intent_fails_only_its_event(self, mock_apply_async):
+        """Test an event for a missing intent doesn't block the batch"""
+        from apps.payments.models import StripeWebhookEvent
+        from apps.payments.webhooks import ingest_events, process_pending_events
+
+        with patch('apps.notifications.tasks.send_deposit_confirmation_batch_task.delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                ingest_events([
+                    self._event('evt_known', 'payment_intent.succeeded', 'pi_batch0'),
+                    self._event('evt_unknown', 'payment_intent.succeeded', 'pi_missing'),
+                ])
+                process_pending_events()
+
+        self.assertEqual(StripeWebhookEvent.objects.get(event_id='evt_known').status, 'PROCESSED')
+        failed = StripeWebhookEvent.objects.get(event_id='evt_unknown')
+        self.assertEqual(failed.status, 'FAILED')
+        self.assertEqual(failed.attempts, 1)
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].wallet_balance, 50)
+
+
+class GenerateStripeEventsCommandTestCase(TestCase):
+    """Test the load test event generator refuses to run against production"""
+
+    @override_settings(DEBUG=False, STRIPE_SECRET_KEY='sk_live_123')
+    def test_refuses_live_configuration(self):
+        """Test the command aborts without DEBUG, a test key or the override flag"""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command('generate_stripe_events', count=1, users=1)
+        self.assertFalse(PaymentIntent.objects.exists())
+
+    @patch('apps.payments.tasks.process_stripe_events_task.apply_async')
+    def test_runs_with_test_key_or_flag(self, mock_apply_async):
+        """Test a test-mode key or the explicit flag allows the run"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        options = {'count': 1, 'users': 1, 'duplicate_rate': 0, 'stdout': StringIO()}
+        with override_settings(DEBUG=False, STRIPE_SECRET_KEY='sk_test_123'):
+            call_command('generate_stripe_events', **options)
+        with override_settings(DEBUG=False, STRIPE_SECRET_KEY='sk_live_123'):
+            call_command('generate_stripe_events', i_know_this_is_not_prod=True, **options)
+        self.assertEqual(PaymentIntent.objects.count(), 2)
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the Stripe API"""
+
+    protocol_version = 'HTTP/1.1'
+    requests = []
+    connections = set()
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        path = self.path.split('?')[0]
+        FakeStripeHandler.requests.append((self.command, path))
+        FakeStripeHandler.connections.add(self.client_address)
+
+        if path == '/v1/payment_intents':
+            intent_id = f'pi_fake{len(FakeStripeHandler.requests)}'
+            body = {'id': intent_id, 'object': 'payment_intent', 'status': 'requires_confirmation',
+                    'client_secret': f'{intent_id}_secret'}
+        elif path == '/v1/payment_methods':
+            body = {'object': 'list', 'data': [], 'has_more': False, 'url': '/v1/payment_methods'}
+        elif path.startswith('/v1/payment_methods/'):
+            body = {'id': path.split('/')[3], 'object': 'payment_method', 'type': 'card', 'customer': 'cus_fake'}
+        else:
+            body = {'id': path.split('/')[-1], 'object': 'customer'}
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class StripeClientTestCase(TestCase):
+    """Test the Stripe client layer: caching, pooling and concurrent calls"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='carduser',
+            email='carduser@example.com',
+            password='TestPassword123'
+        )
+        StripeCustomer.objects.create(user=self.user, stripe_customer_id='cus_fake')
+        cache.delete(CacheKeys.stripe_customer_id(self.user.id))
+        cache.delete(CacheKeys.stripe_payment_methods('cus_fake'))
+
+    def test_customer_id_cached(self):
+        """Test the customer ID is read from the cache after the first lookup"""
+        self.assertEqual(StripeService.get_customer_id(self.user), 'cus_fake')
+        with self.assertNumQueries(0):
+            self.assertEqual(StripeService.get_customer_id(self.user), 'cus_fake')
+
+    @patch('apps.payments.services.stripe.PaymentMethod.list')
+    def test_payment_methods_cached_until_webhook(self, mock_list):
+        """Test card listings are cached and invalidated by payment_method.attached"""
+        import stripe
+        from apps.payments.webhooks import dispatch_event
+
+        mock_list.return_value = MagicMock(data=[
+            stripe.PaymentMethod.construct_from(
+                {'id': 'pm_cached', 'type': 'card', 'card': {'last4': '4242', 'brand': 'visa'}}, 'sk_test'
+            )
+        ])
+
+        first = StripeService.list_payment_methods(self.user)
+        second = StripeService.list_payment_methods(self.user)
+        self.assertEqual(mock_list.call_count, 1)
+        self.assertEqual(second[0].id, 'pm_cached')
+        self.assertEqual(second[0].card.last4, first[0].card.last4)
+
+        dispatch_event('payment_method.attached', {'id': 'pm_new', 'customer': 'cus_fake'})
+        StripeService.list_payment_methods(self.user)
+        self.assertEqual(mock_list.call_count, 2)
+
+    def test_create_payment_intent_against_fake_server(self):
+        """Test a deposit with a saved card against a local fake Stripe server"""
+        from apps.payments import stripe_client
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeStripeHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        FakeStripeHandler.requests = []
+        FakeStripeHandler.connections = set()
+        try:
+            with override_settings(STRIPE_API_BASE=f'http://127.0.0.1:{server.server_port}',
+                                   STRIPE_SECRET_KEY='sk_test_fake'):
+                stripe_client.configure()
+                payment_intent = StripeService.create_payment_intent(
+                    amount=25, user=self.user, payment_method_id='pm_card', save_payment_method=True
+                )
+                StripeService.create_payment_intent(amount=25, user=self.user)
+        finally:
+            server.shutdown()
+            server.server_close()
+            stripe_client.configure()
+
+        self.assertTrue(payment_intent.stripe_payment_intent_id.startswith('pi_fake'))
+        self.assertEqual(sorted(FakeStripeHandler.requests), [
+            ('GET', '/v1/payment_methods'),
+            ('POST', '/v1/customers/cus_fake'),
+            ('POST', '/v1/payment_intents'),
+            ('POST', '/v1/payment_intents'),
+            ('POST', '/v1/payment_methods/pm_card/attach'),
+        ])
+        # Keep-alive connections are reused across calls
+        self.assertLess(len(FakeStripeHandler.connections), len(FakeStripeHandler.requests))
+
+
+class PaymentResilienceTestCase(TestCase):
+    """Test deadlines, circuit breaking and bulkheads for provider calls"""
+
+    def _provider(self, name, **options):
+        from apps.common.resilience import OutboundProvider
+        from apps.payments.stripe_client import is_provider_failure
+
+        options.setdefault('timeout', 1.0)
+        return OutboundProvider(f'test-{name}-{uuid.uuid4().hex[:8]}', is_failure=is_provider_failure, **options)
+
+    def test_circuit_opens_and_recovers_after_probe(self):
+        """Test the breaker opens after repeated failures and a successful probe closes it"""
+        import stripe
+        from apps.common.exceptions import CircuitOpenError
+        from apps.common.resilience import CLOSED, OPEN
+
+        provider = self._provider('breaker', failure_threshold=2, reset_timeout=0.1)
+        failing = MagicMock(side_effect=stripe.error.APIConnectionError('connection reset'))
+
+        for _ in range(2):
+            with self.assertRaises(stripe.error.APIConnectionError):
+                provider.call(failing)
+        self.assertEqual(provider.breaker.state, OPEN)
+
+        with self.assertRaises(CircuitOpenError):
+            provider.call(failing)
+        self.assertEqual(failing.call_count, 2)
+
+        time.sleep(0.15)
+        self.assertEqual(provider.call(lambda: 'ok'), 'ok')
+        self.assertEqual(provider.breaker.state, CLOSED)
+
+        metrics = provider.metrics.snapshot()
+        self.assertEqual(metrics['failures'], 2)
+        self.assertEqual(metrics['rejected_open'], 1)
+        self.assertEqual(metrics['circuit_opened'], 1)
+
+    def test_declined_card_does_not_trip_breaker(self):
+        """Test client errors don't count as provider failures"""
+        import stripe
+        from apps.common.resilience import CLOSED
+
+        provider = self._provider('declined', failure_threshold=1)
+        declined = MagicMock(side_effect=stripe.error.CardError('Your card was declined.', None, 'card_declined'))
+
+        with self.assertRaises(stripe.error.CardError):
+            provider.call(declined)
+        self.assertEqual(provider.breaker.state, CLOSED)
+
+    def test_slow_call_released_at_deadline(self):
+        """Test the caller stops waiting at the call timeout"""
+        from apps.common.exceptions import DeadlineExceededError
+
+        provider = self._provider('deadline', timeout=0.1)
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceededError):
+            provider.call(time.sleep, 0.5)
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(provider.metrics.snapshot()['timeouts'], 1)
+
+    def test_request_budget_shared_by_calls(self):
+        """Test calls made after the request budget is spent are rejected"""
+        from apps.common.exceptions import DeadlineExceededError
+        from apps.common.resilience import deadline
+
+        provider = self._provider('budget')
+        late = MagicMock()
+        with deadline(0.05):
+            with self.assertRaises(DeadlineExceededError):
+                provider.call(time.sleep, 0.1)
+            with self.assertRaises(DeadlineExceededError):
+                provider.call(late)
+        late.assert_not_called()
+
+    def test_bulkhead_rejects_calls_over_limit(self):
+        """Test calls beyond the concurrency limit fail fast"""
+        from apps.common.exceptions import BulkheadFullError
+
+        provider = self._provider('bulkhead', max_concurrent=1)
+        release = threading.Event()
+        future = provider.submit(release.wait, 1)
+        try:
+            with self.assertRaises(BulkheadFullError):
+                provider.call(lambda: 'rejected')
+        finally:
+            release.set()
+        provider.wait(future)
+        self.assertEqual(provider.call(lambda: 'ok'), 'ok')
+
+    @patch('apps.payments.services.StripeService.create_payment_intent')
+    def test_add_funds_returns_503_when_provider_unavailable(self, mock_create):
+        """Test deposits fail fast with 503 while the circuit is open"""
+        from apps.common.exceptions import CircuitOpenError
+
+        user = User.objects.create_user(
+            username='resilient',
+            email='resilient@example.com',
+            password='TestPassword123'
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        mock_create.side_effect = CircuitOpenError('stripe is unavailable (circuit open)')
+
+        response = client.post('/api/users/add_funds/', {'amount': 10})
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
@@ -2,7 +2,7 @@
 URL configuration for payments app.
 """
 from django.urls import path
-from apps.payments import views
+from apps.payments import views, webhooks
 
 app_name = 'payments'
 
@@ -15,5 +15,5 @@ urlpatterns = [
     path('payments/methods/', views.list_payment_methods, name='list_payment_methods'),
     path('payments/methods/<str:payment_method_id>/', views.delete_payment_method, name='delete_payment_method'),
     path('payments/customer/', views.get_stripe_customer, name='get_stripe_customer'),
-    path('payments/webhook/', views.stripe_webhook, name='stripe_webhook'),
+    path('payments/webhook/', webhooks.stripe_webhook, name='stripe_webhook'),
 ]
@@ -5,7 +5,6 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
 import json
@@ -20,7 +19,8 @@ from apps.payments.serializers import (
     StripeCustomerSerializer
 )
 from apps.payments.models import PaymentIntent
-from apps.common.exceptions import PaymentError
+from apps.common.exceptions import PaymentError, ServiceUnavailableError
+from apps.common.resilience import unavailable_response
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +32,7 @@ def create_payment_intent(request):
     Create a payment intent for deposit.
     POST /api/payments/create-intent/
     """
-    from apps.users.responsible_gaming import ResponsibleGamingService
+    from apps.users.responsible_gaming import ResponsibleGamingGate
     
     serializer = CreatePaymentIntentSerializer(data=request.data)
     if not serializer.is_valid():
@@ -44,20 +44,12 @@ def create_payment_intent(request):
         payment_method_id = serializer.validated_data.get('payment_method_id')
         save_payment_method = serializer.validated_data.get('save_payment_method', False)
 
-        # Check self-exclusion
-        is_excluded, exclusion_reason = ResponsibleGamingService.check_self_exclusion(user)
-        if is_excluded:
+        # Self-exclusion and deposit limits in one pass
+        verdict = ResponsibleGamingGate.check_deposit(user, amount)
+        if not verdict:
             return Response(
-                {'error': exclusion_reason},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        # Check deposit limits
-        is_valid, error_message = ResponsibleGamingService.check_deposit_limit(user, float(amount))
-        if not is_valid:
-            return Response(
-                {'error': error_message},
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': verdict.error},
+                status=verdict.status_code
             )
 
         payment_intent = StripeService.create_payment_intent(
@@ -70,6 +62,9 @@ def create_payment_intent(request):
         response_serializer = PaymentIntentSerializer(payment_intent)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
+    except ServiceUnavailableError as e:
+        logger.warning(f"Payment provider unavailable: {e}")
+        return unavailable_response(e)
     except Exception as e:
         logger.error(f"Error creating payment intent: {e}")
         return Response(
@@ -111,6 +106,9 @@ def confirm_payment_intent(request):
             {'error': str(e)},
             status=status.HTTP_404_NOT_FOUND
         )
+    except ServiceUnavailableError as e:
+        logger.warning(f"Payment provider unavailable: {e}")
+        return unavailable_response(e)
     except Exception as e:
         logger.error(f"Error confirming payment intent: {e}")
         return Response(
@@ -172,6 +170,9 @@ def save_payment_method(request):
             status=status.HTTP_201_CREATED
         )
 
+    except ServiceUnavailableError as e:
+        logger.warning(f"Payment provider unavailable: {e}")
+        return unavailable_response(e)
     except Exception as e:
         logger.error(f"Error saving payment method: {e}")
         return Response(
@@ -208,6 +209,9 @@ def list_payment_methods(request):
             status=status.HTTP_200_OK
         )
 
+    except ServiceUnavailableError as e:
+        logger.warning(f"Payment provider unavailable: {e}")
+        return unavailable_response(e)
     except Exception as e:
         logger.error(f"Error listing payment methods: {e}")
         return Response(
@@ -230,6 +234,9 @@ def delete_payment_method(request, payment_method_id):
             status=status.HTTP_200_OK
         )
 
+    except ServiceUnavailableError as e:
+        logger.warning(f"Payment provider unavailable: {e}")
+        return unavailable_response(e)
     except Exception as e:
         logger.error(f"Error deleting payment method: {e}")
         return Response(
@@ -250,6 +257,9 @@ def get_stripe_customer(request):
         serializer = StripeCustomerSerializer(stripe_customer)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    except ServiceUnavailableError as e:
+        logger.warning(f"Payment provider unavailable: {e}")
+        return unavailable_response(e)
     except Exception as e:
         logger.error(f"Error getting Stripe customer: {e}")
         return Response(
@@ -273,53 +283,3 @@ def get_stripe_config(request):
         },
         status=status.HTTP_200_OK
     )
-
-
-@csrf_exempt
-@api_view(['POST'])
-def stripe_webhook(request):
-    """
-    Handle Stripe webhook events.
-    POST /api/payments/webhook/
-    """
-    import stripe
-    from django.conf import settings
-
-    payload = request.body
-    sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
-    webhook_secret = settings.STRIPE_WEBHOOK_SECRET
-
-    try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, webhook_secret
-        )
-    except ValueError as e:
-        logger.error(f"Invalid payload: {e}")
-        return Response({'error': 'Invalid payload'}, status=status.HTTP_400_BAD_REQUEST)
-    except stripe.error.SignatureVerificationError as e:
-        logger.error(f"Invalid signature: {e}")
-        return Response({'error': 'Invalid signature'}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Handle the event
-    if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        payment_intent_id = payment_intent['id']
-        logger.info(f"Payment succeeded: {payment_intent_id}")
-        try:
-            StripeService.handle_payment_success(payment_intent_id)
-        except Exception as e:
-            logger.error(f"Error handling payment success: {e}")
-
-    elif event['type'] == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        payment_intent_id = payment_intent['id']
-        logger.warning(f"Payment failed: {payment_intent_id}")
-        try:
-            StripeService.handle_payment_failure(payment_intent_id)
-        except Exception as e:
-            logger.error(f"Error handling payment failure: {e}")
-
-    else:
-        logger.info(f"Unhandled event type: {event['type']}")
-
-    return Response({'status': 'success'}, status=status.HTTP_200_OK)
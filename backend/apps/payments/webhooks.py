@@ -1,16 +1,53 @@
+"""
+Stripe webhook ingestion and processing.
+
+The webhook view only verifies the signature, inserts the raw event into
+`stripe_webhook_events` (ignoring conflicts, so redeliveries and
+concurrent retries are no-ops) and returns 200. Nothing else happens in
+the request.
+
+Recorded events are drained in batches by `process_stripe_events_task`,
+scheduled (debounced) on ingestion and periodically by beat as a safety
+net. A batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, grouped
+by payment intent so each intent is resolved once, and applied with the
+bulk StripeService methods. If a batch fails, its events are retried one
+by one so a single bad event can't block the rest. Failed events are
+retried with a delay up to MAX_ATTEMPTS; `replay_stripe_events` re-queues
+them (or fetches events from Stripe) after that.
+"""
 import stripe
 import json
 import logging
+from datetime import timedelta
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import JsonResponse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
+from apps.common.cache import CacheKeys
 from apps.payments.services import StripeService
-from apps.payments.models import PaymentIntent
-from apps.notifications.tasks import send_deposit_confirmation_email
+from apps.payments.models import StripeWebhookEvent
 
 logger = logging.getLogger(__name__)
 
+DRAIN_BATCH_SIZE = 500
+DRAIN_DEBOUNCE_SECONDS = 1
+MAX_ATTEMPTS = 5
+FAILED_RETRY_DELAY = timedelta(minutes=1)
+# A PROCESSING claim older than this is assumed to belong to a dead worker
+PROCESSING_LEASE = timedelta(minutes=5)
+
+PAYMENT_SUCCEEDED = 'payment_intent.succeeded'
+# Failure events and the status given to the payment intent; Stripe leaves
+# a failed intent retryable, only a cancellation is final
+PAYMENT_FAILURES = {
+    'payment_intent.payment_failed': 'requires_payment_method',
+    'payment_intent.canceled': 'canceled',
+}
+
 
 @csrf_exempt
 @require_POST
@@ -27,7 +64,7 @@ def stripe_webhook(request):
         return JsonResponse({'error': 'Webhook secret not configured'}, status=500)
 
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, webhook_secret
         )
     except ValueError as e:
@@ -37,48 +74,255 @@ def stripe_webhook(request):
         logger.error(f"Invalid signature: {e}")
         return JsonResponse({'error': 'Invalid signature'}, status=400)
 
-    # Handle the event
-    event_type = event['type']
-    event_data = event['data']['object']
+    ingest_event(json.loads(payload))
+    return JsonResponse({'status': 'received'})
+
+
+def ingest_event(event):
+    """Record a verified event and schedule processing."""
+    ingest_events([event])
+
+
+def ingest_events(events):
+    """
+    Record verified events, skipping any already recorded, and schedule
+    processing.
+
+    Args:
+        events: Event dicts as sent by Stripe
+    """
+    StripeWebhookEvent.objects.bulk_create(
+        [
+            StripeWebhookEvent(event_id=event['id'], type=event['type'], payload=event)
+            for event in events
+        ],
+        ignore_conflicts=True
+    )
+    transaction.on_commit(request_drain)
+
 
-    logger.info(f"Received Stripe webhook: {event_type}")
+def request_drain():
+    """Schedule a debounced drain of pending events."""
+    from apps.payments.tasks import process_stripe_events_task
+
+    if not cache.add(CacheKeys.stripe_events_drain_pending(), True, DRAIN_DEBOUNCE_SECONDS):
+        return False
 
     try:
-        if event_type == 'payment_intent.succeeded':
-            handle_payment_intent_succeeded(event_data)
-        elif event_type == 'payment_intent.payment_failed':
-            handle_payment_intent_failed(event_data)
-        elif event_type == 'payment_intent.canceled':
-            handle_payment_intent_canceled(event_data)
-        elif event_type == 'payment_method.attached':
-            logger.info(f"Payment method attached: {event_data.get('id')}")
-        else:
-            logger.info(f"Unhandled event type: {event_type}")
+        process_stripe_events_task.apply_async(countdown=DRAIN_DEBOUNCE_SECONDS)
+    except Exception as e:
+        # The periodic drain picks the events up
+        logger.warning(f"Could not schedule Stripe event processing: {str(e)}")
+        cache.delete(CacheKeys.stripe_events_drain_pending())
+        return False
+    return True
+
+
+def _claimable(now):
+    # Failed events are retried after a delay, up to MAX_ATTEMPTS
+    return (
+        Q(status='RECEIVED') |
+        Q(status='FAILED', attempts__lt=MAX_ATTEMPTS, locked_at__lt=now - FAILED_RETRY_DELAY) |
+        Q(status='PROCESSING', locked_at__lt=now - PROCESSING_LEASE)
+    )
+
+
+def claim_event(event_id):
+    """
+    Atomically mark an event as being processed.
+
+    Returns:
+        bool: True if this worker owns the event now
+    """
+    now = timezone.now()
+    return bool(
+        StripeWebhookEvent.objects.filter(
+            Q(status__in=['RECEIVED', 'FAILED']) |
+            Q(status='PROCESSING', locked_at__lt=now - PROCESSING_LEASE),
+            event_id=event_id
+        ).update(status='PROCESSING', locked_at=now, attempts=F('attempts') + 1)
+    )
+
+
+def claim_batch(batch_size=DRAIN_BATCH_SIZE):
+    """
+    Claim up to `batch_size` pending events, oldest first.
+
+    Rows locked by a concurrent worker are skipped.
+
+    Returns:
+        list: (event_id, type, payload) tuples
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        event_ids = list(
+            StripeWebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(_claimable(now))
+            .order_by('received_at')
+            .values_list('event_id', flat=True)[:batch_size]
+        )
+        if not event_ids:
+            return []
+        StripeWebhookEvent.objects.filter(event_id__in=event_ids).update(
+            status='PROCESSING', locked_at=now, attempts=F('attempts') + 1
+        )
+    return list(
+        StripeWebhookEvent.objects.filter(event_id__in=event_ids)
+        .order_by('received_at')
+        .values_list('event_id', 'type', 'payload')
+    )
+
+
+def _mark_processed(event_ids):
+    StripeWebhookEvent.objects.filter(event_id__in=list(event_ids)).update(
+        status='PROCESSED', last_error='', locked_at=None, processed_at=timezone.now()
+    )
+
+
+def _mark_failed(event_ids, error):
+    # locked_at stays set so retries wait FAILED_RETRY_DELAY
+    StripeWebhookEvent.objects.filter(event_id__in=list(event_ids)).update(
+        status='FAILED', last_error=str(error)[:2000]
+    )
+
+
+def _event_object(payload):
+    return payload['data']['object']
 
-        return JsonResponse({'status': 'success'})
 
+def process_event(event_id):
+    """
+    Process one recorded event unless another worker has it or it's done.
+
+    Args:
+        event_id: Stripe event ID
+
+    Returns:
+        bool: True if the event was processed by this call
+    """
+    if not claim_event(event_id):
+        logger.info(f"Stripe event {event_id} already processed or in progress")
+        return False
+
+    webhook_event = StripeWebhookEvent.objects.only('type', 'payload').get(event_id=event_id)
+    _process_claimed(event_id, webhook_event.type, webhook_event.payload)
+    return True
+
+
+def _process_claimed(event_id, event_type, payload):
+    try:
+        dispatch_event(event_type, _event_object(payload))
     except Exception as e:
-        logger.error(f"Error processing webhook {event_type}: {e}")
-        return JsonResponse({'error': str(e)}, status=500)
+        _mark_failed([event_id], e)
+        logger.error(f"Error processing webhook {event_type} ({event_id}): {e}")
+        raise
+    _mark_processed([event_id])
+
+
+def apply_batch(events):
+    """
+    Apply a batch of claimed events, resolving each payment intent once.
+
+    A success wins over failures for the same intent; otherwise the
+    latest failure or cancellation is applied.
+
+    Returns:
+        list: IDs of events whose payment intent doesn't exist
+    """
+    succeeded = {}
+    failed = {}
+    for event_id, event_type, payload in events:
+        if event_type == PAYMENT_SUCCEEDED:
+            succeeded.setdefault(_event_object(payload)['id'], []).append(event_id)
+        elif event_type in PAYMENT_FAILURES:
+            intent_id = _event_object(payload)['id']
+            latest = failed.get(intent_id)
+            if latest is None or payload.get('created', 0) >= latest[0]:
+                failed[intent_id] = (payload.get('created', 0), event_type)
+        else:
+            dispatch_event(event_type, _event_object(payload))
+
+    with transaction.atomic():
+        found = StripeService.handle_payment_successes(succeeded) if succeeded else set()
+        by_status = {}
+        for intent_id, (_, event_type) in failed.items():
+            if intent_id not in succeeded:
+                by_status.setdefault(PAYMENT_FAILURES[event_type], []).append(intent_id)
+        for intent_status, intent_ids in by_status.items():
+            StripeService.handle_payment_failures(intent_ids, intent_status)
+
+    return [
+        event_id
+        for intent_id, event_ids in succeeded.items() if intent_id not in found
+        for event_id in event_ids
+    ]
+
+
+def process_pending_events(batch_size=DRAIN_BATCH_SIZE, max_batches=None):
+    """
+    Drain pending events in batches.
+
+    Args:
+        batch_size: Events claimed per batch
+        max_batches: Stop after this many batches (None drains everything)
+
+    Returns:
+        int: Number of events processed
+    """
+    processed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        events = claim_batch(batch_size)
+        if not events:
+            break
+        batches += 1
+
+        try:
+            missing = set(apply_batch(events))
+        except Exception as e:
+            logger.error(f"Error applying Stripe event batch, retrying events one by one: {e}")
+            for event_id, event_type, payload in events:
+                try:
+                    _process_claimed(event_id, event_type, payload)
+                    processed += 1
+                except Exception:
+                    pass
+            continue
+
+        if missing:
+            _mark_failed(missing, 'Payment intent not found')
+            logger.error(f"Payment intents not found for Stripe events: {', '.join(sorted(missing))}")
+        done = [event_id for event_id, _, _ in events if event_id not in missing]
+        _mark_processed(done)
+        processed += len(done)
+
+    return processed
+
+
+def dispatch_event(event_type, event_data):
+    """Run the handler for an event type."""
+    if event_type == 'payment_intent.succeeded':
+        handle_payment_intent_succeeded(event_data)
+    elif event_type == 'payment_intent.payment_failed':
+        handle_payment_intent_failed(event_data)
+    elif event_type == 'payment_intent.canceled':
+        handle_payment_intent_canceled(event_data)
+    elif event_type in ('payment_method.attached', 'payment_method.detached', 'payment_method.updated'):
+        logger.info(f"Payment method {event_type.split('.')[1]}: {event_data.get('id')}")
+        StripeService.invalidate_payment_methods(event_data.get('customer'))
+    else:
+        logger.info(f"Unhandled event type: {event_type}")
 
 
 def handle_payment_intent_succeeded(event_data):
     """Handle successful payment intent"""
     payment_intent_id = event_data['id']
-    amount = event_data['amount'] / 100  # Convert from cents
 
     logger.info(f"Processing successful payment: {payment_intent_id}")
 
     try:
-        payment_intent = StripeService.handle_payment_success(payment_intent_id)
-
-        # Send confirmation email
-        if payment_intent.user:
-            send_deposit_confirmation_task.delay(
-                str(payment_intent.user.id),
-                str(payment_intent.transaction.id) if payment_intent.transaction else None
-            )
-
+        # Credits the wallet once and sends the confirmation email
+        StripeService.handle_payment_success(payment_intent_id)
         logger.info(f"Successfully processed payment: {payment_intent_id}")
 
     except Exception as e:
@@ -89,7 +333,7 @@ def handle_payment_intent_succeeded(event_data):
 def handle_payment_intent_failed(event_data):
     """Handle failed payment intent"""
     payment_intent_id = event_data['id']
-    error_message = event_data.get('last_payment_error', {}).get('message', 'Payment failed')
+    error_message = (event_data.get('last_payment_error') or {}).get('message', 'Payment failed')
 
     logger.warning(f"Processing failed payment: {payment_intent_id} - {error_message}")
 
@@ -108,20 +352,10 @@ def handle_payment_intent_canceled(event_data):
     logger.info(f"Processing canceled payment: {payment_intent_id}")
 
     try:
-        payment_intent = PaymentIntent.objects.get(
-            stripe_payment_intent_id=payment_intent_id
-        )
-        payment_intent.status = 'canceled'
-        payment_intent.save()
-
-        if payment_intent.transaction:
-            payment_intent.transaction.status = 'CANCELLED'
-            payment_intent.transaction.save()
-
+        StripeService.handle_payment_failure(payment_intent_id, status='canceled')
         logger.info(f"Successfully processed payment cancellation: {payment_intent_id}")
-    except PaymentIntent.DoesNotExist:
+    except ValueError:
         logger.error(f"Payment intent not found: {payment_intent_id}")
     except Exception as e:
         logger.error(f"Error handling payment cancellation: {e}")
         raise
-
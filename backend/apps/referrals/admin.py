@@ -175,8 +175,8 @@ class ReferralAdmin(admin.ModelAdmin):
             )
             
             # Credit bonuses to users
-            referral.referrer.add_balance(program.referral_bonus_amount)
-            referral.referred_user.add_balance(program.referred_user_bonus)
+            referral.referrer.add_balance(program.referral_bonus_amount, 'REFERRAL_BONUS')
+            referral.referred_user.add_balance(program.referred_user_bonus, 'REFERRAL_BONUS')
             
             # Update referral link
             referral.referrer.referral_link.total_referred += 1
@@ -1,32 +1,62 @@
 """
 Analytics service for referrals.
 """
+from django.core.cache import cache
 from django.db.models import Count, Sum, Q
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
+from apps.common.cache import CacheKeys
 from apps.referrals.models import (
     ReferralProgram, ReferralLink, Referral,
     ReferralBonus, ReferralWithdrawal
 )
 
+PENDING_WITHDRAWAL_STATUSES = ('PENDING', 'APPROVED', 'PROCESSING')
+LEADERBOARD_CACHE_TIMEOUT = 300  # 5 minutes
+
+
+def _group_by_status(queryset, amount_field=None):
+    """
+    Count (and optionally sum) rows per status in a single query.
+
+    Args:
+        queryset: Queryset with a `status` field
+        amount_field: Field to sum per status, if any
+
+    Returns:
+        Dictionary mapping status to {'count': int, 'total': Decimal}
+    """
+    annotations = {'count': Count('id')}
+    if amount_field:
+        annotations['total'] = Sum(amount_field)
+
+    rows = queryset.order_by().values('status').annotate(**annotations)
+    return {
+        row['status']: {'count': row['count'], 'total': row.get('total') or 0}
+        for row in rows
+    }
+
 
 class ReferralAnalytics:
     """Analytics service for referral system."""
     
     @staticmethod
-    def get_user_stats(user):
+    def get_user_stats(user, link=None, decimals=False):
         """
         Get referral statistics for a user.
         
         Args:
             user: User instance
+            link: The user's ReferralLink, if already loaded
+            decimals: Return amounts as Decimals instead of floats
         
         Returns:
             Dictionary with statistics
         """
-        try:
-            link = user.referral_link
-        except ReferralLink.DoesNotExist:
+        if link is None:
+            link = ReferralLink.objects.filter(user=user).first()
+        if link is None:
             return {
                 'total_referred': 0,
                 'total_bonus_earned': 0,
@@ -37,56 +67,51 @@ class ReferralAnalytics:
                 'total_withdrawn': 0,
             }
         
-        referrals = Referral.objects.filter(referrer=user)
-        pending = referrals.filter(status='PENDING').count()
-        qualified = referrals.filter(status='QUALIFIED').count()
-        bonus_awarded = referrals.filter(status='BONUS_AWARDED').count()
+        referrals = _group_by_status(Referral.objects.filter(referrer=user))
+        bonuses = _group_by_status(ReferralBonus.objects.filter(user=user), 'amount')
+        withdrawals = _group_by_status(ReferralWithdrawal.objects.filter(user=user), 'amount')
         
-        bonuses = ReferralBonus.objects.filter(
-            user=user,
-            status='CREDITED'
+        pending_withdrawals = sum(
+            withdrawals[s]['total'] for s in PENDING_WITHDRAWAL_STATUSES if s in withdrawals
         )
-        available_balance = bonuses.aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        
-        pending_withdrawals = ReferralWithdrawal.objects.filter(
-            user=user,
-            status__in=['PENDING', 'APPROVED', 'PROCESSING']
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        total_withdrawn = ReferralWithdrawal.objects.filter(
-            user=user,
-            status='COMPLETED'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        amount = Decimal if decimals else float
         
         return {
             'total_referred': link.total_referred,
-            'total_bonus_earned': float(link.total_bonus_earned),
-            'pending_referrals': pending,
-            'qualified_referrals': qualified,
-            'bonus_awarded_referrals': bonus_awarded,
-            'available_balance': float(available_balance),
-            'pending_withdrawals': float(pending_withdrawals),
-            'total_withdrawn': float(total_withdrawn),
+            'total_bonus_earned': amount(link.total_bonus_earned),
+            'pending_referrals': referrals.get('PENDING', {}).get('count', 0),
+            'qualified_referrals': referrals.get('QUALIFIED', {}).get('count', 0),
+            'bonus_awarded_referrals': referrals.get('BONUS_AWARDED', {}).get('count', 0),
+            'available_balance': amount(bonuses.get('CREDITED', {}).get('total', 0)),
+            'pending_withdrawals': amount(pending_withdrawals),
+            'total_withdrawn': amount(withdrawals.get('COMPLETED', {}).get('total', 0)),
             'referral_code': link.referral_code,
             'referral_url': f'/register?ref={link.referral_code}',
         }
     
     @staticmethod
-    def get_top_referrers(limit=10):
+    def get_top_referrers(limit=10, use_cache=True):
         """
         Get top referrers by total bonus earned.
         
         Args:
             limit: Number of top referrers to return
+            use_cache: Serve the cached leaderboard snapshot if present
         
         Returns:
             List of dictionaries with referrer stats
         """
-        links = ReferralLink.objects.order_by('-total_bonus_earned')[:limit]
+        cache_key = CacheKeys.referral_leaderboard(limit)
+        if use_cache:
+            cached_result = cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
         
-        return [
+        links = ReferralLink.objects.select_related('user').only(
+            'user__username', 'total_referred', 'total_bonus_earned', 'referral_code'
+        ).order_by('-total_bonus_earned')[:limit]
+        
+        leaderboard = [
             {
                 'user': link.user.username,
                 'total_referred': link.total_referred,
@@ -95,6 +120,9 @@ class ReferralAnalytics:
             }
             for link in links
         ]
+        
+        cache.set(cache_key, leaderboard, LEADERBOARD_CACHE_TIMEOUT)
+        return leaderboard
     
     @staticmethod
     def get_conversion_rate(days=30):
@@ -109,19 +137,15 @@ class ReferralAnalytics:
         """
         start_date = timezone.now() - timedelta(days=days)
         
-        total_referrals = Referral.objects.filter(
-            created_at__gte=start_date
-        ).count()
-        
-        successful_referrals = Referral.objects.filter(
-            created_at__gte=start_date,
-            status='BONUS_AWARDED'
-        ).count()
+        totals = Referral.objects.filter(created_at__gte=start_date).aggregate(
+            total=Count('id'),
+            successful=Count('id', filter=Q(status='BONUS_AWARDED'))
+        )
         
-        if total_referrals == 0:
+        if totals['total'] == 0:
             return 0.0
         
-        return (successful_referrals / total_referrals) * 100
+        return (totals['successful'] / totals['total']) * 100
     
     @staticmethod
     def get_program_stats():
@@ -133,19 +157,20 @@ class ReferralAnalytics:
         """
         program = ReferralProgram.get_program()
         
-        total_referrals = Referral.objects.count()
-        successful_referrals = Referral.objects.filter(
-            status='BONUS_AWARDED'
-        ).count()
-        
+        referrals = Referral.objects.aggregate(
+            total=Count('id'),
+            successful=Count('id', filter=Q(status='BONUS_AWARDED'))
+        )
         total_bonuses_awarded = ReferralBonus.objects.filter(
             status='CREDITED'
         ).aggregate(total=Sum('amount'))['total'] or 0
-        
         total_withdrawals = ReferralWithdrawal.objects.filter(
             status='COMPLETED'
         ).aggregate(total=Sum('amount'))['total'] or 0
         
+        total_referrals = referrals['total']
+        successful_referrals = referrals['successful']
+        
         return {
             'program_status': program.status,
             'total_referrals': total_referrals,
@@ -156,4 +181,8 @@ class ReferralAnalytics:
             'referral_bonus_amount': float(program.referral_bonus_amount),
             'referred_user_bonus': float(program.referred_user_bonus),
         }
-
+    
+    @staticmethod
+    def refresh_leaderboard(limit=10):
+        """Rebuild the cached leaderboard snapshot."""
+        return ReferralAnalytics.get_top_referrers(limit=limit, use_cache=False)
@@ -0,0 +1,85 @@
+"""
+Completed-deposit events for referral qualification.
+
+The deposit path doesn't touch referrals. When a deposit commits,
+`publish_deposits` adds the depositing user to a Redis set and schedules
+`process_referral_deposits_task` with a short debounce. Using a set
+deduplicates the events: a user who deposits several times between two
+runs is qualified once.
+
+The consumer pops users in batches and passes them to
+`ReferralService.qualify_referred_users`. That recomputes deposit totals
+from completed transactions and awards qualifying referrals with the bulk
+award path, so replayed events are harmless. A batch that fails is put
+back in the set.
+
+Without Redis the user IDs go to the task directly. The six-hourly
+`process_pending_referrals` run still covers any lost events.
+"""
+import logging
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.common.cache import CacheKeys, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+PROCESS_DEBOUNCE_SECONDS = 5
+CONSUME_BATCH_SIZE = 1000
+
+
+def publish_deposits(user_ids):
+    """
+    Publish completed deposits once the surrounding transaction commits.
+
+    Args:
+        user_ids: IDs of the users who deposited
+    """
+    user_ids = sorted({str(user_id) for user_id in user_ids})
+    if user_ids:
+        transaction.on_commit(lambda: _publish(user_ids))
+
+
+def _publish(user_ids):
+    from apps.referrals.tasks import process_referral_deposits_task
+
+    client = get_redis_client()
+    try:
+        if client is None:
+            process_referral_deposits_task.delay(user_ids)
+            return
+        client.sadd(CacheKeys.referral_deposit_events(), *user_ids)
+        if cache.add(CacheKeys.referral_deposits_pending(), True, PROCESS_DEBOUNCE_SECONDS):
+            process_referral_deposits_task.apply_async(countdown=PROCESS_DEBOUNCE_SECONDS)
+    except Exception as e:
+        logger.warning(f"Failed to publish deposit events for referrals: {str(e)}")
+
+
+def consume(batch_size=CONSUME_BATCH_SIZE):
+    """
+    Qualify referrals for all published deposits.
+
+    Returns:
+        int: Number of referrals awarded
+    """
+    from apps.referrals.services import ReferralService
+
+    client = get_redis_client()
+    if client is None:
+        return 0
+
+    key = CacheKeys.referral_deposit_events()
+    awarded = 0
+    while True:
+        user_ids = [
+            user_id.decode() if isinstance(user_id, bytes) else user_id
+            for user_id in client.spop(key, batch_size) or []
+        ]
+        if not user_ids:
+            break
+        try:
+            awarded += ReferralService.qualify_referred_users(user_ids)
+        except Exception:
+            client.sadd(key, *user_ids)
+            raise
+    return awarded
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("referrals", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="referrallink",
+            name="referral_code",
+            field=models.CharField(
+                db_index=True,
+                help_text="Unique code for referral link",
+                max_length=24,
+                unique=True,
+            ),
+        ),
+    ]
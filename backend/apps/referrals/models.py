@@ -2,6 +2,12 @@ from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+import string
+import uuid
+
+REFERRAL_CODE_ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+# 62 ** 22 > 2 ** 128, so every UUID fits
+REFERRAL_CODE_UUID_LENGTH = 22
 
 
 class ReferralProgram(models.Model):
@@ -103,7 +109,7 @@ class ReferralLink(models.Model):
     
     # Unique code for referral URL
     referral_code = models.CharField(
-        max_length=20,
+        max_length=24,
         unique=True,
         db_index=True,
         help_text='Unique code for referral link'
@@ -142,6 +148,21 @@ class ReferralLink(models.Model):
     def __str__(self):
         return f'{self.user.username} - {self.referral_code}'
 
+    @staticmethod
+    def build_code(user_id):
+        """
+        Derive a referral code from a user's UUID.
+
+        The UUID is base62-encoded to a fixed 22 characters, so codes are
+        unique by construction and no lookup or retry is needed.
+        """
+        value = uuid.UUID(str(user_id)).int
+        chars = []
+        for _ in range(REFERRAL_CODE_UUID_LENGTH):
+            value, index = divmod(value, 62)
+            chars.append(REFERRAL_CODE_ALPHABET[index])
+        return ''.join(reversed(chars))
+
 
 class Referral(models.Model):
     """
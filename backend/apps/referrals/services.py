@@ -2,19 +2,31 @@
 Services for referral operations.
 """
 import logging
+from collections import Counter, defaultdict
+from decimal import Decimal
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import F, Sum
 from apps.referrals.models import (
     ReferralProgram, ReferralLink, Referral,
     ReferralBonus, ReferralWithdrawal
 )
+from apps.transactions.ledger import LedgerService
 from apps.transactions.models import Transaction
-from apps.users.models import UserProfile
-from apps.notifications.tasks import send_referral_bonus_credited_task
+from apps.users.models import User, UserProfile
+from apps.notifications.tasks import (
+    send_referral_bonus_credited_task,
+    send_referral_bonus_credited_batch_task,
+    create_notifications_batch_task
+)
 from apps.common.exceptions import ReferralError
 
 logger = logging.getLogger(__name__)
 
+BULK_CHUNK_SIZE = 1000
+NOTIFICATION_BATCH_SIZE = 500
+EXPIRY_BATCH_SIZE = 1000
+
 
 class ReferralService:
     """Service for referral operations."""
@@ -141,8 +153,8 @@ class ReferralService:
         )
         
         # Credit bonuses to wallets
-        referral.referrer.add_balance(program.referral_bonus_amount)
-        referral.referred_user.add_balance(program.referred_user_bonus)
+        referral.referrer.add_balance(program.referral_bonus_amount, 'REFERRAL_BONUS')
+        referral.referred_user.add_balance(program.referred_user_bonus, 'REFERRAL_BONUS')
         
         # Create transaction records
         Transaction.objects.create(
@@ -193,29 +205,295 @@ class ReferralService:
         logger.info(f"Bonuses awarded for referral {referral.id}")
     
     @staticmethod
-    def update_referral_deposit(referred_user, deposit_amount):
+    def qualify_referred_users(user_ids):
         """
-        Update referral deposit tracking when referred user makes a deposit.
+        Qualify the pending referrals of users who just deposited.
+        
+        Consumer side of the completed-deposit events (see
+        `apps.referrals.deposit_events`). Deposit totals are recomputed
+        from completed transactions, so duplicate or replayed events are
+        harmless.
         
         Args:
-            referred_user: User who made the deposit
-            deposit_amount: Amount deposited
+            user_ids: IDs of users with new completed deposits
+        
+        Returns:
+            Number of referrals awarded
         """
-        try:
-            referral = Referral.objects.get(
-                referred_user=referred_user,
-                status='PENDING'
+        program = ReferralProgram.get_program()
+        if program.status != 'ACTIVE':
+            return 0
+        
+        user_ids = list(user_ids)
+        awarded = 0
+        for start in range(0, len(user_ids), BULK_CHUNK_SIZE):
+            chunk = list(
+                Referral.objects.filter(
+                    referred_user_id__in=user_ids[start:start + BULK_CHUNK_SIZE],
+                    status='PENDING'
+                ).values_list('id', 'referred_user_id', 'referred_user_deposit')
+            )
+            if chunk:
+                awarded += ReferralService._qualify_chunk(program, chunk)
+        return awarded
+    
+    @staticmethod
+    def process_pending_referrals_in_bulk(chunk_size=BULK_CHUNK_SIZE):
+        """
+        Qualify pending referrals and award their bonuses in set-based batches.
+        
+        Pending referrals are walked in primary key order. Each chunk's
+        deposit totals come from one grouped query, and qualifying
+        referrals are awarded with bulk writes.
+        
+        Args:
+            chunk_size: Number of pending referrals examined per batch
+        
+        Returns:
+            Number of referrals awarded
+        """
+        program = ReferralProgram.get_program()
+        awarded = 0
+        last_id = 0
+        
+        while True:
+            chunk = list(
+                Referral.objects.filter(status='PENDING', id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'referred_user_id', 'referred_user_deposit')[:chunk_size]
             )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            awarded += ReferralService._qualify_chunk(program, chunk)
+        
+        logger.info(f"Awarded bonuses for {awarded} referrals in bulk")
+        return awarded
+    
+    @staticmethod
+    def _qualify_chunk(program, chunk):
+        """
+        Refresh deposit totals for pending referrals and award those that qualify.
+        
+        Args:
+            program: ReferralProgram instance
+            chunk: List of (referral id, referred user id, recorded deposit)
+        
+        Returns:
+            Number of referrals awarded
+        """
+        deposit_totals = dict(
+            Transaction.objects.filter(
+                user_id__in=[user_id for _, user_id, _ in chunk],
+                type='DEPOSIT',
+                status='COMPLETED'
+            ).order_by().values('user_id').annotate(
+                total=Sum('amount')
+            ).values_list('user_id', 'total')
+        )
+        
+        qualifying = {}
+        # Referrals still short of the minimum: one UPDATE per distinct new total
+        referrals_by_total = defaultdict(list)
+        for referral_id, user_id, recorded in chunk:
+            total = deposit_totals.get(user_id) or Decimal('0.00')
+            if total >= program.minimum_referral_deposit:
+                qualifying[referral_id] = total
+            elif total != recorded:
+                referrals_by_total[total].append(referral_id)
+        
+        for total, referral_ids in referrals_by_total.items():
+            Referral.objects.filter(id__in=referral_ids, status='PENDING').update(
+                referred_user_deposit=total,
+                updated_at=timezone.now()
+            )
+        
+        if not qualifying:
+            return 0
+        return ReferralService._award_referral_chunk(program, qualifying)
+    
+    @staticmethod
+    @transaction.atomic
+    def _award_referral_chunk(program, deposits_by_referral):
+        """
+        Award bonuses for a chunk of qualifying referrals.
+        
+        Args:
+            program: ReferralProgram instance
+            deposits_by_referral: Dict of referral id -> referred user's deposit total
+        
+        Returns:
+            Number of referrals awarded
+        """
+        now = timezone.now()
+        referrer_bonus = program.referral_bonus_amount
+        referred_bonus = program.referred_user_bonus
+        
+        # Lock the rows and skip any that were awarded concurrently
+        referrals = list(
+            Referral.objects.select_for_update(of=('self',))
+            .select_related('referrer', 'referred_user')
+            .filter(id__in=list(deposits_by_referral), status='PENDING')
+        )
+        if not referrals:
+            return 0
+        
+        bonuses = []
+        transactions = []
+        credits = defaultdict(Decimal)
+        referrals_per_referrer = Counter()
+        notifications = []
+        
+        for referral in referrals:
+            referral.status = 'BONUS_AWARDED'
+            referral.referred_user_deposit = deposits_by_referral[referral.id]
+            referral.deposit_date = now
+            referral.bonus_awarded_at = now
+            referral.updated_at = now
             
-            referral.referred_user_deposit += deposit_amount
-            referral.save()
+            bonuses.append(ReferralBonus(
+                user_id=referral.referrer_id,
+                referral=referral,
+                bonus_type='REFERRER',
+                amount=referrer_bonus,
+                status='CREDITED',
+                credited_at=now
+            ))
+            bonuses.append(ReferralBonus(
+                user_id=referral.referred_user_id,
+                referral=referral,
+                bonus_type='REFERRED',
+                amount=referred_bonus,
+                status='CREDITED',
+                credited_at=now
+            ))
+            transactions.append(Transaction(
+                user_id=referral.referrer_id,
+                type='REFERRAL_BONUS',
+                amount=referrer_bonus,
+                status='COMPLETED',
+                description=f'Referral bonus for referring {referral.referred_user.username}',
+                completed_at=now
+            ))
+            transactions.append(Transaction(
+                user_id=referral.referred_user_id,
+                type='REFERRAL_BONUS',
+                amount=referred_bonus,
+                status='COMPLETED',
+                description=f'Welcome bonus for being referred by {referral.referrer.username}',
+                completed_at=now
+            ))
             
-            # Check if referral should be approved
-            ReferralService.check_and_approve_referral(referral)
+            credits[referral.referrer_id] += referrer_bonus
+            credits[referral.referred_user_id] += referred_bonus
+            referrals_per_referrer[referral.referrer_id] += 1
+            notifications.append([str(referral.referrer_id), float(referrer_bonus), referral.id])
+            notifications.append([str(referral.referred_user_id), float(referred_bonus), referral.id])
+        
+        Referral.objects.bulk_update(
+            referrals,
+            ['status', 'referred_user_deposit', 'deposit_date', 'bonus_awarded_at', 'updated_at'],
+            batch_size=BULK_CHUNK_SIZE
+        )
+        ReferralBonus.objects.bulk_create(bonuses, batch_size=BULK_CHUNK_SIZE)
+        Transaction.objects.bulk_create(transactions, batch_size=BULK_CHUNK_SIZE)
+        
+        LedgerService.post_many(
+            (t.user_id, t.amount, 'REFERRAL_BONUS', t.id) for t in transactions
+        )
+        
+        # Wallet credits: one UPDATE per distinct credit amount
+        users_by_credit = defaultdict(list)
+        for user_id, amount in credits.items():
+            users_by_credit[amount].append(user_id)
+        for amount, user_ids in users_by_credit.items():
+            User.objects.filter(id__in=user_ids).update(
+                wallet_balance=F('wallet_balance') + amount,
+                updated_at=now
+            )
+        
+        # Referrer stats: one UPDATE per distinct referral count
+        referrers_by_count = defaultdict(list)
+        for referrer_id, count in referrals_per_referrer.items():
+            referrers_by_count[count].append(referrer_id)
+        for count, referrer_ids in referrers_by_count.items():
+            ReferralLink.objects.filter(user_id__in=referrer_ids).update(
+                total_referred=F('total_referred') + count,
+                total_bonus_earned=F('total_bonus_earned') + referrer_bonus * count,
+                updated_at=now
+            )
+            UserProfile.objects.filter(user_id__in=referrer_ids).update(
+                total_referrals=F('total_referrals') + count,
+                total_referral_earnings=F('total_referral_earnings') + referrer_bonus * count,
+                updated_at=now
+            )
+        
+        def send_notifications():
+            for start in range(0, len(notifications), NOTIFICATION_BATCH_SIZE):
+                send_referral_bonus_credited_batch_task.delay(
+                    notifications[start:start + NOTIFICATION_BATCH_SIZE]
+                )
+        
+        transaction.on_commit(send_notifications)
+        
+        return len(referrals)
+    
+    @staticmethod
+    def expire_pending_bonuses(batch_size=EXPIRY_BATCH_SIZE, now=None):
+        """
+        Expire pending bonuses whose referral has expired, in bounded batches.
+        
+        Each batch locks and updates at most `batch_size` rows in its own
+        short transaction, so the daily run never holds long locks on the
+        bonus table.
+        
+        Args:
+            batch_size: Maximum rows updated per transaction
+            now: Cut-off time (defaults to now)
+        
+        Returns:
+            Number of bonuses expired
+        """
+        if now is None:
+            now = timezone.now()
+        
+        expirable = ReferralBonus.objects.filter(
+            status='PENDING',
+            referral__expires_at__lt=now,
+            referral__status='PENDING'
+        )
+        expired_count = 0
+        
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    expirable.select_for_update(skip_locked=True, of=('self',))
+                    .order_by('id')
+                    .values_list('id', 'user_id', 'amount')[:batch_size]
+                )
+                if not batch:
+                    break
+                
+                ReferralBonus.objects.filter(
+                    id__in=[bonus_id for bonus_id, _, _ in batch]
+                ).update(status='EXPIRED', updated_at=timezone.now())
+                
+                notifications = [
+                    {
+                        'user_id': str(user_id),
+                        'type': 'REFERRAL_BONUS',
+                        'title': 'Referral bonus expired',
+                        'message': f'Your pending referral bonus of {amount} has expired.',
+                        'metadata': {'bonus_id': bonus_id},
+                    }
+                    for bonus_id, user_id, amount in batch
+                ]
+                transaction.on_commit(
+                    lambda notifications=notifications: create_notifications_batch_task.delay(notifications)
+                )
             
-        except Referral.DoesNotExist:
-            # No pending referral for this user
-            pass
-        except Exception as e:
-            logger.error(f"Error updating referral deposit: {str(e)}")
-
+            expired_count += len(batch)
+            if len(batch) < batch_size:
+                break
+        
+        return expired_count
@@ -145,3 +145,327 @@ class ReferralViewSetTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('total_referred', response.data)
 
+    def test_get_referral_stats_amounts_are_decimals(self):
+        """Test stats amounts are served as Decimals, not floats"""
+        response = self.client.get('/api/referrals/referrals/stats/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for field in ('total_bonus_earned', 'available_balance',
+                      'pending_withdrawals', 'total_withdrawn'):
+            self.assertIsInstance(response.data[field], Decimal)
+
+
+
+class ReferralAnalyticsTestCase(TestCase):
+    """Test ReferralAnalytics"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.common.cache import CacheKeys
+
+        cache.delete(CacheKeys.referral_leaderboard(10))
+        self.referrer = User.objects.create_user(
+            username='analyticsreferrer',
+            email='analyticsreferrer@example.com',
+            password='Password123'
+        )
+        self.link, _ = ReferralLink.objects.get_or_create(
+            user=self.referrer,
+            defaults={'referral_code': 'ANALYTICS123'}
+        )
+        for index, referral_status in enumerate(['PENDING', 'PENDING', 'QUALIFIED']):
+            referred = User.objects.create_user(
+                username=f'analyticsreferred{index}',
+                email=f'analyticsreferred{index}@example.com',
+                password='Password123'
+            )
+            Referral.objects.create(
+                referrer=self.referrer,
+                referred_user=referred,
+                status=referral_status
+            )
+
+    def test_get_user_stats_grouped_queries(self):
+        """Test user stats are computed with one grouped query per table"""
+        from apps.referrals.analytics import ReferralAnalytics
+
+        with self.assertNumQueries(3):
+            stats = ReferralAnalytics.get_user_stats(self.referrer, link=self.link)
+
+        self.assertEqual(stats['pending_referrals'], 2)
+        self.assertEqual(stats['qualified_referrals'], 1)
+        self.assertEqual(stats['available_balance'], 0.0)
+
+    def test_get_top_referrers_cached(self):
+        """Test leaderboard loads users in one query and is then cached"""
+        from apps.referrals.analytics import ReferralAnalytics
+
+        with self.assertNumQueries(1):
+            leaderboard = ReferralAnalytics.get_top_referrers(limit=10)
+        with self.assertNumQueries(0):
+            self.assertEqual(ReferralAnalytics.get_top_referrers(limit=10), leaderboard)
+
+        usernames = [row['user'] for row in leaderboard]
+        self.assertIn(self.referrer.username, usernames)
+
+    def test_refresh_leaderboard_task_rebuilds_cache(self):
+        """Test the beat task replaces the cached leaderboard snapshot"""
+        from django.core.cache import cache
+        from apps.common.cache import CacheKeys
+        from apps.referrals.tasks import refresh_referral_leaderboard
+
+        cache.set(CacheKeys.referral_leaderboard(10), [], 300)
+        refresh_referral_leaderboard()
+
+        usernames = [row['user'] for row in cache.get(CacheKeys.referral_leaderboard(10))]
+        self.assertIn(self.referrer.username, usernames)
+
+
+class ProcessPendingReferralsTestCase(TestCase):
+    """Test set-based processing of pending referrals"""
+
+    def setUp(self):
+        from apps.transactions.models import Transaction
+
+        self.program = ReferralProgram.get_program()
+        self.program.minimum_referral_deposit = Decimal('20.00')
+        self.program.referral_bonus_amount = Decimal('50.00')
+        self.program.referred_user_bonus = Decimal('25.00')
+        self.program.save()
+
+        self.referrer = User.objects.create_user(
+            username='bulkreferrer',
+            email='bulkreferrer@example.com',
+            password='Password123'
+        )
+        ReferralLink.objects.get_or_create(
+            user=self.referrer,
+            defaults={'referral_code': 'BULKREF123'}
+        )
+        self.referred = []
+        for index, deposit in enumerate([Decimal('30.00'), Decimal('25.00'), Decimal('5.00')]):
+            user = User.objects.create_user(
+                username=f'bulkreferred{index}',
+                email=f'bulkreferred{index}@example.com',
+                password='Password123'
+            )
+            Transaction.objects.create(
+                user=user,
+                type='DEPOSIT',
+                amount=deposit,
+                status='COMPLETED'
+            )
+            Referral.objects.create(referrer=self.referrer, referred_user=user, status='PENDING')
+            self.referred.append(user)
+
+    def test_process_pending_referrals_in_bulk(self):
+        """Test qualifying referrals are awarded and others stay pending"""
+        from apps.referrals.services import ReferralService
+
+        awarded = ReferralService.process_pending_referrals_in_bulk(chunk_size=2)
+
+        self.assertEqual(awarded, 2)
+        self.assertEqual(
+            Referral.objects.filter(referrer=self.referrer, status='BONUS_AWARDED').count(), 2
+        )
+        self.assertEqual(
+            Referral.objects.get(referred_user=self.referred[2]).status, 'PENDING'
+        )
+        self.assertEqual(ReferralBonus.objects.filter(status='CREDITED').count(), 4)
+
+        self.referrer.refresh_from_db()
+        self.assertEqual(self.referrer.wallet_balance, Decimal('100.00'))
+        self.referred[0].refresh_from_db()
+        self.assertEqual(self.referred[0].wallet_balance, Decimal('25.00'))
+
+        link = ReferralLink.objects.get(user=self.referrer)
+        self.assertEqual(link.total_referred, 2)
+        self.assertEqual(link.total_bonus_earned, Decimal('100.00'))
+
+        # A second run finds nothing new to award
+        self.assertEqual(ReferralService.process_pending_referrals_in_bulk(), 0)
+
+    def test_process_pending_referrals_touches_updated_at(self):
+        """Test bulk awards stamp updated_at on the rows they change"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.referrals.services import ReferralService
+
+        stale = timezone.now() - timedelta(days=1)
+        Referral.objects.update(updated_at=stale)
+        User.objects.filter(pk=self.referrer.pk).update(updated_at=stale)
+
+        ReferralService.process_pending_referrals_in_bulk()
+
+        referral = Referral.objects.get(referred_user=self.referred[0])
+        self.assertGreater(referral.updated_at, stale)
+        self.assertEqual(referral.updated_at, referral.bonus_awarded_at)
+        self.referrer.refresh_from_db()
+        self.assertGreater(self.referrer.updated_at, stale)
+
+
+class ReferralBonusExpiryTestCase(TestCase):
+    """Test bulk expiry of pending referral bonuses"""
+
+    def setUp(self):
+        from django.utils import timezone
+        from datetime import timedelta
+
+        self.referrer = User.objects.create_user(
+            username='expiryreferrer',
+            email='expiryreferrer@example.com',
+            password='Password123'
+        )
+        self.bonuses = []
+        for index in range(3):
+            referred = User.objects.create_user(
+                username=f'expiryreferred{index}',
+                email=f'expiryreferred{index}@example.com',
+                password='Password123'
+            )
+            referral = Referral.objects.create(
+                referrer=self.referrer,
+                referred_user=referred,
+                status='PENDING'
+            )
+            # The last referral is still within its expiry window
+            expires_at = timezone.now() + timedelta(days=1 if index == 2 else -1)
+            Referral.objects.filter(id=referral.id).update(expires_at=expires_at)
+            self.bonuses.append(ReferralBonus.objects.create(
+                user=self.referrer,
+                referral=referral,
+                bonus_type='REFERRER',
+                amount=Decimal('10.00'),
+                status='PENDING'
+            ))
+
+    def test_expire_pending_bonuses(self):
+        """Test expired bonuses are updated in batches and others untouched"""
+        from apps.referrals.services import ReferralService
+
+        expired = ReferralService.expire_pending_bonuses(batch_size=1)
+
+        self.assertEqual(expired, 2)
+        statuses = [
+            ReferralBonus.objects.get(id=bonus.id).status for bonus in self.bonuses
+        ]
+        self.assertEqual(statuses, ['EXPIRED', 'EXPIRED', 'PENDING'])
+
+
+class ReferralCodeTestCase(TestCase):
+    """Test UUID-derived referral codes"""
+
+    def test_build_code_is_deterministic_and_fixed_length(self):
+        """Test codes are stable per user and fit the column"""
+        user_id = uuid.uuid4()
+
+        code = ReferralLink.build_code(user_id)
+
+        self.assertEqual(code, ReferralLink.build_code(str(user_id)))
+        self.assertEqual(len(code), 22)
+        self.assertTrue(code.isalnum())
+
+    def test_build_code_is_unique_per_user(self):
+        """Test distinct users get distinct codes"""
+        codes = {ReferralLink.build_code(uuid.uuid4()) for _ in range(1000)}
+
+        self.assertEqual(len(codes), 1000)
+        self.assertEqual(ReferralLink.build_code(uuid.UUID(int=0)), '0' * 22)
+
+
+class ReferralDepositEventsTestCase(TestCase):
+    """Test referral qualification from completed-deposit events"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.common.cache import CacheKeys, get_redis_client
+        from apps.payments.models import PaymentIntent
+
+        self.redis = get_redis_client()
+        if self.redis is None:
+            self.skipTest('Redis cache not configured')
+        self.redis.delete(CacheKeys.referral_deposit_events())
+        cache.delete(CacheKeys.referral_deposits_pending())
+
+        self.program = ReferralProgram.get_program()
+        self.program.minimum_referral_deposit = Decimal('20.00')
+        self.program.save()
+
+        self.referrer = User.objects.create_user(
+            username='eventreferrer',
+            email='eventreferrer@example.com',
+            password='Password123'
+        )
+        self.referred = User.objects.create_user(
+            username='eventreferred',
+            email='eventreferred@example.com',
+            password='Password123'
+        )
+        self.referral = Referral.objects.create(
+            referrer=self.referrer, referred_user=self.referred, status='PENDING'
+        )
+        for index in range(3):
+            PaymentIntent.objects.create(
+                user=self.referred,
+                stripe_payment_intent_id=f'pi_referral_{index}',
+                amount=Decimal('10.00'),
+                status='processing'
+            )
+
+    def _deposit_all(self):
+        from unittest.mock import patch
+        from apps.payments.services import StripeService
+
+        with patch('apps.notifications.tasks.send_deposit_confirmation_email.delay'), \
+                patch('apps.referrals.tasks.process_referral_deposits_task.apply_async') as mock_apply_async, \
+                self.captureOnCommitCallbacks(execute=True):
+            for index in range(3):
+                StripeService.handle_payment_success(f'pi_referral_{index}')
+        return mock_apply_async
+
+    def test_deposit_path_does_not_touch_referrals(self):
+        """Test deposits only publish an event and leave the referral pending"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            self._deposit_all()
+
+        self.assertFalse(any('referrals' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(Referral.objects.get(pk=self.referral.pk).status, 'PENDING')
+
+    def test_deposits_deduplicated_and_awarded_once(self):
+        """Test several deposits by one user lead to one qualification"""
+        from apps.common.cache import CacheKeys
+        from apps.referrals.tasks import process_referral_deposits_task
+
+        mock_apply_async = self._deposit_all()
+
+        # Consumption is debounced and the user is queued once
+        mock_apply_async.assert_called_once()
+        self.assertEqual(self.redis.scard(CacheKeys.referral_deposit_events()), 1)
+
+        process_referral_deposits_task()
+
+        self.referral.refresh_from_db()
+        self.assertEqual(self.referral.status, 'BONUS_AWARDED')
+        self.assertEqual(self.referral.referred_user_deposit, Decimal('30.00'))
+        self.assertEqual(ReferralBonus.objects.filter(referral=self.referral).count(), 2)
+        self.assertEqual(self.redis.scard(CacheKeys.referral_deposit_events()), 0)
+
+        # A replayed event awards nothing
+        from apps.referrals.services import ReferralService
+        self.assertEqual(ReferralService.qualify_referred_users([self.referred.id]), 0)
+        self.assertEqual(ReferralBonus.objects.filter(referral=self.referral).count(), 2)
+
+    def test_deposit_below_minimum_updates_total(self):
+        """Test a referral short of the minimum records the deposit total"""
+        from apps.referrals.services import ReferralService
+        from apps.transactions.models import Transaction
+
+        Transaction.objects.create(user=self.referred, type='DEPOSIT', amount=Decimal('5.00'), status='COMPLETED')
+
+        self.assertEqual(ReferralService.qualify_referred_users([self.referred.id]), 0)
+        self.referral.refresh_from_db()
+        self.assertEqual(self.referral.status, 'PENDING')
+        self.assertEqual(self.referral.referred_user_deposit, Decimal('5.00'))
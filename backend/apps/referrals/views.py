@@ -7,9 +7,6 @@ from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q, Sum, Count
 from django.utils import timezone
 from django.contrib.auth.models import User
-import uuid
-import string
-import random
 
 from .models import (
     ReferralProgram,
@@ -18,6 +15,7 @@ from .models import (
     ReferralBonus,
     ReferralWithdrawal
 )
+from .analytics import ReferralAnalytics
 from .serializers import (
     ReferralProgramSerializer,
     ReferralLinkSerializer,
@@ -99,25 +97,14 @@ class ReferralLinkViewSet(viewsets.ReadOnlyModelViewSet):
             link = request.user.referral_link
         except ReferralLink.DoesNotExist:
             # Create if doesn't exist
-            code = self._generate_referral_code()
             link = ReferralLink.objects.create(
                 user=request.user,
-                referral_code=code
+                referral_code=ReferralLink.build_code(request.user.id)
             )
         
         serializer = self.get_serializer(link, context={'request': request})
         return Response(serializer.data)
 
-    @staticmethod
-    def _generate_referral_code():
-        """Generate unique referral code."""
-        while True:
-            code = f'{timezone.now().year}' + ''.join(
-                random.choices(string.ascii_letters + string.digits, k=12)
-            )
-            if not ReferralLink.objects.filter(referral_code=code).exists():
-                return code
-
 
 class ReferralViewSet(viewsets.ModelViewSet):
     """
@@ -167,54 +154,32 @@ class ReferralViewSet(viewsets.ModelViewSet):
         try:
             link = user.referral_link
         except ReferralLink.DoesNotExist:
-            code = ReferralLinkViewSet._generate_referral_code()
             link = ReferralLink.objects.create(
                 user=user,
-                referral_code=code
+                referral_code=ReferralLink.build_code(user.id)
             )
         
-        # Calculate stats
-        referrals = Referral.objects.filter(referrer=user)
-        pending = referrals.filter(status='PENDING').count()
-        qualified = referrals.filter(status='QUALIFIED').count()
-        
-        bonuses = ReferralBonus.objects.filter(
-            user=user,
-            status='CREDITED'
-        )
-        available_balance = bonuses.aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        
-        # Pending withdrawals
-        pending_withdrawals = ReferralWithdrawal.objects.filter(
-            user=user,
-            status__in=['PENDING', 'APPROVED', 'PROCESSING']
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Total withdrawn
-        total_withdrawn = ReferralWithdrawal.objects.filter(
-            user=user,
-            status='COMPLETED'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        stats = {
-            'total_referred': link.total_referred,
-            'total_bonus_earned': link.total_bonus_earned,
-            'pending_referrals': pending,
-            'qualified_referrals': qualified,
-            'available_balance': available_balance,
-            'pending_withdrawals': pending_withdrawals,
-            'total_withdrawn': total_withdrawn,
-            'referral_code': link.referral_code,
-            'referral_url': f'/register?ref={link.referral_code}'
-        }
+        stats = ReferralAnalytics.get_user_stats(user, link=link, decimals=True)
         
         # Cache for 1 minute
         cache.set(cache_key, stats, 60)
         
         return Response(stats)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdmin])
+    def leaderboard(self, request):
+        """Get top referrers and overall program statistics (admin only)."""
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            limit = 10
+        
+        return Response({
+            'top_referrers': ReferralAnalytics.get_top_referrers(limit=limit),
+            'program': ReferralAnalytics.get_program_stats(),
+            'conversion_rate_30d': ReferralAnalytics.get_conversion_rate(days=30),
+        })
+
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         """Admin action to approve a referral."""
@@ -264,8 +229,8 @@ class ReferralViewSet(viewsets.ModelViewSet):
         referral.referrer.referral_link.save()
         
         # Credit bonuses to users
-        referral.referrer.add_balance(program.referral_bonus_amount)
-        referral.referred_user.add_balance(program.referred_user_bonus)
+        referral.referrer.add_balance(program.referral_bonus_amount, 'REFERRAL_BONUS')
+        referral.referred_user.add_balance(program.referred_user_bonus, 'REFERRAL_BONUS')
         
         # Send notification emails
         from apps.notifications.tasks import send_referral_bonus_credited_task
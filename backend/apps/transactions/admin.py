@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.transactions.models import Transaction, PaymentMethod, WithdrawalRequest
+from apps.transactions.models import Transaction, PaymentMethod, WithdrawalRequest, PayoutBatch
 
 
 @admin.register(Transaction)
@@ -31,6 +31,13 @@ class WithdrawalRequestAdmin(admin.ModelAdmin):
     readonly_fields = ['requested_at', 'processed_at']
     fieldsets = (
         ('Request Information', {'fields': ('user', 'amount', 'status')}),
-        ('Payment Details', {'fields': ('payment_method', 'transaction_id')}),
+        ('Payment Details', {'fields': ('payment_method', 'transaction_id', 'payout_batch')}),
         ('Timestamps', {'fields': ('requested_at', 'processed_at')}),
     )
+
+
+@admin.register(PayoutBatch)
+class PayoutBatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'method', 'file_format', 'status', 'item_count', 'total_amount', 'created_at']
+    list_filter = ['status', 'method', 'file_format', 'created_at']
+    readonly_fields = ['created_at', 'reconciled_at']
@@ -5,6 +5,3 @@ class TransactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.transactions'
     verbose_name = 'Transactions Management'
-    
-    def ready(self):
-        import apps.transactions.signals  # noqa
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""
+Double-entry wallet ledger.
+
+Every wallet movement appends a balanced journal to `LedgerEntry`, which is
+the source of truth for balances. `User.wallet_balance` is kept as a
+projection for reads, updated with a single conditional UPDATE in the same
+transaction instead of a read-modify-write `save()`, so concurrent credits
+never lose updates.
+
+Balances can be read from the ledger as snapshot + delta:
+`WalletBalanceSnapshot` rows are rebuilt periodically by
+`build_wallet_snapshots_task`, and only entries after the snapshot are
+summed. `reconcile` compares the ledger with the projection for all users
+in one vectorized pass.
+
+Committed postings also feed the responsible gaming spend counters.
+"""
+import logging
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+import numpy as np
+
+from apps.transactions.models import LedgerEntry, WalletBalanceSnapshot
+from apps.users.models import User
+from apps.users.spend_counters import SpendCounters, TRACKED_TYPES
+
+logger = logging.getLogger(__name__)
+
+WALLET = 'WALLET'
+COUNTER_ACCOUNTS = {
+    'DEPOSIT': 'DEPOSITS',
+    'WITHDRAWAL': 'WITHDRAWALS',
+    'TICKET_PURCHASE': 'TICKET_SALES',
+    'PRIZE_AWARD': 'PRIZES',
+    'REFUND': 'REFUNDS',
+    'REFERRAL_BONUS': 'REFERRAL_BONUSES',
+    'ADMIN_ADJUSTMENT': 'ADJUSTMENTS',
+    'OPENING_BALANCE': 'OPENING_BALANCES',
+}
+BULK_BATCH_SIZE = 1000
+# Entries newer than this may belong to transactions that haven't
+# committed yet (ids are allocated before commit), so snapshots stop short
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+
+def _record_spend(events):
+    """Count tracked movements towards spend limits once they commit."""
+    events = [event for event in events if event[1] in TRACKED_TYPES]
+    if events:
+        transaction.on_commit(lambda: SpendCounters.record_many(events))
+
+
+def _to_cents(values):
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+
+class LedgerService:
+    """Service for wallet ledger postings, balances and reconciliation."""
+
+    @staticmethod
+    def build_entries(user_id, amount, entry_type, transaction_id=None):
+        """
+        Build the two legs of a wallet journal.
+
+        Args:
+            user_id: Wallet owner's ID
+            amount: Signed amount; positive credits the wallet
+            entry_type: Transaction type (see COUNTER_ACCOUNTS)
+            transaction_id: Related Transaction ID, if any
+
+        Returns:
+            list: Unsaved LedgerEntry instances
+        """
+        amount = Decimal(str(amount))
+        journal_id = uuid.uuid4()
+        return [
+            LedgerEntry(journal_id=journal_id, account=WALLET, user_id=user_id,
+                        amount=amount, entry_type=entry_type, transaction_id=transaction_id),
+            LedgerEntry(journal_id=journal_id, account=COUNTER_ACCOUNTS[entry_type], user_id=user_id,
+                        amount=-amount, entry_type=entry_type, transaction_id=transaction_id),
+        ]
+
+    @classmethod
+    def post_many(cls, postings):
+        """
+        Append many journals in bulk.
+
+        Does not touch `User.wallet_balance`; callers that post in bulk
+        update the projection themselves.
+
+        Args:
+            postings: Iterable of (user_id, amount, entry_type, transaction_id)
+
+        Returns:
+            int: Number of journals posted
+        """
+        entries = []
+        events = []
+        for user_id, amount, entry_type, transaction_id in postings:
+            entries.extend(cls.build_entries(user_id, amount, entry_type, transaction_id))
+            events.append((user_id, entry_type, amount))
+        LedgerEntry.objects.bulk_create(entries, batch_size=BULK_BATCH_SIZE)
+        _record_spend(events)
+        return len(events)
+
+    @classmethod
+    def credit(cls, user, amount, entry_type, transaction_id=None):
+        """
+        Credit a user's wallet.
+
+        Args:
+            user: User instance
+            amount: Positive amount
+            entry_type: Transaction type
+            transaction_id: Related Transaction ID, if any
+
+        Returns:
+            bool: True if credited
+        """
+        amount = Decimal(str(amount))
+        if amount <= 0:
+            return False
+
+        with transaction.atomic():
+            User.objects.filter(pk=user.pk).update(
+                wallet_balance=F('wallet_balance') + amount,
+                updated_at=timezone.now()
+            )
+            LedgerEntry.objects.bulk_create(cls.build_entries(user.pk, amount, entry_type, transaction_id))
+            _record_spend([(user.pk, entry_type, amount)])
+        return True
+
+    @classmethod
+    def debit(cls, user, amount, entry_type, transaction_id=None):
+        """
+        Debit a user's wallet if the balance covers it.
+
+        Args:
+            user: User instance
+            amount: Positive amount
+            entry_type: Transaction type
+            transaction_id: Related Transaction ID, if any
+
+        Returns:
+            bool: True if debited, False on insufficient balance
+        """
+        amount = Decimal(str(amount))
+        if amount <= 0:
+            return False
+
+        with transaction.atomic():
+            # The balance check and the decrement are one statement
+            updated = User.objects.filter(pk=user.pk, wallet_balance__gte=amount).update(
+                wallet_balance=F('wallet_balance') - amount,
+                updated_at=timezone.now()
+            )
+            if not updated:
+                return False
+            LedgerEntry.objects.bulk_create(cls.build_entries(user.pk, -amount, entry_type, transaction_id))
+            _record_spend([(user.pk, entry_type, amount)])
+        return True
+
+    @staticmethod
+    def get_balance(user_id):
+        """
+        Get a user's ledger balance as snapshot + delta.
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            Decimal: Wallet balance according to the ledger
+        """
+        snapshot = WalletBalanceSnapshot.objects.filter(user_id=user_id).values_list(
+            'balance', 'last_entry_id'
+        ).first()
+        balance, last_entry_id = snapshot or (Decimal('0.00'), 0)
+
+        delta = LedgerEntry.objects.filter(
+            user_id=user_id, account=WALLET, id__gt=last_entry_id
+        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        return balance + delta
+
+    @staticmethod
+    def build_snapshots(now=None):
+        """
+        Roll ledger entries since the last run into the balance snapshots.
+
+        Args:
+            now: Reference time (defaults to now)
+
+        Returns:
+            int: Number of snapshots written
+        """
+        if now is None:
+            now = timezone.now()
+
+        watermark = WalletBalanceSnapshot.objects.aggregate(last=Max('last_entry_id'))['last'] or 0
+        upper = LedgerEntry.objects.filter(
+            id__gt=watermark, created_at__lt=now - SNAPSHOT_LAG
+        ).aggregate(last=Max('id'))['last']
+        if upper is None:
+            return 0
+
+        deltas = dict(
+            LedgerEntry.objects.filter(account=WALLET, id__gt=watermark, id__lte=upper)
+            .order_by()
+            .values('user_id')
+            .annotate(total=Sum('amount'))
+            .values_list('user_id', 'total')
+        )
+        current = dict(
+            WalletBalanceSnapshot.objects.filter(user_id__in=list(deltas)).values_list('user_id', 'balance')
+        )
+        snapshots = [
+            WalletBalanceSnapshot(
+                user_id=user_id,
+                balance=current.get(user_id, Decimal('0.00')) + total,
+                last_entry_id=upper,
+                updated_at=now
+            )
+            for user_id, total in deltas.items()
+        ]
+        if not snapshots:
+            return 0
+
+        WalletBalanceSnapshot.objects.bulk_create(
+            snapshots,
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['balance', 'last_entry_id', 'updated_at']
+        )
+        return len(snapshots)
+
+    @staticmethod
+    def reconcile():
+        """
+        Compare ledger balances with `User.wallet_balance` for all users.
+
+        Returns:
+            dict: users checked, mismatches (user_id, ledger, wallet),
+            total wallet liabilities per the ledger and the sum of all
+            legs (zero when every journal is balanced)
+        """
+        watermark = WalletBalanceSnapshot.objects.aggregate(last=Max('last_entry_id'))['last'] or 0
+
+        ledger_ids = []
+        ledger_amounts = []
+        for user_id, balance in WalletBalanceSnapshot.objects.values_list('user_id', 'balance').iterator(chunk_size=20000):
+            ledger_ids.append(user_id.bytes)
+            ledger_amounts.append(balance)
+        deltas = (
+            LedgerEntry.objects.filter(account=WALLET, id__gt=watermark)
+            .order_by()
+            .values('user_id')
+            .annotate(total=Sum('amount'))
+            .values_list('user_id', 'total')
+        )
+        for user_id, total in deltas:
+            ledger_ids.append(user_id.bytes)
+            ledger_amounts.append(total)
+
+        wallet_ids = []
+        wallet_amounts = []
+        for user_id, balance in User.objects.values_list('id', 'wallet_balance').iterator(chunk_size=20000):
+            wallet_ids.append(user_id.bytes)
+            wallet_amounts.append(balance)
+
+        keys = np.array(ledger_ids + wallet_ids, dtype='S16')
+        cents = np.concatenate([_to_cents(ledger_amounts), -_to_cents(wallet_amounts)])
+        ledger_cents = np.concatenate([_to_cents(ledger_amounts), np.zeros(len(wallet_ids), dtype=np.int64)])
+
+        mismatches = []
+        if keys.size:
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            difference = np.bincount(inverse, weights=cents, minlength=unique_keys.size)
+            ledger_totals = np.bincount(inverse, weights=ledger_cents, minlength=unique_keys.size)
+            for index in np.flatnonzero(np.rint(difference)):
+                ledger = Decimal(int(ledger_totals[index])) / 100
+                mismatches.append((
+                    str(uuid.UUID(bytes=unique_keys[index].ljust(16, b'\0'))),
+                    ledger,
+                    ledger - Decimal(int(difference[index])) / 100,
+                ))
+
+        unbalanced = LedgerEntry.objects.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        total_liabilities = Decimal(int(_to_cents(ledger_amounts).sum())) / 100 if ledger_amounts else Decimal('0.00')
+
+        if mismatches or unbalanced:
+            logger.warning(
+                f"Wallet ledger reconciliation: {len(mismatches)} mismatched wallets, "
+                f"unbalanced total {unbalanced}"
+            )
+
+        return {
+            'users_checked': len(wallet_ids),
+            'mismatches': mismatches,
+            'total_liabilities': total_liabilities,
+            'unbalanced_total': unbalanced,
+        }
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.common.exceptions import WithdrawalError
+from apps.transactions.payouts import BATCH_MAX_ITEMS, WRITERS, PayoutBatchService
+
+
+class Command(BaseCommand):
+    help = 'Export approved withdrawals as payout batches, one per payment method'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(WRITERS), type=str.upper,
+                            help='Payout file format (default: PAYOUT_BATCH_FORMAT)')
+        parser.add_argument('--dir', help='Export directory (default: PAYOUT_EXPORT_DIR)')
+        parser.add_argument('--max-items', type=int, default=BATCH_MAX_ITEMS, help='Withdrawals per batch')
+
+    def handle(self, *args, **options):
+        try:
+            batches = PayoutBatchService.create_batches(
+                file_format=options['format'],
+                export_dir=options['dir'],
+                max_items=options['max_items']
+            )
+        except WithdrawalError as e:
+            raise CommandError(str(e))
+
+        for batch in batches:
+            self.stdout.write(
+                f"{batch.id} {batch.method}: {batch.item_count} withdrawals, "
+                f"${batch.total_amount} -> {batch.file_path}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Created {len(batches)} payout batches"))
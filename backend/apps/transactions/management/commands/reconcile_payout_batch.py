@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.common.exceptions import WithdrawalError
+from apps.transactions.payouts import PayoutBatchService
+
+
+class Command(BaseCommand):
+    help = 'Reconcile a settlement CSV against a payout batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch_id', help='Payout batch ID')
+        parser.add_argument('settlement_file', help='Settlement CSV with withdrawal_id, amount and status columns')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['settlement_file'], encoding='utf-8-sig', newline='') as settlement:
+                result = PayoutBatchService.reconcile(options['batch_id'], settlement)
+        except OSError as e:
+            raise CommandError(f"Could not read settlement file: {e}")
+        except WithdrawalError as e:
+            raise CommandError(str(e))
+
+        for mismatch in result['mismatched']:
+            self.stdout.write(self.style.WARNING(f"{mismatch['id']}: {mismatch['error']}"))
+        if result['unknown']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(result['unknown'])} settlement lines don't match a pending withdrawal in this batch"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(result['settled'])} settled, {len(result['failed'])} failed, "
+            f"{result['outstanding']} outstanding"
+        ))
@@ -0,0 +1,116 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("users", "0005_partition_audit_logs"),
+        ("transactions", "0002_alter_transaction_type"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WalletBalanceSnapshot",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="wallet_snapshot",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "balance",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("last_entry_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "wallet_balance_snapshots",
+            },
+        ),
+        migrations.CreateModel(
+            name="LedgerEntry",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("journal_id", models.UUIDField(db_index=True, default=uuid.uuid4)),
+                (
+                    "account",
+                    models.CharField(
+                        choices=[
+                            ("WALLET", "User Wallet"),
+                            ("DEPOSITS", "Deposits"),
+                            ("WITHDRAWALS", "Withdrawals"),
+                            ("TICKET_SALES", "Ticket Sales"),
+                            ("PRIZES", "Prizes"),
+                            ("REFUNDS", "Refunds"),
+                            ("REFERRAL_BONUSES", "Referral Bonuses"),
+                            ("ADJUSTMENTS", "Admin Adjustments"),
+                            ("OPENING_BALANCES", "Opening Balances"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "entry_type",
+                    models.CharField(
+                        choices=[
+                            ("TICKET_PURCHASE", "Ticket Purchase"),
+                            ("PRIZE_AWARD", "Prize Award"),
+                            ("DEPOSIT", "Deposit"),
+                            ("WITHDRAWAL", "Withdrawal"),
+                            ("REFUND", "Refund"),
+                            ("ADMIN_ADJUSTMENT", "Admin Adjustment"),
+                            ("REFERRAL_BONUS", "Referral Bonus"),
+                            ("OPENING_BALANCE", "Opening Balance"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "transaction",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger_entries",
+                        to="transactions.transaction",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ledger_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "ledger_entries",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "account", "id"],
+                        name="ledger_entr_user_id_90aef8_idx",
+                    ),
+                    models.Index(
+                        fields=["account", "id"], name="ledger_entr_account_ae642f_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+import uuid
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def create_opening_balances(apps, schema_editor):
+    """Seed the ledger with each user's current wallet balance."""
+    User = apps.get_model("users", "User")
+    LedgerEntry = apps.get_model("transactions", "LedgerEntry")
+
+    balances = (
+        User.objects.exclude(wallet_balance=0)
+        .order_by("id")
+        .values_list("id", "wallet_balance")
+    )
+    entries = []
+    for user_id, balance in balances.iterator(chunk_size=BATCH_SIZE):
+        journal_id = uuid.uuid4()
+        entries.append(LedgerEntry(
+            journal_id=journal_id, account="WALLET", user_id=user_id,
+            amount=balance, entry_type="OPENING_BALANCE",
+        ))
+        entries.append(LedgerEntry(
+            journal_id=journal_id, account="OPENING_BALANCES", user_id=user_id,
+            amount=-balance, entry_type="OPENING_BALANCE",
+        ))
+        if len(entries) >= BATCH_SIZE:
+            LedgerEntry.objects.bulk_create(entries)
+            entries = []
+    if entries:
+        LedgerEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("transactions", "0003_ledger"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_opening_balances, migrations.RunPython.noop),
+    ]
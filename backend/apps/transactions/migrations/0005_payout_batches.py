@@ -0,0 +1,103 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("transactions", "0004_ledger_opening_balances"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PayoutBatch",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("method", models.CharField(max_length=50)),
+                (
+                    "file_format",
+                    models.CharField(
+                        choices=[("CSV", "CSV"), ("BANK", "Bank File")],
+                        default="CSV",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("EXPORTED", "Exported"),
+                            ("PARTIALLY_RECONCILED", "Partially Reconciled"),
+                            ("RECONCILED", "Reconciled"),
+                        ],
+                        default="EXPORTED",
+                        max_length=30,
+                    ),
+                ),
+                ("file_path", models.CharField(blank=True, max_length=500)),
+                ("item_count", models.PositiveIntegerField(default=0)),
+                (
+                    "total_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("settled_count", models.PositiveIntegerField(default=0)),
+                (
+                    "settled_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("failed_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("reconciled_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "payout_batches",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="payoutbatch",
+            name="created_by",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="payout_batches",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="withdrawalrequest",
+            name="payout_batch",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="withdrawals",
+                to="transactions.payoutbatch",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="withdrawalrequest",
+            index=models.Index(
+                fields=["payout_batch", "status"], name="withdrawal__payout__76f7ef_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payoutbatch",
+            index=models.Index(
+                fields=["status", "-created_at"], name="payout_batc_status_6ccf34_idx"
+            ),
+        ),
+    ]
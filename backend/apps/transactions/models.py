@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from apps.users.models import User
 from apps.lotteries.models import Lottery
 import uuid
@@ -96,6 +97,55 @@ class PaymentMethod(models.Model):
         return f"{self.user.username} - {self.method_type}"
 
 
+class PayoutBatch(models.Model):
+    """
+    One payout file for approved withdrawals of a single payment method.
+
+    Withdrawals in the batch are PROCESSING until a settlement file is
+    reconciled against it.
+    """
+    STATUS_CHOICES = [
+        ('EXPORTED', 'Exported'),
+        ('PARTIALLY_RECONCILED', 'Partially Reconciled'),
+        ('RECONCILED', 'Reconciled'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('CSV', 'CSV'),
+        ('BANK', 'Bank File'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    method = models.CharField(max_length=50)  # PaymentMethod.method_type or BANK_TRANSFER
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='CSV')
+    status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='EXPORTED')
+    file_path = models.CharField(max_length=500, blank=True)
+    item_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    settled_count = models.PositiveIntegerField(default=0)
+    settled_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payout_batches'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'payout_batches'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Payout batch {self.id} - {self.method} ({self.item_count} items, {self.status})"
+
+
 class WithdrawalRequest(models.Model):
     STATUS_CHOICES = [
         ('REQUESTED', 'Requested'),
@@ -121,6 +171,13 @@ class WithdrawalRequest(models.Model):
         blank=True,
         related_name='withdrawal_request'
     )
+    payout_batch = models.ForeignKey(
+        PayoutBatch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='withdrawals'
+    )
 
     class Meta:
         db_table = 'withdrawal_requests'
@@ -128,7 +185,73 @@ class WithdrawalRequest(models.Model):
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['status']),
+            models.Index(fields=['payout_batch', 'status']),
         ]
 
     def __str__(self):
         return f"Withdrawal - {self.user.username} - {self.amount} ({self.status})"
+
+
+class LedgerEntry(models.Model):
+    """
+    Append-only double-entry wallet ledger.
+
+    Every wallet movement is a journal of two legs that sum to zero: the
+    user's WALLET leg and the counter-account leg. Rows are never updated
+    or deleted.
+    """
+    ACCOUNT_CHOICES = [
+        ('WALLET', 'User Wallet'),
+        ('DEPOSITS', 'Deposits'),
+        ('WITHDRAWALS', 'Withdrawals'),
+        ('TICKET_SALES', 'Ticket Sales'),
+        ('PRIZES', 'Prizes'),
+        ('REFUNDS', 'Refunds'),
+        ('REFERRAL_BONUSES', 'Referral Bonuses'),
+        ('ADJUSTMENTS', 'Admin Adjustments'),
+        ('OPENING_BALANCES', 'Opening Balances'),
+    ]
+
+    ENTRY_TYPE_CHOICES = Transaction.TYPE_CHOICES + [
+        ('OPENING_BALANCE', 'Opening Balance'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    journal_id = models.UUIDField(default=uuid.uuid4, db_index=True)
+    account = models.CharField(max_length=30, choices=ACCOUNT_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_entries', db_index=False)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # Signed; credits to the account are positive
+    entry_type = models.CharField(max_length=50, choices=ENTRY_TYPE_CHOICES)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'ledger_entries'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'account', 'id']),  # Snapshot deltas
+            models.Index(fields=['account', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.account} {self.amount} ({self.entry_type})"
+
+
+class WalletBalanceSnapshot(models.Model):
+    """Ledger wallet balance per user as of `last_entry_id`."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='wallet_snapshot')
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_entry_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'wallet_balance_snapshots'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.balance} @ {self.last_entry_id}"
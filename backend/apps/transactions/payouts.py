@@ -0,0 +1,376 @@
+"""
+Payout batches for approved withdrawals.
+
+Instead of completing approved withdrawals one by one through the admin
+`process` endpoint, a daily cycle groups them by payment method into
+payout batches:
+
+1. `create_batches` locks the approved withdrawals of one method (up to
+   BATCH_MAX_ITEMS per batch), marks them PROCESSING in one UPDATE per
+   chunk and streams the payout file (CSV or fixed-width bank file) to
+   PAYOUT_EXPORT_DIR, reading rows with a server-side iterator.
+2. The provider returns a settlement file (CSV with `withdrawal_id`,
+   `amount`, `status` and optionally `reason` columns). `reconcile`
+   loads the batch's processing withdrawals into a dict keyed by ID and
+   streams the settlement file against it, a hash join in memory.
+   Paid rows are completed in bulk; failed or returned payouts are
+   rejected and the amount goes back to the wallet with a reversing
+   ledger journal. Rows that don't match (wrong amount, unknown status)
+   stay PROCESSING and are reported, so a later settlement file for the
+   same batch can settle them.
+"""
+import csv
+import logging
+import os
+import uuid
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.common.exceptions import WithdrawalError
+from apps.transactions.ledger import LedgerService
+from apps.transactions.models import PayoutBatch, Transaction, WithdrawalRequest
+from apps.transactions.services import WithdrawalService, BULK_BATCH_SIZE
+from apps.transactions.withdrawal_counters import WithdrawalCounters
+from apps.users.audit import record_audit
+from apps.users.models import User
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = 10000
+EXPORT_CHUNK_SIZE = 2000
+# Withdrawals without a saved payment method are paid by bank transfer
+DEFAULT_METHOD = 'BANK_TRANSFER'
+CSV_HEADER = [
+    'withdrawal_id', 'user_id', 'username', 'amount', 'currency', 'method',
+    'account_name', 'account_number', 'routing_number',
+]
+SETTLEMENT_COLUMNS = {'withdrawal_id', 'amount', 'status'}
+PAID_STATUSES = {'PAID', 'SETTLED', 'COMPLETED'}
+FAILED_STATUSES = {'FAILED', 'RETURNED', 'REJECTED'}
+
+
+def _chunks(values, size=BULK_BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1')))
+
+
+def _account(bank_details, payment_details):
+    """Payee account fields; the withdrawal's bank details win over the saved method."""
+    details = {**(payment_details or {}), **(bank_details or {})}
+    return (
+        str(details.get('account_name') or details.get('account_holder') or ''),
+        str(details.get('account_number') or details.get('upi_id') or details.get('wallet_id') or ''),
+        str(details.get('routing_number') or details.get('ifsc_code') or details.get('swift_code') or ''),
+    )
+
+
+def _write_csv(out, batch, rows):
+    writer = csv.writer(out)
+    writer.writerow(CSV_HEADER)
+    currency = settings.STRIPE_CURRENCY.upper()
+    for withdrawal_id, user_id, username, amount, bank_details, payment_details in rows:
+        writer.writerow([
+            withdrawal_id, user_id, username, amount, currency, batch.method,
+            *_account(bank_details, payment_details),
+        ])
+
+
+def _write_bank(out, batch, rows):
+    # Fixed-width records: header, one detail per withdrawal, trailer with
+    # the count and total in cents for the bank's control checks
+    out.write(f"H{batch.id.hex:<32}{batch.created_at:%Y%m%d}{batch.method[:20]:<20}{settings.STRIPE_CURRENCY.upper():<3}\n")
+    for withdrawal_id, _, _, amount, bank_details, payment_details in rows:
+        account_name, account_number, routing_number = _account(bank_details, payment_details)
+        out.write(
+            f"D{withdrawal_id.hex:<32}{_cents(amount):012d}"
+            f"{account_number[:34]:<34}{routing_number[:11]:<11}{account_name[:35]:<35}\n"
+        )
+    out.write(f"T{batch.item_count:08d}{_cents(batch.total_amount):014d}\n")
+
+
+WRITERS = {
+    'CSV': (_write_csv, 'csv'),
+    'BANK': (_write_bank, 'txt'),
+}
+
+
+class PayoutBatchService:
+    """Service for exporting payout batches and reconciling settlements."""
+
+    @classmethod
+    def create_batches(cls, admin=None, file_format=None, export_dir=None, max_items=BATCH_MAX_ITEMS):
+        """
+        Export all approved withdrawals not yet in a batch, one batch per
+        payment method (more if a method has over `max_items`).
+
+        Args:
+            admin: Admin user running the export, if any
+            file_format: 'CSV' or 'BANK' (defaults to PAYOUT_BATCH_FORMAT)
+            export_dir: Destination directory (defaults to PAYOUT_EXPORT_DIR)
+            max_items: Withdrawals per batch
+
+        Returns:
+            list: Created PayoutBatch instances
+        """
+        file_format = (file_format or settings.PAYOUT_BATCH_FORMAT).upper()
+        if file_format not in WRITERS:
+            raise WithdrawalError(f"Invalid payout file format. Must be one of: {', '.join(WRITERS)}")
+        export_dir = export_dir or settings.PAYOUT_EXPORT_DIR
+        os.makedirs(export_dir, exist_ok=True)
+
+        methods = list(
+            WithdrawalRequest.objects.filter(status='APPROVED', payout_batch__isnull=True)
+            .order_by()
+            .values_list('payment_method__method_type', flat=True)
+            .distinct()
+        )
+
+        batches = []
+        for method in methods:
+            while True:
+                batch = cls._create_batch(method, admin, file_format, export_dir, max_items)
+                if batch is None:
+                    break
+                batches.append(batch)
+                if batch.item_count < max_items:
+                    break
+
+        logger.info(f"Created {len(batches)} payout batches")
+        return batches
+
+    @classmethod
+    @transaction.atomic
+    def _create_batch(cls, method, admin, file_format, export_dir, max_items):
+        """Lock, mark and export one batch of a payment method's withdrawals."""
+        method_filter = Q(payment_method__method_type=method) if method else Q(payment_method__isnull=True)
+        # Rows another export holds are skipped and picked up by its next batch
+        withdrawals = list(
+            WithdrawalRequest.objects.select_for_update(of=('self',), skip_locked=True)
+            .filter(method_filter, status='APPROVED', payout_batch__isnull=True)
+            .only('id', 'user_id', 'amount', 'status')
+            .order_by('requested_at')[:max_items]
+        )
+        if not withdrawals:
+            return None
+
+        batch = PayoutBatch.objects.create(
+            method=method or DEFAULT_METHOD,
+            file_format=file_format,
+            item_count=len(withdrawals),
+            total_amount=sum((w.amount for w in withdrawals), Decimal('0.00')),
+            created_by=admin
+        )
+        # APPROVED and PROCESSING both count towards withdrawal limits, so
+        # usage counters don't change
+        for chunk in _chunks([w.id for w in withdrawals]):
+            WithdrawalRequest.objects.filter(id__in=chunk).update(status='PROCESSING', payout_batch=batch)
+
+        writer, extension = WRITERS[file_format]
+        path = os.path.join(
+            export_dir,
+            f"payout_{batch.created_at:%Y%m%d}_{batch.method.lower()}_{batch.id.hex[:8]}.{extension}"
+        )
+        tmp_path = f"{path}.tmp"
+        rows = (
+            WithdrawalRequest.objects.filter(payout_batch=batch, status='PROCESSING')
+            .order_by('requested_at')
+            .values_list('id', 'user_id', 'user__username', 'amount', 'bank_details', 'payment_method__payment_details')
+        )
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+                writer(out, batch, rows.iterator(chunk_size=EXPORT_CHUNK_SIZE))
+            # Only publish complete files
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        batch.file_path = path
+        batch.save(update_fields=['file_path'])
+
+        record_audit(
+            user=admin,
+            action='WITHDRAW',
+            description=f'Exported payout batch of {batch.item_count} {batch.method} withdrawals (${batch.total_amount})',
+            resource_type='PayoutBatch',
+            resource_id=batch.id
+        )
+        WithdrawalService._notify(withdrawals, 'Withdrawal status updated to PROCESSING')
+
+        logger.info(f"Exported payout batch {batch.id}: {batch.item_count} {batch.method} withdrawals to {path}")
+        return batch
+
+    @classmethod
+    @transaction.atomic
+    def reconcile(cls, batch_id, settlement, admin=None):
+        """
+        Reconcile a settlement file against a payout batch.
+
+        Args:
+            batch_id: PayoutBatch ID
+            settlement: Iterable of CSV lines (an open text file or upload)
+            admin: Admin user reconciling, if any
+
+        Returns:
+            dict: settled and failed withdrawal IDs, mismatches
+            ({id, error}), unknown IDs (not pending in this batch) and the
+            number of withdrawals still outstanding
+        """
+        try:
+            batch = PayoutBatch.objects.select_for_update().get(id=batch_id)
+        except (PayoutBatch.DoesNotExist, ValueError, ValidationError):
+            raise WithdrawalError('Payout batch not found')
+
+        reader = csv.DictReader(settlement)
+        missing_columns = SETTLEMENT_COLUMNS - set(reader.fieldnames or [])
+        if missing_columns:
+            raise WithdrawalError(f"Settlement file is missing columns: {', '.join(sorted(missing_columns))}")
+
+        # Build side: the batch's unsettled withdrawals, keyed by ID
+        pending = {
+            str(withdrawal.id): withdrawal
+            for withdrawal in WithdrawalRequest.objects.select_for_update(of=('self',))
+            .filter(payout_batch=batch, status='PROCESSING')
+            .only('id', 'user_id', 'amount', 'status', 'remarks', 'requested_at', 'processed_at', 'transaction_id')
+        }
+
+        # Probe side: stream the settlement lines
+        settled = []
+        failed = []
+        mismatched = []
+        unknown = []
+        seen = set()
+        for line in reader:
+            raw_id = (line['withdrawal_id'] or '').strip()
+            try:
+                # Bank files carry the ID without dashes
+                withdrawal_id = str(uuid.UUID(raw_id))
+            except ValueError:
+                withdrawal_id = raw_id
+            withdrawal = pending.get(withdrawal_id)
+            if withdrawal is None:
+                unknown.append(withdrawal_id)
+                continue
+            if withdrawal_id in seen:
+                mismatched.append({'id': withdrawal_id, 'error': 'Duplicate settlement line'})
+                continue
+            seen.add(withdrawal_id)
+
+            try:
+                amount = Decimal((line['amount'] or '').strip())
+            except InvalidOperation:
+                mismatched.append({'id': withdrawal_id, 'error': 'Invalid amount'})
+                continue
+            if amount != withdrawal.amount:
+                mismatched.append({
+                    'id': withdrawal_id,
+                    'error': f'Settled amount {amount} does not match {withdrawal.amount}'
+                })
+                continue
+
+            outcome = (line['status'] or '').strip().upper()
+            if outcome in PAID_STATUSES:
+                settled.append(withdrawal)
+            elif outcome in FAILED_STATUSES:
+                WithdrawalService._append_remarks(
+                    withdrawal, 'Payout Failed', (line.get('reason') or '').strip() or outcome.title()
+                )
+                failed.append(withdrawal)
+            else:
+                mismatched.append({'id': withdrawal_id, 'error': f'Unknown settlement status: {outcome}'})
+
+        # A withdrawal with several lines isn't applied from any of them
+        duplicates = {m['id'] for m in mismatched if m['error'] == 'Duplicate settlement line'}
+        settled = [w for w in settled if str(w.id) not in duplicates]
+        failed = [w for w in failed if str(w.id) not in duplicates]
+
+        now = timezone.now()
+        cls._complete(settled, now)
+        cls._return_to_wallets(failed, now)
+
+        batch.settled_count += len(settled)
+        batch.settled_amount += sum((w.amount for w in settled), Decimal('0.00'))
+        batch.failed_count += len(failed)
+        outstanding = len(pending) - len(settled) - len(failed)
+        batch.status = 'RECONCILED' if outstanding == 0 else 'PARTIALLY_RECONCILED'
+        batch.reconciled_at = now
+        batch.save(update_fields=['settled_count', 'settled_amount', 'failed_count', 'status', 'reconciled_at'])
+
+        record_audit(
+            user=admin,
+            action='WITHDRAW',
+            description=(
+                f'Reconciled payout batch {batch.id}: {len(settled)} settled, {len(failed)} failed, '
+                f'{len(mismatched)} mismatched, {outstanding} outstanding'
+            ),
+            resource_type='PayoutBatch',
+            resource_id=batch.id
+        )
+        WithdrawalService._notify(settled, 'Withdrawal completed')
+        WithdrawalService._notify(failed, 'Withdrawal payout failed; the amount was returned to your wallet')
+        if settled or failed:
+            WithdrawalService._refresh_dashboard()
+
+        logger.info(
+            f"Reconciled payout batch {batch.id}: {len(settled)} settled, {len(failed)} failed, "
+            f"{len(mismatched)} mismatched, {len(unknown)} unknown, {outstanding} outstanding"
+        )
+        return {
+            'settled': [str(w.id) for w in settled],
+            'failed': [str(w.id) for w in failed],
+            'mismatched': mismatched,
+            'unknown': unknown,
+            'outstanding': outstanding,
+        }
+
+    @staticmethod
+    def _complete(withdrawals, now):
+        """Mark paid withdrawals COMPLETED in bulk."""
+        for chunk in _chunks([w.id for w in withdrawals]):
+            WithdrawalRequest.objects.filter(id__in=chunk).update(status='COMPLETED', processed_at=now)
+        for chunk in _chunks([w.transaction_id for w in withdrawals if w.transaction_id]):
+            Transaction.objects.filter(id__in=chunk).update(status='COMPLETED', completed_at=now)
+
+    @staticmethod
+    def _return_to_wallets(withdrawals, now):
+        """Reject failed payouts and credit the amounts back."""
+        if not withdrawals:
+            return
+
+        for withdrawal in withdrawals:
+            withdrawal.status = 'REJECTED'
+            withdrawal.processed_at = now
+
+        # Wallet credits: one UPDATE per distinct credit total
+        credits = defaultdict(Decimal)
+        for withdrawal in withdrawals:
+            credits[withdrawal.user_id] += withdrawal.amount
+        users_by_credit = defaultdict(list)
+        for user_id, total in credits.items():
+            users_by_credit[total].append(user_id)
+        for total, user_ids in users_by_credit.items():
+            User.objects.filter(id__in=user_ids).update(
+                wallet_balance=F('wallet_balance') + total,
+                updated_at=now
+            )
+        # Reverses the journal posted at approval
+        LedgerService.post_many(
+            (w.user_id, w.amount, 'WITHDRAWAL', w.transaction_id) for w in withdrawals
+        )
+
+        WithdrawalRequest.objects.bulk_update(
+            withdrawals, ['status', 'processed_at', 'remarks'], batch_size=BULK_BATCH_SIZE
+        )
+        for chunk in _chunks([w.transaction_id for w in withdrawals if w.transaction_id]):
+            Transaction.objects.filter(id__in=chunk).update(status='FAILED')
+        WithdrawalCounters.record_transitions(withdrawals, 'PROCESSING')
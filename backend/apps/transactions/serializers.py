@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from apps.transactions.models import Transaction, PaymentMethod, WithdrawalRequest
+from apps.transactions.models import Transaction, PaymentMethod, WithdrawalRequest, PayoutBatch
 from apps.users.serializers import UserSerializer
 from apps.lotteries.serializers import LotterySerializer
 
@@ -41,3 +41,14 @@ class WithdrawalRequestSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'id', 'user', 'status', 'requested_at', 'processed_at'
         ]
+
+
+class PayoutBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PayoutBatch
+        fields = [
+            'id', 'method', 'file_format', 'status', 'item_count', 'total_amount',
+            'settled_count', 'settled_amount', 'failed_count', 'created_by',
+            'created_at', 'reconciled_at'
+        ]
+        read_only_fields = fields
@@ -1,17 +1,29 @@
 """
 Service for withdrawal operations and validation.
 """
+import uuid
+from collections import defaultdict
 from decimal import Decimal
 from datetime import date, datetime, timedelta
 from django.utils import timezone
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import F, Q, Sum
 from django.conf import settings
 import logging
 
+from apps.common.exceptions import WithdrawalError
+from apps.transactions.ledger import LedgerService
 from apps.transactions.models import WithdrawalRequest, Transaction
+from apps.transactions.withdrawal_counters import WithdrawalCounters, COUNTED_STATUSES
+from apps.users.audit import record_audit
+from apps.users.models import User
 
 logger = logging.getLogger(__name__)
 
+BULK_MAX_ITEMS = 5000
+BULK_BATCH_SIZE = 1000
+NOTIFICATION_BATCH_SIZE = 500
+
 
 class WithdrawalService:
     """Service for handling withdrawal requests and validations."""
@@ -23,13 +35,14 @@ class WithdrawalService:
     MONTHLY_WITHDRAWAL_LIMIT = getattr(settings, 'WITHDRAWAL_MONTHLY_LIMIT', Decimal('5000.00'))
     
     @classmethod
-    def validate_withdrawal_request(cls, user, amount):
+    def validate_withdrawal_request(cls, user, amount, usage=None):
         """
         Validate a withdrawal request against all limits and rules.
         
         Args:
             user: User requesting withdrawal
             amount: Withdrawal amount
+            usage: Result of get_usage(user), if already loaded
             
         Returns:
             tuple: (is_valid: bool, error_message: str or None)
@@ -48,20 +61,58 @@ class WithdrawalService:
         if user.wallet_balance < amount:
             return False, 'Insufficient wallet balance'
         
+        if usage is None:
+            usage = cls.get_usage(user)
+        
         # Check daily limit
-        daily_total = cls.calculate_daily_withdrawals(user, timezone.now().date())
+        daily_total = usage['daily']
         if daily_total + amount > cls.DAILY_WITHDRAWAL_LIMIT:
             remaining = cls.DAILY_WITHDRAWAL_LIMIT - daily_total
             return False, f'Daily withdrawal limit exceeded. Remaining: ${remaining}'
         
         # Check monthly limit
-        monthly_total = cls.calculate_monthly_withdrawals(user, timezone.now().date())
+        monthly_total = usage['monthly']
         if monthly_total + amount > cls.MONTHLY_WITHDRAWAL_LIMIT:
             remaining = cls.MONTHLY_WITHDRAWAL_LIMIT - monthly_total
             return False, f'Monthly withdrawal limit exceeded. Remaining: ${remaining}'
         
         return True, None
     
+    @classmethod
+    def get_usage(cls, user):
+        """
+        Get a user's withdrawal usage for today and this month.
+        
+        Served from the withdrawal counters (which seed themselves from the
+        database on a miss), falling back to a single aggregate query when
+        Redis is unavailable.
+        
+        Args:
+            user: User to get usage for
+            
+        Returns:
+            dict: {'daily': Decimal, 'monthly': Decimal}
+        """
+        usage = WithdrawalCounters.get(user.id)
+        if usage is not None:
+            return usage
+        
+        today = timezone.localdate()
+        day_start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+        month_start = timezone.make_aware(datetime.combine(today.replace(day=1), datetime.min.time()))
+        totals = WithdrawalRequest.objects.filter(
+            user=user,
+            status__in=COUNTED_STATUSES,
+            requested_at__gte=month_start
+        ).aggregate(
+            daily=Sum('amount', filter=Q(requested_at__gte=day_start)),
+            monthly=Sum('amount')
+        )
+        return {
+            'daily': totals['daily'] or Decimal('0.00'),
+            'monthly': totals['monthly'] or Decimal('0.00'),
+        }
+    
     @classmethod
     def calculate_daily_withdrawals(cls, user, target_date=None):
         """
@@ -146,12 +197,13 @@ class WithdrawalService:
         errors = []
         amount = Decimal(str(amount))
         
-        is_valid, error = cls.validate_withdrawal_request(user, amount)
+        usage = cls.get_usage(user)
+        is_valid, error = cls.validate_withdrawal_request(user, amount, usage)
         if not is_valid:
             errors.append(error)
         
-        daily_total = cls.calculate_daily_withdrawals(user)
-        monthly_total = cls.calculate_monthly_withdrawals(user)
+        daily_total = usage['daily']
+        monthly_total = usage['monthly']
         
         limits_info = {
             'min_amount': cls.MIN_WITHDRAWAL_AMOUNT,
@@ -170,4 +222,237 @@ class WithdrawalService:
             'errors': errors,
             'limits': limits_info
         }
-
+    
+    @staticmethod
+    def _lock_withdrawals(withdrawal_ids, statuses, error):
+        """
+        Lock the withdrawals in `statuses` with one SELECT ... FOR UPDATE.
+        
+        Returns:
+            tuple: (locked withdrawals oldest first, failures for the
+            remaining IDs)
+        """
+        if len(withdrawal_ids) > BULK_MAX_ITEMS:
+            raise WithdrawalError(f'At most {BULK_MAX_ITEMS} withdrawals can be processed at once')
+        
+        failed = []
+        valid_ids = set()
+        for withdrawal_id in withdrawal_ids:
+            try:
+                valid_ids.add(uuid.UUID(str(withdrawal_id)))
+            except ValueError:
+                failed.append({'id': str(withdrawal_id), 'error': 'Invalid withdrawal ID'})
+        
+        withdrawals = list(
+            WithdrawalRequest.objects.select_for_update(of=('self',))
+            .select_related('user')
+            .only(
+                'id', 'user_id', 'amount', 'status', 'remarks', 'requested_at',
+                'processed_at', 'transaction_id', 'user__id', 'user__username'
+            )
+            .filter(id__in=valid_ids, status__in=statuses)
+            .order_by('requested_at')
+        )
+        found = {withdrawal.id for withdrawal in withdrawals}
+        failed.extend({'id': str(withdrawal_id), 'error': error} for withdrawal_id in valid_ids - found)
+        return withdrawals, failed
+    
+    @staticmethod
+    def _append_remarks(withdrawal, label, text):
+        if text:
+            withdrawal.remarks = f"{withdrawal.remarks}\n{label}: {text}" if withdrawal.remarks else f"{label}: {text}"
+    
+    @staticmethod
+    def _notify(withdrawals, status_message):
+        """Enqueue status emails in batches once the transaction commits."""
+        from apps.notifications.tasks import send_withdrawal_status_batch_task
+        
+        items = [[str(w.user_id), str(w.id), status_message] for w in withdrawals]
+        
+        def send_notifications():
+            for start in range(0, len(items), NOTIFICATION_BATCH_SIZE):
+                send_withdrawal_status_batch_task.delay(items[start:start + NOTIFICATION_BATCH_SIZE])
+        
+        if items:
+            transaction.on_commit(send_notifications)
+    
+    @staticmethod
+    def _refresh_dashboard():
+        """
+        Schedule a dashboard rebuild once the transaction commits.
+        
+        Bulk updates skip the post_save receiver that does this for single
+        withdrawals.
+        """
+        from apps.analytics.snapshots import DashboardSnapshotService
+        
+        transaction.on_commit(DashboardSnapshotService.request_refresh)
+    
+    @classmethod
+    @transaction.atomic
+    def bulk_approve(cls, withdrawal_ids, admin, admin_notes=''):
+        """
+        Approve many requested withdrawals and debit the wallets.
+        
+        Withdrawals a user's balance can't cover (oldest first) are
+        skipped and reported as failed.
+        
+        Args:
+            withdrawal_ids: WithdrawalRequest IDs
+            admin: Admin user approving
+            admin_notes: Notes appended to each withdrawal's remarks
+            
+        Returns:
+            dict: {'processed': list of IDs, 'failed': list of {id, error}}
+        """
+        now = timezone.now()
+        withdrawals, failed = cls._lock_withdrawals(
+            withdrawal_ids, ['REQUESTED'], 'Only requested withdrawals can be approved'
+        )
+        
+        balances = dict(
+            User.objects.select_for_update()
+            .filter(id__in={w.user_id for w in withdrawals})
+            .order_by('id')
+            .values_list('id', 'wallet_balance')
+        )
+        
+        approved = []
+        debits = defaultdict(Decimal)
+        for withdrawal in withdrawals:
+            if debits[withdrawal.user_id] + withdrawal.amount > balances[withdrawal.user_id]:
+                failed.append({'id': str(withdrawal.id), 'error': 'Insufficient wallet balance'})
+                continue
+            debits[withdrawal.user_id] += withdrawal.amount
+            withdrawal.status = 'APPROVED'
+            withdrawal.processed_at = now
+            cls._append_remarks(withdrawal, 'Admin Notes', admin_notes)
+            approved.append(withdrawal)
+        
+        # Wallet debits: one conditional UPDATE per distinct debit total
+        users_by_debit = defaultdict(list)
+        for user_id, total in debits.items():
+            if total:
+                users_by_debit[total].append(user_id)
+        for total, user_ids in users_by_debit.items():
+            updated = User.objects.filter(id__in=user_ids, wallet_balance__gte=total).update(
+                wallet_balance=F('wallet_balance') - total,
+                updated_at=now
+            )
+            if updated != len(user_ids):
+                # Rows are locked, so this only happens if a balance changed
+                # outside a transaction; roll the whole batch back
+                raise WithdrawalError('Wallet balances changed during bulk approval')
+        
+        LedgerService.post_many(
+            (w.user_id, -w.amount, 'WITHDRAWAL', w.transaction_id) for w in approved
+        )
+        WithdrawalRequest.objects.bulk_update(
+            approved, ['status', 'processed_at', 'remarks'], batch_size=BULK_BATCH_SIZE
+        )
+        Transaction.objects.filter(
+            id__in=[w.transaction_id for w in approved if w.transaction_id]
+        ).update(status='COMPLETED', completed_at=now)
+        WithdrawalCounters.record_transitions(approved, 'REQUESTED')
+        
+        for withdrawal in approved:
+            record_audit(
+                user=admin,
+                action='WITHDRAW',
+                description=f'Approved withdrawal of ${withdrawal.amount} for {withdrawal.user.username}',
+                resource_type='WithdrawalRequest',
+                resource_id=withdrawal.id
+            )
+        cls._notify(approved, 'Withdrawal approved')
+        if approved:
+            cls._refresh_dashboard()
+        
+        logger.info(f"Bulk approved {len(approved)} withdrawals, {len(failed)} failed")
+        return {'processed': [str(w.id) for w in approved], 'failed': failed}
+    
+    @classmethod
+    @transaction.atomic
+    def bulk_reject(cls, withdrawal_ids, admin, rejection_reason):
+        """
+        Reject many requested withdrawals.
+        
+        Args:
+            withdrawal_ids: WithdrawalRequest IDs
+            admin: Admin user rejecting
+            rejection_reason: Reason appended to each withdrawal's remarks
+            
+        Returns:
+            dict: {'processed': list of IDs, 'failed': list of {id, error}}
+        """
+        now = timezone.now()
+        withdrawals, failed = cls._lock_withdrawals(
+            withdrawal_ids, ['REQUESTED'], 'Only requested withdrawals can be rejected'
+        )
+        
+        for withdrawal in withdrawals:
+            withdrawal.status = 'REJECTED'
+            withdrawal.processed_at = now
+            cls._append_remarks(withdrawal, 'Rejection Reason', rejection_reason)
+        
+        WithdrawalRequest.objects.bulk_update(
+            withdrawals, ['status', 'processed_at', 'remarks'], batch_size=BULK_BATCH_SIZE
+        )
+        Transaction.objects.filter(
+            id__in=[w.transaction_id for w in withdrawals if w.transaction_id]
+        ).update(status='FAILED')
+        WithdrawalCounters.record_transitions(withdrawals, 'REQUESTED')
+        
+        for withdrawal in withdrawals:
+            record_audit(
+                user=admin,
+                action='WITHDRAW',
+                description=f'Rejected withdrawal of ${withdrawal.amount} for {withdrawal.user.username}. Reason: {rejection_reason}',
+                resource_type='WithdrawalRequest',
+                resource_id=withdrawal.id
+            )
+        cls._notify(withdrawals, f'Withdrawal rejected: {rejection_reason}')
+        
+        logger.info(f"Bulk rejected {len(withdrawals)} withdrawals, {len(failed)} failed")
+        return {'processed': [str(w.id) for w in withdrawals], 'failed': failed}
+    
+    @classmethod
+    @transaction.atomic
+    def bulk_process(cls, withdrawal_ids, new_status):
+        """
+        Mark many approved or processing withdrawals as PROCESSING or COMPLETED.
+        
+        Args:
+            withdrawal_ids: WithdrawalRequest IDs
+            new_status: 'PROCESSING' or 'COMPLETED'
+            
+        Returns:
+            dict: {'processed': list of IDs, 'failed': list of {id, error}}
+        """
+        if new_status not in ('PROCESSING', 'COMPLETED'):
+            raise WithdrawalError('Invalid status. Must be PROCESSING or COMPLETED')
+        
+        now = timezone.now()
+        withdrawals, failed = cls._lock_withdrawals(
+            withdrawal_ids, ['APPROVED', 'PROCESSING'],
+            'Withdrawal must be approved or processing to update status'
+        )
+        
+        for withdrawal in withdrawals:
+            withdrawal.status = new_status
+            if new_status == 'COMPLETED':
+                withdrawal.processed_at = now
+        
+        WithdrawalRequest.objects.bulk_update(
+            withdrawals, ['status', 'processed_at'], batch_size=BULK_BATCH_SIZE
+        )
+        if new_status == 'COMPLETED':
+            Transaction.objects.filter(
+                id__in=[w.transaction_id for w in withdrawals if w.transaction_id]
+            ).update(status='COMPLETED', completed_at=now)
+        
+        cls._notify(withdrawals, f'Withdrawal status updated to {new_status}')
+        if withdrawals and new_status == 'COMPLETED':
+            cls._refresh_dashboard()
+        
+        logger.info(f"Bulk marked {len(withdrawals)} withdrawals as {new_status}, {len(failed)} failed")
+        return {'processed': [str(w.id) for w in withdrawals], 'failed': failed}
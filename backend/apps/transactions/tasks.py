@@ -0,0 +1,59 @@
+"""
+Celery tasks for the wallet ledger and withdrawals.
+"""
+from celery import shared_task
+from apps.transactions.ledger import LedgerService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def build_wallet_snapshots_task():
+    """Roll recent ledger entries into the wallet balance snapshots."""
+    try:
+        count = LedgerService.build_snapshots()
+        return f"Updated {count} wallet balance snapshots"
+    except Exception as e:
+        logger.error(f"Error building wallet balance snapshots: {str(e)}")
+        raise
+
+
+@shared_task
+def reconcile_wallet_ledger_task():
+    """Compare ledger balances with user wallet balances."""
+    try:
+        result = LedgerService.reconcile()
+        return (
+            f"Checked {result['users_checked']} wallets, "
+            f"{len(result['mismatches'])} mismatches"
+        )
+    except Exception as e:
+        logger.error(f"Error reconciling wallet ledger: {str(e)}")
+        raise
+
+
+@shared_task
+def reconcile_withdrawal_counters_task():
+    """Rebuild withdrawal usage counters from withdrawal requests."""
+    from apps.transactions.withdrawal_counters import WithdrawalCounters
+
+    try:
+        count = WithdrawalCounters.reconcile()
+        return f"Reconciled withdrawal counters for {count} users"
+    except Exception as e:
+        logger.error(f"Error reconciling withdrawal counters: {str(e)}")
+        raise
+
+
+@shared_task
+def create_payout_batches_task():
+    """Export approved withdrawals as payout batches."""
+    from apps.transactions.payouts import PayoutBatchService
+
+    try:
+        batches = PayoutBatchService.create_batches()
+        return f"Created {len(batches)} payout batches with {sum(b.item_count for b in batches)} withdrawals"
+    except Exception as e:
+        logger.error(f"Error creating payout batches: {str(e)}")
+        raise
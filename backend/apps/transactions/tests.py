@@ -157,6 +157,27 @@ class WithdrawalRequestViewSetTestCase(TestCase):
         self.assertEqual(withdrawal.status, 'REJECTED')
 
 
+    def test_approve_rejects_overdraft(self):
+        """Test approval fails without side effects when the debit is rejected"""
+        transaction = Transaction.objects.create(
+            user=self.admin_user, type='WITHDRAWAL', amount=Decimal('50.00'), status='PENDING'
+        )
+        withdrawal = WithdrawalRequest.objects.create(
+            user=self.admin_user,
+            amount=Decimal('50.00'),
+            status='REQUESTED',
+            transaction=transaction
+        )
+
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(f'/api/withdrawals/{withdrawal.id}/approve/')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        withdrawal.refresh_from_db()
+        self.assertEqual(withdrawal.status, 'REQUESTED')
+        self.assertEqual(Transaction.objects.get(id=transaction.id).status, 'PENDING')
+
+
 class PaymentMethodViewSetTestCase(TestCase):
     """Test PaymentMethodViewSet"""
 
@@ -203,3 +224,517 @@ class PaymentMethodViewSetTestCase(TestCase):
         self.assertFalse(pm1.is_primary)
         self.assertTrue(pm2.is_primary)
 
+
+
+class LedgerServiceTestCase(TestCase):
+    """Test the double-entry wallet ledger"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='ledgeruser',
+            email='ledger@example.com',
+            password='TestPassword123'
+        )
+
+    def test_credit_and_debit_post_balanced_journals(self):
+        """Test every movement posts two legs that sum to zero"""
+        from django.db.models import Sum
+        from apps.transactions.models import LedgerEntry
+
+        self.assertTrue(self.user.add_balance(Decimal('50.00'), 'DEPOSIT'))
+        self.assertTrue(self.user.deduct_balance(Decimal('20.00'), 'TICKET_PURCHASE'))
+
+        self.assertEqual(LedgerEntry.objects.count(), 4)
+        self.assertEqual(LedgerEntry.objects.aggregate(total=Sum('amount'))['total'], Decimal('0.00'))
+        self.assertEqual(
+            set(LedgerEntry.objects.exclude(account='WALLET').values_list('account', flat=True)),
+            {'DEPOSITS', 'TICKET_SALES'}
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, Decimal('30.00'))
+
+    def test_debit_insufficient_balance(self):
+        """Test a debit larger than the balance posts nothing"""
+        from apps.transactions.models import LedgerEntry
+
+        self.user.add_balance(Decimal('10.00'), 'DEPOSIT')
+        self.assertFalse(self.user.deduct_balance(Decimal('25.00'), 'WITHDRAWAL'))
+
+        self.assertEqual(LedgerEntry.objects.filter(entry_type='WITHDRAWAL').count(), 0)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, Decimal('10.00'))
+
+    def test_get_balance_snapshot_plus_delta(self):
+        """Test ledger balance reads combine the snapshot with later entries"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.transactions.ledger import LedgerService
+        from apps.transactions.models import WalletBalanceSnapshot
+
+        self.user.add_balance(Decimal('40.00'), 'DEPOSIT')
+        self.assertEqual(LedgerService.build_snapshots(now=timezone.now() + timedelta(hours=1)), 1)
+        self.assertEqual(WalletBalanceSnapshot.objects.get(user=self.user).balance, Decimal('40.00'))
+
+        self.user.deduct_balance(Decimal('15.00'), 'TICKET_PURCHASE')
+        self.assertEqual(LedgerService.get_balance(self.user.id), Decimal('25.00'))
+
+    def test_reconcile_detects_drift(self):
+        """Test reconciliation flags wallets that disagree with the ledger"""
+        from apps.transactions.ledger import LedgerService
+
+        self.user.add_balance(Decimal('30.00'), 'DEPOSIT')
+        self.assertEqual(LedgerService.reconcile()['mismatches'], [])
+
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=Decimal('35.00'))
+        result = LedgerService.reconcile()
+        self.assertEqual(result['mismatches'], [(str(self.user.id), Decimal('30.00'), Decimal('35.00'))])
+        self.assertEqual(result['unbalanced_total'], Decimal('0.00'))
+
+
+class AdminRefundTestCase(TestCase):
+    """Test admin refunds of completed transactions"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='refunduser',
+            email='refund@example.com',
+            password='TestPassword123'
+        )
+        self.admin_user = User.objects.create_user(
+            username='refundadmin',
+            email='refundadmin@example.com',
+            password='AdminPassword123',
+            role='admin'
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        self.purchase = Transaction.objects.create(
+            user=self.user,
+            type='TICKET_PURCHASE',
+            amount=Decimal('20.00'),
+            status='COMPLETED'
+        )
+
+    def test_refund_ledger_points_at_refund_transaction(self):
+        """Test the refund journal references the REFUND transaction it pays out"""
+        from apps.transactions.models import LedgerEntry
+
+        response = self.client.post(f'/api/admin/transactions/{self.purchase.id}/refund/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        refund = Transaction.objects.get(type='REFUND', reference_id=str(self.purchase.id))
+        entries = LedgerEntry.objects.filter(entry_type='REFUND')
+        self.assertEqual(entries.count(), 2)
+        self.assertEqual(set(entries.values_list('transaction_id', flat=True)), {refund.id})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, Decimal('20.00'))
+
+    def test_second_refund_rejected(self):
+        """Test a transaction can only be refunded once"""
+        self.client.post(f'/api/admin/transactions/{self.purchase.id}/refund/')
+        response = self.client.post(f'/api/admin/transactions/{self.purchase.id}/refund/')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Transaction.objects.filter(type='REFUND').count(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, Decimal('20.00'))
+
+
+class WithdrawalCountersTestCase(TestCase):
+    """Test withdrawal limits served from usage counters"""
+
+    def setUp(self):
+        from apps.common.cache import get_redis_client
+        self.redis = get_redis_client()
+        self.redis.flushdb()
+        self.user = User.objects.create_user(
+            username='withdrawer',
+            email='withdrawer@example.com',
+            password='TestPassword123',
+            wallet_balance=Decimal('5000.00')
+        )
+
+    def tearDown(self):
+        self.redis.flushdb()
+
+    def test_fallback_usage_single_query(self):
+        """Test unseeded usage is read with one aggregate query"""
+        WithdrawalRequest.objects.create(user=self.user, amount=Decimal('200.00'), status='APPROVED')
+        WithdrawalRequest.objects.create(user=self.user, amount=Decimal('300.00'), status='REQUESTED')
+
+        with self.assertNumQueries(1):
+            usage = WithdrawalService.get_usage(self.user)
+        self.assertEqual(usage, {'daily': Decimal('200.00'), 'monthly': Decimal('200.00')})
+
+    def test_transitions_update_counters(self):
+        """Test approving and rejecting adjust usage and limits read no rows"""
+        from apps.transactions.withdrawal_counters import WithdrawalCounters
+
+        withdrawal = WithdrawalRequest.objects.create(user=self.user, amount=Decimal('900.00'), status='REQUESTED')
+        WithdrawalCounters.get(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            withdrawal.status = 'APPROVED'
+            withdrawal.save()
+            WithdrawalCounters.record_transition(withdrawal, 'REQUESTED')
+
+        with self.assertNumQueries(0):
+            result = WithdrawalService.check_withdrawal_limits(self.user, Decimal('150.00'))
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['limits']['daily_used'], Decimal('900.00'))
+        self.assertEqual(result['limits']['daily_remaining'], Decimal('100.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            withdrawal.status = 'REJECTED'
+            withdrawal.save()
+            WithdrawalCounters.record_transition(withdrawal, 'APPROVED')
+        self.assertEqual(WithdrawalCounters.get(self.user.id)['monthly'], Decimal('0.00'))
+
+    def test_reconcile_rebuilds_usage(self):
+        """Test reconciliation replaces drifted counters"""
+        from django.utils import timezone
+        from apps.transactions.withdrawal_counters import WithdrawalCounters
+
+        WithdrawalCounters.record_many([(self.user.id, timezone.now(), 99900)])
+        WithdrawalRequest.objects.create(user=self.user, amount=Decimal('40.00'), status='COMPLETED')
+
+        self.assertEqual(WithdrawalCounters.reconcile(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                WithdrawalCounters.get(self.user.id),
+                {'daily': Decimal('40.00'), 'monthly': Decimal('40.00')}
+            )
+
+    def test_evicted_window_not_read_as_zero(self):
+        """Test a window recreated by increments after eviction is reseeded"""
+        from django.utils import timezone
+        from apps.common.cache import CacheKeys
+        from apps.transactions.withdrawal_counters import WithdrawalCounters
+
+        WithdrawalRequest.objects.create(user=self.user, amount=Decimal('800.00'), status='APPROVED')
+        WithdrawalCounters.get(self.user.id)
+
+        self.redis.delete(CacheKeys.withdrawal_window(self.user.id, 'day', timezone.localdate().isoformat()))
+        withdrawal = WithdrawalRequest.objects.create(user=self.user, amount=Decimal('100.00'), status='APPROVED')
+        WithdrawalCounters.record_many([(self.user.id, withdrawal.requested_at, 10000)])
+
+        result = WithdrawalService.check_withdrawal_limits(self.user, Decimal('150.00'))
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['limits']['daily_used'], Decimal('900.00'))
+
+    def test_reconcile_keeps_concurrent_changes(self):
+        """Test transitions recorded while reconcile sums withdrawals are kept"""
+        from unittest.mock import patch
+        from django.utils import timezone
+        from apps.transactions.withdrawal_counters import WithdrawalCounters
+
+        WithdrawalCounters.get(self.user.id)
+        WithdrawalRequest.objects.create(user=self.user, amount=Decimal('40.00'), status='COMPLETED')
+        totals = WithdrawalCounters._totals
+
+        def totals_with_concurrent_approval(*args, **kwargs):
+            result = totals(*args, **kwargs)
+            WithdrawalCounters.record_many([(self.user.id, timezone.now(), 2500)])
+            return result
+
+        with patch.object(WithdrawalCounters, '_totals', side_effect=totals_with_concurrent_approval):
+            WithdrawalCounters.reconcile()
+
+        self.assertEqual(WithdrawalCounters.get(self.user.id)['daily'], Decimal('65.00'))
+
+
+class BulkWithdrawalTestCase(TestCase):
+    """Test bulk admin withdrawal processing"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            username='finance',
+            email='finance@example.com',
+            password='AdminPassword123',
+            role='admin'
+        )
+        self.user = User.objects.create_user(
+            username='payee',
+            email='payee@example.com',
+            password='TestPassword123',
+            wallet_balance=Decimal('100.00')
+        )
+        self.withdrawals = []
+        for amount in ('40.00', '50.00', '30.00'):
+            transaction = Transaction.objects.create(
+                user=self.user, type='WITHDRAWAL', amount=Decimal(amount), status='PENDING'
+            )
+            self.withdrawals.append(WithdrawalRequest.objects.create(
+                user=self.user, amount=Decimal(amount), status='REQUESTED', transaction=transaction
+            ))
+
+    def test_bulk_approve_debits_covered_withdrawals(self):
+        """Test oldest withdrawals are approved until the balance runs out"""
+        from django.db.models import Sum
+        from apps.transactions.models import LedgerEntry
+
+        ids = [str(w.id) for w in self.withdrawals] + ['not-a-uuid']
+        with self.captureOnCommitCallbacks(execute=True):
+            result = WithdrawalService.bulk_approve(ids, self.admin_user, 'Payout run')
+
+        self.assertEqual(result['processed'], [str(w.id) for w in self.withdrawals[:2]])
+        self.assertEqual(
+            {(f['id'], f['error']) for f in result['failed']},
+            {(str(self.withdrawals[2].id), 'Insufficient wallet balance'), ('not-a-uuid', 'Invalid withdrawal ID')}
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, Decimal('10.00'))
+        self.assertEqual(
+            LedgerEntry.objects.filter(account='WALLET', entry_type='WITHDRAWAL').aggregate(total=Sum('amount'))['total'],
+            Decimal('-90.00')
+        )
+        self.assertEqual(
+            list(WithdrawalRequest.objects.order_by('requested_at').values_list('status', flat=True)),
+            ['APPROVED', 'APPROVED', 'REQUESTED']
+        )
+        self.assertEqual(Transaction.objects.filter(status='COMPLETED').count(), 2)
+        self.assertIn('Admin Notes: Payout run', WithdrawalRequest.objects.get(id=self.withdrawals[0].id).remarks)
+
+    def test_bulk_reject_and_process(self):
+        """Test bulk reject and bulk completion"""
+        first, second, third = self.withdrawals
+        result = WithdrawalService.bulk_reject([str(first.id)], self.admin_user, 'Duplicate')
+        self.assertEqual(result['processed'], [str(first.id)])
+        self.assertEqual(Transaction.objects.get(id=first.transaction_id).status, 'FAILED')
+
+        WithdrawalService.bulk_approve([str(second.id)], self.admin_user)
+        result = WithdrawalService.bulk_process([str(second.id), str(third.id)], 'COMPLETED')
+        self.assertEqual(result['processed'], [str(second.id)])
+        self.assertEqual(len(result['failed']), 1)
+        self.assertEqual(WithdrawalRequest.objects.get(id=second.id).status, 'COMPLETED')
+
+    def test_bulk_approve_and_complete_refresh_dashboard(self):
+        """Test bulk approvals and completions schedule one dashboard refresh each"""
+        from unittest.mock import patch
+        from apps.analytics.snapshots import DashboardSnapshotService
+
+        ids = [str(w.id) for w in self.withdrawals[:2]]
+        with patch.object(DashboardSnapshotService, 'request_refresh') as request_refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                WithdrawalService.bulk_approve(ids, self.admin_user)
+            self.assertEqual(request_refresh.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                WithdrawalService.bulk_process(ids, 'PROCESSING')
+            self.assertEqual(request_refresh.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                WithdrawalService.bulk_process(ids, 'COMPLETED')
+            self.assertEqual(request_refresh.call_count, 2)
+
+    def test_bulk_approve_endpoint(self):
+        """Test the bulk approve endpoint"""
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            '/api/withdrawals/bulk_approve/',
+            {'ids': [str(self.withdrawals[0].id)]},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['processed'], 1)
+
+        response = self.client.post('/api/withdrawals/bulk_approve/', {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PayoutBatchTestCase(TestCase):
+    """Test payout batch export and settlement reconciliation"""
+
+    def setUp(self):
+        import tempfile
+
+        self.export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.export_dir.cleanup)
+
+        self.client = APIClient()
+        self.admin_user = User.objects.create_user(
+            username='payouts',
+            email='payouts@example.com',
+            password='AdminPassword123',
+            role='admin'
+        )
+        self.first = User.objects.create_user(
+            username='firstpayee',
+            email='firstpayee@example.com',
+            password='TestPassword123'
+        )
+        self.second = User.objects.create_user(
+            username='secondpayee',
+            email='secondpayee@example.com',
+            password='TestPassword123'
+        )
+        net_banking = PaymentMethod.objects.create(
+            user=self.first,
+            method_type='NET_BANKING',
+            payment_details={'account_number': '111222', 'routing_number': 'RT01'}
+        )
+        bank_details = {'account_name': 'Payee', 'account_number': '333444', 'routing_number': 'RT02'}
+        self.card_withdrawal = self._approved(self.first, '40.00', payment_method=net_banking)
+        self.bank_withdrawals = [
+            self._approved(self.first, '30.00', bank_details=bank_details),
+            self._approved(self.second, '20.00', bank_details=bank_details),
+        ]
+        self.requested = WithdrawalRequest.objects.create(user=self.second, amount=Decimal('15.00'), status='REQUESTED')
+
+    def _approved(self, user, amount, **kwargs):
+        transaction = Transaction.objects.create(
+            user=user, type='WITHDRAWAL', amount=Decimal(amount), status='COMPLETED'
+        )
+        return WithdrawalRequest.objects.create(
+            user=user, amount=Decimal(amount), status='APPROVED', transaction=transaction, **kwargs
+        )
+
+    def _export(self, file_format='CSV'):
+        from apps.transactions.payouts import PayoutBatchService
+
+        with self.captureOnCommitCallbacks(execute=True):
+            batches = PayoutBatchService.create_batches(file_format=file_format, export_dir=self.export_dir.name)
+        return {batch.method: batch for batch in batches}
+
+    def _settlement(self, lines):
+        return ['withdrawal_id,amount,status,reason\n'] + [','.join(line) + '\n' for line in lines]
+
+    def test_create_batches_groups_by_method(self):
+        """Test approved withdrawals are exported per method and marked processing"""
+        import csv
+        from apps.transactions.payouts import PayoutBatchService
+
+        batches = self._export()
+
+        self.assertEqual(set(batches), {'NET_BANKING', 'BANK_TRANSFER'})
+        bank_batch = batches['BANK_TRANSFER']
+        self.assertEqual(bank_batch.item_count, 2)
+        self.assertEqual(bank_batch.total_amount, Decimal('50.00'))
+        self.assertEqual(
+            set(WithdrawalRequest.objects.filter(payout_batch=bank_batch).values_list('status', flat=True)),
+            {'PROCESSING'}
+        )
+        self.assertEqual(WithdrawalRequest.objects.get(id=self.requested.id).status, 'REQUESTED')
+
+        with open(bank_batch.file_path, newline='') as payout_file:
+            rows = list(csv.DictReader(payout_file))
+        self.assertEqual(
+            [row['withdrawal_id'] for row in rows],
+            [str(w.id) for w in self.bank_withdrawals]
+        )
+        self.assertEqual(rows[0]['account_number'], '333444')
+        with open(batches['NET_BANKING'].file_path, newline='') as payout_file:
+            self.assertEqual(next(csv.DictReader(payout_file))['routing_number'], 'RT01')
+
+        # Exported withdrawals aren't picked up again
+        self.assertEqual(PayoutBatchService.create_batches(export_dir=self.export_dir.name), [])
+
+    def test_bank_file_format(self):
+        """Test the fixed-width bank file has a control trailer"""
+        batch = self._export('BANK')['BANK_TRANSFER']
+
+        with open(batch.file_path) as payout_file:
+            lines = payout_file.read().splitlines()
+        self.assertEqual([line[0] for line in lines], ['H', 'D', 'D', 'T'])
+        self.assertEqual(lines[1][1:33], self.bank_withdrawals[0].id.hex)
+        self.assertEqual(lines[1][33:45], '000000003000')
+        self.assertEqual(lines[-1], 'T00000002' + '00000000005000')
+
+    def test_reconcile_settles_and_returns_failed_payouts(self):
+        """Test paid rows complete and returned payouts go back to the wallet"""
+        from unittest.mock import patch
+        from apps.analytics.snapshots import DashboardSnapshotService
+        from apps.transactions.models import LedgerEntry
+        from apps.transactions.payouts import PayoutBatchService
+
+        batch = self._export()['BANK_TRANSFER']
+        paid, returned = self.bank_withdrawals
+        with patch.object(DashboardSnapshotService, 'request_refresh') as request_refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = PayoutBatchService.reconcile(batch.id, self._settlement([
+                    (paid.id.hex, '30', 'PAID', ''),
+                    (str(returned.id), '20.00', 'RETURNED', 'Account closed'),
+                    (str(uuid.uuid4()), '10.00', 'PAID', ''),
+                ]))
+        request_refresh.assert_called_once()
+
+        self.assertEqual(result['settled'], [str(paid.id)])
+        self.assertEqual(result['failed'], [str(returned.id)])
+        self.assertEqual(len(result['unknown']), 1)
+        self.assertEqual(result['outstanding'], 0)
+
+        self.assertEqual(WithdrawalRequest.objects.get(id=paid.id).status, 'COMPLETED')
+        returned.refresh_from_db()
+        self.assertEqual(returned.status, 'REJECTED')
+        self.assertIn('Payout Failed: Account closed', returned.remarks)
+        self.assertEqual(Transaction.objects.get(id=returned.transaction_id).status, 'FAILED')
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.wallet_balance, Decimal('20.00'))
+        self.assertTrue(
+            LedgerEntry.objects.filter(user=self.second, account='WALLET', amount=Decimal('20.00')).exists()
+        )
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'RECONCILED')
+        self.assertEqual((batch.settled_count, batch.failed_count), (1, 1))
+        self.assertEqual(batch.settled_amount, Decimal('30.00'))
+
+    def test_reconcile_reports_mismatches(self):
+        """Test mismatched lines stay processing for a later settlement file"""
+        from apps.common.exceptions import WithdrawalError
+        from apps.transactions.payouts import PayoutBatchService
+
+        batch = self._export()['BANK_TRANSFER']
+        first, second = self.bank_withdrawals
+        result = PayoutBatchService.reconcile(batch.id, self._settlement([
+            (str(first.id), '31.00', 'PAID', ''),
+            (str(second.id), '20.00', 'PAID', ''),
+        ]))
+
+        self.assertEqual(result['mismatched'], [
+            {'id': str(first.id), 'error': 'Settled amount 31.00 does not match 30.00'}
+        ])
+        self.assertEqual(result['outstanding'], 1)
+        self.assertEqual(WithdrawalRequest.objects.get(id=first.id).status, 'PROCESSING')
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'PARTIALLY_RECONCILED')
+
+        result = PayoutBatchService.reconcile(batch.id, self._settlement([(str(first.id), '30.00', 'SETTLED', '')]))
+        self.assertEqual(result['outstanding'], 0)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.settled_count), ('RECONCILED', 2))
+
+        with self.assertRaises(WithdrawalError):
+            PayoutBatchService.reconcile(batch.id, ['withdrawal_id,amount\n'])
+
+    def test_payout_batch_endpoints(self):
+        """Test export, download and settlement upload endpoints"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+
+        self.client.force_authenticate(user=self.admin_user)
+        with override_settings(PAYOUT_EXPORT_DIR=self.export_dir.name):
+            response = self.client.post('/api/admin/payout-batches/export/', {'format': 'csv'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['batches']), 2)
+
+        batch = next(b for b in response.data['batches'] if b['method'] == 'BANK_TRANSFER')
+        response = self.client.get(f"/api/admin/payout-batches/{batch['id']}/download/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(str(self.bank_withdrawals[0].id), b''.join(response.streaming_content).decode())
+
+        settlement = ''.join(self._settlement([(str(w.id), str(w.amount), 'PAID', '') for w in self.bank_withdrawals]))
+        response = self.client.post(
+            f"/api/admin/payout-batches/{batch['id']}/reconcile/",
+            {'file': SimpleUploadedFile('settlement.csv', settlement.encode())},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['settled'], 2)
+        self.assertEqual(response.data['batch']['status'], 'RECONCILED')
+
+        self.client.force_authenticate(user=self.first)
+        response = self.client.get('/api/admin/payout-batches/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from apps.transactions.views import (
     TransactionViewSet, PaymentMethodViewSet, WithdrawalRequestViewSet,
-    AdminTransactionViewSet
+    AdminTransactionViewSet, PayoutBatchViewSet
 )
 
 router = DefaultRouter()
@@ -10,6 +10,7 @@ router.register(r'transactions', TransactionViewSet, basename='transaction')
 router.register(r'payment-methods', PaymentMethodViewSet, basename='payment-method')
 router.register(r'withdrawals', WithdrawalRequestViewSet, basename='withdrawal')
 router.register(r'admin/transactions', AdminTransactionViewSet, basename='admin-transaction')
+router.register(r'admin/payout-batches', PayoutBatchViewSet, basename='payout-batch')
 
 urlpatterns = [
     path('', include(router.urls)),
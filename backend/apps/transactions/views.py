@@ -2,16 +2,23 @@ from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+import io
+import os
+from django.db import transaction as db_transaction
 from django.db.models import Sum, Q
+from django.http import FileResponse
 from django.utils import timezone
 
-from apps.transactions.models import Transaction, PaymentMethod, WithdrawalRequest
+from apps.transactions.models import Transaction, PaymentMethod, WithdrawalRequest, PayoutBatch
+from apps.transactions.payouts import PayoutBatchService
 from apps.transactions.serializers import (
     TransactionSerializer, PaymentMethodSerializer,
-    WithdrawalRequestSerializer
+    WithdrawalRequestSerializer, PayoutBatchSerializer
 )
 from apps.transactions.services import WithdrawalService
-from apps.users.models import AuditLog
+from apps.transactions.withdrawal_counters import WithdrawalCounters
+from apps.common.exceptions import WithdrawalError
+from apps.users.audit import record_audit
 from apps.users.permissions import IsAdminUser
 from apps.notifications.tasks import send_withdrawal_status_task as send_withdrawal_status_email
 
@@ -125,7 +132,7 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             serializer.save(user=request.user)
-            AuditLog.objects.create(
+            record_audit(
                 user=request.user,
                 action='DEPOSIT',
                 description=f'Added payment method: {serializer.data["name"]}'
@@ -140,7 +147,7 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
         PaymentMethod.objects.filter(user=request.user).update(is_primary=False)
         payment_method.is_primary = True
         payment_method.save()
-        AuditLog.objects.create(
+        record_audit(
             user=request.user,
             action='WITHDRAW',
             description=f'Set primary payment method: {payment_method.name}'
@@ -231,7 +238,7 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
         withdrawal.save()
 
         # Log action
-        AuditLog.objects.create(
+        record_audit(
             user=user,
             action='WITHDRAW',
             description=f'Withdrawal request for ${amount}'
@@ -249,33 +256,42 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
     def approve(self, request, pk=None):
         """Approve withdrawal (admin only)"""
         withdrawal = self.get_object()
+        admin_notes = request.data.get('admin_notes', '')
 
-        if withdrawal.status != 'REQUESTED':
-            return Response(
-                {'error': 'Only requested withdrawals can be approved'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        with db_transaction.atomic():
+            # Lock the request so concurrent approvals can't both debit it
+            withdrawal = WithdrawalRequest.objects.select_for_update().select_related('user').get(pk=withdrawal.pk)
 
-        admin_notes = request.data.get('admin_notes', '')
+            if withdrawal.status != 'REQUESTED':
+                return Response(
+                    {'error': 'Only requested withdrawals can be approved'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
-        # Deduct from user wallet
-        withdrawal.user.deduct_balance(withdrawal.amount)
+            # Deduct from user wallet; the balance check is enforced in SQL
+            if not withdrawal.user.deduct_balance(withdrawal.amount, 'WITHDRAWAL', withdrawal.transaction_id):
+                return Response(
+                    {'error': 'Insufficient wallet balance'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
-        # Update withdrawal
-        withdrawal.status = 'APPROVED'
-        withdrawal.processed_at = timezone.now()
-        if admin_notes:
-            withdrawal.remarks = f"{withdrawal.remarks}\nAdmin Notes: {admin_notes}" if withdrawal.remarks else f"Admin Notes: {admin_notes}"
-        withdrawal.save()
+            # Update withdrawal
+            old_status = withdrawal.status
+            withdrawal.status = 'APPROVED'
+            withdrawal.processed_at = timezone.now()
+            if admin_notes:
+                withdrawal.remarks = f"{withdrawal.remarks}\nAdmin Notes: {admin_notes}" if withdrawal.remarks else f"Admin Notes: {admin_notes}"
+            withdrawal.save()
+            WithdrawalCounters.record_transition(withdrawal, old_status)
 
-        # Update transaction
-        if withdrawal.transaction:
-            withdrawal.transaction.status = 'COMPLETED'
-            withdrawal.transaction.completed_at = timezone.now()
-            withdrawal.transaction.save()
+            # Update transaction
+            if withdrawal.transaction:
+                withdrawal.transaction.status = 'COMPLETED'
+                withdrawal.transaction.completed_at = timezone.now()
+                withdrawal.transaction.save()
 
         # Log action
-        AuditLog.objects.create(
+        record_audit(
             user=request.user,
             action='WITHDRAW',
             description=f'Approved withdrawal of ${withdrawal.amount} for {withdrawal.user.username}'
@@ -308,10 +324,12 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
             )
 
         # Update withdrawal
+        old_status = withdrawal.status
         withdrawal.status = 'REJECTED'
         withdrawal.processed_at = timezone.now()
         withdrawal.remarks = f"{withdrawal.remarks}\nRejection Reason: {rejection_reason}" if withdrawal.remarks else f"Rejection Reason: {rejection_reason}"
         withdrawal.save()
+        WithdrawalCounters.record_transition(withdrawal, old_status)
 
         # Update transaction
         if withdrawal.transaction:
@@ -319,7 +337,7 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
             withdrawal.transaction.save()
 
         # Log action
-        AuditLog.objects.create(
+        record_audit(
             user=request.user,
             action='WITHDRAW',
             description=f'Rejected withdrawal of ${withdrawal.amount} for {withdrawal.user.username}. Reason: {rejection_reason}'
@@ -351,6 +369,7 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        old_status = withdrawal.status
         withdrawal.status = new_status
         if new_status == 'COMPLETED':
             withdrawal.processed_at = timezone.now()
@@ -359,6 +378,7 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
                 withdrawal.transaction.completed_at = timezone.now()
                 withdrawal.transaction.save()
         withdrawal.save()
+        WithdrawalCounters.record_transition(withdrawal, old_status)
         
         # Send email notification
         send_withdrawal_status_email.delay(str(withdrawal.user.id), str(withdrawal.id), f'Withdrawal status updated to {new_status}')
@@ -368,6 +388,75 @@ class WithdrawalRequestViewSet(viewsets.ModelViewSet):
             'withdrawal': WithdrawalRequestSerializer(withdrawal).data
         })
     
+    def _bulk_ids(self, request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return None
+        return ids
+
+    def _bulk_response(self, result):
+        return Response({
+            'processed': len(result['processed']),
+            'failed': len(result['failed']),
+            'processed_ids': result['processed'],
+            'errors': result['failed'],
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_approve(self, request):
+        """Approve a list of withdrawals (admin only)"""
+        ids = self._bulk_ids(request)
+        if ids is None:
+            return Response(
+                {'error': 'ids must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            result = WithdrawalService.bulk_approve(ids, request.user, request.data.get('admin_notes', ''))
+        except WithdrawalError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self._bulk_response(result)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_reject(self, request):
+        """Reject a list of withdrawals (admin only)"""
+        ids = self._bulk_ids(request)
+        if ids is None:
+            return Response(
+                {'error': 'ids must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rejection_reason = request.data.get('rejection_reason', '')
+        if not rejection_reason:
+            return Response(
+                {'error': 'Rejection reason is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            result = WithdrawalService.bulk_reject(ids, request.user, rejection_reason)
+        except WithdrawalError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self._bulk_response(result)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_process(self, request):
+        """Mark a list of withdrawals as processing or completed (admin only)"""
+        ids = self._bulk_ids(request)
+        if ids is None:
+            return Response(
+                {'error': 'ids must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            result = WithdrawalService.bulk_process(ids, request.data.get('status', 'PROCESSING'))
+        except WithdrawalError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self._bulk_response(result)
+
     @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
     def admin_list(self, request):
         """List all withdrawals for admin with filters"""
@@ -461,31 +550,41 @@ class AdminTransactionViewSet(viewsets.ReadOnlyModelViewSet):
     def refund(self, request, pk=None):
         """Process refund for a transaction"""
         transaction = self.get_object()
-        
-        if transaction.status != 'COMPLETED':
-            return Response(
-                {'error': 'Only completed transactions can be refunded'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         reason = request.data.get('reason', 'Admin refund')
         
-        # Refund amount to user
-        transaction.user.add_balance(transaction.amount)
-        
-        # Create refund transaction
-        refund_transaction = Transaction.objects.create(
-            user=transaction.user,
-            type='REFUND',
-            amount=transaction.amount,
-            status='COMPLETED',
-            description=f'Refund for transaction {transaction.id}: {reason}',
-            reference_id=str(transaction.id)
-        )
+        with db_transaction.atomic():
+            # Lock the original so concurrent refunds of it serialize here
+            transaction = Transaction.objects.select_for_update().select_related('user').get(
+                pk=transaction.pk
+            )
+            
+            if transaction.status != 'COMPLETED':
+                return Response(
+                    {'error': 'Only completed transactions can be refunded'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            if Transaction.objects.filter(type='REFUND', reference_id=str(transaction.id)).exists():
+                return Response(
+                    {'error': 'Transaction has already been refunded'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Create refund transaction first so the ledger entries point at it
+            refund_transaction = Transaction.objects.create(
+                user=transaction.user,
+                type='REFUND',
+                amount=transaction.amount,
+                status='COMPLETED',
+                description=f'Refund for transaction {transaction.id}: {reason}',
+                reference_id=str(transaction.id)
+            )
+            
+            # Refund amount to user
+            transaction.user.add_balance(transaction.amount, 'REFUND', refund_transaction.id)
         
         # Log action
-        from apps.users.models import AuditLog
-        AuditLog.objects.create(
+        record_audit(
             user=request.user,
             action='WITHDRAWAL',  # Reusing action
             description=f'Refunded transaction {transaction.id} for user {transaction.user.username}. Reason: {reason}'
@@ -495,3 +594,76 @@ class AdminTransactionViewSet(viewsets.ReadOnlyModelViewSet):
             'message': 'Refund processed successfully',
             'refund_transaction': TransactionSerializer(refund_transaction).data
         })
+
+
+class PayoutBatchViewSet(viewsets.ReadOnlyModelViewSet):
+    """Admin payout batches for approved withdrawals"""
+    queryset = PayoutBatch.objects.all()
+    serializer_class = PayoutBatchSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = PageNumberPagination
+
+    def get_queryset(self):
+        queryset = PayoutBatch.objects.all()
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset.order_by('-created_at')
+
+    @action(detail=False, methods=['post'])
+    def export(self, request):
+        """Export all approved withdrawals as payout batches, one per payment method"""
+        try:
+            batches = PayoutBatchService.create_batches(
+                admin=request.user,
+                file_format=request.data.get('format')
+            )
+        except WithdrawalError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'message': f'Created {len(batches)} payout batches',
+            'batches': PayoutBatchSerializer(batches, many=True).data
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download the payout file"""
+        batch = self.get_object()
+        if not batch.file_path or not os.path.exists(batch.file_path):
+            return Response(
+                {'error': 'Payout file not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return FileResponse(
+            open(batch.file_path, 'rb'),
+            as_attachment=True,
+            filename=os.path.basename(batch.file_path)
+        )
+
+    @action(detail=True, methods=['post'])
+    def reconcile(self, request, pk=None):
+        """Reconcile an uploaded settlement file against the batch"""
+        batch = self.get_object()
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'Settlement file is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        settlement = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            result = PayoutBatchService.reconcile(batch.id, settlement, admin=request.user)
+        except (WithdrawalError, UnicodeDecodeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        batch.refresh_from_db()
+        return Response({
+            'batch': PayoutBatchSerializer(batch).data,
+            'settled': len(result['settled']),
+            'failed': len(result['failed']),
+            'outstanding': result['outstanding'],
+            'mismatched': result['mismatched'],
+            'unknown': result['unknown'],
+        })
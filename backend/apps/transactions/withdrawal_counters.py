@@ -0,0 +1,252 @@
+"""
+Per-user withdrawal usage per day and month, kept in Redis.
+
+Withdrawal limits count requests in APPROVED, PROCESSING or COMPLETED
+status, bucketed by the day they were requested. Status transitions into
+or out of that set adjust one hash per window (see `record_transition`),
+so limit checks and the limits endpoint read usage in one round trip
+instead of running SUM queries over `withdrawal_requests`.
+
+Each window hash carries a `ready` field once it has been seeded from
+`WithdrawalRequest`. A hash without it (never seeded, expired or evicted)
+is never read as zero usage: `get` seeds it from the database first, so
+limits fail closed. `reconcile_withdrawal_counters_task` corrects drift in
+the existing hashes nightly.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.common.cache import CacheKeys, COUNTER_READY_FIELD, apply_counter_totals, get_redis_client
+from apps.transactions.models import WithdrawalRequest
+
+logger = logging.getLogger(__name__)
+
+COUNTED_STATUSES = ('APPROVED', 'PROCESSING', 'COMPLETED')
+WINDOW_TTLS = {
+    'day': 2 * 24 * 3600,
+    'month': 32 * 24 * 3600,
+}
+FIELD = 'amount_cents'
+RECONCILE_CHUNK_SIZE = 5000
+
+
+def _to_cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1')))
+
+
+def _buckets(day):
+    return {'day': day.isoformat(), 'month': day.replace(day=1).isoformat()}
+
+
+class WithdrawalCounters:
+    """Redis-backed withdrawal usage per user and window."""
+
+    @staticmethod
+    def record_transition(withdrawal, old_status):
+        """
+        Adjust usage after a withdrawal changed status.
+
+        Applied when the surrounding transaction commits; transitions that
+        don't enter or leave a counted status are ignored.
+
+        Args:
+            withdrawal: WithdrawalRequest with its new status
+            old_status: Status before the change
+        """
+        was_counted = old_status in COUNTED_STATUSES
+        is_counted = withdrawal.status in COUNTED_STATUSES
+        if was_counted == is_counted:
+            return
+
+        cents = _to_cents(withdrawal.amount)
+        event = (withdrawal.user_id, withdrawal.requested_at, cents if is_counted else -cents)
+        transaction.on_commit(lambda: WithdrawalCounters.record_many([event]))
+
+    @staticmethod
+    def record_transitions(withdrawals, old_status):
+        """
+        Adjust usage after many withdrawals moved from the same status.
+
+        Args:
+            withdrawals: WithdrawalRequests with their new status
+            old_status: Status they all had before the change
+        """
+        was_counted = old_status in COUNTED_STATUSES
+        events = []
+        for withdrawal in withdrawals:
+            is_counted = withdrawal.status in COUNTED_STATUSES
+            if was_counted == is_counted:
+                continue
+            cents = _to_cents(withdrawal.amount)
+            events.append((withdrawal.user_id, withdrawal.requested_at, cents if is_counted else -cents))
+        if events:
+            transaction.on_commit(lambda: WithdrawalCounters.record_many(events))
+
+    @staticmethod
+    def record_many(events):
+        """
+        Apply usage changes.
+
+        Args:
+            events: Iterable of (user_id, requested_at, signed cents)
+        """
+        client = get_redis_client()
+        if client is None:
+            return
+
+        try:
+            pipe = client.pipeline(transaction=False)
+            for user_id, requested_at, cents in events:
+                for window, bucket in _buckets(timezone.localdate(requested_at)).items():
+                    key = CacheKeys.withdrawal_window(user_id, window, bucket)
+                    pipe.hincrby(key, FIELD, cents)
+                    pipe.expire(key, WINDOW_TTLS[window])
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to update withdrawal counters: {str(e)}")
+
+    @staticmethod
+    def get(user_id, now=None):
+        """
+        Get a user's withdrawal usage for today and this month.
+
+        Windows that haven't been seeded are filled from the database first.
+
+        Args:
+            user_id: User ID
+            now: Reference time (defaults to now)
+
+        Returns:
+            dict: {'daily': Decimal, 'monthly': Decimal}, or None if Redis
+            is unavailable and the caller should fall back to the database
+        """
+        client = get_redis_client()
+        if client is None:
+            return None
+
+        today = timezone.localdate(now or timezone.now())
+        buckets = _buckets(today)
+        keys = {window: CacheKeys.withdrawal_window(user_id, window, bucket) for window, bucket in buckets.items()}
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key in keys.values():
+                pipe.hmget(key, FIELD, COUNTER_READY_FIELD)
+            (daily, daily_ready), (monthly, monthly_ready) = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to read withdrawal counters for user {user_id}: {str(e)}")
+            return None
+
+        if daily_ready is None or monthly_ready is None:
+            seen = {keys['day']: daily, keys['month']: monthly}
+            return WithdrawalCounters._seed(client, user_id, today, keys, seen)
+
+        return {
+            'daily': Decimal(int(daily or 0)) / 100,
+            'monthly': Decimal(int(monthly or 0)) / 100,
+        }
+
+    @staticmethod
+    def _seed(client, user_id, today, keys, seen):
+        """Fill a user's windows from the database and return the usage."""
+        totals, _ = WithdrawalCounters._totals(today, user_id=user_id)
+        try:
+            pipe = client.pipeline(transaction=False)
+            for window, key in keys.items():
+                apply_counter_totals(
+                    pipe, key, {FIELD: totals.get(key, 0)}, {FIELD: seen[key]}, WINDOW_TTLS[window], seed=True
+                )
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to seed withdrawal counters for user {user_id}: {str(e)}")
+
+        return {
+            'daily': Decimal(totals.get(keys['day'], 0)) / 100,
+            'monthly': Decimal(totals.get(keys['month'], 0)) / 100,
+        }
+
+    @staticmethod
+    def _totals(today, user_id=None):
+        """
+        Sum counted withdrawals this month per window hash.
+
+        Returns:
+            tuple: (dict of key -> cents, set of user IDs)
+        """
+        buckets = _buckets(today)
+        month_start = timezone.make_aware(datetime.combine(today.replace(day=1), datetime.min.time()))
+
+        withdrawals = WithdrawalRequest.objects.filter(status__in=COUNTED_STATUSES, requested_at__gte=month_start)
+        if user_id is not None:
+            withdrawals = withdrawals.filter(user_id=user_id)
+        rows = (
+            withdrawals
+            .annotate(day=TruncDate('requested_at'))
+            .order_by()
+            .values('user_id', 'day')
+            .annotate(total=Sum('amount'))
+            .values_list('user_id', 'day', 'total')
+        )
+
+        totals = defaultdict(int)
+        users = set()
+        for row_user_id, day, total in rows:
+            users.add(row_user_id)
+            cents = _to_cents(total)
+            totals[CacheKeys.withdrawal_window(row_user_id, 'month', buckets['month'])] += cents
+            if day == today:
+                totals[CacheKeys.withdrawal_window(row_user_id, 'day', buckets['day'])] += cents
+        return totals, users
+
+    @staticmethod
+    def reconcile(now=None):
+        """
+        Correct this month's counters against withdrawal requests.
+
+        Only hashes that already exist are touched; missing ones are seeded
+        on their next read. Changes recorded while the totals are summed
+        are kept.
+
+        Args:
+            now: Reference time (defaults to now)
+
+        Returns:
+            int: Number of users with withdrawals this month
+        """
+        client = get_redis_client()
+        if client is None:
+            return 0
+
+        today = timezone.localdate(now or timezone.now())
+
+        # Snapshot the live counters before summing so the totals can be
+        # applied as a difference
+        seen = {}
+        for window, bucket in _buckets(today).items():
+            keys = [
+                key.decode() if isinstance(key, bytes) else key
+                for key in client.scan_iter(match=CacheKeys.withdrawal_window('*', window, bucket), count=1000)
+            ]
+            for offset in range(0, len(keys), RECONCILE_CHUNK_SIZE):
+                chunk = keys[offset:offset + RECONCILE_CHUNK_SIZE]
+                pipe = client.pipeline(transaction=False)
+                for key in chunk:
+                    pipe.hget(key, FIELD)
+                seen.update(zip(chunk, pipe.execute()))
+
+        totals, users = WithdrawalCounters._totals(today)
+
+        pipe = client.pipeline(transaction=False)
+        for index, (key, cents) in enumerate(seen.items(), start=1):
+            window = key.rsplit(':', 2)[1]
+            apply_counter_totals(pipe, key, {FIELD: totals.get(key, 0)}, {FIELD: cents}, WINDOW_TTLS[window])
+            if index % RECONCILE_CHUNK_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+
+        return len(users)
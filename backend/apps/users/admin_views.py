@@ -4,6 +4,7 @@ Admin-specific views for user management.
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.db.models import Q
 from rest_framework.pagination import PageNumberPagination
 
@@ -58,7 +59,7 @@ class AdminUserViewSet(viewsets.ModelViewSet):
         """Suspend a user"""
         user = self.get_object()
         user.is_active = False
-        user.save()
+        user.save(update_fields=['is_active', 'updated_at'])
         
         return Response({
             'message': f'User {user.username} has been suspended',
@@ -70,7 +71,7 @@ class AdminUserViewSet(viewsets.ModelViewSet):
         """Activate a user"""
         user = self.get_object()
         user.is_active = True
-        user.save()
+        user.save(update_fields=['is_active', 'updated_at'])
         
         return Response({
             'message': f'User {user.username} has been activated',
@@ -86,19 +87,25 @@ class AdminUserViewSet(viewsets.ModelViewSet):
         
         try:
             amount = float(amount)
-            if amount > 0:
-                user.add_balance(amount)
-            else:
-                user.deduct_balance(abs(amount))
             
             from apps.transactions.models import Transaction
-            Transaction.objects.create(
-                user=user,
-                type='ADMIN_ADJUSTMENT',
-                amount=abs(amount),
-                status='COMPLETED',
-                description=f'Admin adjustment: {reason}'
-            )
+            with transaction.atomic():
+                adjustment = Transaction.objects.create(
+                    user=user,
+                    type='ADMIN_ADJUSTMENT',
+                    amount=abs(amount),
+                    status='COMPLETED',
+                    description=f'Admin adjustment: {reason}'
+                )
+                if amount > 0:
+                    user.add_balance(amount, 'ADMIN_ADJUSTMENT', adjustment.id)
+                elif not user.deduct_balance(abs(amount), 'ADMIN_ADJUSTMENT', adjustment.id):
+                    # Nothing was debited; drop the adjustment record
+                    transaction.set_rollback(True)
+                    return Response(
+                        {'error': 'Insufficient balance'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
             
             return Response({
                 'message': f'Wallet adjusted by ${abs(amount)}',
@@ -0,0 +1,231 @@
+"""
+Buffered audit log writes.
+
+`record_audit` replaces direct `AuditLog.objects.create` calls. Events
+only count once the surrounding transaction commits; one recorded inside
+an atomic block that rolls back is dropped. Inside a request, committed
+events are collected by `AuditLoggingMiddleware` and written once after
+the response with a single `bulk_create` (or, with
+`AUDIT_LOG_BUFFER = 'redis'`, pushed to a Redis list). Outside a request
+they are written when the surrounding transaction commits.
+
+The Redis list is drained by `flush_audit_buffer_task`. High-volume events
+such as failed logins always go through it, so the request path never
+inserts a row for them. Without Redis the events are written directly.
+"""
+import contextvars
+import json
+import logging
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.common.cache import CacheKeys, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 1000
+# Cap the buffer so a sustained attack can't grow Redis memory unbounded
+MAX_BUFFERED_EVENTS = 100000
+
+
+class _RequestAuditState:
+    """Audit events collected during one request."""
+
+    __slots__ = ('events', 'logged')
+
+    def __init__(self):
+        self.events = []
+        self.logged = False
+
+    def collect(self, entry):
+        self.logged = True
+        self.events.append(entry)
+
+
+_request_state = contextvars.ContextVar('audit_request_state', default=None)
+
+
+def build_audit_entry(action, description, user=None, user_id=None, username=None,
+                      ip_address=None, user_agent='', resource_type=None,
+                      resource_id=None, changes=None):
+    """Build a serializable audit event."""
+    if user is not None and user_id is None:
+        user_id = user.pk
+    return {
+        'action': action,
+        'description': description,
+        'user_id': str(user_id) if user_id else None,
+        'username': username,
+        'ip_address': ip_address,
+        'user_agent': (user_agent or '')[:255],
+        'resource_type': resource_type,
+        'resource_id': str(resource_id) if resource_id is not None else None,
+        'changes': changes or {},
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
+def record_audit(action, description, user=None, **kwargs):
+    """
+    Record an audit event without a synchronous insert.
+
+    Accepts the same fields as AuditLog. The event is dropped if the
+    surrounding transaction rolls back.
+
+    Args:
+        action: AuditLog action
+        description: Event description
+        user: User the event belongs to, if any
+        **kwargs: Other AuditLog fields (ip_address, user_agent,
+            resource_type, resource_id, changes)
+    """
+    entry = build_audit_entry(action, description, user=user, **kwargs)
+
+    state = _request_state.get()
+    if state is not None:
+        transaction.on_commit(lambda: state.collect(entry))
+        return
+
+    transaction.on_commit(lambda: write_audit_events([entry]))
+
+
+def begin_request():
+    """Start collecting audit events for the current request."""
+    return _request_state.set(_RequestAuditState())
+
+
+def end_request(token):
+    """
+    Stop collecting audit events for the current request.
+
+    Returns:
+        The collected state (events and whether the view logged anything)
+    """
+    state = _request_state.get()
+    try:
+        _request_state.reset(token)
+    except ValueError:
+        # Response handled in a different context than the request
+        _request_state.set(None)
+    return state
+
+
+def write_audit_events(entries):
+    """Persist a batch of audit events using the configured writer."""
+    if not entries:
+        return
+    if getattr(settings, 'AUDIT_LOG_BUFFER', 'redis') == 'redis':
+        AuditBuffer.push_many(entries)
+    else:
+        AuditBuffer.write(entries)
+
+
+class AuditBuffer:
+    """Redis-backed buffer of pending AuditLog rows."""
+
+    @staticmethod
+    def push(action, description, **kwargs):
+        """
+        Buffer an audit event.
+
+        Args:
+            action: AuditLog action
+            description: Event description
+            **kwargs: Other entry fields; pass `username` to resolve the
+                user at flush time when the user ID isn't known
+        """
+        AuditBuffer.push_many([build_audit_entry(action, description, **kwargs)])
+
+    @staticmethod
+    def push_many(entries):
+        """Append entries to the buffer in one round trip."""
+        client = get_redis_client()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.rpush(CacheKeys.audit_buffer(), *[json.dumps(entry, cls=DjangoJSONEncoder) for entry in entries])
+                pipe.ltrim(CacheKeys.audit_buffer(), -MAX_BUFFERED_EVENTS, -1)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Failed to buffer {len(entries)} audit events: {str(e)}")
+
+        AuditBuffer.write(entries)
+
+    @staticmethod
+    def write(entries):
+        """
+        Insert entries with one user lookup and one bulk insert.
+
+        Args:
+            entries: List of entry dicts
+
+        Returns:
+            int: Number of rows written
+        """
+        from apps.users.models import User, AuditLog
+
+        usernames = {e['username'] for e in entries if e.get('username') and not e.get('user_id')}
+        user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id')) if usernames else {}
+
+        logs = [
+            AuditLog(
+                user_id=entry.get('user_id') or user_ids.get(entry.get('username')),
+                action=entry['action'],
+                description=entry['description'],
+                ip_address=entry.get('ip_address'),
+                user_agent=entry.get('user_agent', ''),
+                resource_type=entry.get('resource_type'),
+                resource_id=entry.get('resource_id'),
+                changes=entry.get('changes') or {},
+                timestamp=parse_datetime(entry['timestamp']) if entry.get('timestamp') else timezone.now(),
+            )
+            for entry in entries
+        ]
+        AuditLog.objects.bulk_create(logs, batch_size=FLUSH_BATCH_SIZE)
+        return len(logs)
+
+    @staticmethod
+    def flush(batch_size=FLUSH_BATCH_SIZE):
+        """
+        Drain the buffer into the database.
+
+        Args:
+            batch_size: Entries taken from Redis per round trip
+
+        Returns:
+            int: Number of rows written
+        """
+        client = get_redis_client()
+        if client is None:
+            return 0
+
+        key = CacheKeys.audit_buffer()
+        written = 0
+        while True:
+            pipe = client.pipeline(transaction=True)
+            pipe.lrange(key, 0, batch_size - 1)
+            pipe.ltrim(key, batch_size, -1)
+            raw_entries, _ = pipe.execute()
+            if not raw_entries:
+                break
+
+            entries = []
+            for raw in raw_entries:
+                try:
+                    entries.append(json.loads(raw))
+                except (TypeError, ValueError):
+                    logger.error(f"Dropping malformed audit buffer entry: {raw!r}")
+            try:
+                written += AuditBuffer.write(entries)
+            except Exception:
+                # Put the batch back so the next flush retries it
+                client.rpush(key, *raw_entries)
+                raise
+
+            if len(raw_entries) < batch_size:
+                break
+        return written
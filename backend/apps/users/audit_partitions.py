@@ -0,0 +1,339 @@
+"""
+Monthly partitioning, retention and archival for audit logs.
+
+On PostgreSQL `audit_logs` is range-partitioned by month on `timestamp`
+(see migration 0005): inserts and recent-window queries only touch the
+current partition's indexes, and expired months are archived and dropped
+as whole partitions instead of with row-by-row deletes. On other
+databases the table stays a plain table and the same retention policy is
+applied with batched deletes.
+
+An expired month is first detached from `audit_logs` (rows that landed in
+the `audit_logs_default` partition are moved into it in the same
+transaction), then archived from the detached table, then dropped. A run
+that fails part-way leaves the detached table behind and the next run
+picks it up, so rows are never dropped unarchived nor visible twice.
+
+Archives are gzip-compressed JSON lines, one file per month; an existing
+archive is never overwritten.
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.users.models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = 'audit_logs'
+PARTITION_PREFIX = 'audit_logs_p'
+DEFAULT_PARTITION = 'audit_logs_default'
+PARTITIONS_AHEAD = 3
+ARCHIVE_BATCH_SIZE = 5000
+ARCHIVE_FIELDS = (
+    'id', 'user_id', 'action', 'description', 'resource_type', 'resource_id',
+    'changes', 'ip_address', 'user_agent', 'timestamp',
+)
+
+
+def month_start(value):
+    """Return the first instant (UTC) of the month containing `value`."""
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    """Shift a month start by `months` months."""
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}"
+
+
+def _parse_partition_names(names):
+    partitions = []
+    for name in names:
+        if not name.startswith(PARTITION_PREFIX):
+            continue  # e.g. the default partition
+        try:
+            month = datetime.strptime(name[len(PARTITION_PREFIX):], '%Y_%m').replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue
+        partitions.append((month, name))
+    return sorted(partitions)
+
+
+def _move_default_rows(cursor, name, month):
+    """Move a month's rows out of the default partition into table `name`."""
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{name}" (LIKE "{TABLE_NAME}" INCLUDING DEFAULTS)'
+    )
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+        f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        [month, add_months(month, 1)]
+    )
+
+
+def _iter_table(table):
+    """Yield a table's rows as ARCHIVE_FIELDS dicts, paging by id."""
+    columns = ', '.join(f'"{field}"' for field in ARCHIVE_FIELDS)
+    last_id = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {columns} FROM "{table}" WHERE "id" > %s ORDER BY "id" LIMIT %s',
+                [last_id, ARCHIVE_BATCH_SIZE]
+            )
+            batch = cursor.fetchall()
+        if not batch:
+            return
+        for row in batch:
+            yield dict(zip(ARCHIVE_FIELDS, row))
+        last_id = batch[-1][0]
+
+
+class AuditLogPartitionService:
+    """Service for audit log partitions, retention and archival."""
+
+    @staticmethod
+    def is_partitioned():
+        """Return True if audit_logs is a native partitioned table."""
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+                [TABLE_NAME]
+            )
+            return cursor.fetchone() is not None
+
+    @staticmethod
+    def list_partitions():
+        """
+        List monthly partitions.
+
+        Returns:
+            list: Sorted (month start, partition name) tuples
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT child.relname FROM pg_inherits i "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "WHERE parent.relname = %s",
+                [TABLE_NAME]
+            )
+            names = [row[0] for row in cursor.fetchall()]
+
+        return _parse_partition_names(names)
+
+    @staticmethod
+    def list_detached():
+        """
+        List monthly tables detached by an unfinished retention run.
+
+        Returns:
+            list: Sorted (month start, table name) tuples
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname FROM pg_class c "
+                "WHERE c.relkind = 'r' AND c.relname LIKE %s AND NOT c.relispartition "
+                "AND pg_table_is_visible(c.oid)",
+                [f"{PARTITION_PREFIX}%"]
+            )
+            return _parse_partition_names(row[0] for row in cursor.fetchall())
+
+    @classmethod
+    def ensure_partitions(cls, months_ahead=PARTITIONS_AHEAD, now=None):
+        """
+        Create partitions for the current month and the next `months_ahead`.
+
+        Args:
+            months_ahead: Number of future months to pre-create
+            now: Reference time (defaults to now)
+
+        Returns:
+            list: Names of the partitions created
+        """
+        if not cls.is_partitioned():
+            return []
+
+        existing = {name for _, name in cls.list_partitions()}
+        current = month_start(now or timezone.now())
+        created = []
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            name = partition_name(month)
+            if name in existing:
+                continue
+            # Rows for the month may already sit in the default partition,
+            # which would make CREATE ... PARTITION OF fail; move them into
+            # the new table and attach it instead
+            with transaction.atomic(), connection.cursor() as cursor:
+                _move_default_rows(cursor, name, month)
+                cursor.execute(
+                    f'ALTER TABLE "{TABLE_NAME}" ATTACH PARTITION "{name}" '
+                    'FOR VALUES FROM (%s) TO (%s)',
+                    [month, add_months(month, 1)]
+                )
+            created.append(name)
+
+        if created:
+            logger.info(f"Created audit log partitions: {', '.join(created)}")
+        return created
+
+    @staticmethod
+    def archive_month(month, archive_dir=None, table=None):
+        """
+        Write one month of audit logs to a compressed archive file.
+
+        Args:
+            month: Month start (UTC)
+            archive_dir: Destination directory
+            table: Detached monthly table to read from instead of audit_logs
+
+        Returns:
+            tuple: (archive path, number of rows archived); the path is
+            None for an empty month
+        """
+        archive_dir = archive_dir or settings.AUDIT_LOG_ARCHIVE_DIR
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"{partition_name(month)}.jsonl.gz")
+        # A retried run must not replace what an earlier run archived
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(archive_dir, f"{partition_name(month)}.{suffix}.jsonl.gz")
+            suffix += 1
+        tmp_path = f"{path}.tmp"
+
+        if table is None:
+            rows = AuditLog.objects.filter(
+                timestamp__gte=month,
+                timestamp__lt=add_months(month, 1)
+            ).order_by().values(*ARCHIVE_FIELDS).iterator(chunk_size=ARCHIVE_BATCH_SIZE)
+        else:
+            rows = _iter_table(table)
+
+        count = 0
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder))
+                archive.write('\n')
+                count += 1
+        if not count:
+            os.remove(tmp_path)
+            return None, 0
+        # Only publish complete archives
+        os.replace(tmp_path, path)
+        return path, count
+
+    @staticmethod
+    def _detach_month(month):
+        """Detach a month's partition, folding in its default-partition rows."""
+        name = partition_name(month)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # DETACH refuses to run while deferred FK checks are pending
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(
+                "SELECT 1 FROM pg_class WHERE relname = %s AND relispartition",
+                [name]
+            )
+            if cursor.fetchone() is not None:
+                cursor.execute(f'ALTER TABLE "{TABLE_NAME}" DETACH PARTITION "{name}"')
+            _move_default_rows(cursor, name, month)
+        return name
+
+    @staticmethod
+    def _delete_month(month):
+        """Remove an archived month from a plain (unpartitioned) table."""
+        queryset = AuditLog.objects.filter(timestamp__gte=month, timestamp__lt=add_months(month, 1))
+        while True:
+            ids = list(queryset.values_list('id', flat=True)[:ARCHIVE_BATCH_SIZE])
+            if not ids:
+                break
+            AuditLog.objects.filter(id__in=ids).delete()
+
+    @classmethod
+    def expired_months(cls, retention_months=None, now=None):
+        """
+        Get months that are past the retention window.
+
+        Args:
+            retention_months: Months of audit logs to keep online
+            now: Reference time (defaults to now)
+
+        Returns:
+            list: Month starts (UTC), oldest first
+        """
+        if retention_months is None:
+            retention_months = settings.AUDIT_LOG_RETENTION_MONTHS
+        cutoff = add_months(month_start(now or timezone.now()), -retention_months)
+
+        if cls.is_partitioned():
+            months = {month for month, _ in cls.list_partitions() if month < cutoff}
+            months.update(month for month, _ in cls.list_detached())
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT DISTINCT date_trunc(\'month\', "timestamp" AT TIME ZONE \'UTC\') '
+                    f'FROM "{DEFAULT_PARTITION}" WHERE "timestamp" < %s',
+                    [cutoff]
+                )
+                months.update(row[0].replace(tzinfo=dt_timezone.utc) for row in cursor.fetchall())
+            return sorted(months)
+
+        oldest = AuditLog.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+        if oldest is None:
+            return []
+        months = []
+        month = month_start(oldest)
+        while month < cutoff:
+            months.append(month)
+            month = add_months(month, 1)
+        return months
+
+    @classmethod
+    def apply_retention(cls, retention_months=None, archive_dir=None, now=None, dry_run=False):
+        """
+        Archive and remove audit logs older than the retention window.
+
+        Args:
+            retention_months: Months of audit logs to keep online
+            archive_dir: Destination directory for archives
+            now: Reference time (defaults to now)
+            dry_run: Only report which months would be archived
+
+        Returns:
+            list: (month start, archive path, rows) per archived month
+        """
+        partitioned = cls.is_partitioned()
+        results = []
+        for month in cls.expired_months(retention_months, now):
+            if dry_run:
+                results.append((month, None, 0))
+                continue
+            if partitioned:
+                # Detach first so the archived rows can't change underneath
+                # us; the detached table is only dropped once archived
+                table = cls._detach_month(month)
+                path, count = cls.archive_month(month, archive_dir, table=table)
+                with connection.cursor() as cursor:
+                    cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                    cursor.execute(f'DROP TABLE "{table}"')
+            else:
+                path, count = cls.archive_month(month, archive_dir)
+                cls._delete_month(month)
+            logger.info(f"Archived {count} audit logs for {month:%Y-%m} to {path}")
+            results.append((month, path, count))
+        return results
@@ -1,66 +1,110 @@
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+import re
+from functools import lru_cache
+from django.contrib.auth import get_user_model
 from rest_framework.authentication import BaseAuthentication
-from django.http import HttpRequest
-from rest_framework import exceptions
 from rest_framework_simplejwt.tokens import AccessToken
 
+from apps.common.cache import CacheKeys, TwoTierCache
+
+# Public endpoints that should skip authentication
+PUBLIC_ENDPOINTS = (
+    '/api/users/register/',
+    '/api/users/login/',
+    '/api/users/password-reset-request/',
+    '/api/users/password-reset/',
+    '/api/users/verify-email/',
+    '/api/users/resend-verification/',
+)
+PUBLIC_PATH_RE = re.compile('|'.join(re.escape(endpoint) for endpoint in PUBLIC_ENDPOINTS))
+
+# Columns cached for the authenticated principal; everything else on the
+# user row is deferred and loaded on first access.
+PRINCIPAL_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'role',
+    'is_active', 'is_admin', 'is_staff', 'is_superuser', 'email_verified',
+)
+# A save touching any of these must drop the cached principal
+PRINCIPAL_INVALIDATING_FIELDS = frozenset(PRINCIPAL_FIELDS) | {'password'}
+PRINCIPAL_CACHE_TIMEOUT = 60
+
+principal_cache = TwoTierCache(local_timeout=5)
+
+
+@lru_cache(maxsize=None)
+def _principal_columns():
+    """PRINCIPAL_FIELDS in model column order, as Model.from_db expects."""
+    User = get_user_model()
+    return tuple(
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in PRINCIPAL_FIELDS
+    )
+
+
+def get_principal(user_id):
+    """
+    Get the authenticated user for an ID, served from the principal cache.
+
+    Args:
+        user_id: User ID from the access token
+
+    Returns:
+        User instance with only PRINCIPAL_FIELDS loaded, or None if the
+        user doesn't exist
+    """
+    User = get_user_model()
+    cache_key = CacheKeys.auth_principal(user_id)
+
+    columns = _principal_columns()
+
+    values = principal_cache.get(cache_key)
+    if values is None:
+        values = User.objects.filter(id=user_id).values_list(*columns).first()
+        if values is None:
+            return None
+        principal_cache.set(cache_key, values, PRINCIPAL_CACHE_TIMEOUT)
+
+    return User.from_db('default', columns, values)
+
+
+def invalidate_principal(user_id):
+    """Drop the cached principal for a user."""
+    principal_cache.delete(CacheKeys.auth_principal(user_id))
+
 
 class CustomJWTAuthentication(BaseAuthentication):
     """
     Custom JWT Authentication that handles authentication properly
     """
     def authenticate(self, request):
-        # Check if this is a public endpoint that should skip authentication
-        # by checking the request path
-        path = request.path
-        
-        # Public endpoints that should skip authentication
-        public_endpoints = [
-            '/api/users/register/',
-            '/api/users/login/',
-            '/api/users/password-reset-request/',
-            '/api/users/password-reset/',
-            '/api/users/verify-email/',
-            '/api/users/resend-verification/'
-        ]
-        
         # If this is a public endpoint, skip authentication
-        for endpoint in public_endpoints:
-            if path.startswith(endpoint):
-                return None
-        
+        if PUBLIC_PATH_RE.match(request.path):
+            return None
+
         # For other endpoints, check if Authorization header is present
         auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        
-        # If no Authorization header is present, return None to skip authentication
-        if not auth_header:
-            return None
-        
-        # If Authorization header is present, check if it's in Bearer format
+
+        # If no Authorization header is present, or it isn't in Bearer
+        # format, return None to skip authentication
         if not auth_header.startswith('Bearer '):
             return None
-        
+
         # Extract the token from the header
         try:
             token = auth_header.split(' ')[1]  # Get token after 'Bearer '
         except IndexError:
             return None  # Malformed header
-        
+
         # Attempt to decode and validate the JWT token
         try:
-            # Create an AccessToken instance to validate the token
-            from rest_framework_simplejwt.tokens import AccessToken
             access_token = AccessToken(token)
             user_id = access_token.get('user_id') or access_token.get('token_id')
-            
-            # Get the user from the database
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            user = User.objects.get(id=user_id)
-            
-            return (user, token)  # Return user and token if valid
+            user = get_principal(user_id)
         except Exception:
             # If token is invalid, return None instead of raising exception
             # This allows the view's permission classes to handle it
-            return None
\ No newline at end of file
+            return None
+
+        if user is None or not user.is_active:
+            return None
+
+        return (user, token)  # Return user and token if valid
@@ -158,7 +158,9 @@ class GDPRService:
             })
         
         # Audit logs
-        audit_logs = AuditLog.objects.filter(user=user)[:100]  # Limit to last 100
+        audit_logs = AuditLog.objects.filter(user=user).only(
+            'action', 'description', 'timestamp'
+        )[:100]  # Limit to last 100
         for log in audit_logs:
             data['audit_logs'].append({
                 'action': log.action,
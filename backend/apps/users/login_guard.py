@@ -0,0 +1,102 @@
+"""
+Failed-login counters and lockouts kept in the cache.
+
+Failed attempts are counted with an atomic Redis INCR on a key that
+expires after the lockout window, and a lockout is a second key with its
+own TTL. A failed attempt therefore never writes to the database. This
+replaces the old `failed_login_attempts` / `locked_until` user columns.
+"""
+import hashlib
+import logging
+from django.core.cache import cache
+
+from apps.common.cache import CacheKeys, get_redis_client
+from apps.common.constants import MAX_LOGIN_ATTEMPTS, ACCOUNT_LOCKOUT_DURATION_MINUTES
+from apps.users.audit import AuditBuffer
+
+logger = logging.getLogger(__name__)
+
+LOCKOUT_SECONDS = ACCOUNT_LOCKOUT_DURATION_MINUTES * 60
+
+
+def _username_key(username):
+    return hashlib.md5((username or '').encode()).hexdigest()
+
+
+def _increment(failures_key):
+    """Atomically bump a failure counter, starting its window on first use."""
+    client = get_redis_client()
+    if client is not None:
+        try:
+            # Create the key with its TTL and bump it in one MULTI, so a
+            # crash between the two can't leave a counter that never expires
+            pipe = client.pipeline(transaction=True)
+            pipe.set(failures_key, 0, ex=LOCKOUT_SECONDS, nx=True)
+            pipe.incr(failures_key)
+            _, failures = pipe.execute()
+            return failures
+        except Exception as e:
+            logger.warning(f"Failed to update login failure counter: {str(e)}")
+
+    # Local memory cache fallback
+    cache.add(failures_key, 0, LOCKOUT_SECONDS)
+    try:
+        return cache.incr(failures_key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(failures_key, 1, LOCKOUT_SECONDS)
+        return 1
+
+
+def _clear(failures_key):
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.delete(failures_key)
+        except Exception as e:
+            logger.warning(f"Failed to clear login failure counter: {str(e)}")
+    cache.delete(failures_key)
+
+
+class LoginAttemptGuard:
+    """Per-username failed login tracking."""
+
+    @staticmethod
+    def is_locked(username):
+        """Return True if the account is locked out."""
+        return cache.get(CacheKeys.login_lockout(_username_key(username))) is not None
+
+    @staticmethod
+    def register_failure(username):
+        """
+        Count a failed attempt and lock the account once the limit is hit.
+
+        Args:
+            username: Username the attempt was made for
+
+        Returns:
+            bool: True if this attempt locked the account
+        """
+        key = _username_key(username)
+        failures_key = CacheKeys.login_failures(key)
+
+        failures = _increment(failures_key)
+
+        if failures < MAX_LOGIN_ATTEMPTS:
+            return False
+
+        if not cache.add(CacheKeys.login_lockout(key), True, LOCKOUT_SECONDS):
+            return False  # Already locked
+
+        _clear(failures_key)
+        AuditBuffer.push(
+            'ACCOUNT_LOCKED',
+            f'Account locked after {failures} failed login attempts',
+            username=username
+        )
+        return True
+
+    @staticmethod
+    def reset(username):
+        """Clear failed attempts after a successful login."""
+        _clear(CacheKeys.login_failures(_username_key(username)))
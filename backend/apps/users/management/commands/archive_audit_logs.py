@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from apps.users.audit_partitions import AuditLogPartitionService
+
+
+class Command(BaseCommand):
+    help = 'Archive audit logs older than the retention window to compressed files and drop them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-months', type=int, help='Months to keep online (default: AUDIT_LOG_RETENTION_MONTHS)')
+        parser.add_argument('--output-dir', help='Archive directory (default: AUDIT_LOG_ARCHIVE_DIR)')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the months that would be archived')
+        parser.add_argument('--skip-partitions', action='store_true', help="Don't pre-create upcoming partitions")
+
+    def handle(self, *args, **options):
+        if not options['skip_partitions']:
+            for name in AuditLogPartitionService.ensure_partitions():
+                self.stdout.write(f'Created partition {name}')
+
+        results = AuditLogPartitionService.apply_retention(
+            retention_months=options['retention_months'],
+            archive_dir=options['output_dir'],
+            dry_run=options['dry_run'],
+        )
+
+        if not results:
+            self.stdout.write('No audit logs past the retention window')
+            return
+
+        for month, path, count in results:
+            if options['dry_run']:
+                self.stdout.write(f'Would archive {month:%Y-%m}')
+            elif path:
+                self.stdout.write(f'Archived {count} rows for {month:%Y-%m} to {path}')
+            else:
+                self.stdout.write(f'Dropped empty month {month:%Y-%m}')
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(results)} months'))
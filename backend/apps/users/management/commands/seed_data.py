@@ -216,7 +216,7 @@ class Command(BaseCommand):
                     user_profile.save()
                     
                     # Deduct balance from user
-                    user.deduct_balance(lottery.ticket_price)
+                    user.deduct_balance(lottery.ticket_price, 'TICKET_PURCHASE')
         
         # Create some winners for drawn lotteries
         drawn_lotteries = Lottery.objects.filter(status='DRAWN')
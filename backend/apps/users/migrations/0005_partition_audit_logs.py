@@ -0,0 +1,152 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:59
+
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Keep in sync with apps.users.audit_partitions
+PARTITION_PREFIX = "audit_logs_p"
+PARTITIONS_AHEAD = 3
+
+# Django's names for the AuditLog indexes, recreated on the partitioned table
+INDEXES = [
+    ("audit_logs_user_id_e11c73_idx", '("user_id", "timestamp" DESC)'),
+    ("audit_logs_action_f48619_idx", '("action", "timestamp" DESC)'),
+    ("audit_logs_resourc_bda8a6_idx", '("resource_type", "resource_id")'),
+    ("audit_logs_timesta_423be6_idx", '("timestamp")'),
+]
+
+
+def _add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_audit_logs(apps, schema_editor):
+    """
+    Convert audit_logs into a table range-partitioned by month on PostgreSQL.
+
+    The primary key becomes (id, timestamp) since it must include the
+    partition key; ids still come from the identity sequence. Other
+    databases keep the plain table.
+
+    Existing rows are copied with one INSERT ... SELECT while the table is
+    locked, so run this in a maintenance window on large tables.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        # The AlterField above re-adds the deferred user FK; with rows in the
+        # table its checks would still be pending and block the CREATE
+        # TABLE / CREATE INDEX statements below
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute('ALTER TABLE "audit_logs" RENAME TO "audit_logs_unpartitioned"')
+        cursor.execute(
+            'CREATE TABLE "audit_logs" (LIKE "audit_logs_unpartitioned" '
+            "INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute('ALTER TABLE "audit_logs" ADD PRIMARY KEY ("id", "timestamp")')
+        cursor.execute(
+            'ALTER TABLE "audit_logs" ADD CONSTRAINT "audit_logs_user_id_fk_users_id" '
+            'FOREIGN KEY ("user_id") REFERENCES "users" ("id") DEFERRABLE INITIALLY DEFERRED'
+        )
+        # Catches rows outside the pre-created months
+        cursor.execute('CREATE TABLE "audit_logs_default" PARTITION OF "audit_logs" DEFAULT')
+
+        cursor.execute('SELECT MIN("timestamp") FROM "audit_logs_unpartitioned"')
+        oldest = cursor.fetchone()[0]
+        now = datetime.now(timezone.utc)
+        start = (oldest or now).astimezone(timezone.utc)
+        month = datetime(start.year, start.month, 1, tzinfo=timezone.utc)
+        last = _add_months(datetime(now.year, now.month, 1, tzinfo=timezone.utc), PARTITIONS_AHEAD)
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE "{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}" '
+                'PARTITION OF "audit_logs" FOR VALUES FROM (%s) TO (%s)',
+                [month, _add_months(month, 1)],
+            )
+            month = _add_months(month, 1)
+
+        cursor.execute('INSERT INTO "audit_logs" SELECT * FROM "audit_logs_unpartitioned"')
+        # A serial (pre-identity) id keeps using the old sequence; move its
+        # ownership so it survives dropping the old table
+        cursor.execute(
+            "SELECT is_identity FROM information_schema.columns "
+            "WHERE table_name = 'audit_logs_unpartitioned' AND column_name = 'id'"
+        )
+        if cursor.fetchone()[0] != "YES":
+            cursor.execute("SELECT pg_get_serial_sequence('audit_logs_unpartitioned', 'id')")
+            sequence = cursor.fetchone()[0]
+            if sequence:
+                cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "audit_logs"."id"')
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence('audit_logs', 'id'), "
+            'COALESCE((SELECT MAX("id") FROM "audit_logs"), 0) + 1, false)'
+        )
+        cursor.execute('DROP TABLE "audit_logs_unpartitioned"')
+
+        for name, columns in INDEXES:
+            cursor.execute(f'CREATE INDEX "{name}" ON "audit_logs" {columns}')
+
+
+def unpartition_audit_logs(apps, schema_editor):
+    """Turn the partitioned audit_logs back into a plain table."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute('ALTER TABLE "audit_logs" RENAME TO "audit_logs_partitioned"')
+        cursor.execute(
+            'CREATE TABLE "audit_logs" (LIKE "audit_logs_partitioned" '
+            "INCLUDING DEFAULTS INCLUDING IDENTITY)"
+        )
+        cursor.execute('INSERT INTO "audit_logs" SELECT * FROM "audit_logs_partitioned"')
+        cursor.execute(
+            "SELECT is_identity FROM information_schema.columns "
+            "WHERE table_name = 'audit_logs_partitioned' AND column_name = 'id'"
+        )
+        if cursor.fetchone()[0] != "YES":
+            cursor.execute("SELECT pg_get_serial_sequence('audit_logs_partitioned', 'id')")
+            sequence = cursor.fetchone()[0]
+            if sequence:
+                cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "audit_logs"."id"')
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence('audit_logs', 'id'), "
+            'COALESCE((SELECT MAX("id") FROM "audit_logs"), 0) + 1, false)'
+        )
+        # Drops the monthly and default partitions and their indexes
+        cursor.execute('DROP TABLE "audit_logs_partitioned"')
+
+        cursor.execute('ALTER TABLE "audit_logs" ADD CONSTRAINT "audit_logs_pkey" PRIMARY KEY ("id")')
+        cursor.execute(
+            'ALTER TABLE "audit_logs" ADD CONSTRAINT "audit_logs_user_id_fk_users_id" '
+            'FOREIGN KEY ("user_id") REFERENCES "users" ("id") DEFERRABLE INITIALLY DEFERRED'
+        )
+        for name, columns in INDEXES:
+            cursor.execute(f'CREATE INDEX "{name}" ON "audit_logs" {columns}')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0004_auditlog_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="auditlog",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="audit_logs",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(partition_audit_logs, unpartition_audit_logs),
+    ]
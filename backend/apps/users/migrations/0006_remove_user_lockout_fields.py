@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0005_partition_audit_logs"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="user",
+            name="failed_login_attempts",
+        ),
+        migrations.RemoveField(
+            model_name="user",
+            name="locked_until",
+        ),
+    ]
@@ -1,9 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from django.contrib.auth.models import Group, Permission
 import uuid
 import secrets
+from decimal import Decimal
 from datetime import datetime, timedelta
 
 class User(AbstractUser):
@@ -35,8 +37,6 @@ class User(AbstractUser):
     password_reset_expires = models.DateTimeField(blank=True, null=True)
     last_login_ip = models.GenericIPAddressField(null=True, blank=True)
     last_login_user_agent = models.CharField(max_length=255, blank=True)
-    failed_login_attempts = models.IntegerField(default=0)
-    locked_until = models.DateTimeField(null=True, blank=True)
     # Two-Factor Authentication fields
     is_2fa_enabled = models.BooleanField(default=False, help_text='Whether 2FA is enabled for this user')
     two_factor_secret = models.CharField(max_length=32, blank=True, null=True, help_text='TOTP secret key')
@@ -85,19 +85,26 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.email})"
 
-    def add_balance(self, amount):
-        """Add funds to user's wallet"""
-        if amount > 0:
-            self.wallet_balance += amount
-            self.save()
+    def refresh_from_db(self, using=None, fields=None):
+        """Load all deferred columns together when one of them is first accessed"""
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields)
+
+    def add_balance(self, amount, entry_type='ADMIN_ADJUSTMENT', transaction_id=None):
+        """Add funds to user's wallet, recording the movement in the ledger"""
+        from apps.transactions.ledger import LedgerService
+        if LedgerService.credit(self, amount, entry_type, transaction_id):
+            self.wallet_balance = Decimal(str(self.wallet_balance)) + Decimal(str(amount))
             return True
         return False
 
-    def deduct_balance(self, amount):
-        """Deduct funds from user's wallet"""
-        if 0 < amount <= self.wallet_balance:
-            self.wallet_balance -= amount
-            self.save()
+    def deduct_balance(self, amount, entry_type='ADMIN_ADJUSTMENT', transaction_id=None):
+        """Deduct funds from user's wallet, recording the movement in the ledger"""
+        from apps.transactions.ledger import LedgerService
+        if LedgerService.debit(self, amount, entry_type, transaction_id):
+            self.wallet_balance = Decimal(str(self.wallet_balance)) - Decimal(str(amount))
             return True
         return False
 
@@ -106,7 +113,7 @@ class User(AbstractUser):
         token = secrets.token_urlsafe(32)
         self.email_verification_token = token
         self.email_verification_sent_at = datetime.now()
-        self.save()
+        self.save(update_fields=['email_verification_token', 'email_verification_sent_at', 'updated_at'])
         return token
 
     def generate_password_reset_token(self):
@@ -114,28 +121,9 @@ class User(AbstractUser):
         token = secrets.token_urlsafe(32)
         self.password_reset_token = token
         self.password_reset_expires = datetime.now() + timedelta(hours=1)
-        self.save()
+        self.save(update_fields=['password_reset_token', 'password_reset_expires', 'updated_at'])
         return token
 
-    def is_account_locked(self):
-        """Check if account is locked due to failed login attempts"""
-        if self.locked_until and datetime.now() < self.locked_until.replace(tzinfo=None):
-            return True
-        return False
-
-    def reset_failed_login_attempts(self):
-        """Reset failed login attempts"""
-        self.failed_login_attempts = 0
-        self.locked_until = None
-        self.save()
-
-    def increment_failed_login_attempts(self):
-        """Increment failed login attempts and lock account if needed"""
-        self.failed_login_attempts += 1
-        if self.failed_login_attempts >= 5:  # Lock after 5 failed attempts
-            self.locked_until = datetime.now() + timedelta(minutes=30)
-        self.save()
-
     @property
     def is_user(self):
         return self.role == 'user'
@@ -208,7 +196,8 @@ class AuditLog(models.Model):
         ('PAYMENT', 'Payment'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_logs')
+    # Covered by the (user, -timestamp) index
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_logs', db_index=False)
     action = models.CharField(max_length=50, choices=ACTION_CHOICES)
     description = models.TextField()
     resource_type = models.CharField(max_length=20, choices=RESOURCE_TYPE_CHOICES, null=True, blank=True)
@@ -216,7 +205,7 @@ class AuditLog(models.Model):
     changes = models.JSONField(default=dict, blank=True, help_text='Before/after values for the change')
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.CharField(max_length=255, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)  # Set at event time; rows may be written in batches later
 
     class Meta:
         db_table = 'audit_logs'
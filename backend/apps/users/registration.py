@@ -0,0 +1,67 @@
+"""
+Registration side effects.
+
+Only the user and profile rows (and the REGISTER audit entry) are written
+inside the signup request. The welcome email and referral bookkeeping run
+in a single background job queued once the signup transaction commits.
+"""
+import logging
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class RegistrationService:
+    """Service for post-registration side effects."""
+
+    @staticmethod
+    def schedule_side_effects(user, referral_code=None):
+        """
+        Queue the post-registration job to run after the current transaction commits.
+
+        Args:
+            user: Newly registered user
+            referral_code: Referral code used at signup, if any
+        """
+        user_id = str(user.id)
+
+        def enqueue():
+            from apps.users.tasks import process_registration_task
+
+            try:
+                process_registration_task.delay(user_id, referral_code)
+            except Exception as e:
+                # Broker unavailable: do the database bookkeeping inline but
+                # never send mail from the request thread.
+                logger.error(f"Could not queue registration job for user {user_id}: {str(e)}")
+                RegistrationService.run_side_effects(user_id, referral_code, send_email=False)
+
+        transaction.on_commit(enqueue)
+
+    @staticmethod
+    def run_side_effects(user_id, referral_code=None, send_email=True):
+        """
+        Create the referral link, track the referral and send the welcome email.
+
+        Args:
+            user_id: ID of the registered user
+            referral_code: Referral code used at signup, if any
+            send_email: Whether to send the welcome email
+        """
+        from apps.users.models import User
+        from apps.referrals.models import ReferralLink
+        from apps.referrals.services import ReferralService
+        from apps.notifications.services import EmailService
+
+        user = User.objects.get(id=user_id)
+
+        ReferralLink.objects.get_or_create(
+            user=user,
+            defaults={'referral_code': ReferralLink.build_code(user.id)}
+        )
+
+        if referral_code:
+            ReferralService.track_referral(user, referral_code)
+
+        if send_email:
+            EmailService.send_welcome_email(user)
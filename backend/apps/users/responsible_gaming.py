@@ -1,5 +1,8 @@
 """
 Service for responsible gaming checks and limits.
+
+Limit checks read the per-user spend counters (see spend_counters) and only
+fall back to summing transactions when the counters are unavailable.
 """
 from decimal import Decimal
 from datetime import date, datetime, timedelta
@@ -9,6 +12,8 @@ from django.conf import settings
 import logging
 
 from apps.transactions.models import Transaction
+from apps.users.models import User
+from apps.users.spend_counters import SpendCounters
 
 logger = logging.getLogger(__name__)
 
@@ -27,21 +32,40 @@ class ResponsibleGamingService:
         Returns:
             tuple: (is_excluded: bool, reason: str or None)
         """
+        is_excluded, reason, expired = ResponsibleGamingService._exclusion_status(user, timezone.now())
+        if expired:
+            # Exclusion period expired, reset
+            ResponsibleGamingService._clear_expired_exclusion(user)
+        return is_excluded, reason
+    
+    @staticmethod
+    def _exclusion_status(user, now):
+        """
+        Evaluate self-exclusion without persisting anything.
+        
+        Returns:
+            tuple: (is_excluded: bool, reason: str or None, expired: bool)
+        """
         if not user.self_excluded:
-            return False, None
+            return False, None, False
         
         if user.self_exclusion_until:
-            if timezone.now() < user.self_exclusion_until:
-                return True, f'Self-excluded until {user.self_exclusion_until.strftime("%Y-%m-%d %H:%M")}'
-            else:
-                # Exclusion period expired, reset
-                user.self_excluded = False
-                user.self_exclusion_until = None
-                user.save()
-                return False, None
+            if now < user.self_exclusion_until:
+                return True, f'Self-excluded until {user.self_exclusion_until.strftime("%Y-%m-%d %H:%M")}', False
+            return False, None, True
         
         # Permanent exclusion
-        return True, 'Permanently self-excluded'
+        return True, 'Permanently self-excluded', False
+    
+    @staticmethod
+    def _clear_expired_exclusion(user):
+        user.self_excluded = False
+        user.self_exclusion_until = None
+        User.objects.filter(pk=user.pk).update(
+            self_excluded=False,
+            self_exclusion_until=None,
+            updated_at=timezone.now()
+        )
     
     @staticmethod
     def check_deposit_limit(user, amount):
@@ -55,28 +79,41 @@ class ResponsibleGamingService:
         Returns:
             tuple: (is_valid: bool, error_message: str or None)
         """
+        if not (user.daily_deposit_limit or user.weekly_deposit_limit or user.monthly_deposit_limit):
+            return True, None
+        
         amount = Decimal(str(amount))
         now = timezone.now()
+        counters = SpendCounters.get(user.id, now)
         
         # Check daily limit
         if user.daily_deposit_limit:
-            daily_total = ResponsibleGamingService._calculate_daily_deposits(user, now.date())
+            if counters is not None:
+                daily_total = counters['day']['deposits']
+            else:
+                daily_total = ResponsibleGamingService._calculate_daily_deposits(user, now.date())
             if daily_total + amount > user.daily_deposit_limit:
                 remaining = user.daily_deposit_limit - daily_total
                 return False, f'Daily deposit limit exceeded. Remaining: ${remaining}'
         
         # Check weekly limit
         if user.weekly_deposit_limit:
-            week_start = now - timedelta(days=now.weekday())
-            weekly_total = ResponsibleGamingService._calculate_weekly_deposits(user, week_start.date())
+            if counters is not None:
+                weekly_total = counters['week']['deposits']
+            else:
+                week_start = now - timedelta(days=now.weekday())
+                weekly_total = ResponsibleGamingService._calculate_weekly_deposits(user, week_start.date())
             if weekly_total + amount > user.weekly_deposit_limit:
                 remaining = user.weekly_deposit_limit - weekly_total
                 return False, f'Weekly deposit limit exceeded. Remaining: ${remaining}'
         
         # Check monthly limit
         if user.monthly_deposit_limit:
-            month_start = date(now.year, now.month, 1)
-            monthly_total = ResponsibleGamingService._calculate_monthly_deposits(user, month_start)
+            if counters is not None:
+                monthly_total = counters['month']['deposits']
+            else:
+                month_start = date(now.year, now.month, 1)
+                monthly_total = ResponsibleGamingService._calculate_monthly_deposits(user, month_start)
             if monthly_total + amount > user.monthly_deposit_limit:
                 remaining = user.monthly_deposit_limit - monthly_total
                 return False, f'Monthly deposit limit exceeded. Remaining: ${remaining}'
@@ -102,7 +139,12 @@ class ResponsibleGamingService:
         now = timezone.now()
         
         # Calculate today's losses (ticket purchases without wins)
-        today_losses = ResponsibleGamingService._calculate_daily_losses(user, now.date())
+        counters = SpendCounters.get(user.id, now)
+        if counters is not None:
+            today = counters['day']
+            today_losses = max(Decimal('0.00'), today['purchases'] - today['prizes'])
+        else:
+            today_losses = ResponsibleGamingService._calculate_daily_losses(user, now.date())
         
         if today_losses + amount > user.daily_loss_limit:
             remaining = user.daily_loss_limit - today_losses
@@ -121,10 +163,14 @@ class ResponsibleGamingService:
         Returns:
             tuple: (is_valid: bool, error_message: str or None, minutes_remaining: int or None)
         """
+        return ResponsibleGamingService._session_status(user, timezone.now())
+    
+    @staticmethod
+    def _session_status(user, now):
+        """Evaluate the session time limit at `now`."""
         if not user.session_time_limit or not user.last_session_start:
             return True, None, None
         
-        now = timezone.now()
         session_duration = (now - user.last_session_start).total_seconds() / 60  # minutes
         
         if session_duration >= user.session_time_limit:
@@ -150,7 +196,7 @@ class ResponsibleGamingService:
             user.self_exclusion_until = timezone.now() + timedelta(days=days)
         else:
             user.self_exclusion_until = None  # Permanent
-        user.save()
+        user.save(update_fields=['self_excluded', 'self_exclusion_until', 'updated_at'])
         
         logger.info(f'Applied self-exclusion to user {user.id} for {days} days' if days else 'permanently')
         return True
@@ -240,3 +286,133 @@ class ResponsibleGamingService:
         # Loss = purchases - prizes
         return max(Decimal('0.00'), total_purchases - total_prizes)
 
+
+
+class GateVerdict:
+    """Outcome of a responsible gaming gate check."""
+
+    __slots__ = ('allowed', 'error', 'status_code', 'minutes_remaining', 'pending')
+
+    def __init__(self, allowed=True, error=None, status_code=None, minutes_remaining=None, pending=None):
+        self.allowed = allowed
+        self.error = error
+        self.status_code = status_code
+        self.minutes_remaining = minutes_remaining
+        # User fields to persist once the gated action goes through
+        self.pending = pending or {}
+
+    def __bool__(self):
+        return self.allowed
+
+
+class ResponsibleGamingGate:
+    """
+    Single-pass responsible gaming checks for purchases and deposits.
+
+    Loads every field the rules need in one query and evaluates all rules
+    against that snapshot. An expired exclusion is cleared right away with
+    one narrow UPDATE; a session start is returned on the verdict and only
+    written by `apply_pending` once the purchase has gone through.
+    """
+
+    SNAPSHOT_FIELDS = (
+        'wallet_balance', 'self_excluded', 'self_exclusion_until',
+        'daily_deposit_limit', 'weekly_deposit_limit', 'monthly_deposit_limit',
+        'daily_loss_limit', 'session_time_limit', 'last_session_start',
+    )
+
+    @classmethod
+    def check_purchase(cls, user, amount):
+        """
+        Gate a ticket purchase: self-exclusion, session time and loss limit.
+
+        If the user's session hasn't started, the verdict carries the
+        session start as a pending change; call `apply_pending` after the
+        purchase succeeds.
+
+        Args:
+            user: Purchasing user; the snapshot is loaded onto it, so later
+                reads of these fields (e.g. wallet_balance) don't query
+            amount: Purchase amount
+
+        Returns:
+            GateVerdict
+        """
+        return cls._check(user, amount, purchase=True)
+
+    @classmethod
+    def check_deposit(cls, user, amount):
+        """
+        Gate a deposit: self-exclusion and deposit limits.
+
+        Args:
+            user: Depositing user
+            amount: Deposit amount
+
+        Returns:
+            GateVerdict
+        """
+        return cls._check(user, amount, purchase=False)
+
+    @staticmethod
+    def apply_pending(user, verdict):
+        """
+        Persist the state changes an allowed verdict deferred.
+
+        Args:
+            user: User the verdict was issued for
+            verdict: GateVerdict from `check_purchase`
+        """
+        if not verdict.pending:
+            return
+        for field, value in verdict.pending.items():
+            setattr(user, field, value)
+        User.objects.filter(pk=user.pk).update(**verdict.pending, updated_at=timezone.now())
+
+    @classmethod
+    def _load_snapshot(cls, user):
+        values = User.objects.filter(pk=user.pk).values_list(*cls.SNAPSHOT_FIELDS).first()
+        if values is None:
+            return
+        for field, value in zip(cls.SNAPSHOT_FIELDS, values):
+            setattr(user, field, value)
+
+    @classmethod
+    def _check(cls, user, amount, purchase):
+        now = timezone.now()
+        cls._load_snapshot(user)
+        changes = {}
+
+        verdict = cls._evaluate(user, amount, purchase, now, changes)
+
+        if changes:
+            for field, value in changes.items():
+                setattr(user, field, value)
+            User.objects.filter(pk=user.pk).update(**changes, updated_at=now)
+        return verdict
+
+    @staticmethod
+    def _evaluate(user, amount, purchase, now, changes):
+        is_excluded, reason, expired = ResponsibleGamingService._exclusion_status(user, now)
+        if expired:
+            changes['self_excluded'] = False
+            changes['self_exclusion_until'] = None
+        if is_excluded:
+            return GateVerdict(False, reason, 403)
+
+        if not purchase:
+            is_valid, error_message = ResponsibleGamingService.check_deposit_limit(user, amount)
+            if not is_valid:
+                return GateVerdict(False, error_message, 400)
+            return GateVerdict()
+
+        is_valid, error_message, minutes_remaining = ResponsibleGamingService._session_status(user, now)
+        if not is_valid:
+            return GateVerdict(False, error_message, 403)
+
+        is_valid, error_message = ResponsibleGamingService.check_loss_limit(user, amount)
+        if not is_valid:
+            return GateVerdict(False, error_message, 400, minutes_remaining)
+
+        pending = {} if user.last_session_start else {'last_session_start': now}
+        return GateVerdict(minutes_remaining=minutes_remaining, pending=pending)
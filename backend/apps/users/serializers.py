@@ -5,6 +5,7 @@ from django.core.exceptions import ValidationError
 from datetime import datetime, date
 from django.utils import timezone
 from apps.users.models import User, UserProfile, AuditLog
+from apps.users.login_guard import LoginAttemptGuard
 from apps.common.validators import validate_password_strength
 
 
@@ -26,11 +27,12 @@ class RegisterSerializer(serializers.ModelSerializer):
     last_name = serializers.CharField(required=False, max_length=30, allow_blank=True, default='')
     date_of_birth = serializers.DateField(required=False, allow_null=True)
     age_verification_consent = serializers.BooleanField(required=False, default=False)
+    referral_code = serializers.CharField(write_only=True, required=False, allow_blank=True, max_length=24)
 
     class Meta:
         model = User
         fields = ['username', 'email', 'password', 'password_confirm', 'first_name', 'last_name', 
-                  'date_of_birth', 'age_verification_consent']
+                  'date_of_birth', 'age_verification_consent', 'referral_code']
 
     def validate_email(self, value):
         try:
@@ -72,6 +74,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('password_confirm', None)
+        validated_data.pop('referral_code', None)
         age_verification_consent = validated_data.pop('age_verification_consent', False)
         
         # Set defaults for optional fields
@@ -80,21 +83,20 @@ class RegisterSerializer(serializers.ModelSerializer):
         if not validated_data.get('last_name'):
             validated_data['last_name'] = ''
         
-        user = User.objects.create_user(**validated_data)
-        user.role = 'user'  # Default role for new users
-        user.is_active = True  # Auto-activate users
-        user.email_verified = True  # Auto-verify email for easier registration
+        validated_data['role'] = 'user'  # Default role for new users
+        validated_data['is_active'] = True  # Auto-activate users
+        validated_data['email_verified'] = True  # Auto-verify email for easier registration
         # Set age verification if date_of_birth is provided and user is 18+
-        if user.date_of_birth:
+        date_of_birth = validated_data.get('date_of_birth')
+        if date_of_birth:
             today = date.today()
-            age = today.year - user.date_of_birth.year - ((today.month, today.day) < (user.date_of_birth.month, user.date_of_birth.day))
+            age = today.year - date_of_birth.year - ((today.month, today.day) < (date_of_birth.month, date_of_birth.day))
             if age >= 18:
-                user.age_verified = True
-                user.age_verified_at = timezone.now()
-        user.save()
-        # Use get_or_create to avoid duplicate profile errors
-        UserProfile.objects.get_or_create(user=user)
-        return user
+                validated_data['age_verified'] = True
+                validated_data['age_verified_at'] = timezone.now()
+        
+        # Single INSERT; the post_save signal creates the profile
+        return User.objects.create_user(**validated_data)
 
 
 class LoginSerializer(serializers.Serializer):
@@ -105,39 +107,28 @@ class LoginSerializer(serializers.Serializer):
         username = data.get('username')
         password = data.get('password')
 
-        # Check if user exists first to prevent enumeration attacks
-        try:
-            user = User.objects.get(username=username)
-            
-            # Check if account is locked
-            if user.is_account_locked():
-                raise serializers.ValidationError("Account is locked due to multiple failed login attempts")
-            
-            # Authenticate user
-            authenticated_user = authenticate(username=username, password=password)
-            
-            if not authenticated_user:
-                # Increment failed login attempts
-                user.increment_failed_login_attempts()
-                raise serializers.ValidationError("Invalid credentials")
-            
-            # Check if account is active
-            if not authenticated_user.is_active:
-                raise serializers.ValidationError("Account is not active")
-            
-            # Email verification check removed - allow login even if email not verified
-            # This can be re-enabled if email verification is required
-            
-            # Reset failed login attempts on successful login
-            user.reset_failed_login_attempts()
-            
-            user = authenticated_user
-            
-        except User.DoesNotExist:
-            # To prevent user enumeration, treat non-existent users same as wrong password
-            # Just call authenticate with invalid credentials to take similar time
-            authenticate(username=username, password=password)
+        # Lockouts and failure counts live in the cache, so a rejected
+        # attempt never writes to the database
+        if LoginAttemptGuard.is_locked(username):
+            raise serializers.ValidationError("Account is locked due to multiple failed login attempts")
+        
+        # authenticate() runs the password hasher for unknown usernames too,
+        # so non-existent users take the same time as a wrong password
+        user = authenticate(username=username, password=password)
+        
+        if not user:
+            LoginAttemptGuard.register_failure(username)
             raise serializers.ValidationError("Invalid credentials")
+        
+        # Check if account is active
+        if not user.is_active:
+            raise serializers.ValidationError("Account is not active")
+        
+        # Email verification check removed - allow login even if email not verified
+        # This can be re-enabled if email verification is required
+        
+        # Reset failed login attempts on successful login
+        LoginAttemptGuard.reset(username)
 
         data['user'] = user
         return data
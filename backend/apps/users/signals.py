@@ -1,8 +1,7 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from apps.users.models import User, UserProfile, AuditLog
-from apps.notifications.services import EmailService
-from apps.notifications.tasks import send_welcome_email_task
+from apps.users.authentication.jwt import PRINCIPAL_INVALIDATING_FIELDS, invalidate_principal
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,37 +14,23 @@ def create_user_profile(sender, instance, created, **kwargs):
     """
     if created:
         UserProfile.objects.get_or_create(user=instance)
-        # Send welcome email asynchronously
-        try:
-            send_welcome_email_task.delay(str(instance.id))
-        except Exception as e:
-            logger.error(f"Error sending welcome email: {e}")
-            # Fallback to synchronous sending if Celery is not available
-            try:
-                EmailService.send_welcome_email(instance)
-            except Exception as e2:
-                logger.error(f"Error sending welcome email synchronously: {e2}")
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def invalidate_cached_principal(sender, instance, created, update_fields=None, **kwargs):
     """
-    Signal to save UserProfile when User is saved
+    Signal to drop the cached auth principal when role, active flag,
+    password or other cached columns change
     """
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+    if created:
+        return
+    if update_fields is None or PRINCIPAL_INVALIDATING_FIELDS.intersection(update_fields):
+        invalidate_principal(instance.pk)
 
 
-@receiver(pre_save, sender=User)
-def log_user_changes(sender, instance, **kwargs):
+@receiver(post_delete, sender=User)
+def delete_cached_principal(sender, instance, **kwargs):
     """
-    Signal to log user changes
+    Signal to drop the cached auth principal when a user is deleted
     """
-    try:
-        old_instance = sender.objects.get(pk=instance.pk)
-        if old_instance.wallet_balance != instance.wallet_balance:
-            # Wallet balance changed - this will be logged in the transaction
-            pass
-    except sender.DoesNotExist:
-        # New user being created
-        pass
+    invalidate_principal(instance.pk)
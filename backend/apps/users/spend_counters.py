@@ -0,0 +1,235 @@
+"""
+Per-user deposit, ticket purchase and prize totals per day, week and month,
+kept in Redis.
+
+Every completed wallet movement of a tracked type bumps one hash per
+window (see `LedgerService`), so responsible gaming limit checks read three
+hashes in one round trip instead of running SUM queries over
+`transactions`. Windows follow the limits' calendar periods: the current
+day, the week starting Monday and the calendar month.
+
+Each window hash carries a `ready` field once it has been seeded from
+`Transaction`. A hash without it (never seeded, expired or evicted) is
+never read as zero usage: `get` seeds it from the database first, so
+limits fail closed. `reconcile_spend_counters_task` corrects drift in the
+existing hashes nightly.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.common.cache import CacheKeys, COUNTER_READY_FIELD, apply_counter_totals, get_redis_client
+from apps.transactions.models import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Transaction type -> counter field
+TRACKED_TYPES = {
+    'DEPOSIT': 'deposits',
+    'TICKET_PURCHASE': 'purchases',
+    'PRIZE_AWARD': 'prizes',
+}
+FIELDS = tuple(TRACKED_TYPES.values())
+WINDOW_TTLS = {
+    'day': 2 * 24 * 3600,
+    'week': 8 * 24 * 3600,
+    'month': 32 * 24 * 3600,
+}
+RECONCILE_CHUNK_SIZE = 5000
+
+
+def _to_cents(amount):
+    return int((abs(Decimal(str(amount))) * 100).quantize(Decimal('1')))
+
+
+def window_starts(now=None):
+    """Return the first day of the current day, week and month windows."""
+    today = timezone.localdate(now or timezone.now())
+    return {
+        'day': today,
+        'week': today - timedelta(days=today.weekday()),
+        'month': today.replace(day=1),
+    }
+
+
+class SpendCounters:
+    """Redis-backed spend totals per user and window."""
+
+    @staticmethod
+    def record_many(events, now=None):
+        """
+        Add completed movements to the current windows.
+
+        Args:
+            events: Iterable of (user_id, transaction type, amount);
+                untracked types are ignored
+            now: Time the movements completed (defaults to now)
+        """
+        client = get_redis_client()
+        if client is None:
+            return
+
+        starts = window_starts(now)
+        try:
+            pipe = client.pipeline(transaction=False)
+            for user_id, entry_type, amount in events:
+                field = TRACKED_TYPES.get(entry_type)
+                if field is None:
+                    continue
+                cents = _to_cents(amount)
+                for window, start in starts.items():
+                    key = CacheKeys.spend_window(user_id, window, start.isoformat())
+                    pipe.hincrby(key, field, cents)
+                    pipe.expire(key, WINDOW_TTLS[window])
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to update spend counters: {str(e)}")
+
+    @staticmethod
+    def get(user_id, now=None):
+        """
+        Get a user's totals for the current windows.
+
+        Windows that haven't been seeded are filled from the database first.
+
+        Args:
+            user_id: User ID
+            now: Reference time (defaults to now)
+
+        Returns:
+            dict: window -> {deposits, purchases, prizes} as Decimals, or
+            None if Redis is unavailable and the caller should fall back
+            to the database
+        """
+        client = get_redis_client()
+        if client is None:
+            return None
+
+        starts = window_starts(now)
+        keys = {window: CacheKeys.spend_window(user_id, window, start.isoformat()) for window, start in starts.items()}
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key in keys.values():
+                pipe.hmget(key, *FIELDS, COUNTER_READY_FIELD)
+            values = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to read spend counters for user {user_id}: {str(e)}")
+            return None
+
+        if any(window_values[-1] is None for window_values in values):
+            seen = {key: dict(zip(FIELDS, window_values)) for key, window_values in zip(keys.values(), values)}
+            return SpendCounters._seed(client, user_id, starts, keys, seen)
+
+        return {
+            window: {
+                field: Decimal(int(value or 0)) / 100
+                for field, value in zip(FIELDS, window_values)
+            }
+            for window, window_values in zip(starts, values)
+        }
+
+    @staticmethod
+    def _seed(client, user_id, starts, keys, seen):
+        """Fill a user's windows from the database and return the totals."""
+        totals, _ = SpendCounters._totals(starts, user_id=user_id)
+        window_totals = {window: totals.get(key) or dict.fromkeys(FIELDS, 0) for window, key in keys.items()}
+        try:
+            pipe = client.pipeline(transaction=False)
+            for window, key in keys.items():
+                apply_counter_totals(pipe, key, window_totals[window], seen[key], WINDOW_TTLS[window], seed=True)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to seed spend counters for user {user_id}: {str(e)}")
+
+        return {
+            window: {field: Decimal(cents) / 100 for field, cents in fields.items()}
+            for window, fields in window_totals.items()
+        }
+
+    @staticmethod
+    def _totals(starts, user_id=None):
+        """
+        Sum completed tracked movements per window hash.
+
+        Returns:
+            tuple: (dict of key -> {field: cents}, set of user IDs)
+        """
+        since = timezone.make_aware(datetime.combine(min(starts.values()), datetime.min.time()))
+        transactions = Transaction.objects.filter(
+            status='COMPLETED',
+            type__in=list(TRACKED_TYPES),
+            created_at__gte=since
+        )
+        if user_id is not None:
+            transactions = transactions.filter(user_id=user_id)
+        rows = (
+            transactions
+            .annotate(day=TruncDate('created_at'))
+            .order_by()
+            .values('user_id', 'type', 'day')
+            .annotate(total=Sum('amount'))
+            .values_list('user_id', 'type', 'day', 'total')
+        )
+
+        totals = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        users = set()
+        for row_user_id, entry_type, day, total in rows.iterator(chunk_size=RECONCILE_CHUNK_SIZE):
+            users.add(row_user_id)
+            cents = _to_cents(total)
+            for window, start in starts.items():
+                if day >= start:
+                    totals[CacheKeys.spend_window(row_user_id, window, start.isoformat())][TRACKED_TYPES[entry_type]] += cents
+        return totals, users
+
+    @staticmethod
+    def reconcile(now=None):
+        """
+        Correct the current windows' counters against completed transactions.
+
+        Only hashes that already exist are touched; missing ones are seeded
+        on their next read. Increments made while the totals are summed are
+        kept.
+
+        Args:
+            now: Reference time (defaults to now)
+
+        Returns:
+            int: Number of users with activity in the current windows
+        """
+        client = get_redis_client()
+        if client is None:
+            return 0
+
+        starts = window_starts(now)
+
+        # Snapshot the live counters before summing so the totals can be
+        # applied as a difference
+        seen = {}
+        for window, start in starts.items():
+            keys = [
+                key.decode() if isinstance(key, bytes) else key
+                for key in client.scan_iter(match=CacheKeys.spend_window('*', window, start.isoformat()), count=1000)
+            ]
+            for offset in range(0, len(keys), RECONCILE_CHUNK_SIZE):
+                chunk = keys[offset:offset + RECONCILE_CHUNK_SIZE]
+                pipe = client.pipeline(transaction=False)
+                for key in chunk:
+                    pipe.hmget(key, *FIELDS)
+                for key, values in zip(chunk, pipe.execute()):
+                    seen[key] = dict(zip(FIELDS, values))
+
+        totals, users = SpendCounters._totals(starts)
+
+        pipe = client.pipeline(transaction=False)
+        for index, (key, fields) in enumerate(seen.items(), start=1):
+            window = key.rsplit(':', 2)[1]
+            apply_counter_totals(pipe, key, totals.get(key) or dict.fromkeys(FIELDS, 0), fields, WINDOW_TTLS[window])
+            if index % RECONCILE_CHUNK_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+
+        return len(users)
@@ -0,0 +1,58 @@
+"""
+Celery tasks for user operations.
+"""
+from celery import shared_task
+from apps.users.registration import RegistrationService
+from apps.users.audit import AuditBuffer
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_registration_task(user_id, referral_code=None):
+    """Run post-registration side effects for a new user."""
+    try:
+        RegistrationService.run_side_effects(user_id, referral_code)
+        return f"Processed registration for user {user_id}"
+    except Exception as e:
+        logger.error(f"Error processing registration for user {user_id}: {str(e)}")
+        raise
+
+
+@shared_task
+def flush_audit_buffer_task():
+    """Write buffered audit events to the database in bulk."""
+    try:
+        written = AuditBuffer.flush()
+        return f"Flushed {written} audit events"
+    except Exception as e:
+        logger.error(f"Error flushing audit buffer: {str(e)}")
+        raise
+
+
+@shared_task
+def maintain_audit_log_partitions_task():
+    """Pre-create upcoming audit log partitions and archive expired months."""
+    from apps.users.audit_partitions import AuditLogPartitionService
+
+    try:
+        created = AuditLogPartitionService.ensure_partitions()
+        archived = AuditLogPartitionService.apply_retention()
+        return f"Created {len(created)} partitions, archived {len(archived)} months"
+    except Exception as e:
+        logger.error(f"Error maintaining audit log partitions: {str(e)}")
+        raise
+
+
+@shared_task
+def reconcile_spend_counters_task():
+    """Rebuild responsible gaming spend counters from transactions."""
+    from apps.users.spend_counters import SpendCounters
+
+    try:
+        count = SpendCounters.reconcile()
+        return f"Reconciled spend counters for {count} users"
+    except Exception as e:
+        logger.error(f"Error reconciling spend counters: {str(e)}")
+        raise
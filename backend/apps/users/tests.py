@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
@@ -11,6 +11,10 @@ User = get_user_model()
 
 class AuthenticationTestCase(TestCase):
     def setUp(self):
+        from apps.common.cache import CacheKeys, get_redis_client
+        redis_client = get_redis_client()
+        if redis_client is not None:
+            redis_client.delete(CacheKeys.audit_buffer())
         self.client = APIClient()
         self.register_url = reverse('register')
         self.login_url = reverse('login')
@@ -93,7 +97,10 @@ class AuthenticationTestCase(TestCase):
 
     def test_audit_log_created_on_registration(self):
         """Test that audit log is created on user registration"""
-        self.client.post(self.register_url, self.user_data, format='json')
+        from apps.users.audit import AuditBuffer
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.register_url, self.user_data, format='json')
+        AuditBuffer.flush()
         user = User.objects.get(username='testuser')
         audit_log = AuditLog.objects.filter(user=user, action='REGISTER').first()
         self.assertIsNotNone(audit_log)
@@ -101,13 +108,16 @@ class AuthenticationTestCase(TestCase):
 
     def test_audit_log_created_on_login(self):
         """Test that audit log is created on user login"""
+        from apps.users.audit import AuditBuffer
         # Register and login
         self.client.post(self.register_url, self.user_data, format='json')
         login_data = {
             'username': 'testuser',
             'password': 'TestPassword123'
         }
-        self.client.post(self.login_url, login_data, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.login_url, login_data, format='json')
+        AuditBuffer.flush()
         
         user = User.objects.get(username='testuser')
         audit_log = AuditLog.objects.filter(user=user, action='LOGIN').first()
@@ -273,4 +283,642 @@ class EmailVerificationTestCase(TestCase):
         
         # Check if a new token was generated
         user = User.objects.get(email='test@example.com')
-        self.assertIsNotNone(user.email_verification_token)
\ No newline at end of file
+        self.assertIsNotNone(user.email_verification_token)
+
+class RegistrationSideEffectsTestCase(TestCase):
+    """Test post-registration side effects"""
+
+    def setUp(self):
+        from apps.referrals.models import ReferralLink, ReferralProgram
+        ReferralProgram.get_program()
+        self.referrer = User.objects.create_user(
+            username='referrer', email='referrer@example.com', password='TestPass123!'
+        )
+        self.referrer_link = ReferralLink.objects.create(
+            user=self.referrer, referral_code=ReferralLink.build_code(self.referrer.id)
+        )
+        self.user = User.objects.create_user(
+            username='newuser', email='newuser@example.com', password='TestPass123!'
+        )
+
+    def test_job_queued_once_after_commit(self):
+        """Test the registration job is queued only when the transaction commits"""
+        from unittest.mock import patch
+        from apps.users.registration import RegistrationService
+
+        with patch('apps.users.tasks.process_registration_task.delay') as mock_delay:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                RegistrationService.schedule_side_effects(self.user, referral_code='abc')
+                mock_delay.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        mock_delay.assert_called_once_with(str(self.user.id), 'abc')
+
+    def test_run_side_effects_creates_link_and_referral(self):
+        """Test the job creates the referral link and tracks the referral"""
+        from apps.referrals.models import ReferralLink, Referral
+        from apps.users.registration import RegistrationService
+
+        RegistrationService.run_side_effects(
+            str(self.user.id), self.referrer_link.referral_code, send_email=False
+        )
+        self.assertTrue(ReferralLink.objects.filter(user=self.user).exists())
+        self.assertTrue(
+            Referral.objects.filter(referrer=self.referrer, referred_user=self.user).exists()
+        )
+
+
+class UserWriteTestCase(TestCase):
+    """Test User writes stay on the users table"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='writer', email='writer@example.com', password='TestPass123!'
+        )
+        self.user.refresh_from_db()
+
+    def test_add_balance_single_update(self):
+        """Test wallet changes issue one UPDATE and do not touch the profile"""
+        from decimal import Decimal
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.add_balance(Decimal('10.00'))
+        statements = [q['sql'] for q in ctx.captured_queries]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('UPDATE')]), 1)
+        self.assertFalse(any('user_profiles' in sql for sql in statements))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, Decimal('10.00'))
+
+
+class AdminWalletAdjustmentTestCase(TestCase):
+    """Test admin wallet adjustments"""
+
+    def setUp(self):
+        from decimal import Decimal
+        from rest_framework.test import APIClient
+
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            username='walletadmin', email='walletadmin@example.com', password='TestPass123!', role='admin'
+        )
+        self.user = User.objects.create_user(
+            username='adjusted', email='adjusted@example.com', password='TestPass123!',
+            wallet_balance=Decimal('5.00')
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def test_overdraft_rejected(self):
+        """Test a debit larger than the balance is refused and not recorded"""
+        from decimal import Decimal
+        from apps.transactions.models import Transaction
+
+        response = self.client.post(f'/api/admin/users/{self.user.id}/adjust_wallet/', {'amount': '-10'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.filter(type='ADMIN_ADJUSTMENT').exists())
+        self.assertEqual(User.objects.get(pk=self.user.pk).wallet_balance, Decimal('5.00'))
+
+    def test_adjustment_linked_to_transaction(self):
+        """Test the ledger entries reference the adjustment transaction"""
+        from apps.transactions.models import LedgerEntry, Transaction
+
+        response = self.client.post(f'/api/admin/users/{self.user.id}/adjust_wallet/', {'amount': '-5'})
+
+        self.assertEqual(response.status_code, 200)
+        adjustment = Transaction.objects.get(type='ADMIN_ADJUSTMENT')
+        self.assertEqual(
+            set(LedgerEntry.objects.filter(user=self.user).values_list('transaction_id', flat=True)),
+            {adjustment.id}
+        )
+
+
+class JWTPrincipalCacheTestCase(TestCase):
+    """Test cached JWT principal lookup"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.users.authentication.jwt import principal_cache
+        cache.clear()
+        principal_cache.clear_local()
+        self.user = User.objects.create_user(
+            username='principal', email='principal@example.com', password='TestPass123!'
+        )
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def _authenticate(self, path='/api/users/me/'):
+        from django.test import RequestFactory
+        from apps.users.authentication.jwt import CustomJWTAuthentication
+        request = RequestFactory().get(path, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return CustomJWTAuthentication().authenticate(request)
+
+    def test_repeat_authentication_hits_cache(self):
+        """Test the second request authenticates without a query"""
+        with self.assertNumQueries(1):
+            user, _ = self._authenticate()
+        with self.assertNumQueries(0):
+            user, _ = self._authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.role, 'user')
+
+    def test_deferred_fields_load_in_one_query(self):
+        """Test accessing uncached columns loads the rest of the row once"""
+        user, _ = self._authenticate()
+        with self.assertNumQueries(1):
+            user.wallet_balance
+            user.phone_number
+            user.kyc_status
+
+    def test_role_and_active_changes_invalidate(self):
+        """Test role and active changes are visible on the next request"""
+        self._authenticate()
+        self.user.role = 'moderator'
+        self.user.save(update_fields=['role'])
+        user, _ = self._authenticate()
+        self.assertEqual(user.role, 'moderator')
+
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertIsNone(self._authenticate())
+
+    def test_public_path_skips_authentication(self):
+        """Test public endpoints are not authenticated"""
+        with self.assertNumQueries(0):
+            self.assertIsNone(self._authenticate('/api/users/login/'))
+
+
+class LoginFastPathTestCase(TestCase):
+    """Test cache-backed failed login tracking"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from apps.common.cache import CacheKeys, get_redis_client
+        cache.clear()
+        client = get_redis_client()
+        if client is not None:
+            client.delete(CacheKeys.audit_buffer())
+            for key in client.keys('auth:login_failures:*'):
+                client.delete(key)
+        self.user = User.objects.create_user(
+            username='target', email='target@example.com', password='TestPass123!'
+        )
+
+    def _login(self, password):
+        from apps.users.serializers import LoginSerializer
+        return LoginSerializer(data={'username': 'target', 'password': password})
+
+    def test_failed_attempt_does_not_write(self):
+        """Test a failed attempt only reads the user row"""
+        with self.assertNumQueries(1):
+            self.assertFalse(self._login('wrong').is_valid())
+
+    def test_failure_counter_expires(self):
+        """Test the failure counter is created with the lockout window as its TTL"""
+        from apps.common.cache import CacheKeys, get_redis_client
+        from apps.users.login_guard import LOCKOUT_SECONDS, _username_key
+
+        client = get_redis_client()
+        if client is None:
+            self.skipTest('Redis cache not configured')
+        self.assertFalse(self._login('wrong').is_valid())
+        self.assertFalse(self._login('wrong').is_valid())
+
+        key = CacheKeys.login_failures(_username_key('target'))
+        self.assertEqual(int(client.get(key)), 2)
+        self.assertTrue(0 < client.ttl(key) <= LOCKOUT_SECONDS)
+
+    def test_lockout_after_max_attempts(self):
+        """Test the account locks after repeated failures and rejects the right password"""
+        from apps.common.constants import MAX_LOGIN_ATTEMPTS
+        for _ in range(MAX_LOGIN_ATTEMPTS):
+            self.assertFalse(self._login('wrong').is_valid())
+
+        serializer = self._login('TestPass123!')
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('locked', str(serializer.errors))
+
+    def test_success_resets_failures(self):
+        """Test a successful login clears the failure count"""
+        from apps.common.constants import MAX_LOGIN_ATTEMPTS
+        for _ in range(MAX_LOGIN_ATTEMPTS - 1):
+            self._login('wrong').is_valid()
+        self.assertTrue(self._login('TestPass123!').is_valid())
+        self.assertFalse(self._login('wrong').is_valid())
+        self.assertTrue(self._login('TestPass123!').is_valid())
+
+    def test_buffered_failures_flush_in_bulk(self):
+        """Test buffered failure audits are written with the user resolved"""
+        from apps.users.audit import AuditBuffer
+        for _ in range(3):
+            AuditBuffer.push('FAILED_LOGIN', 'Failed login attempt', username='target', ip_address='127.0.0.1')
+        AuditBuffer.push('FAILED_LOGIN', 'Failed login attempt', username='ghost')
+
+        AuditBuffer.flush()
+        logs = AuditLog.objects.filter(action='FAILED_LOGIN')
+        self.assertEqual(logs.count(), 4)
+        self.assertEqual(logs.filter(user=self.user).count(), 3)
+        self.assertEqual(logs.filter(user__isnull=True).count(), 1)
+
+
+@override_settings(AUDIT_LOG_BUFFER='database')
+class AuditPipelineTestCase(TestCase):
+    """Test request-scoped audit batching"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='auditor', email='auditor@example.com', password='TestPass123!'
+        )
+
+    def _run(self, view):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from apps.common.middleware import AuditLoggingMiddleware
+
+        def get_response(request):
+            view(request)
+            return HttpResponse(status=200)
+
+        request = RequestFactory().post('/api/users/something/')
+        request.user = self.user
+        with self.captureOnCommitCallbacks(execute=True):
+            return AuditLoggingMiddleware(get_response)(request)
+
+    def test_view_events_written_in_one_insert(self):
+        """Test events recorded by a view are bulk inserted and not duplicated"""
+        from apps.users.audit import record_audit
+
+        def view(request):
+            with self.assertNumQueries(0):
+                record_audit(user=self.user, action='DEPOSIT', description='first')
+                record_audit(user=self.user, action='WITHDRAWAL', description='second')
+
+        with self.assertNumQueries(1):
+            self._run(view)
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('description', flat=True)),
+            ['first', 'second']
+        )
+
+    def test_generic_row_when_view_does_not_log(self):
+        """Test the middleware logs a mutating request the view didn't log"""
+        self._run(lambda request: None)
+        log = AuditLog.objects.get()
+        self.assertEqual(log.user, self.user)
+        self.assertIn('POST /api/users/something/', log.description)
+
+    def test_rolled_back_events_dropped(self):
+        """Test events from a rolled back atomic block are not written"""
+        from django.db import transaction
+        from apps.users.audit import record_audit
+
+        def view(request):
+            try:
+                with transaction.atomic():
+                    record_audit(user=self.user, action='DEPOSIT', description='rolled back')
+                    raise ValueError('abort')
+            except ValueError:
+                pass
+
+        self._run(view)
+        log = AuditLog.objects.get()
+        self.assertIn('POST /api/users/something/', log.description)
+
+    def test_failed_batch_written_per_event(self):
+        """Test one failing event doesn't drop the rest of the batch"""
+        from unittest.mock import patch
+        from apps.users.audit import AuditBuffer, record_audit
+
+        write = AuditBuffer.write
+
+        def failing_write(entries):
+            if len(entries) > 1 or entries[0]['description'] == 'bad':
+                raise ValueError('insert failed')
+            return write(entries)
+
+        def view(request):
+            record_audit(user=self.user, action='DEPOSIT', description='good')
+            record_audit(user=self.user, action='DEPOSIT', description='bad')
+
+        with patch.object(AuditBuffer, 'write', side_effect=failing_write):
+            self._run(view)
+        self.assertEqual(list(AuditLog.objects.values_list('description', flat=True)), ['good'])
+
+    def test_redis_buffer_keeps_insert_off_request(self):
+        """Test the redis writer buffers request events instead of inserting them"""
+        from apps.common.cache import CacheKeys, get_redis_client
+        from apps.users.audit import AuditBuffer, record_audit
+
+        client = get_redis_client()
+        if client is None:
+            self.skipTest('Redis not available')
+        client.delete(CacheKeys.audit_buffer())
+
+        def view(request):
+            record_audit(user=self.user, action='DEPOSIT', description='buffered')
+
+        with self.settings(AUDIT_LOG_BUFFER='redis'), self.assertNumQueries(0):
+            self._run(view)
+        self.assertEqual(AuditLog.objects.count(), 0)
+
+        AuditBuffer.flush()
+        self.assertEqual(AuditLog.objects.get().description, 'buffered')
+
+    def test_outside_request_written_on_commit(self):
+        """Test events outside a request are written when the transaction commits"""
+        from apps.users.audit import record_audit
+        with self.captureOnCommitCallbacks(execute=True):
+            record_audit(user=self.user, action='WIN', description='draw')
+            self.assertEqual(AuditLog.objects.count(), 0)
+        self.assertEqual(AuditLog.objects.filter(action='WIN').count(), 1)
+
+
+class AuditLogRetentionTestCase(TestCase):
+    """Test audit log retention and archival"""
+
+    def setUp(self):
+        import tempfile
+        from datetime import datetime, timezone as dt_timezone
+        self.archive_dir = tempfile.mkdtemp()
+        self.now = datetime(2026, 6, 15, tzinfo=dt_timezone.utc)
+        for month, count in ((1, 3), (2, 2), (6, 1)):
+            AuditLog.objects.bulk_create([
+                AuditLog(action='LOGIN', description=f'{month}-{i}',
+                         timestamp=datetime(2026, month, 10, tzinfo=dt_timezone.utc))
+                for i in range(count)
+            ])
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+
+    def test_apply_retention_archives_and_deletes_old_months(self):
+        """Test months past retention are archived to gzip files and removed"""
+        import gzip
+        import json
+        from apps.users.audit_partitions import AuditLogPartitionService
+
+        results = AuditLogPartitionService.apply_retention(
+            retention_months=3, archive_dir=self.archive_dir, now=self.now
+        )
+
+        self.assertEqual([(month.month, count) for month, _, count in results], [(1, 3), (2, 2)])
+        self.assertEqual(list(AuditLog.objects.values_list('description', flat=True)), ['6-0'])
+        with gzip.open(results[0][1], 'rt') as archive:
+            rows = [json.loads(line) for line in archive]
+        self.assertEqual(sorted(row['description'] for row in rows), ['1-0', '1-1', '1-2'])
+
+    def test_dry_run_keeps_rows(self):
+        """Test dry run only reports months"""
+        from apps.users.audit_partitions import AuditLogPartitionService
+
+        results = AuditLogPartitionService.apply_retention(
+            retention_months=3, archive_dir=self.archive_dir, now=self.now, dry_run=True
+        )
+        self.assertEqual(len(results), 2)
+        self.assertEqual(AuditLog.objects.count(), 6)
+
+    def test_rerun_keeps_existing_archive(self):
+        """Test archiving a month again writes a new file instead of replacing the old one"""
+        from datetime import datetime, timezone as dt_timezone
+        from apps.users.audit_partitions import AuditLogPartitionService
+
+        month = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        first, _ = AuditLogPartitionService.archive_month(month, self.archive_dir)
+        second, count = AuditLogPartitionService.archive_month(month, self.archive_dir)
+
+        self.assertNotEqual(first, second)
+        self.assertTrue(second.endswith('audit_logs_p2026_01.1.jsonl.gz'))
+        self.assertEqual(count, 3)
+
+
+class AuditLogPartitionTestCase(TestCase):
+    """Test retention on the partitioned PostgreSQL table"""
+
+    def setUp(self):
+        import tempfile
+        from datetime import datetime, timezone as dt_timezone
+        from django.db import connection
+        from apps.users.audit_partitions import AuditLogPartitionService
+
+        if not AuditLogPartitionService.is_partitioned():
+            self.skipTest(f'audit_logs is not partitioned on {connection.vendor}')
+        self.archive_dir = tempfile.mkdtemp()
+        self.now = datetime(2026, 6, 15, tzinfo=dt_timezone.utc)
+        # No partition exists this far back, so these land in the default one
+        self.old_month = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+        AuditLog.objects.create(action='LOGIN', description='old',
+                                timestamp=datetime(2020, 1, 10, tzinfo=dt_timezone.utc))
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+
+    def _default_rows(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM "audit_logs_default"')
+            return cursor.fetchone()[0]
+
+    def test_default_partition_rows_archived(self):
+        """Test expired rows in the default partition are archived and removed"""
+        from apps.users.audit_partitions import AuditLogPartitionService
+
+        self.assertEqual(self._default_rows(), 1)
+        results = AuditLogPartitionService.apply_retention(
+            retention_months=3, archive_dir=self.archive_dir, now=self.now
+        )
+
+        self.assertIn((self.old_month, 1), [(month, count) for month, _, count in results])
+        self.assertEqual(self._default_rows(), 0)
+        self.assertFalse(AuditLog.objects.filter(description='old').exists())
+
+    def test_detached_table_resumed(self):
+        """Test a month detached by an interrupted run is archived by the next one"""
+        from apps.users.audit_partitions import AuditLogPartitionService
+
+        AuditLogPartitionService._detach_month(self.old_month)
+        self.assertFalse(AuditLog.objects.filter(description='old').exists())
+        self.assertEqual(AuditLogPartitionService.list_detached()[0][0], self.old_month)
+
+        results = AuditLogPartitionService.apply_retention(
+            retention_months=3, archive_dir=self.archive_dir, now=self.now
+        )
+
+        self.assertIn((self.old_month, 1), [(month, count) for month, _, count in results])
+        self.assertEqual(AuditLogPartitionService.list_detached(), [])
+
+
+class SpendCountersTestCase(TestCase):
+    """Test responsible gaming limits served from spend counters"""
+
+    def setUp(self):
+        from decimal import Decimal
+        from apps.common.cache import get_redis_client
+        self.client_redis = get_redis_client()
+        self.client_redis.flushdb()
+        self.user = User.objects.create_user(
+            username='spender', email='spender@example.com', password='TestPass123!'
+        )
+        self.user.daily_deposit_limit = Decimal('100.00')
+        self.user.daily_loss_limit = Decimal('30.00')
+        self.user.save()
+
+    def tearDown(self):
+        self.client_redis.flushdb()
+
+    def test_missing_windows_seeded_from_database(self):
+        """Test unseeded windows are filled from transactions on first read"""
+        from decimal import Decimal
+        from apps.transactions.models import Transaction
+        from apps.users.spend_counters import SpendCounters
+
+        Transaction.objects.create(user=self.user, type='DEPOSIT', amount=Decimal('60.00'), status='COMPLETED')
+
+        with self.assertNumQueries(1):
+            counters = SpendCounters.get(self.user.id)
+        self.assertEqual(counters['day']['deposits'], Decimal('60.00'))
+        with self.assertNumQueries(0):
+            self.assertEqual(SpendCounters.get(self.user.id), counters)
+
+    def test_evicted_window_not_read_as_zero(self):
+        """Test a window recreated by increments after eviction is reseeded"""
+        from decimal import Decimal
+        from apps.common.cache import CacheKeys
+        from apps.transactions.models import Transaction
+        from apps.users.responsible_gaming import ResponsibleGamingService
+        from apps.users.spend_counters import SpendCounters, window_starts
+
+        Transaction.objects.create(user=self.user, type='DEPOSIT', amount=Decimal('60.00'), status='COMPLETED')
+        SpendCounters.get(self.user.id)
+
+        day_key = CacheKeys.spend_window(self.user.id, 'day', window_starts()['day'].isoformat())
+        self.client_redis.delete(day_key)
+        Transaction.objects.create(user=self.user, type='DEPOSIT', amount=Decimal('10.00'), status='COMPLETED')
+        SpendCounters.record_many([(self.user.id, 'DEPOSIT', Decimal('10.00'))])
+
+        counters = SpendCounters.get(self.user.id)
+        self.assertEqual(counters['day']['deposits'], Decimal('70.00'))
+        is_valid, _ = ResponsibleGamingService.check_deposit_limit(self.user, 40)
+        self.assertFalse(is_valid)
+
+    def test_limit_checks_read_counters(self):
+        """Test committed movements update counters and checks run without SUM queries"""
+        from decimal import Decimal
+        from apps.users.responsible_gaming import ResponsibleGamingService
+        from apps.users.spend_counters import SpendCounters
+
+        SpendCounters.get(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.add_balance(Decimal('80.00'), 'DEPOSIT')
+            self.user.deduct_balance(Decimal('25.00'), 'TICKET_PURCHASE')
+
+        with self.assertNumQueries(0):
+            is_valid, error = ResponsibleGamingService.check_deposit_limit(self.user, 30)
+            self.assertFalse(is_valid)
+            self.assertIn('Remaining: $20.00', error)
+            is_valid, _ = ResponsibleGamingService.check_loss_limit(self.user, 10)
+            self.assertFalse(is_valid)
+            is_valid, _ = ResponsibleGamingService.check_loss_limit(self.user, 5)
+            self.assertTrue(is_valid)
+
+    def test_reconcile_rebuilds_from_transactions(self):
+        """Test reconciliation replaces drifted counters with transaction totals"""
+        from decimal import Decimal
+        from apps.transactions.models import Transaction
+        from apps.users.spend_counters import SpendCounters
+
+        SpendCounters.record_many([(self.user.id, 'DEPOSIT', Decimal('500.00'))])
+        Transaction.objects.create(user=self.user, type='DEPOSIT', amount=Decimal('40.00'), status='COMPLETED')
+        Transaction.objects.create(user=self.user, type='PRIZE_AWARD', amount=Decimal('5.00'), status='COMPLETED')
+        Transaction.objects.create(user=self.user, type='DEPOSIT', amount=Decimal('70.00'), status='PENDING')
+
+        self.assertEqual(SpendCounters.reconcile(), 1)
+        with self.assertNumQueries(0):
+            counters = SpendCounters.get(self.user.id)
+        self.assertEqual(counters['day']['deposits'], Decimal('40.00'))
+        self.assertEqual(counters['month']['prizes'], Decimal('5.00'))
+        self.assertEqual(counters['week']['purchases'], Decimal('0.00'))
+
+    def test_reconcile_keeps_concurrent_increments(self):
+        """Test movements recorded while reconcile sums transactions are kept"""
+        from decimal import Decimal
+        from unittest.mock import patch
+        from apps.transactions.models import Transaction
+        from apps.users.spend_counters import SpendCounters
+
+        SpendCounters.get(self.user.id)
+        Transaction.objects.create(user=self.user, type='DEPOSIT', amount=Decimal('40.00'), status='COMPLETED')
+        totals = SpendCounters._totals
+
+        def totals_with_concurrent_deposit(*args, **kwargs):
+            result = totals(*args, **kwargs)
+            SpendCounters.record_many([(self.user.id, 'DEPOSIT', Decimal('15.00'))])
+            return result
+
+        with patch.object(SpendCounters, '_totals', side_effect=totals_with_concurrent_deposit):
+            SpendCounters.reconcile()
+
+        self.assertEqual(SpendCounters.get(self.user.id)['day']['deposits'], Decimal('55.00'))
+
+
+class ResponsibleGamingGateTestCase(TestCase):
+    """Test the single-pass responsible gaming gate"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='gated', email='gated@example.com', password='TestPass123!'
+        )
+
+    def test_purchase_one_read_deferred_session_start(self):
+        """Test an allowed purchase reads once and defers the session start to one narrow UPDATE"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.users.responsible_gaming import ResponsibleGamingGate
+
+        with self.assertNumQueries(1):
+            verdict = ResponsibleGamingGate.check_purchase(self.user, 5)
+            self.user.wallet_balance  # loaded by the gate
+
+        self.assertTrue(verdict)
+        self.assertIn('last_session_start', verdict.pending)
+        self.assertIsNone(User.objects.get(pk=self.user.pk).last_session_start)
+
+        with CaptureQueriesContext(connection) as ctx:
+            ResponsibleGamingGate.apply_pending(self.user, verdict)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        update = ctx.captured_queries[0]['sql']
+        self.assertTrue(update.startswith('UPDATE'))
+        self.assertIn('last_session_start', update)
+        self.assertNotIn('password', update)
+        self.assertIsNotNone(User.objects.get(pk=self.user.pk).last_session_start)
+
+    def test_expired_exclusion_cleared(self):
+        """Test an expired exclusion is cleared and the deposit allowed"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.users.responsible_gaming import ResponsibleGamingGate
+
+        User.objects.filter(pk=self.user.pk).update(
+            self_excluded=True, self_exclusion_until=timezone.now() - timedelta(days=1)
+        )
+        verdict = ResponsibleGamingGate.check_deposit(self.user, 10)
+
+        self.assertTrue(verdict)
+        self.assertFalse(User.objects.get(pk=self.user.pk).self_excluded)
+
+    def test_verdicts(self):
+        """Test exclusion and session limit verdicts"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.users.responsible_gaming import ResponsibleGamingGate
+
+        User.objects.filter(pk=self.user.pk).update(
+            session_time_limit=30, last_session_start=timezone.now() - timedelta(hours=1)
+        )
+        verdict = ResponsibleGamingGate.check_purchase(self.user, 5)
+        self.assertFalse(verdict)
+        self.assertEqual(verdict.status_code, 403)
+        self.assertIn('Session time limit', verdict.error)
+
+        User.objects.filter(pk=self.user.pk).update(self_excluded=True)
+        verdict = ResponsibleGamingGate.check_deposit(self.user, 10)
+        self.assertEqual((verdict.allowed, verdict.error), (False, 'Permanently self-excluded'))
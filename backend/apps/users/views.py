@@ -7,6 +7,8 @@ from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny
 from apps.common.throttling import SafeAnonRateThrottle
+from apps.common.exceptions import ServiceUnavailableError
+from apps.common.resilience import unavailable_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,14 +17,15 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.decorators import method_decorator
 from django.utils import timezone
+from django.db import transaction
 from decimal import Decimal
 from apps.notifications.services import EmailService
 from apps.notifications.tasks import (
-    send_welcome_email_task,
     send_email_verification_task,
     send_password_reset_task
 )
-from apps.users.models import User, UserProfile, AuditLog
+from apps.users.models import User, UserProfile
+from apps.users.audit import AuditBuffer, record_audit
 from apps.users.serializers import (
     UserSerializer, RegisterSerializer, LoginSerializer,
     UserDetailSerializer, UserProfileSerializer,
@@ -30,6 +33,7 @@ from apps.users.serializers import (
     EmailVerificationSerializer, ChangePasswordSerializer
 )
 from apps.users.permissions import IsSameUserOrAdmin
+from apps.users.registration import RegistrationService
 
 
 class RegisterThrottle(SafeAnonRateThrottle):
@@ -55,23 +59,27 @@ def register_view(request):
     """Handle user registration"""
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
-        user = serializer.save()
-        AuditLog.objects.create(
-            user=user,
-            action='REGISTER',
-            description='User registered',
-            ip_address=get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
-        )
-        # Send welcome email asynchronously
-        send_welcome_email_task.delay(str(user.id))
+        with transaction.atomic():
+            user = serializer.save()
+            record_audit(
+                user=user,
+                action='REGISTER',
+                description='User registered',
+                ip_address=get_client_ip(request),
+                user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
+            )
+            # Welcome email and referral bookkeeping run in one job after commit
+            RegistrationService.schedule_side_effects(
+                user,
+                referral_code=serializer.validated_data.get('referral_code') or None
+            )
         return Response(
             {'message': 'User registered successfully'},
             status=status.HTTP_201_CREATED
         )
     else:
         # Log failed registration attempt
-        AuditLog.objects.create(
+        record_audit(
             user=None,
             action='FAILED_REGISTER',
             description=f'Failed registration attempt: {str(serializer.errors)}',
@@ -100,7 +108,7 @@ def login_view(request):
         user.last_login_user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
         user.save(update_fields=['last_login_ip', 'last_login_user_agent'])
         
-        AuditLog.objects.create(
+        record_audit(
             user=user,
             action='LOGIN',
             description='User logged in',
@@ -117,27 +125,17 @@ def login_view(request):
             'user': UserDetailSerializer(user).data
         })
     else:
-        # Log failed login attempt
+        # Log failed login attempt; buffered and bulk-written off the request
+        # path, with the username resolved to a user at flush time
         username = request.data.get('username')
         if username:
-            try:
-                user = User.objects.get(username=username)
-                AuditLog.objects.create(
-                    user=user,
-                    action='FAILED_LOGIN',
-                    description='Failed login attempt',
-                    ip_address=get_client_ip(request),
-                    user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
-                )
-            except User.DoesNotExist:
-                # User doesn't exist, but we still want to log the attempt
-                AuditLog.objects.create(
-                    user=None,
-                    action='FAILED_LOGIN',
-                    description=f'Failed login attempt for non-existent user: {username}',
-                    ip_address=get_client_ip(request),
-                    user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
-                )
+            AuditBuffer.push(
+                'FAILED_LOGIN',
+                f'Failed login attempt for username: {username}',
+                username=username,
+                ip_address=get_client_ip(request),
+                user_agent=request.META.get('HTTP_USER_AGENT', '')
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -164,7 +162,7 @@ class PasswordResetRequestView(APIView):
                     send_password_reset_task.delay(str(user.id), token)
                     
                     # Create audit log
-                    AuditLog.objects.create(
+                    record_audit(
                         user=user,
                         action='PASSWORD_RESET_REQUEST',
                         description='Password reset request sent',
@@ -193,10 +191,10 @@ class PasswordResetView(APIView):
             user.set_password(new_password)
             user.password_reset_token = None
             user.password_reset_expires = None
-            user.save()
+            user.save(update_fields=['password', 'password_reset_token', 'password_reset_expires', 'updated_at'])
             
             # Create audit log
-            AuditLog.objects.create(
+            record_audit(
                 user=user,
                 action='PASSWORD_RESET',
                 description='Password reset successful',
@@ -226,10 +224,10 @@ class ChangePasswordView(APIView):
             
             # Set new password
             user.set_password(new_password)
-            user.save()
+            user.save(update_fields=['password', 'updated_at'])
             
             # Create audit log
-            AuditLog.objects.create(
+            record_audit(
                 user=user,
                 action='CHANGE_PASSWORD',
                 description='Password changed',
@@ -254,10 +252,10 @@ class EmailVerificationView(APIView):
                 # Verify email
                 user.email_verified = True
                 user.email_verification_token = None
-                user.save()
+                user.save(update_fields=['email_verified', 'email_verification_token', 'updated_at'])
                 
                 # Create audit log
-                AuditLog.objects.create(
+                record_audit(
                     user=user,
                     action='EMAIL_VERIFICATION',
                     description='Email verified successfully',
@@ -449,19 +447,11 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def add_funds(self, request):
         """Add funds to user wallet via Stripe payment intent"""
-        from apps.users.responsible_gaming import ResponsibleGamingService
+        from apps.users.responsible_gaming import ResponsibleGamingGate
         from apps.payments.services import StripeService
         
         user = request.user
         
-        # Check self-exclusion
-        is_excluded, exclusion_reason = ResponsibleGamingService.check_self_exclusion(user)
-        if is_excluded:
-            return Response(
-                {'error': exclusion_reason},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        
         amount = request.data.get('amount', 0)
         payment_method_id = request.data.get('payment_method_id')
         save_payment_method = request.data.get('save_payment_method', False)
@@ -474,12 +464,12 @@ class UserViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Check deposit limits
-            is_valid, error_message = ResponsibleGamingService.check_deposit_limit(user, amount)
-            if not is_valid:
+            # Self-exclusion and deposit limits in one pass
+            verdict = ResponsibleGamingGate.check_deposit(user, amount)
+            if not verdict:
                 return Response(
-                    {'error': error_message},
-                    status=status.HTTP_400_BAD_REQUEST
+                    {'error': verdict.error},
+                    status=verdict.status_code
                 )
             
             # Create Stripe payment intent
@@ -491,7 +481,7 @@ class UserViewSet(viewsets.ModelViewSet):
                     save_payment_method=save_payment_method
                 )
                 
-                AuditLog.objects.create(
+                record_audit(
                     user=user,
                     action='DEPOSIT',
                     description=f'Created payment intent for ${amount}'
@@ -505,6 +495,8 @@ class UserViewSet(viewsets.ModelViewSet):
                     'currency': payment_intent.currency
                 })
                 
+            except ServiceUnavailableError as e:
+                return unavailable_response(e)
             except Exception as e:
                 import logging
                 logger = logging.getLogger(__name__)
@@ -533,7 +525,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def logout(self, request):
         """Handle user logout"""
         user = request.user
-        AuditLog.objects.create(
+        record_audit(
             user=user,
             action='LOGOUT',
             description='User logged out'
@@ -601,10 +593,10 @@ class UserViewSet(viewsets.ModelViewSet):
         old_role = user.role
         user.role = new_role
         user.is_admin = (new_role == 'admin')
-        user.save()
+        user.save(update_fields=['role', 'is_admin', 'updated_at'])
         
         # Create audit log
-        AuditLog.objects.create(
+        record_audit(
             user=request.user,
             action='CHANGE_ROLE',
             description=f'Changed user {user.username} role from {old_role} to {new_role}',
@@ -624,12 +616,12 @@ class UserViewSet(viewsets.ModelViewSet):
         
         user = self.get_object()
         user.is_active = not user.is_active
-        user.save()
+        user.save(update_fields=['is_active', 'updated_at'])
         
         status_str = 'activated' if user.is_active else 'deactivated'
         
         # Create audit log
-        AuditLog.objects.create(
+        record_audit(
             user=request.user,
             action='TOGGLE_USER_STATUS',
             description=f'{status_str.capitalize()} user {user.username}',
@@ -665,9 +657,9 @@ class UserViewSet(viewsets.ModelViewSet):
             user.date_of_birth = dob
             user.age_verified = True
             user.age_verified_at = timezone.now()
-            user.save()
+            user.save(update_fields=['date_of_birth', 'age_verified', 'age_verified_at', 'updated_at'])
             
-            AuditLog.objects.create(
+            record_audit(
                 user=user,
                 action='EMAIL_VERIFICATION',  # Reusing action type
                 description='Age verified'
@@ -707,7 +699,7 @@ class UserViewSet(viewsets.ModelViewSet):
         
         ResponsibleGamingService.apply_self_exclusion(user, days)
         
-        AuditLog.objects.create(
+        record_audit(
             user=user,
             action='ACCOUNT_LOCKED',  # Reusing action type
             description=f'Self-exclusion requested for {days} days' if days else 'Permanent self-exclusion requested'
@@ -755,7 +747,7 @@ class UserViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        user.save()
+        user.save(update_fields=['daily_deposit_limit', 'weekly_deposit_limit', 'monthly_deposit_limit', 'updated_at'])
         
         return Response({
             'message': 'Deposit limits updated',
@@ -785,9 +777,9 @@ class UserViewSet(viewsets.ModelViewSet):
         
         user.kyc_status = 'PENDING'
         user.kyc_submitted_at = timezone.now()
-        user.save()
+        user.save(update_fields=['id_document', 'address_proof', 'kyc_status', 'kyc_submitted_at', 'updated_at'])
         
-        AuditLog.objects.create(
+        record_audit(
             user=user,
             action='EMAIL_VERIFICATION',  # Reusing action type
             description='KYC documents submitted'
@@ -842,7 +834,7 @@ class UserViewSet(viewsets.ModelViewSet):
         
         GDPRService.delete_user_data(user)
         
-        AuditLog.objects.create(
+        record_audit(
             user=user,
             action='ACCOUNT_LOCKED',
             description='Account deleted (GDPR request)'
@@ -894,7 +886,7 @@ class Setup2FAView(APIView):
         # Generate secret
         secret = generate_totp_secret()
         user.two_factor_secret = secret
-        user.save()
+        user.save(update_fields=['two_factor_secret', 'updated_at'])
         
         # Generate QR code
         uri = generate_totp_uri(user, secret)
@@ -941,7 +933,7 @@ class Verify2FASetupView(APIView):
         backup_codes = generate_backup_codes()
         user.two_factor_backup_codes = backup_codes
         user.is_2fa_enabled = True
-        user.save()
+        user.save(update_fields=['two_factor_backup_codes', 'is_2fa_enabled', 'updated_at'])
         
         return Response({
             'message': '2FA enabled successfully',
@@ -967,6 +959,6 @@ class Disable2FAView(APIView):
         user.is_2fa_enabled = False
         user.two_factor_secret = None
         user.two_factor_backup_codes = []
-        user.save()
+        user.save(update_fields=['is_2fa_enabled', 'two_factor_secret', 'two_factor_backup_codes', 'updated_at'])
         
         return Response({'message': '2FA disabled successfully'})
\ No newline at end of file
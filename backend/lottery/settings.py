@@ -300,6 +300,42 @@ STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
 STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
 STRIPE_CURRENCY = os.environ.get('STRIPE_CURRENCY', 'usd')
+# Alternative API endpoint, e.g. a local stripe-mock server for tests
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', '')
+# Keep-alive connections (and concurrent calls) to Stripe per process
+STRIPE_HTTP_POOL_SIZE = int(os.environ.get('STRIPE_HTTP_POOL_SIZE', '10'))
+# Saved card listings are invalidated by payment_method.* webhooks
+STRIPE_PAYMENT_METHODS_CACHE_TIMEOUT = int(os.environ.get('STRIPE_PAYMENT_METHODS_CACHE_TIMEOUT', '3600'))
+# Time budget for all Stripe calls made by one API request
+STRIPE_REQUEST_BUDGET = float(os.environ.get('STRIPE_REQUEST_BUDGET', '8'))
+
+# Outbound provider calls: per-call timeout (seconds), circuit breaker and
+# per-host concurrency limit (see apps/common/resilience.py)
+OUTBOUND_PROVIDERS = {
+    'stripe': {
+        'timeout': float(os.environ.get('STRIPE_CALL_TIMEOUT', '5')),
+        'failure_threshold': int(os.environ.get('STRIPE_BREAKER_FAILURE_THRESHOLD', '5')),
+        'reset_timeout': float(os.environ.get('STRIPE_BREAKER_RESET_TIMEOUT', '30')),
+        'max_concurrent': int(os.environ.get('STRIPE_MAX_CONCURRENT_CALLS', '4')),
+    },
+}
+
+# Audit Logging
+# 'redis': buffer in Redis and bulk insert from flush_audit_buffer_task,
+# falling back to a direct insert when Redis is unavailable;
+# 'database': one bulk insert per request, in the request path
+AUDIT_LOG_BUFFER = os.environ.get('AUDIT_LOG_BUFFER', 'redis')
+# Months of audit logs kept online; older months are archived and dropped
+AUDIT_LOG_RETENTION_MONTHS = int(os.environ.get('AUDIT_LOG_RETENTION_MONTHS', '12'))
+AUDIT_LOG_ARCHIVE_DIR = os.environ.get('AUDIT_LOG_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archives', 'audit_logs'))
+
+# Analytics Exports
+ANALYTICS_EXPORT_DIR = os.environ.get('ANALYTICS_EXPORT_DIR', os.path.join(BASE_DIR, 'exports'))
+
+# Withdrawal Payouts
+# 'CSV' or 'BANK' (fixed-width bank file)
+PAYOUT_BATCH_FORMAT = os.environ.get('PAYOUT_BATCH_FORMAT', 'CSV')
+PAYOUT_EXPORT_DIR = os.environ.get('PAYOUT_EXPORT_DIR', os.path.join(BASE_DIR, 'exports', 'payouts'))
 
 # Celery Beat Schedule
 CELERY_BEAT_SCHEDULE = {
@@ -319,6 +355,14 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.lotteries.tasks.update_lottery_statuses',
         'schedule': 3600.0,  # Every hour
     },
+    'reconcile-sales-counters': {
+        'task': 'apps.lotteries.tasks.reconcile_sales_counters',
+        'schedule': 600.0,  # Every 10 minutes
+    },
+    'refresh-dashboard-snapshots': {
+        'task': 'apps.analytics.tasks.refresh_dashboard_snapshots_task',
+        'schedule': 300.0,  # Every 5 minutes
+    },
     'check-referral-bonus-expiry': {
         'task': 'apps.referrals.tasks.check_referral_bonus_expiry',
         'schedule': 86400.0,  # Daily
@@ -327,6 +371,46 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.referrals.tasks.process_pending_referrals',
         'schedule': 21600.0,  # Every 6 hours
     },
+    'refresh-referral-leaderboard': {
+        'task': 'apps.referrals.tasks.refresh_referral_leaderboard',
+        'schedule': 240.0,  # Every 4 minutes, inside the 5-minute snapshot TTL
+    },
+    'flush-audit-buffer': {
+        'task': 'apps.users.tasks.flush_audit_buffer_task',
+        'schedule': 15.0,  # Every 15 seconds
+    },
+    'maintain-audit-log-partitions': {
+        'task': 'apps.users.tasks.maintain_audit_log_partitions_task',
+        'schedule': 86400.0,  # Daily
+    },
+    'build-wallet-snapshots': {
+        'task': 'apps.transactions.tasks.build_wallet_snapshots_task',
+        'schedule': 3600.0,  # Every hour
+    },
+    'reconcile-wallet-ledger': {
+        'task': 'apps.transactions.tasks.reconcile_wallet_ledger_task',
+        'schedule': 86400.0,  # Daily
+    },
+    'reconcile-spend-counters': {
+        'task': 'apps.users.tasks.reconcile_spend_counters_task',
+        'schedule': 86400.0,  # Daily
+    },
+    'reconcile-withdrawal-counters': {
+        'task': 'apps.transactions.tasks.reconcile_withdrawal_counters_task',
+        'schedule': 86400.0,  # Daily
+    },
+    'process-stripe-events': {
+        'task': 'apps.payments.tasks.process_stripe_events_task',
+        'schedule': 30.0,  # Every 30 seconds
+    },
+    'create-payout-batches': {
+        'task': 'apps.transactions.tasks.create_payout_batches_task',
+        'schedule': 86400.0,  # Daily
+    },
+    'process-referral-deposits': {
+        'task': 'apps.referrals.tasks.process_referral_deposits_task',
+        'schedule': 300.0,  # Every 5 minutes
+    },
 }
 
 # Logging Configuration